@@ -0,0 +1,279 @@
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from firebase_admin import firestore
+from clients import get_db
+from tracing import span
+
+# Asynchronous contract analysis jobs.
+# analyzeContract creates a job document and returns 202; the runAnalysisJob
+# Firestore trigger executes the pipeline and records stage progress on it.
+# A claimed job holds a lease; if the instance running it dies, the lease
+# expires and reclaim_expired_jobs runs it again (or fails it once it has used
+# up its attempts), so no job stays 'running' forever.
+
+ANALYSIS_JOBS_COLLECTION = 'analysisJobs'
+JOB_STAGES = ('downloading', 'parsing', 'analyzing', 'saving')
+# Longer than runAnalysisJob's 540s timeout, so a live run never outlasts it
+ANALYSIS_JOB_LEASE_SECONDS = int(os.environ.get("ANALYSIS_JOB_LEASE_SECONDS", 600))
+ANALYSIS_JOB_MAX_ATTEMPTS = int(os.environ.get("ANALYSIS_JOB_MAX_ATTEMPTS", 2))
+# Expired jobs re-run per reclaim pass
+ANALYSIS_JOB_RECLAIM_BATCH = int(os.environ.get("ANALYSIS_JOB_RECLAIM_BATCH", 1))
+
+
+def create_analysis_job(contract_id, pdf_url=None, pdf_path=None, options=None, user_id=None):
+    """
+    Create a queued analysis job and return its id. user_id is the contract's
+    owner; only they can read the job (firestore.rules, getAnalysisJob).
+    """
+    job_ref = get_db().collection(ANALYSIS_JOBS_COLLECTION).document()
+    job_ref.set({
+        'contractId': contract_id,
+        'userId': user_id,
+        'pdfUrl': pdf_url,
+        'pdfPath': pdf_path,
+        'options': options or {},
+        'status': 'queued',
+        'stage': 'queued',
+        'stages': {},
+        'attempts': 0,
+        'error': None,
+        'createdAt': firestore.SERVER_TIMESTAMP,
+        'updatedAt': firestore.SERVER_TIMESTAMP
+    })
+    print(f"Analysis job {job_ref.id} queued for contract {contract_id}")
+    return job_ref.id
+
+
+def lease_expired(job, now=None):
+    """
+    Whether a running job's lease has run out
+    """
+    lease_expires_at = job.get('leaseExpiresAt')
+    if job.get('status') != 'running' or lease_expires_at is None:
+        return False
+    return lease_expires_at <= (now or datetime.now(timezone.utc))
+
+
+def claim_updates(job, now):
+    """
+    The update that claims a job at `now`: a new lease for a queued job or one
+    whose lease expired, a failure once it is out of attempts, or None when a
+    live run still holds it
+    """
+    if job.get('status') != 'queued' and not lease_expired(job, now):
+        return None
+    attempts = job.get('attempts', 0) + 1
+    if attempts > ANALYSIS_JOB_MAX_ATTEMPTS:
+        return {
+            'status': 'failed',
+            'failedStage': job.get('stage'),
+            'error': f"Lease expired after {job.get('attempts', 0)} attempts",
+            'leaseExpiresAt': firestore.DELETE_FIELD,
+            'finishedAt': firestore.SERVER_TIMESTAMP,
+            'updatedAt': firestore.SERVER_TIMESTAMP
+        }
+    return {
+        'status': 'running',
+        'attempts': attempts,
+        'leaseExpiresAt': now + timedelta(seconds=ANALYSIS_JOB_LEASE_SECONDS),
+        'startedAt': firestore.SERVER_TIMESTAMP,
+        'updatedAt': firestore.SERVER_TIMESTAMP
+    }
+
+
+def claim_analysis_job(job_id):
+    """
+    Atomically move a queued job, or a running one whose lease expired, to
+    running under a new lease. Returns the job data, or None if the job is
+    missing, held by a live run (triggers are at-least-once) or out of attempts.
+    """
+    job_ref = get_db().collection(ANALYSIS_JOBS_COLLECTION).document(job_id)
+
+    @firestore.transactional
+    def claim(transaction):
+        snapshot = job_ref.get(transaction=transaction)
+        if not snapshot.exists:
+            return None
+        job = snapshot.to_dict()
+        updates = claim_updates(job, datetime.now(timezone.utc))
+        if updates is None:
+            return None
+        transaction.update(job_ref, updates)
+        job['status'] = updates['status']
+        job['attempts'] = updates.get('attempts', job.get('attempts', 0))
+        return job
+
+    with span('firestore_write', collection=ANALYSIS_JOBS_COLLECTION, transaction=True):
+        job = claim(get_db().transaction())
+    if job is not None and job['status'] == 'failed':
+        print(f"Analysis job {job_id} lease expired with no attempts left, failing it")
+        _mark_contract_failed(job['contractId'])
+        return None
+    return job
+
+
+def reclaim_expired_jobs():
+    """
+    Re-run (or fail) jobs whose lease expired; returns the ids handled
+    """
+    now = datetime.now(timezone.utc)
+    # Finished jobs drop leaseExpiresAt, so this single-field range query only
+    # sees jobs that are still marked running
+    query = (get_db().collection(ANALYSIS_JOBS_COLLECTION)
+             .where('leaseExpiresAt', '<=', now)
+             .limit(ANALYSIS_JOB_RECLAIM_BATCH))
+    with span('firestore_read', collection=ANALYSIS_JOBS_COLLECTION):
+        snapshots = list(query.stream())
+
+    reclaimed = []
+    for snapshot in snapshots:
+        print(f"Analysis job {snapshot.id} lease expired, reclaiming")
+        run_analysis_job(snapshot.id)
+        reclaimed.append(snapshot.id)
+    return reclaimed
+
+
+def get_analysis_job(job_id, user_id=None):
+    """
+    Return the job document as a JSON-serializable dict, or None. Raises
+    PermissionError when user_id is given and does not own the job.
+    """
+    with span('firestore_read', collection=ANALYSIS_JOBS_COLLECTION):
+        snapshot = get_db().collection(ANALYSIS_JOBS_COLLECTION).document(job_id).get()
+    if not snapshot.exists:
+        return None
+    job = _to_json(snapshot.to_dict())
+    if user_id is not None and job.get('userId') != user_id:
+        raise PermissionError(f"Job {job_id} belongs to another user")
+    job['id'] = job_id
+    return job
+
+
+def _to_json(value):
+    if isinstance(value, dict):
+        return {k: _to_json(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_to_json(v) for v in value]
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+class JobProgress:
+    """
+    Stage progress reporter passed to analyze_contract as its progress callback
+    """
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.job_ref = get_db().collection(ANALYSIS_JOBS_COLLECTION).document(job_id)
+        self.timings = {}
+        self._started = time.monotonic()
+        self._stage = None
+        self._stage_started = None
+
+    def __call__(self, stage):
+        updates = self._close_stage()
+        self._stage = stage
+        self._stage_started = time.monotonic()
+        updates.update({
+            'stage': stage,
+            f'stages.{stage}.startedAt': firestore.SERVER_TIMESTAMP,
+            'updatedAt': firestore.SERVER_TIMESTAMP
+        })
+        self._write(updates)
+
+    def succeed(self, extra=None):
+        updates = self._close_stage()
+        updates.update({
+            'status': 'succeeded',
+            'stage': 'done',
+            'totalDurationMs': self._elapsed_ms(self._started),
+            'leaseExpiresAt': firestore.DELETE_FIELD,
+            'finishedAt': firestore.SERVER_TIMESTAMP,
+            'updatedAt': firestore.SERVER_TIMESTAMP
+        })
+        updates.update(extra or {})
+        self._write(updates)
+
+    def fail(self, error):
+        failed_stage = self._stage
+        updates = self._close_stage()
+        updates.update({
+            'status': 'failed',
+            'failedStage': failed_stage,
+            'error': str(error),
+            'totalDurationMs': self._elapsed_ms(self._started),
+            'leaseExpiresAt': firestore.DELETE_FIELD,
+            'finishedAt': firestore.SERVER_TIMESTAMP,
+            'updatedAt': firestore.SERVER_TIMESTAMP
+        })
+        self._write(updates)
+
+    def _close_stage(self):
+        if self._stage is None:
+            return {}
+        duration_ms = self._elapsed_ms(self._stage_started)
+        self.timings[self._stage] = duration_ms
+        stage = self._stage
+        self._stage = None
+        return {f'stages.{stage}.durationMs': duration_ms}
+
+    @staticmethod
+    def _elapsed_ms(started):
+        return int((time.monotonic() - started) * 1000)
+
+    def _write(self, updates):
+        # Progress is informational; a failed write must not abort the pipeline
+        try:
+            self.job_ref.update(updates)
+        except Exception as e:
+            print(f"Error updating analysis job {self.job_id}: {str(e)}")
+
+
+def run_analysis_job(job_id):
+    """
+    Execute a queued analysis job end to end
+    """
+    job = claim_analysis_job(job_id)
+    if job is None:
+        print(f"Analysis job {job_id} not found, already claimed or out of attempts, skipping")
+        return
+
+    from contract_analyzer import analyze_contract
+
+    contract_id = job['contractId']
+    options = job.get('options') or {}
+    progress = JobProgress(job_id)
+
+    try:
+        result = analyze_contract(
+            contract_id,
+            job.get('pdfUrl'),
+            job.get('pdfPath'),
+            bypass_cache=bool(options.get('bypassCache', False)),
+            analysis_mode=options.get('analysisMode', 'auto'),
+            progress=progress
+        )
+    except Exception as e:
+        result = {'success': False, 'error': str(e)}
+
+    if result.get('success'):
+        progress.succeed()
+        print(f"Analysis job {job_id} succeeded in {progress.timings}")
+        return
+
+    progress.fail(result.get('error', 'Analysis failed'))
+    _mark_contract_failed(contract_id)
+    print(f"Analysis job {job_id} failed: {result.get('error')}")
+
+
+def _mark_contract_failed(contract_id):
+    try:
+        get_db().collection('contracts').document(contract_id).update({
+            'status': 'error',
+            'updatedAt': firestore.SERVER_TIMESTAMP
+        })
+    except Exception as e:
+        print(f"Error marking contract {contract_id} as failed: {str(e)}")
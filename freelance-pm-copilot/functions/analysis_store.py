@@ -0,0 +1,134 @@
+import os
+import copy
+import gzip
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from firebase_admin import firestore
+from clients import get_bucket, get_db
+from tracing import span
+from contract_chunker import LIST_FIELDS
+
+# Where full contract analyses live.
+# "inline" keeps the whole analysis on contracts/{id}. "storage" writes it as
+# gzipped JSON to Storage and keeps only a compact summary (counts, severity
+# histograms, timeline) on the contract, so list views stay small and large
+# contracts stay clear of the 1 MiB document limit. Objects are content
+# addressed, so a downloaded one never goes stale; the previous version's
+# object is deleted once the contract points at the new one.
+
+ANALYSIS_STORAGE_MODE = os.environ.get("ANALYSIS_STORAGE_MODE", "inline").lower()
+ANALYSIS_STORAGE_PREFIX = os.environ.get("ANALYSIS_STORAGE_PREFIX", "analyses/")
+# Full analyses kept in memory per instance
+ANALYSIS_CACHE_SIZE = int(os.environ.get("ANALYSIS_CACHE_SIZE", 32))
+
+SEVERITY_FIELDS = ('ambiguities', 'risks')
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def summarize_analysis(analysis):
+    """
+    Compact form of an analysis for the contract document
+    """
+    compact = {
+        'summary': analysis.get('summary', ""),
+        'timeline': analysis.get('timeline') or {},
+        'counts': {field: len(analysis.get(field) or []) for field, _ in LIST_FIELDS},
+        'severity': {},
+    }
+    for field in SEVERITY_FIELDS:
+        histogram = {}
+        for item in analysis.get(field) or []:
+            if isinstance(item, dict) and item.get('severity'):
+                histogram[item['severity']] = histogram.get(item['severity'], 0) + 1
+        compact['severity'][field] = histogram
+    if analysis.get('revision'):
+        compact['revision'] = analysis['revision']
+    return compact
+
+
+def _remember(path, analysis):
+    with _lock:
+        _cache[path] = analysis
+        _cache.move_to_end(path)
+        while len(_cache) > ANALYSIS_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def offload_analysis(contract_id, analysis):
+    """
+    Upload the full analysis and return the compact summary that replaces it
+    on the contract, with a 'storage' reference to the uploaded object
+    """
+    full = {k: v for k, v in analysis.items() if v is not firestore.SERVER_TIMESTAMP}
+    full['analyzedAt'] = datetime.now(timezone.utc).isoformat()
+    payload = json.dumps(full, ensure_ascii=False, default=str).encode("utf-8")
+    digest = hashlib.sha256(payload).hexdigest()
+    path = f"{ANALYSIS_STORAGE_PREFIX}{contract_id}/{digest[:16]}.json.gz"
+    compressed = gzip.compress(payload)
+
+    with span('storage_write', bytes=len(compressed)):
+        get_bucket().blob(path).upload_from_string(compressed, content_type="application/gzip")
+    _remember(path, full)
+    print(f"Analysis for {contract_id} stored at {path} ({len(payload)} -> {len(compressed)} bytes)")
+
+    compact = summarize_analysis(analysis)
+    compact['analyzedAt'] = firestore.SERVER_TIMESTAMP
+    compact['storage'] = {'path': path, 'sha256': digest, 'bytes': len(payload)}
+    return compact
+
+
+def stored_analysis_path(contract_id):
+    """
+    Storage path of the contract's current offloaded analysis, or None
+    """
+    with span('firestore_read', collection='contracts'):
+        snapshot = get_db().collection('contracts').document(contract_id).get(
+            field_paths=['analysis.storage.path']
+        )
+    if not snapshot.exists:
+        return None
+    return (((snapshot.to_dict() or {}).get('analysis') or {}).get('storage') or {}).get('path')
+
+
+def delete_stored_analysis(path):
+    """
+    Delete a superseded analysis object; failures only leave garbage behind
+    """
+    from google.api_core.exceptions import NotFound
+    with _lock:
+        _cache.pop(path, None)
+    try:
+        with span('storage_write', path=path):
+            get_bucket().blob(path).delete()
+        print(f"Deleted superseded analysis {path}")
+    except NotFound:
+        pass
+    except Exception as e:
+        print(f"Could not delete superseded analysis {path}: {str(e)}")
+
+
+def load_analysis(analysis):
+    """
+    Full analysis for the 'analysis' field of a contract: downloaded when it
+    is a compact summary pointing to Storage, returned as is when inline
+    """
+    storage = (analysis or {}).get('storage')
+    if not storage:
+        return analysis
+    path = storage['path']
+    with _lock:
+        cached = _cache.get(path)
+        if cached is not None:
+            _cache.move_to_end(path)
+            return copy.deepcopy(cached)
+
+    with span('storage_read', path=path):
+        compressed = get_bucket().blob(path).download_as_bytes()
+    full = json.loads(gzip.decompress(compressed).decode("utf-8"))
+    _remember(path, copy.deepcopy(full))
+    return full
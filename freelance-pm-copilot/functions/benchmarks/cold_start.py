@@ -0,0 +1,164 @@
+"""
+Import-time (cold start) benchmark for the Cloud Functions endpoints.
+
+Each sample runs in a fresh interpreter and measures:
+  - entry:    importing the functions entry point (main.py) -- paid by every endpoint
+  - endpoint: the deferred imports the endpoint performs on its first request
+
+Usage (from the functions directory):
+    python benchmarks/cold_start.py                      # print results
+    python benchmarks/cold_start.py --save-baseline      # record benchmarks/cold_start_baseline.json
+    python benchmarks/cold_start.py --check              # require a baseline
+
+Every run is compared against benchmarks/cold_start_baseline.json when it
+exists and exits non-zero when an endpoint's import cost grew past the
+tolerance.
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+FUNCTIONS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cold_start_baseline.json")
+
+# Modules each endpoint imports lazily on its first request
+ENDPOINT_MODULES = {
+    'analyzeContract (async)': ['analysis_jobs'],
+    'analyzeContract (sync)': ['contract_analyzer'],
+    'runAnalysisJob': ['analysis_jobs', 'contract_analyzer'],
+    'getAnalysisJob': ['analysis_jobs'],
+    'getContractAnalysis': ['contract_reader'],
+    'generateSprintPlan': ['sprint_planner'],
+    'generateSmartPlan': ['sprint_planner'],
+    'generateTasks': ['task_generator'],
+    'analyzeChangeOrder': ['change_analyzer'],
+}
+
+_SAMPLE_SCRIPT = """
+import sys, time, json
+sys.path.insert(0, {functions_dir!r})
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+t2 = time.perf_counter()
+print(json.dumps({{'entryMs': (t1 - t0) * 1000, 'endpointMs': (t2 - t1) * 1000}}))
+"""
+
+
+def run_sample(modules, import_profile=False):
+    """
+    Measure one cold import in a fresh interpreter
+    """
+    cmd = [sys.executable]
+    if import_profile:
+        cmd += ["-X", "importtime"]
+    cmd += ["-c", _SAMPLE_SCRIPT.format(functions_dir=FUNCTIONS_DIR, modules=modules)]
+    proc = subprocess.run(cmd, capture_output=True, text=True, cwd=FUNCTIONS_DIR)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr else "import failed")
+    sample = json.loads(proc.stdout.strip().splitlines()[-1])
+    if import_profile:
+        sample['topImports'] = _top_imports(proc.stderr)
+    return sample
+
+
+def _top_imports(importtime_output, limit=10):
+    """
+    Slowest modules by self time from `python -X importtime` output
+    """
+    rows = []
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = [p.strip() for p in line[len("import time:"):].split("|")]
+        if len(parts) != 3 or not parts[0].isdigit():
+            continue
+        rows.append((int(parts[0]), int(parts[1]), parts[2].strip()))
+    rows.sort(reverse=True)
+    return [{'module': name, 'selfMs': round(self_us / 1000, 1), 'cumulativeMs': round(cum_us / 1000, 1)}
+            for self_us, cum_us, name in rows[:limit]]
+
+
+def benchmark(runs=5, endpoints=None, import_profile=False):
+    """
+    Median cold import cost per endpoint over `runs` fresh interpreters
+    """
+    results = {}
+    for endpoint, modules in ENDPOINT_MODULES.items():
+        if endpoints and endpoint not in endpoints:
+            continue
+        samples = [run_sample(modules) for _ in range(runs)]
+        entry = statistics.median(s['entryMs'] for s in samples)
+        first_request = statistics.median(s['endpointMs'] for s in samples)
+        results[endpoint] = {
+            'entryMs': round(entry, 1),
+            'endpointMs': round(first_request, 1),
+            'totalMs': round(entry + first_request, 1),
+        }
+        if import_profile:
+            results[endpoint]['topImports'] = run_sample(modules, import_profile=True)['topImports']
+        print(f"{endpoint:28s} entry {entry:8.1f} ms  endpoint {first_request:8.1f} ms")
+    return results
+
+
+def check_against_baseline(results, baseline, tolerance):
+    """
+    Return endpoints whose total cold import cost regressed past the tolerance
+    """
+    regressions = []
+    for endpoint, result in results.items():
+        base = baseline.get(endpoint)
+        if not base:
+            continue
+        limit = base['totalMs'] * (1 + tolerance)
+        if result['totalMs'] > limit:
+            regressions.append(f"{endpoint}: {result['totalMs']} ms > {limit:.1f} ms (baseline {base['totalMs']} ms)")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cold-start import benchmark")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--endpoint', action='append', help="Only benchmark this endpoint (repeatable)")
+    parser.add_argument('--profile', action='store_true', help="Include the slowest imports per endpoint")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--check', action='store_true',
+                        help="Fail when there is no baseline (runs are always checked against an existing one)")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed slowdown vs baseline (0.25 = 25%%)")
+    parser.add_argument('--json', help="Write results to this file")
+    args = parser.parse_args(argv)
+
+    results = benchmark(args.runs, args.endpoint, args.profile)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        if args.check:
+            parser.error(f"No baseline at {args.baseline}; run with --save-baseline first")
+        print(f"No baseline at {args.baseline}; not checking for regressions")
+        return 0
+    with open(args.baseline) as f:
+        regressions = check_against_baseline(results, json.load(f), args.tolerance)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    print(f"{len(regressions)} regression(s) against {args.baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
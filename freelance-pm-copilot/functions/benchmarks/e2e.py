@@ -0,0 +1,536 @@
+"""
+Offline end-to-end benchmark for the analysis and planning code paths.
+
+Runs the real analyze_contract, generate_tasks, generate_sprint_plan,
+generate_smart_sprint_plan and analyze_change_request against local stand-ins
+(benchmarks/fakes.py): a Groq-compatible HTTP server with a latency profile,
+a fake LlamaParse, a fake Storage bucket and an in-memory Firestore (or the
+Firestore emulator when FIRESTORE_EMULATOR_HOST is set).
+
+For every endpoint and concurrency level it reports throughput, p50/p95/p99
+latency and RPCs per request (Firestore reads/commits, Groq calls, LlamaParse
+parses, Storage reads/writes).
+
+Usage (from the functions directory):
+    python benchmarks/e2e.py                                  # print results
+    python benchmarks/e2e.py --profile groq --concurrency 1 --concurrency 8
+    python benchmarks/e2e.py --save-baseline                  # record benchmarks/e2e_baseline.json (worst of 3 runs)
+    python benchmarks/e2e.py --check                          # require a comparable baseline
+
+Every run with the settings the baseline was recorded with (the defaults for
+the committed benchmarks/e2e_baseline.json) is compared against it and exits
+non-zero when an endpoint got slower, lost throughput or makes more RPCs.
+"""
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+FUNCTIONS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "e2e_baseline.json")
+
+# The local stand-ins are the only limit; spans and histograms stay off
+BENCH_ENV = {
+    'GROQ_REQUESTS_PER_MINUTE': '1000000',
+    'GROQ_TOKENS_PER_MINUTE': '1000000000',
+    'GROQ_MAX_CONCURRENCY': '256',
+    'GROQ_LIMITER_SHARED': 'false',
+    'METRICS_ENABLED': 'false',
+    'TRACE_LOG_SPANS': 'false',
+    'LLAMA_CLOUD_API_KEY': 'bench',
+    'GROQ_API_KEY': 'bench',
+}
+
+ENDPOINTS = ['analyzeContract', 'generateTasks', 'generateSprintPlan', 'generateSmartPlan', 'analyzeChangeOrder']
+DEFAULT_CONCURRENCY = [1, 4, 16]
+
+# RPC counters reported per request and checked against the baseline
+RPC_KEYS = ['firestoreReads', 'firestoreCommits', 'firestoreDocsRead', 'firestoreDocsWritten', 'firestoreBytesRead',
+            'groqCalls', 'llamaParseCalls', 'llamaParsePages', 'storageReads', 'storageWrites']
+# Counters that vary with the synthetic data, so they get the latency tolerance
+SIZE_KEYS = ('firestoreBytesRead',)
+# Options that change what a level measures; a baseline only applies to runs
+# with the same values (--endpoint/--concurrency just pick which levels run)
+BASELINE_SETTINGS = ['requests', 'profile', 'time_scale', 'groq_max_concurrency', 'parse_ms', 'parse_page_ms',
+                     'storage_ms', 'firestore_ms', 'clauses', 'scanned_ratio', 'same_contract',
+                     'boilerplate_ratio', 'changed_pages', 'plan_tasks', 'llm_rationale']
+
+PDF_CHARS_PER_PAGE = 2500
+
+SKILLS = ['Flutter', 'Firebase', 'Python', 'UI', 'Backend', 'QA']
+
+
+def contract_text(index, clauses=40, boilerplate_ratio=0.75):
+    """
+    Synthetic contract text. Clauses mentioning the index are specific to the
+    contract and make every page (and parse) unique; the other
+    `boilerplate_ratio` of clauses are identical in every contract.
+    """
+    specific_every = max(1, round(1 / (1 - boilerplate_ratio))) if boilerplate_ratio < 1 else 0
+    lines = [f"YAZILIM GELİŞTİRME SÖZLEŞMESİ No. BENCH-{index}"]
+    for n in range(1, clauses + 1):
+        if specific_every and n % specific_every == 0:
+            lines.append(
+                f"Madde {n}. BENCH-{index} projesi kapsamında Yüklenici, {n}. teslimatı ({index * 7 + n} ekran) "
+                f"müşterinin onayına uygun şekilde {n + index % 30} iş günü içinde teslim edecektir."
+            )
+        else:
+            lines.append(
+                f"Madde {n}. Yüklenici, {n}. teslimatı makul bir süre içinde ve müşterinin onayına uygun şekilde "
+                f"teslim edecektir. Ödeme teslimattan sonra gerekli görülen zamanda yapılır. Taraflar bu maddeye "
+                f"ilişkin bilgileri gizli tutar ve fikri mülkiyet hakları ödeme ile birlikte devredilir."
+            )
+    return "\n\n".join(lines)
+
+
+def contract_analysis(deliverables=6):
+    return {
+        'summary': "Mobil uygulama ve yönetim paneli geliştirme projesi.",
+        'ambiguities': [
+            {'id': f"amb_{n}", 'clause': f"Madde {n}", 'issue': "Süre belirsiz", 'severity': 'medium',
+             'suggestedRedline': "Teslim süresi 10 iş günüdür.", 'clarificationQuestions': ["Süre nedir?"]}
+            for n in range(1, 7)
+        ],
+        'risks': [
+            {'id': f"risk_{n}", 'title': f"Risk {n}", 'description': "Kapsam kayması", 'severity': 'high',
+             'probability': 40, 'impact': 60, 'mitigation': "Değişiklik talebi süreci"}
+            for n in range(1, 6)
+        ],
+        'deliverables': [
+            {'id': f"del_{n}", 'title': f"Teslimat {n}", 'description': f"Modül {n} geliştirmesi",
+             'acceptanceCriteria': "Tüm testleri geçmesi"}
+            for n in range(1, deliverables + 1)
+        ],
+        'milestones': [{'id': f"mil_{n}", 'title': f"Aşama {n}", 'dueDate': None} for n in range(1, 4)],
+        'paymentPlan': [{'id': 'pay_1', 'amount': 5000, 'currency': 'USD', 'dueDate': None,
+                         'description': "Proje başlangıcında"}],
+        'timeline': {'optimistic': None, 'realistic': None, 'pessimistic': None}
+    }
+
+
+def generated_tasks(deliverable_ids, tasks_per_deliverable=4):
+    epics, tasks = [], []
+    for d, deliverable_id in enumerate(deliverable_ids, start=1):
+        epics.append({'id': f"epic_{d}", 'title': f"Epic {d}", 'description': "Epic açıklaması",
+                      'deliverableId': deliverable_id})
+        for t in range(tasks_per_deliverable):
+            task_id = f"task_{d}_{t}"
+            tasks.append({
+                'id': task_id, 'epicId': f"epic_{d}", 'title': f"Görev {d}.{t}",
+                'description': "Detaylı task açıklaması", 'requiredSkills': [SKILLS[(d + t) % len(SKILLS)]],
+                'estimatedHours': 8 + 4 * t, 'acceptanceCriteria': ["Kriter 1"],
+                'dependsOn': [f"task_{d}_{t - 1}"] if t else []
+            })
+    return {'epics': epics, 'tasks': tasks}
+
+
+def team(people=6):
+    return {
+        'people': [{'id': f"p{n}", 'name': f"Kişi {n}", 'hoursPerWeek': 40,
+                    'skills': [SKILLS[n % len(SKILLS)], SKILLS[(n + 1) % len(SKILLS)]]}
+                   for n in range(people)]
+    }
+
+
+def plan_tasks(count):
+    """
+    Smart planner input: `count` tasks in dependency chains of five
+    """
+    return [
+        {'id': f"t{n}", 'title': f"Görev {n} ödeme ekranı" if n % 7 == 0 else f"Görev {n}",
+         'estimatedHours': 4 + n % 5 * 4, 'requiredSkills': [SKILLS[n % len(SKILLS)]],
+         'dependsOn': [f"t{n - 1}"] if n % 5 else []}
+        for n in range(count)
+    ]
+
+
+def build_responders(sprints=4):
+    """
+    System prompt -> canned response builder for the fake Groq server
+    """
+    from contract_analyzer import AMBIGUITY_SYSTEM_PROMPT
+    from task_generator import TASK_GENERATION_PROMPT
+    from sprint_planner import SPRINT_SYSTEM_PROMPT, RATIONALE_SYSTEM_PROMPT
+    from change_analyzer import CHANGE_ORDER_PROMPT
+
+    def tasks_for(user_prompt):
+        ids = list(dict.fromkeys(re.findall(r"del_\d+", user_prompt))) or ['del_1']
+        return generated_tasks(ids)
+
+    def sprint_plan(user_prompt):
+        return {'sprints': [
+            {'sprint_num': n, 'sprint_hedefi': f"Sprint {n} hedefi",
+             'gorevler': [{'gorev': f"Sprint {n} görevi {k}", 'tahmini_saat': 8 * k} for k in range(1, 5)]}
+            for n in range(1, sprints + 1)
+        ]}
+
+    def rationale(user_prompt):
+        task_ids = re.findall(r'"id":\s*"([^"]+)"', user_prompt)
+        return {'sprints': [{'sprintNum': n, 'goal': f"Sprint {n} hedefi"} for n in range(1, sprints + 1)],
+                'reasons': {task_id: "Yetkinlik ve kapasite uygun" for task_id in task_ids}}
+
+    def change_order(user_prompt):
+        option = {'timeline': "+3 gün", 'cost': "$1200", 'pros': ["Tüm özellikler korunur"], 'cons': ["Gecikme"]}
+        return {
+            'classification': 'minor_scope',
+            'impactAnalysis': {'timeDays': 3, 'costEstimate': "$1200", 'affectedTasks': [], 'affectedSprints': []},
+            'options': [dict(option, id=n, title=f"Seçenek {n}", description="Açıklama") for n in range(1, 4)],
+            'recommendation': 1,
+            'confidence': 0.9
+        }
+
+    return {
+        AMBIGUITY_SYSTEM_PROMPT: lambda user_prompt: contract_analysis(),
+        TASK_GENERATION_PROMPT: tasks_for,
+        SPRINT_SYSTEM_PROMPT: sprint_plan,
+        RATIONALE_SYSTEM_PROMPT: rationale,
+        CHANGE_ORDER_PROMPT: change_order,
+    }
+
+
+class Bench:
+    """
+    Stand-ins wired into clients.py plus the seeded data for each endpoint
+    """
+
+    def __init__(self, args):
+        from fakes import RpcCounter, FakeGroqServer, FakeBucket, InMemoryFirestore, install_fake_llamaparse
+
+        self.args = args
+        self.counter = RpcCounter()
+        self._shared_contract = None
+        install_fake_llamaparse(self.counter, base_ms=args.parse_ms, per_page_ms=args.parse_page_ms,
+                                time_scale=args.time_scale)
+
+        import clients
+        from groq import Groq
+
+        self.groq = FakeGroqServer(
+            build_responders(), self.counter, profile=args.profile,
+            time_scale=args.time_scale, max_concurrency=args.groq_max_concurrency
+        ).start()
+        clients.set_client('groq', Groq(
+            api_key='bench', base_url=self.groq.url, max_retries=0, http_client=clients.get_http_client()
+        ))
+
+        self.bucket = FakeBucket(self.counter, latency_ms=args.storage_ms, time_scale=args.time_scale)
+        clients.set_client('bucket', self.bucket)
+
+        self.emulator = bool(os.environ.get('FIRESTORE_EMULATOR_HOST'))
+        if self.emulator:
+            self.db = clients.get_db()
+        else:
+            self.db = InMemoryFirestore(self.counter, latency_ms=args.firestore_ms, time_scale=args.time_scale)
+            clients.set_client('firestore', self.db)
+
+        self.seeded = 0
+
+    def close(self):
+        self.groq.stop()
+
+    def seed(self, path, data):
+        if self.emulator:
+            collection, doc_id = path.split('/', 1)
+            self.db.collection(collection).document(doc_id).set(data)
+        else:
+            self.db.seed(path, data)
+
+    def new_id(self, prefix):
+        self.seeded += 1
+        return f"bench_{prefix}_{self.seeded}"
+
+    # Each prepare_* seeds one request's data and returns the call to time
+
+    def prepare_analyzeContract(self):
+        from fakes import fake_pdf, split_pages
+        from contract_analyzer import analyze_contract
+        contract_id = self.new_id('contract')
+        pdf_path = f"contracts/{contract_id}.pdf"
+        changed = self.args.changed_pages
+        if changed is None:
+            pages = split_pages(contract_text(self.seeded, self.args.clauses, self.args.boilerplate_ratio),
+                                PDF_CHARS_PER_PAGE)
+        else:
+            # A revision of one base contract with `changed` pages edited
+            pages = split_pages(contract_text(0, self.args.clauses, self.args.boilerplate_ratio), PDF_CHARS_PER_PAGE)
+            for index in sorted({n * len(pages) // max(1, changed) for n in range(min(changed, len(pages)))}):
+                pages[index] += f"\nRevizyon {self.seeded}: bu sayfa değiştirildi."
+        step = max(1, round(1 / self.args.scanned_ratio)) if self.args.scanned_ratio else 0
+        scanned = set(range(step - 1, len(pages), step)) if step else set()
+        self.bucket.objects[pdf_path] = fake_pdf(pages, scanned)
+        self.seed(f"contracts/{contract_id}", {'pdfPath': pdf_path, 'status': 'uploaded'})
+        return lambda: analyze_contract(contract_id, None, pdf_path=pdf_path, bypass_cache=True)
+
+    def _analyzed_contract(self):
+        if self.args.same_contract and self._shared_contract:
+            return self._shared_contract
+        contract_id = self.new_id('contract')
+        self.seed(f"contracts/{contract_id}", {'status': 'analyzed', 'analysis': contract_analysis()})
+        self._shared_contract = contract_id
+        return contract_id
+
+    def prepare_generateTasks(self):
+        from task_generator import generate_tasks
+        contract_id = self._analyzed_contract()
+        project_id = self.new_id('project')
+        return lambda: generate_tasks(contract_id, project_id, bypass_cache=True)
+
+    def prepare_generateSprintPlan(self):
+        from sprint_planner import generate_sprint_plan
+        contract_id = self._analyzed_contract()
+        return lambda: generate_sprint_plan(contract_id, 2, bypass_cache=True)
+
+    def prepare_generateSmartPlan(self):
+        from sprint_planner import generate_smart_sprint_plan
+        tasks, team_data = plan_tasks(self.args.plan_tasks), team()
+        return lambda: generate_smart_sprint_plan(
+            tasks, team_data, 2, bypass_cache=True,
+            use_llm_rationale=self.args.llm_rationale, start_date='2026-01-05'
+        )
+
+    def prepare_analyzeChangeOrder(self):
+        from change_analyzer import analyze_change_request
+        from sprint_scheduler import schedule_sprints
+        contract_id = self._analyzed_contract()
+        project_id = self.new_id('project')
+        tasks = plan_tasks(self.args.plan_tasks)
+        for task in tasks:
+            self.seed(f"tasks/{project_id}_{task['id']}", dict(
+                task, projectId=project_id, status='todo',
+                dependsOn=[f"{project_id}_{d}" for d in task['dependsOn']]
+            ))
+        plan = schedule_sprints(
+            [dict(t, id=f"{project_id}_{t['id']}", dependsOn=[f"{project_id}_{d}" for d in t['dependsOn']])
+             for t in tasks],
+            team(), 2, start_date='2026-01-05'
+        )
+        version_id = self.new_id('plan')
+        self.seed(f"planVersions/{version_id}", {'projectId': project_id, 'plan': plan})
+        self.seed(f"projects/{project_id}", {
+            'contractId': contract_id, 'name': "Bench projesi",
+            'tasksVersion': 1, 'currentPlanVersionId': version_id
+        })
+        change_request_id = self.new_id('change')
+        self.seed(f"changeRequests/{change_request_id}", {
+            'contractId': contract_id, 'projectId': project_id, 'status': 'pending',
+            'requestText': "Ödeme ekranına taksit seçeneği eklensin", 'estimatedHours': 12
+        })
+        return lambda: analyze_change_request(change_request_id, bypass_cache=True)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def run_level(bench, endpoint, concurrency, requests, quiet=True):
+    """
+    Time `requests` calls of an endpoint with `concurrency` workers
+    """
+    calls = [getattr(bench, f"prepare_{endpoint}")() for _ in range(requests)]
+    bench.counter.reset()
+
+    def timed(call):
+        started = time.perf_counter()
+        try:
+            result = call()
+            ok = not (isinstance(result, dict) and result.get('success') is False)
+        except Exception:
+            ok = False
+        return (time.perf_counter() - started) * 1000, ok
+
+    with contextlib.ExitStack() as stack:
+        if quiet:
+            stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, 'w'))))
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            samples = list(executor.map(timed, calls))
+        wall = time.perf_counter() - started
+
+    latencies = sorted(ms for ms, _ in samples)
+    counts = bench.counter.snapshot()
+    rpcs = {key: round(counts.get(key, 0) / requests, 2) for key in RPC_KEYS}
+    if bench.emulator:
+        for key in RPC_KEYS:
+            if key.startswith('firestore'):
+                rpcs.pop(key)
+    return {
+        'requests': requests,
+        'errors': sum(1 for _, ok in samples if not ok),
+        'throughputPerSec': round(requests / wall, 2),
+        'p50Ms': round(percentile(latencies, 0.50), 1),
+        'p95Ms': round(percentile(latencies, 0.95), 1),
+        'p99Ms': round(percentile(latencies, 0.99), 1),
+        'rpcsPerRequest': rpcs,
+        'groq429': counts.get('groq429', 0),
+    }
+
+
+def benchmark(args):
+    bench = Bench(args)
+    results = {}
+    try:
+        for endpoint in args.endpoint or ENDPOINTS:
+            results[endpoint] = {}
+            for concurrency in args.concurrency or DEFAULT_CONCURRENCY:
+                requests = max(args.requests, concurrency * 2)
+                result = run_level(bench, endpoint, concurrency, requests, quiet=not args.verbose)
+                results[endpoint][str(concurrency)] = result
+                rpcs = " ".join(f"{k}={v}" for k, v in result['rpcsPerRequest'].items() if v)
+                print(f"{endpoint:20s} c={concurrency:<3d} {result['throughputPerSec']:8.2f} req/s  "
+                      f"p50 {result['p50Ms']:8.1f}  p95 {result['p95Ms']:8.1f}  p99 {result['p99Ms']:8.1f} ms  "
+                      f"errors {result['errors']}  {rpcs}")
+    finally:
+        bench.close()
+    return results
+
+
+def check_against_baseline(results, baseline, tolerance):
+    """
+    Return levels that got slower, lost throughput or make more RPCs than the baseline
+    """
+    regressions = []
+    for endpoint, levels in results.items():
+        for concurrency, result in levels.items():
+            base = (baseline.get(endpoint) or {}).get(concurrency)
+            if not base:
+                continue
+            label = f"{endpoint} c={concurrency}"
+            limit = base['p95Ms'] * (1 + tolerance)
+            if result['p95Ms'] > limit:
+                regressions.append(f"{label}: p95 {result['p95Ms']} ms > {limit:.1f} ms (baseline {base['p95Ms']} ms)")
+            floor = base['throughputPerSec'] * (1 - tolerance)
+            if result['throughputPerSec'] < floor:
+                regressions.append(f"{label}: {result['throughputPerSec']} req/s < {floor:.2f} req/s "
+                                   f"(baseline {base['throughputPerSec']} req/s)")
+            if result['errors'] > base.get('errors', 0):
+                regressions.append(f"{label}: {result['errors']} errors (baseline {base.get('errors', 0)})")
+            # RPC counts are deterministic, so any increase is a regression
+            for key, value in result['rpcsPerRequest'].items():
+                base_value = base.get('rpcsPerRequest', {}).get(key)
+                if base_value is None:
+                    continue
+                allowed = base_value * (1 + tolerance) if key in SIZE_KEYS else base_value + 0.01
+                if value > allowed:
+                    regressions.append(f"{label}: {key} {value}/request > baseline {base_value}/request")
+    return regressions
+
+
+def worst_of(runs):
+    """
+    Per level, the slowest p95/p99, lowest throughput and most errors and
+    RPCs across several runs, so a saved baseline covers run-to-run noise
+    """
+    merged = json.loads(json.dumps(runs[0]))
+    for run in runs[1:]:
+        for endpoint, levels in run.items():
+            for concurrency, result in levels.items():
+                base = merged[endpoint][concurrency]
+                for key in ('p50Ms', 'p95Ms', 'p99Ms', 'errors', 'groq429'):
+                    base[key] = max(base[key], result[key])
+                base['throughputPerSec'] = min(base['throughputPerSec'], result['throughputPerSec'])
+                for key, value in result['rpcsPerRequest'].items():
+                    base['rpcsPerRequest'][key] = max(base['rpcsPerRequest'].get(key, 0), value)
+    return merged
+
+
+def load_baseline(path, settings):
+    """
+    The baseline's results, or None (with the reason) when there is no
+    baseline or it was recorded with other settings
+    """
+    if not os.path.exists(path):
+        return None, f"No baseline at {path}; run with --save-baseline first"
+    with open(path) as f:
+        baseline = json.load(f)
+    differing = sorted(k for k in settings if baseline.get('settings', {}).get(k) != settings[k])
+    if differing:
+        return None, f"Baseline {path} was recorded with other settings ({', '.join(differing)})"
+    return baseline['results'], None
+
+
+def main(argv=None):
+    from fakes import GROQ_PROFILES
+
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark")
+    parser.add_argument('--endpoint', action='append', choices=ENDPOINTS, help="Only this endpoint (repeatable)")
+    parser.add_argument('--concurrency', action='append', type=int, help="Concurrency level (repeatable, default 1 4 16)")
+    parser.add_argument('--requests', type=int, default=16, help="Requests per level (at least 2x concurrency)")
+    parser.add_argument('--profile', choices=sorted(GROQ_PROFILES), default='fast', help="Fake Groq latency profile")
+    parser.add_argument('--time-scale', type=float, default=1.0, help="Multiply every simulated latency (0 = none)")
+    parser.add_argument('--groq-max-concurrency', type=int, help="Fake Groq answers 429 above this many in flight")
+    parser.add_argument('--parse-ms', type=float, default=800, help="Fake LlamaParse latency per job")
+    parser.add_argument('--parse-page-ms', type=float, default=100, help="Fake LlamaParse latency per page")
+    parser.add_argument('--storage-ms', type=float, default=20, help="Fake Storage latency per request")
+    parser.add_argument('--firestore-ms', type=float, default=5, help="In-memory Firestore latency per RPC")
+    parser.add_argument('--clauses', type=int, default=40, help="Clauses in each synthetic contract")
+    parser.add_argument('--scanned-ratio', type=float, default=0.0,
+                        help="Share of contract pages without a text layer (need LlamaParse)")
+    parser.add_argument('--same-contract', action='store_true',
+                        help="Plan every request from one contract (warm contract-read cache)")
+    parser.add_argument('--boilerplate-ratio', type=float, default=0.75,
+                        help="Share of contract clauses shared by every contract")
+    parser.add_argument('--changed-pages', type=int,
+                        help="Every contract is a revision of one base contract with this many pages edited")
+    parser.add_argument('--plan-tasks', type=int, default=60, help="Tasks per smart plan / change request project")
+    parser.add_argument('--llm-rationale', action='store_true', help="generateSmartPlan words reasons with the LLM")
+    parser.add_argument('--verbose', action='store_true', help="Keep the functions' own log output")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--baseline-runs', type=int, default=3,
+                        help="Runs whose worst results --save-baseline records")
+    parser.add_argument('--check', action='store_true',
+                        help="Fail when there is no baseline for these settings (runs with matching settings are always checked)")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed slowdown vs baseline (0.25 = 25%%)")
+    parser.add_argument('--json', help="Write results to this file")
+    args = parser.parse_args(argv)
+
+    results = benchmark(args)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    settings = {key: getattr(args, key) for key in BASELINE_SETTINGS}
+    if args.save_baseline:
+        runs = [results] + [benchmark(args) for _ in range(args.baseline_runs - 1)]
+        with open(args.baseline, 'w') as f:
+            json.dump({'settings': settings, 'results': worst_of(runs)}, f, indent=2)
+            f.write('\n')
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    baseline, reason = load_baseline(args.baseline, settings)
+    if baseline is None:
+        if args.check:
+            parser.error(reason)
+        print(f"{reason}; not checking for regressions")
+        return 0
+    regressions = check_against_baseline(results, baseline, args.tolerance)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    print(f"{len(regressions)} regression(s) against {args.baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    # Settings are read at import time, so they must be in place before the
+    # functions modules load; the parse cache gets a throwaway directory
+    for key, value in BENCH_ENV.items():
+        os.environ.setdefault(key, value)
+    parse_cache_dir = tempfile.mkdtemp(prefix="e2e-parse-cache-")
+    os.environ['PARSE_CACHE_DIR'] = parse_cache_dir
+    sys.path.insert(0, FUNCTIONS_DIR)
+    try:
+        exit_code = main()
+    finally:
+        shutil.rmtree(parse_cache_dir, ignore_errors=True)
+    raise SystemExit(exit_code)
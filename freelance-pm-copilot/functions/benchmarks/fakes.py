@@ -0,0 +1,590 @@
+"""
+Local stand-ins for the services the functions call, used by benchmarks/e2e.py.
+
+  - FakeGroqServer:   OpenAI-compatible HTTP server answering chat completions
+                      with schema-valid JSON after a latency derived from a
+                      token-rate profile; the real Groq SDK talks to it
+  - install_fake_llamaparse: replaces llama_cloud_services.LlamaParse
+  - FakeBucket:       Storage bucket (PDFs and the parse cache)
+  - InMemoryFirestore: the subset of the Firestore client the functions use
+
+Every stand-in counts its RPCs in a shared RpcCounter.
+"""
+import io
+import copy
+import sys
+import json
+import time
+import uuid
+import hashlib
+import types
+import asyncio
+import threading
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+CHARS_PER_TOKEN = 3.2
+
+# Groq-like latency profiles: time to first token plus generation speed
+GROQ_PROFILES = {
+    'instant': {'ttft_ms': 0, 'tokens_per_second': 0},
+    'fast': {'ttft_ms': 80, 'tokens_per_second': 2000},
+    'groq': {'ttft_ms': 250, 'tokens_per_second': 600},
+    'slow': {'ttft_ms': 800, 'tokens_per_second': 150},
+}
+
+
+class RpcCounter:
+    """
+    Thread-safe counters shared by all stand-ins
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {}
+
+    def add(self, name, amount=1):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + amount
+
+    def reset(self):
+        with self._lock:
+            self.counts = {}
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counts)
+
+
+def _sleep_ms(ms, time_scale):
+    if ms > 0 and time_scale > 0:
+        time.sleep(ms * time_scale / 1000)
+
+
+# ---- Groq ------------------------------------------------------------------
+
+class FakeGroqServer:
+    """
+    Chat completions server on 127.0.0.1. responders maps a system prompt to a
+    function (user_prompt) -> response dict. Above max_concurrency in-flight
+    requests it answers 429 like the real API.
+    """
+
+    def __init__(self, responders, counter, profile='fast', time_scale=1.0, max_concurrency=None):
+        self.responders = responders
+        self.counter = counter
+        self.profile = GROQ_PROFILES[profile]
+        self.time_scale = time_scale
+        self.max_concurrency = max_concurrency
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def complete(self, request):
+        """
+        Build the completion body for a request and the seconds it should take
+        """
+        messages = request.get('messages', [])
+        system = next((m['content'] for m in messages if m.get('role') == 'system'), '')
+        user = next((m['content'] for m in messages if m.get('role') == 'user'), '')
+        responder = self.responders.get(system)
+        if responder is None:
+            raise KeyError("No fake responder for this system prompt")
+        content = json.dumps(responder(user), ensure_ascii=False)
+
+        prompt_tokens = int(sum(len(m.get('content') or '') for m in messages) / CHARS_PER_TOKEN) + 1
+        completion_tokens = int(len(content) / CHARS_PER_TOKEN) + 1
+        rate = self.profile['tokens_per_second']
+        delay_ms = self.profile['ttft_ms'] + (completion_tokens / rate * 1000 if rate else 0)
+        body = {
+            'id': f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop'
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens
+            }
+        }
+        return body, delay_ms
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body, headers=None):
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                request = json.loads(self.rfile.read(length) or b'{}')
+                if not self.path.endswith('/chat/completions') or request.get('stream'):
+                    self._send(400, {'error': {'message': 'Only non-streamed chat completions are faked'}})
+                    return
+
+                with server._lock:
+                    server._in_flight += 1
+                    over_limit = server.max_concurrency and server._in_flight > server.max_concurrency
+                try:
+                    if over_limit:
+                        server.counter.add('groq429')
+                        self._send(429, {'error': {'message': 'Rate limit reached'}}, {'retry-after': '1'})
+                        return
+                    server.counter.add('groqCalls')
+                    try:
+                        body, delay_ms = server.complete(request)
+                    except KeyError as e:
+                        self._send(400, {'error': {'message': str(e)}})
+                        return
+                    server.counter.add('groqCompletionTokens', body['usage']['completion_tokens'])
+                    _sleep_ms(delay_ms, server.time_scale)
+                    self._send(200, body)
+                finally:
+                    with server._lock:
+                        server._in_flight -= 1
+
+        return Handler
+
+
+# ---- LlamaParse -------------------------------------------------------------
+
+def install_fake_llamaparse(counter, base_ms=800, per_page_ms=100, time_scale=1.0):
+    """
+    Register a llama_cloud_services module whose LlamaParse returns the
+    PDF's text (see pdf_pages) after base_ms per job + per_page_ms per page
+    """
+    class FakeJobResult:
+        def __init__(self, pages):
+            self.pages = pages
+
+        def get_text_documents(self, split_by_page=False):
+            texts = self.pages if split_by_page else ["\n".join(self.pages)]
+            return [types.SimpleNamespace(text=text, metadata={}) for text in texts]
+
+    class LlamaParse:
+        def __init__(self, **kwargs):
+            self.kwargs = kwargs
+
+        async def aparse(self, file_path, extra_info=None, fs=None):
+            if isinstance(file_path, str):
+                with open(file_path, 'rb') as f:
+                    data = f.read()
+            else:
+                data = file_path.read()
+            pages = pdf_pages(data)
+            counter.add('llamaParseCalls')
+            counter.add('llamaParsePages', len(pages))
+            delay_ms = base_ms + per_page_ms * len(pages)
+            if time_scale > 0:
+                await asyncio.sleep(delay_ms * time_scale / 1000)
+            return FakeJobResult(pages)
+
+        def parse(self, file_path, extra_info=None, fs=None):
+            return asyncio.run(self.aparse(file_path, extra_info, fs))
+
+    module = types.ModuleType('llama_cloud_services')
+    module.LlamaParse = LlamaParse
+    sys.modules['llama_cloud_services'] = module
+    return module
+
+
+# Characters the standard PDF fonts cannot encode
+_PDF_TRANSLITERATION = str.maketrans("ğĞşŞıİ", "gGsSiI")
+SCANNED_PAGE_TEXT = "Taranmis sayfa metni (OCR). " * 60
+
+
+def split_pages(text, chars_per_page=2500):
+    return [text[i:i + chars_per_page] for i in range(0, len(text), chars_per_page)] or [""]
+
+
+def fake_pdf(page_texts, scanned_pages=()):
+    """
+    Minimal real PDF with a Helvetica text layer. Pages in scanned_pages have
+    no text layer, like a scan, so only OCR (LlamaParse) can read them; their
+    content stream still differs with the page text, as scans do.
+    """
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+    kids = []
+    for index, page_text in enumerate(page_texts):
+        page_text = page_text.translate(_PDF_TRANSLITERATION)
+        if index in scanned_pages:
+            stream = f"% scan {hashlib.sha256(page_text.encode()).hexdigest()}\nq Q".encode()
+        else:
+            lines = []
+            for paragraph in page_text.split("\n"):
+                for start in range(0, len(paragraph), 90):
+                    line = paragraph[start:start + 90].replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+                    lines.append(f"({line}) Tj T*")
+            stream = ("BT /F1 10 Tf 12 TL 50 790 Td " + " ".join(lines) + " ET").encode("cp1252", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id)
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % k for k in kids), len(kids))
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+def pdf_pages(data):
+    """
+    What the fake LlamaParse "reads": the text layer of each page, with
+    OCR-like filler for pages that have none
+    """
+    from pypdf import PdfReader
+    pages = [page.extract_text() or "" for page in PdfReader(io.BytesIO(data)).pages]
+    return [text if text.strip() else SCANNED_PAGE_TEXT for text in pages]
+
+
+# ---- Storage ----------------------------------------------------------------
+
+class FakeBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+
+    def _latency(self, size):
+        _sleep_ms(self.bucket.latency_ms + size / 1024 / 1024 * self.bucket.ms_per_mb, self.bucket.time_scale)
+
+    def exists(self):
+        self.bucket.counter.add('storageReads')
+        return self.name in self.bucket.objects
+
+    def download_to_file(self, file_obj):
+        from google.api_core.exceptions import NotFound
+        self.bucket.counter.add('storageReads')
+        data = self.bucket.objects.get(self.name)
+        if data is None:
+            raise NotFound(f"No such object: {self.bucket.name}/{self.name}")
+        self._latency(len(data))
+        for start in range(0, len(data), 256 * 1024):
+            file_obj.write(data[start:start + 256 * 1024])
+
+    def download_as_bytes(self):
+        from google.api_core.exceptions import NotFound
+        self.bucket.counter.add('storageReads')
+        data = self.bucket.objects.get(self.name)
+        if data is None:
+            raise NotFound(f"No such object: {self.bucket.name}/{self.name}")
+        self._latency(len(data))
+        return data
+
+    def upload_from_string(self, data, content_type=None):
+        self.bucket.counter.add('storageWrites')
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self._latency(len(data))
+        self.bucket.objects[self.name] = bytes(data)
+
+    def upload_from_file(self, file_obj, content_type=None):
+        self.upload_from_string(file_obj.read(), content_type=content_type)
+
+    def delete(self):
+        from google.api_core.exceptions import NotFound
+        self.bucket.counter.add('storageWrites')
+        if self.bucket.objects.pop(self.name, None) is None:
+            raise NotFound(f"No such object: {self.bucket.name}/{self.name}")
+
+
+class FakeBucket:
+    def __init__(self, counter, name='bench-bucket', latency_ms=20, ms_per_mb=10, time_scale=1.0):
+        self.name = name
+        self.counter = counter
+        self.latency_ms = latency_ms
+        self.ms_per_mb = ms_per_mb
+        self.time_scale = time_scale
+        self.objects = {}
+
+    def blob(self, name):
+        return FakeBlob(self, name)
+
+
+# ---- Firestore --------------------------------------------------------------
+
+def _resolve(value, current=None):
+    """
+    Apply Firestore sentinels (SERVER_TIMESTAMP, Increment, DELETE_FIELD)
+    """
+    from firebase_admin import firestore
+    if value is firestore.SERVER_TIMESTAMP:
+        return datetime.now(timezone.utc)
+    if isinstance(value, firestore.Increment):
+        return (current if isinstance(current, (int, float)) else 0) + value.value
+    if isinstance(value, dict):
+        base = current if isinstance(current, dict) else {}
+        return {k: _resolve(v, base.get(k)) for k, v in value.items()}
+    return copy.deepcopy(value)
+
+
+def _merge(target, updates):
+    for key, value in updates.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict) and not _is_sentinel(value):
+            _merge(target[key], value)
+        else:
+            target[key] = _resolve(value, target.get(key))
+
+
+def _is_sentinel(value):
+    from firebase_admin import firestore
+    return value is firestore.SERVER_TIMESTAMP or isinstance(value, firestore.Increment)
+
+
+def _project(data, field_paths):
+    """
+    The fields named by (dotted) field paths, nested like Firestore returns them
+    """
+    projected = {}
+    for path in field_paths:
+        value, found = data, True
+        for part in path.split('.'):
+            if not isinstance(value, dict) or part not in value:
+                found = False
+                break
+            value = value[part]
+        if not found:
+            continue
+        target = projected
+        *parents, leaf = path.split('.')
+        for part in parents:
+            target = target.setdefault(part, {})
+        target[leaf] = value
+    return projected
+
+
+class FakeSnapshot:
+    def __init__(self, reference, data, update_time=None):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+        self.exists = data is not None
+        self.update_time = update_time
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field):
+        value = self._data or {}
+        for part in field.split('.'):
+            value = (value or {}).get(part)
+        return value
+
+
+class FakeDocument:
+    def __init__(self, db, collection, doc_id):
+        self._db = db
+        self.collection_name = collection
+        self.id = doc_id
+        self.path = f"{collection}/{doc_id}"
+
+    def get(self, field_paths=None, transaction=None):
+        self._db.rpc('firestoreReads')
+        self._db.counter.add('firestoreDocsRead')
+        with self._db.lock:
+            data, update_time = self._db.docs.get(self.path, (None, None))
+            if data is not None and field_paths is not None:
+                data = _project(data, field_paths)
+            if data is not None:
+                self._db.counter.add('firestoreBytesRead', len(json.dumps(data, default=str)))
+            return FakeSnapshot(self, copy.deepcopy(data) if data is not None else None,
+                                update_time)
+
+    def set(self, data, merge=False):
+        self._db.rpc('firestoreCommits')
+        self._db.apply([('set', self, data, merge)])
+
+    def update(self, data):
+        self._db.rpc('firestoreCommits')
+        self._db.apply([('update', self, data, False)])
+
+    def delete(self):
+        self._db.rpc('firestoreCommits')
+        self._db.apply([('delete', self, None, False)])
+
+    def collection(self, name):
+        return FakeCollection(self._db, f"{self.path}/{name}")
+
+
+class FakeQuery:
+    _OPS = {
+        '==': lambda a, b: a == b,
+        '!=': lambda a, b: a != b,
+        '<': lambda a, b: a is not None and a < b,
+        '<=': lambda a, b: a is not None and a <= b,
+        '>': lambda a, b: a is not None and a > b,
+        '>=': lambda a, b: a is not None and a >= b,
+        'in': lambda a, b: a in b,
+        'array_contains': lambda a, b: isinstance(a, list) and b in a,
+    }
+
+    def __init__(self, collection, filters=(), fields=None, limit_count=None):
+        self._collection = collection
+        self._filters = list(filters)
+        self._fields = fields
+        self._limit = limit_count
+
+    def where(self, field, op, value):
+        return FakeQuery(self._collection, self._filters + [(field, op, value)], self._fields, self._limit)
+
+    def select(self, fields):
+        return FakeQuery(self._collection, self._filters, list(fields), self._limit)
+
+    def limit(self, count):
+        return FakeQuery(self._collection, self._filters, self._fields, count)
+
+    def stream(self):
+        db = self._collection._db
+        db.rpc('firestoreReads')
+        prefix = f"{self._collection.name}/"
+        results = []
+        with db.lock:
+            for path, (data, update_time) in db.docs.items():
+                if not path.startswith(prefix) or '/' in path[len(prefix):]:
+                    continue
+                if all(self._OPS[op](data.get(field), value) for field, op, value in self._filters):
+                    if self._fields is not None:
+                        data = {f: data[f] for f in self._fields if f in data}
+                    ref = FakeDocument(db, self._collection.name, path[len(prefix):])
+                    results.append(FakeSnapshot(ref, copy.deepcopy(data), update_time))
+                    if self._limit and len(results) >= self._limit:
+                        break
+        db.counter.add('firestoreDocsRead', max(1, len(results)))
+        return iter(results)
+
+    def get(self):
+        return list(self.stream())
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, db, name):
+        self._db = db
+        self.name = name
+        super().__init__(self)
+
+    def document(self, doc_id=None):
+        return FakeDocument(self._db, self.name, doc_id or uuid.uuid4().hex[:20])
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self._db = db
+        self._operations = []
+
+    def set(self, ref, data, merge=False):
+        self._operations.append(('set', ref, data, merge))
+
+    def update(self, ref, data):
+        self._operations.append(('update', ref, data, False))
+
+    def delete(self, ref):
+        self._operations.append(('delete', ref, None, False))
+
+    def commit(self):
+        self._db.rpc('firestoreCommits')
+        self._db.apply(self._operations)
+        self._operations = []
+
+
+class InMemoryFirestore:
+    """
+    Dict-backed Firestore client: documents, queries (where/select/limit),
+    batches, merges, dotted update paths and sentinels. Transactions are not
+    supported (the async job path is not benchmarked).
+    """
+
+    def __init__(self, counter, latency_ms=5, time_scale=1.0):
+        self.counter = counter
+        self.latency_ms = latency_ms
+        self.time_scale = time_scale
+        self.lock = threading.RLock()
+        self.docs = {}
+
+    def rpc(self, name):
+        self.counter.add(name)
+        _sleep_ms(self.latency_ms, self.time_scale)
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def transaction(self):
+        raise NotImplementedError("InMemoryFirestore does not support transactions")
+
+    def seed(self, path, data):
+        with self.lock:
+            self.docs[path] = (copy.deepcopy(data), datetime.now(timezone.utc))
+
+    def apply(self, operations):
+        now = datetime.now(timezone.utc)
+        with self.lock:
+            self.counter.add('firestoreDocsWritten', len(operations))
+            for op, ref, data, merge in operations:
+                current = self.docs.get(ref.path, (None, None))[0]
+                if op == 'delete':
+                    self.docs.pop(ref.path, None)
+                    continue
+                if op == 'update':
+                    if current is None:
+                        raise ValueError(f"No document to update: {ref.path}")
+                    updated = copy.deepcopy(current)
+                    for key, value in data.items():
+                        parts = key.split('.')
+                        target = updated
+                        for part in parts[:-1]:
+                            target = target.setdefault(part, {})
+                        target[parts[-1]] = _resolve(value, target.get(parts[-1]))
+                    self.docs[ref.path] = (updated, now)
+                elif merge and current is not None:
+                    updated = copy.deepcopy(current)
+                    _merge(updated, data)
+                    self.docs[ref.path] = (updated, now)
+                else:
+                    self.docs[ref.path] = (_resolve(data), now)
@@ -0,0 +1,233 @@
+"""
+Bulk contract re-analysis.
+
+Re-runs analyze_contract over many contracts after AMBIGUITY_SYSTEM_PROMPT or
+the model changes. Work is fanned out over a bounded worker pool, throttled by
+a start-rate limit, and checkpointed so an interrupted run resumes where it
+stopped. Contracts analyzed since the parse cache landed carry a
+parseCacheKey, so their parsed text is reused instead of re-running LlamaParse.
+
+Usage:
+    python bulk_reanalyze.py --where status == analyzed --concurrency 8 --rate 60
+    python bulk_reanalyze.py --contract-ids abc,def --checkpoint run1.json
+"""
+import os
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_RATE_PER_MINUTE = 60
+DEFAULT_CHECKPOINT_PATH = ".reanalyze-checkpoint.json"
+
+
+class RateLimiter:
+    """
+    Token bucket limiting how many contracts are started per minute
+    """
+
+    def __init__(self, rate_per_minute, burst=1):
+        self.interval = 60.0 / rate_per_minute if rate_per_minute > 0 else 0.0
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.interval <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) / self.interval)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) * self.interval
+            time.sleep(wait)
+
+
+class Checkpoint:
+    """
+    JSON checkpoint of completed and failed contract ids, rewritten atomically
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.completed = set()
+        self.failed = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            self.completed = set(data.get('completed', []))
+            self.failed = data.get('failed', {})
+            print(f"Resuming from checkpoint {path}: {len(self.completed)} done, {len(self.failed)} failed")
+
+    def record(self, contract_id, error=None):
+        with self._lock:
+            if error is None:
+                self.completed.add(contract_id)
+                self.failed.pop(contract_id, None)
+            else:
+                self.failed[contract_id] = error
+            self._save()
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'completed': sorted(self.completed), 'failed': self.failed}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+def query_contract_ids(db, filters, limit=None):
+    """
+    Resolve contract ids from (field, op, value) filters without reading analyses
+    """
+    query = db.collection('contracts')
+    for field, op, value in filters:
+        query = query.where(field, op, value)
+    if limit:
+        query = query.limit(limit)
+    # Project to no fields: only document names come back over the wire
+    return [snapshot.id for snapshot in query.select([]).stream()]
+
+
+def reanalyze_one(db, contract_id, bypass_cache, analysis_mode):
+    """
+    Re-analyze a single contract, reusing its cached parsed text when possible
+    """
+    from contract_analyzer import analyze_contract
+
+    snapshot = db.collection('contracts').document(contract_id).get(
+        field_paths=['pdfUrl', 'pdfPath', 'parseCacheKey']
+    )
+    if not snapshot.exists:
+        raise ValueError(f"Contract {contract_id} not found")
+    contract = snapshot.to_dict() or {}
+
+    result = analyze_contract(
+        contract_id,
+        contract.get('pdfUrl'),
+        contract.get('pdfPath'),
+        bypass_cache=bypass_cache,
+        analysis_mode=analysis_mode,
+        parse_cache_key=contract.get('parseCacheKey')
+    )
+    if not result.get('success'):
+        raise RuntimeError(result.get('error', 'Analysis failed'))
+    return result
+
+
+def bulk_reanalyze(db, contract_ids, concurrency=DEFAULT_CONCURRENCY,
+                   rate_per_minute=DEFAULT_RATE_PER_MINUTE, checkpoint_path=DEFAULT_CHECKPOINT_PATH,
+                   bypass_cache=True, analysis_mode="auto", retry_failed=False):
+    """
+    Re-analyze contract_ids on a worker pool and return a run summary
+    """
+    contract_ids = list(dict.fromkeys(contract_ids))
+    checkpoint = Checkpoint(checkpoint_path)
+    pending = [
+        cid for cid in contract_ids
+        if cid not in checkpoint.completed and (retry_failed or cid not in checkpoint.failed)
+    ]
+    print(f"Re-analyzing {len(pending)} of {len(contract_ids)} contracts "
+          f"(concurrency={concurrency}, rate={rate_per_minute}/min)")
+
+    limiter = RateLimiter(rate_per_minute, burst=concurrency)
+    started = time.monotonic()
+    succeeded = 0
+    failed = 0
+
+    def run(contract_id):
+        limiter.acquire()
+        task_started = time.monotonic()
+        reanalyze_one(db, contract_id, bypass_cache, analysis_mode)
+        return time.monotonic() - task_started
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = {executor.submit(run, cid): cid for cid in pending}
+        for future in as_completed(futures):
+            contract_id = futures[future]
+            try:
+                elapsed = future.result()
+                checkpoint.record(contract_id)
+                succeeded += 1
+                print(f"[{succeeded + failed}/{len(pending)}] {contract_id} done in {elapsed:.1f}s")
+            except Exception as e:
+                checkpoint.record(contract_id, error=str(e))
+                failed += 1
+                print(f"[{succeeded + failed}/{len(pending)}] {contract_id} failed: {str(e)}")
+
+    summary = {
+        'requested': len(contract_ids),
+        'processed': len(pending),
+        'succeeded': succeeded,
+        'failed': failed,
+        'skipped': len(contract_ids) - len(pending),
+        'elapsedSeconds': round(time.monotonic() - started, 1)
+    }
+    print(f"Bulk re-analysis finished: {summary}")
+    return summary
+
+
+def _parse_filter_value(raw):
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return raw
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-analyze contracts in bulk")
+    parser.add_argument('--contract-ids', help="Comma separated contract ids")
+    parser.add_argument('--ids-file', help="File with one contract id per line")
+    parser.add_argument('--where', nargs=3, action='append', metavar=('FIELD', 'OP', 'VALUE'),
+                        default=[], help="Firestore filter on contracts, e.g. --where status == analyzed")
+    parser.add_argument('--limit', type=int, help="Maximum contracts selected by --where")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE_PER_MINUTE,
+                        help="Maximum contracts started per minute (0 = unlimited)")
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT_PATH)
+    parser.add_argument('--analysis-mode', default='auto', choices=['auto', 'single', 'chunked'])
+    parser.add_argument('--use-llm-cache', action='store_true',
+                        help="Allow cached completions (off by default so the new prompt/model runs)")
+    parser.add_argument('--retry-failed', action='store_true')
+    args = parser.parse_args(argv)
+
+    from clients import get_db
+    db = get_db()
+
+    contract_ids = []
+    if args.contract_ids:
+        contract_ids.extend(cid.strip() for cid in args.contract_ids.split(',') if cid.strip())
+    if args.ids_file:
+        with open(args.ids_file) as f:
+            contract_ids.extend(line.strip() for line in f if line.strip())
+    if args.where:
+        filters = [(field, op, _parse_filter_value(value)) for field, op, value in args.where]
+        contract_ids.extend(query_contract_ids(db, filters, args.limit))
+
+    if not contract_ids:
+        parser.error("No contracts selected; use --contract-ids, --ids-file or --where")
+
+    summary = bulk_reanalyze(
+        db,
+        contract_ids,
+        concurrency=args.concurrency,
+        rate_per_minute=args.rate,
+        checkpoint_path=args.checkpoint,
+        bypass_cache=not args.use_llm_cache,
+        analysis_mode=args.analysis_mode,
+        retry_failed=args.retry_failed
+    )
+    return 0 if summary['failed'] == 0 else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,16 +1,16 @@
 import os
 import json
-from groq import Groq
 from firebase_admin import firestore
 from dotenv import load_dotenv
+from clients import get_db, get_groq_client
+from model_router import routed_completion
+from llm_client import decode_json_response
+from tracing import span, annotate
+from prompt_builder import build_prompt
 
 # Load environment variables
 load_dotenv()
 
-# Initialize clients
-groq_client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
-db = firestore.client()
-
 CHANGE_ORDER_PROMPT = """
 Sen, değişiklik taleplerini analiz eden uzman bir proje yöneticisisin.
 
@@ -57,13 +57,117 @@ Görevin:
       "cons": ["Kısıtlı özellik", "Gelecekte ek iş"]
     }
   ],
-  "recommendation": 1
+  "recommendation": 1,
+  "confidence": 0.85
 }
+
+"confidence", sınıflandırmandan ne kadar emin olduğunu 0 ile 1 arasında belirtir.
+"""
+
+CHANGE_ORDER_USER_TEMPLATE = """
+Aşağıdaki değişiklik talebini analiz et:
+
+{project_context}
+{impact_context}
+Değişiklik Talebi:
+{change_request_text}
+
+Lütfen:
+1. Talebin türünü belirle (bug, minor scope, major scope, out of scope)
+2. Etki analizi yap (zaman, maliyet, etkilenen task'lar)
+3. 3 farklı seçenek sun
+4. Hangi seçeneği önerdiğini belirt
+
+Sadece yukarıdaki JSON formatını döndür.
+"""
+
+# Downstream task ids listed verbatim in the prompt; the rest are only counted
+IMPACT_PROMPT_MAX_TASKS = 15
+
+def compute_change_impact(project_id, change_request_data):
+    """
+    Deterministic impact from the project's dependency index: seed tasks (named
+    on the change request or matched by title), everything downstream of them,
+    hours at risk and the sprints of the current plan they sit in
+    """
+    from dependency_index import get_dependency_index, match_tasks
+    from replanner import load_current_plan_version
+
+    index = get_dependency_index(project_id)
+    seeds = change_request_data.get('taskIds')
+    seed_source = 'request'
+    if not seeds:
+        seeds = match_tasks(change_request_data.get('requestText', ''), index)
+        seed_source = 'title_match'
+    _, plan_version = load_current_plan_version(project_id)
+    impact = index.impact(
+        seeds,
+        extra_hours=change_request_data.get('estimatedHours') or 0,
+        plan=(plan_version or {}).get('plan')
+    )
+    impact['seedTaskTitles'] = {t: index.tasks[t].get('title', '') for t in impact['seedTasks']}
+    impact['seedSource'] = seed_source
+    return impact
+
+def _impact_context(impact):
+    downstream = impact['downstreamTasks']
+    listed = ", ".join(downstream[:IMPACT_PROMPT_MAX_TASKS])
+    if len(downstream) > IMPACT_PROMPT_MAX_TASKS:
+        listed += f" (+{len(downstream) - IMPACT_PROMPT_MAX_TASKS} daha)"
+    seeds = "; ".join(f"{t}: {title}" for t, title in impact['seedTaskTitles'].items())
+    if impact.get('seedSource') == 'request':
+        seed_note = "talepte belirtilen task'lar"
+    else:
+        seed_note = "başlık benzerliğiyle tahmin edildi, yanlış olabilir"
+    return f"""
+Hesaplanmış Etki (bağımlılık grafiğinden, ipucu):
+- Doğrudan etkilenen task'lar ({seed_note}): {seeds or 'eşleşme yok'}
+- Aşağı akıştaki task'lar ({len(downstream)}): {listed or 'yok'}
+- Risk altındaki kalan efor: {impact['hoursAtRisk']} saat
+- En uzun bağımlılık zinciri: {impact['criticalChainHours']} saat
+- Talep edilen ek efor: {impact['hourDelta']} saat
+- Etkilenen sprint'ler: {impact['affectedSprints'] or 'plan yok'}
+- Kayacak sprint'ler: {impact['slippedSprints'] or 'yok'}
+Bu değerleri ipucu olarak kullan: taleple ilgisiz task'ları "affectedTasks" listesine alma,
+eksik olanları ekle; zaman ve maliyet tahminini bu listeye dayandır.
 """
 
-def analyze_change_order(change_request_text, current_project_data=None):
+def merge_impact(impact_analysis, impact):
     """
-    Analyze change request and provide options
+    Merge the model's affected tasks and sprints with the computed impact.
+    Seeds named on the request are certain; title-matched seeds count only
+    when the model kept them. The dependents of counted seeds are added from
+    the dependency graph.
+    """
+    model_tasks = [str(t) for t in impact_analysis.get('affectedTasks') or []]
+    if impact.get('seedSource') == 'request':
+        seeds = impact['seedTasks']
+    else:
+        seeds = [t for t in impact['seedTasks'] if t in model_tasks]
+    tasks = list(model_tasks)
+    for seed in seeds:
+        for task_id in [seed] + impact['downstreamBySeed'].get(seed, []):
+            if task_id not in tasks:
+                tasks.append(task_id)
+
+    sprints = set()
+    for sprint in impact_analysis.get('affectedSprints') or []:
+        try:
+            sprints.add(int(sprint))
+        except (TypeError, ValueError):
+            continue
+    sprints |= {impact['taskSprints'][t] for t in tasks if t in impact['taskSprints']}
+
+    merged = dict(impact_analysis)
+    merged['affectedTasks'] = tasks
+    merged['affectedSprints'] = sorted(sprints)
+    return merged
+
+def analyze_change_order(change_request_text, current_project_data=None, bypass_cache=False, impact=None):
+    """
+    Analyze change request and provide options.
+    A computed impact is given to the model as a hint and merged with its
+    affected tasks and sprints (see merge_impact).
     """
     try:
         # Prepare project context if available
@@ -78,37 +182,34 @@ Mevcut Proje Bilgileri:
 """
         
         # User prompt with change request
-        USER_PROMPT = f"""
-Aşağıdaki değişiklik talebini analiz et:
-
-{project_context}
-
-Değişiklik Talebi:
-{change_request_text}
-
-Lütfen:
-1. Talebin türünü belirle (bug, minor scope, major scope, out of scope)
-2. Etki analizi yap (zaman, maliyet, etkilenen task'lar)
-3. 3 farklı seçenek sun
-4. Hangi seçeneği önerdiğini belirt
-
-Sadece yukarıdaki JSON formatını döndür.
-"""
+        USER_PROMPT, max_tokens = build_prompt(
+            'change_order',
+            CHANGE_ORDER_USER_TEMPLATE,
+            [],
+            project_context=project_context,
+            impact_context=_impact_context(impact) if impact else '',
+            change_request_text=change_request_text
+        )
 
         # Call Groq API
-        completion = groq_client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
+        json_string_response = routed_completion(
+            'change_order',
+            get_groq_client(),
             messages=[
                 {"role": "system", "content": CHANGE_ORDER_PROMPT},
                 {"role": "user", "content": USER_PROMPT}
             ],
             temperature=0.2,
-            max_tokens=4096,
-            response_format={"type": "json_object"}
+            max_tokens=max_tokens,
+            response_format={"type": "json_object"},
+            bypass_cache=bypass_cache
         )
         
-        json_string_response = completion.choices[0].message.content
-        analysis_data = json.loads(json_string_response)
+        analysis_data = decode_json_response(json_string_response)
+
+        if impact:
+            analysis_data['impactAnalysis'] = merge_impact(analysis_data.get('impactAnalysis') or {}, impact)
+            analysis_data['computedImpact'] = impact
         
         print("Change order analysis completed successfully")
         return analysis_data
@@ -123,12 +224,13 @@ def save_change_analysis_to_firestore(change_request_id, analysis_data):
     """
     try:
         # Update change request with analysis
-        change_request_ref = db.collection('changeRequests').document(change_request_id)
-        change_request_ref.update({
-            'analysis': analysis_data,
-            'status': 'analyzed',
-            'updatedAt': firestore.SERVER_TIMESTAMP
-        })
+        change_request_ref = get_db().collection('changeRequests').document(change_request_id)
+        with span('firestore_write', collection='changeRequests'):
+            change_request_ref.update({
+                'analysis': analysis_data,
+                'status': 'analyzed',
+                'updatedAt': firestore.SERVER_TIMESTAMP
+            })
         
         print(f"Change analysis saved to Firestore for change request {change_request_id}")
         return True
@@ -137,7 +239,7 @@ def save_change_analysis_to_firestore(change_request_id, analysis_data):
         print(f"Error saving change analysis to Firestore: {str(e)}")
         raise
 
-def analyze_change_request(change_request_id):
+def analyze_change_request(change_request_id, bypass_cache=False):
     """
     Main function to analyze change request
     """
@@ -146,8 +248,9 @@ def analyze_change_request(change_request_id):
         
         # Step 1: Get change request from Firestore
         print("Getting change request from Firestore...")
-        change_request_ref = db.collection('changeRequests').document(change_request_id)
-        change_request_doc = change_request_ref.get()
+        change_request_ref = get_db().collection('changeRequests').document(change_request_id)
+        with span('firestore_read', collection='changeRequests'):
+            change_request_doc = change_request_ref.get()
         
         if not change_request_doc.exists:
             raise ValueError(f"Change request {change_request_id} not found")
@@ -157,23 +260,31 @@ def analyze_change_request(change_request_id):
         
         # Step 2: Get project data if available
         project_data = None
+        project_id = change_request_data.get('projectId')
         if change_request_data.get('contractId'):
-            contract_ref = db.collection('contracts').document(change_request_data['contractId'])
-            contract_doc = contract_ref.get()
-            if contract_doc.exists:
-                contract_data = contract_doc.to_dict()
-                # Get project data if available
-                projects_ref = db.collection('projects')
-                projects_query = projects_ref.where('contractId', '==', change_request_data['contractId']).limit(1)
+            projects_ref = get_db().collection('projects')
+            projects_query = projects_ref.where('contractId', '==', change_request_data['contractId']).limit(1)
+            with span('firestore_read', collection='projects'):
                 projects = projects_query.get()
-                if projects:
-                    project_data = projects[0].to_dict()
+            if projects:
+                project_data = projects[0].to_dict()
+                project_id = projects[0].id
+
+        # Step 3: Compute the impact from the task graph
+        impact = None
+        if project_id:
+            try:
+                impact = compute_change_impact(project_id, change_request_data)
+                annotate(impactedTasks=impact['impactedTaskCount'], seedSource=impact['seedSource'])
+            except Exception as e:
+                # Fall back to the model's own estimate
+                print(f"Error computing change impact: {str(e)}")
         
-        # Step 3: Analyze change request with Groq
+        # Step 4: Analyze change request with Groq
         print("Analyzing change request with Groq API...")
-        analysis_data = analyze_change_order(request_text, project_data)
+        analysis_data = analyze_change_order(request_text, project_data, bypass_cache=bypass_cache, impact=impact)
         
-        # Step 4: Save to Firestore
+        # Step 5: Save to Firestore
         print("Saving analysis to Firestore...")
         save_change_analysis_to_firestore(change_request_id, analysis_data)
         
@@ -0,0 +1,274 @@
+import os
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from firebase_admin import firestore
+from clients import get_db
+from tracing import span
+from firestore_batch import BatchWriter
+from contract_chunker import _normalize
+from contract_revision import attribute_item
+
+# Library of already analyzed clauses, per user.
+# Clauses are fingerprinted with MinHash over word shingles and indexed with
+# LSH banding, so boilerplate (payment terms, IP transfer, confidentiality)
+# seen in the user's earlier contracts is recognised even with small edits
+# and its ambiguity and risk findings are reused; the model is told to skip
+# those clauses for these two fields. Document-level fields (summary,
+# deliverables, milestones, payments, timeline) always come from the model.
+#
+# Only clauses whose findings quote them are stored, and clauses containing
+# numbers (amounts, dates, durations; not their own numbering) are only
+# reused on an exact match.
+#
+# Entries live in users/{uid}/clauseLibrary/{version}/clauses; the version
+# changes with the analysis prompt and model, so findings never outlive them.
+# Each instance keeps an in-memory index per user and pulls new entries every
+# CLAUSE_LIBRARY_REFRESH_SECONDS.
+
+CLAUSE_LIBRARY_ENABLED = os.environ.get("CLAUSE_LIBRARY_ENABLED", "false").lower() == "true"
+CLAUSE_LIBRARY_COLLECTION = 'clauseLibrary'
+# Fields whose findings are stored and reused
+LIBRARY_FIELDS = ('ambiguities', 'risks')
+# Estimated Jaccard similarity needed to reuse a library entry
+CLAUSE_LIBRARY_MIN_SIMILARITY = float(os.environ.get("CLAUSE_LIBRARY_MIN_SIMILARITY", 0.9))
+# Shorter clauses (headings, signature blocks) are always sent to the model
+CLAUSE_LIBRARY_MIN_CHARS = int(os.environ.get("CLAUSE_LIBRARY_MIN_CHARS", 200))
+CLAUSE_LIBRARY_REFRESH_SECONDS = int(os.environ.get("CLAUSE_LIBRARY_REFRESH_SECONDS", 300))
+# In-memory indexes kept per instance (one per user and version)
+CLAUSE_LIBRARY_MAX_INDEXES = int(os.environ.get("CLAUSE_LIBRARY_MAX_INDEXES", 32))
+# A finding is tied to a clause when this much of its quoted clause text
+# appears in exactly one clause
+MIN_QUOTE_CHARS = 20
+
+SHINGLE_WORDS = 5
+NUM_PERMUTATIONS = 64
+# 16 bands of 4 rows: pairs above ~0.5 Jaccard become candidates, and the
+# signature comparison then applies CLAUSE_LIBRARY_MIN_SIMILARITY
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERMUTATIONS // LSH_BANDS
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+# Fixed seed: signatures are stored, so the permutations must never change
+_rng = np.random.RandomState(20240601)
+_PERM_A = _rng.randint(1, 1 << 32, size=NUM_PERMUTATIONS, dtype=np.uint64)
+_PERM_B = _rng.randint(0, 1 << 32, size=NUM_PERMUTATIONS, dtype=np.uint64)
+_DIGIT_RE = re.compile(r"\d")
+# Leading clause numbering ("MADDE 5 -", "Article 3", "5.1)"), which says
+# nothing about the terms and would make every numbered clause exact-only
+_NUMBERING_RE = re.compile(
+    r"^\s*(?:#{1,6}\s*)?(?:(?:MADDE|Madde|madde|ARTICLE|Article|SECTION|Section|BÖLÜM|Bölüm)\s+)?\d+(?:\.\d+)*[.)]?"
+)
+
+
+def shingles(normalized_text, size=SHINGLE_WORDS):
+    words = normalized_text.split()
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def minhash(normalized_text):
+    """
+    MinHash signature (NUM_PERMUTATIONS uint32 values) of the text's shingles
+    """
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), 'little')
+         for s in shingles(normalized_text)],
+        dtype=np.uint64
+    )
+    # a, b and the hashes are below 2**32, so a * h + b cannot overflow uint64
+    permuted = (np.outer(hashes, _PERM_A) + _PERM_B) % _MERSENNE_PRIME & _MAX_HASH
+    return permuted.min(axis=0)
+
+
+def band_keys(signature):
+    return [(band, signature[band * LSH_ROWS:(band + 1) * LSH_ROWS].tobytes()) for band in range(LSH_BANDS)]
+
+
+def similarity(signature_a, signature_b):
+    return float(np.mean(signature_a == signature_b))
+
+
+def entry_id(clause):
+    return hashlib.sha256(clause.normalized.encode("utf-8")).hexdigest()[:32]
+
+
+def exact_only(clause):
+    """
+    Clauses with numbers differ in what matters (amounts, dates) while
+    sharing most shingles, so they are only reused verbatim
+    """
+    return bool(_DIGIT_RE.search(_NUMBERING_RE.sub("", clause.text, count=1)))
+
+
+def linked_clause(item, clauses):
+    """
+    The one clause an item quotes, or None
+    """
+    quote = _normalize(item.get('clause'))[:200]
+    if len(quote) < MIN_QUOTE_CHARS:
+        return None
+    quoted = [clause for clause in clauses if quote in clause.normalized]
+    return quoted[0] if len(quoted) == 1 else None
+
+
+class ClauseLibrary:
+    """
+    In-memory LSH index over one user's clause library for one prompt/model
+    version
+    """
+
+    def __init__(self, tenant, version):
+        self.tenant = tenant
+        self.version = version
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._buckets = {}
+        self._synced_until = None
+        self._checked_at = 0.0
+
+    def _clauses(self):
+        return get_db().collection('users').document(self.tenant) \
+            .collection(CLAUSE_LIBRARY_COLLECTION).document(self.version).collection('clauses')
+
+    def _index(self, entry_id, signature, findings):
+        with self._lock:
+            if entry_id in self._entries:
+                return
+            self._entries[entry_id] = (signature, findings)
+            for key in band_keys(signature):
+                self._buckets.setdefault(key, set()).add(entry_id)
+
+    def refresh(self, force=False):
+        """
+        Pull entries created since the last sync (all of them the first time)
+        """
+        if not force and time.monotonic() - self._checked_at < CLAUSE_LIBRARY_REFRESH_SECONDS:
+            return
+        self._checked_at = time.monotonic()
+        query = self._clauses()
+        if self._synced_until is not None:
+            query = query.where('createdAt', '>', self._synced_until)
+        with span('firestore_read', collection=CLAUSE_LIBRARY_COLLECTION) as attrs:
+            loaded = 0
+            for snapshot in query.stream():
+                entry = snapshot.to_dict() or {}
+                if not entry.get('signature') or not entry.get('findings'):
+                    continue
+                self._index(snapshot.id, np.array(entry['signature'], dtype=np.uint64), entry['findings'])
+                created_at = entry.get('createdAt')
+                if created_at is not None and (self._synced_until is None or created_at > self._synced_until):
+                    self._synced_until = created_at
+                loaded += 1
+            attrs['documents'] = loaded
+        if loaded:
+            print(f"Clause library {self.version}: {loaded} entries loaded, {len(self._entries)} indexed")
+
+    def match(self, clauses):
+        """
+        {clause index: (entry id, similarity, findings)} for the clauses
+        (contract_revision.Clause) that match a library entry
+        """
+        self.refresh()
+        matches = {}
+        for clause in clauses:
+            if len(clause.text) < CLAUSE_LIBRARY_MIN_CHARS:
+                continue
+            if exact_only(clause):
+                with self._lock:
+                    entry = self._entries.get(entry_id(clause))
+                if entry is not None:
+                    matches[clause.index] = (entry_id(clause), 1.0, entry[1])
+                continue
+            signature = minhash(clause.normalized)
+            with self._lock:
+                candidates = set()
+                for key in band_keys(signature):
+                    candidates |= self._buckets.get(key, set())
+                scored = [(similarity(signature, self._entries[c][0]), c) for c in candidates]
+            if not scored:
+                continue
+            score, best = max(scored)
+            if score >= CLAUSE_LIBRARY_MIN_SIMILARITY:
+                matches[clause.index] = (best, score, self._entries[best][1])
+        return matches
+
+    def learn(self, clauses, analysis, matches=None):
+        """
+        Store the analyzed clauses whose ambiguity and risk findings quote
+        them, and count hits on the matched entries; one batch commit.
+        Clauses without findings are not stored, and neither are clauses an
+        unquoted finding may be about, since reusing them would lose it.
+        """
+        writer = BatchWriter()
+        clauses_ref = self._clauses()
+        findings_by_clause = {}
+        unclear = set()
+        for field in LIBRARY_FIELDS:
+            for item in (analysis or {}).get(field) or []:
+                if not isinstance(item, dict):
+                    continue
+                clause = linked_clause(item, clauses)
+                if clause is None:
+                    guess = attribute_item(field, item, clauses)
+                    if guess is not None:
+                        unclear.add(guess.index)
+                    continue
+                stored = {k: v for k, v in item.items() if k not in ('id', 'provenance')}
+                findings_by_clause.setdefault(clause.index, {}).setdefault(field, []).append(stored)
+
+        added = 0
+        for clause in clauses:
+            findings = findings_by_clause.get(clause.index)
+            if not findings or clause.index in unclear or len(clause.text) < CLAUSE_LIBRARY_MIN_CHARS:
+                continue
+            clause_id = entry_id(clause)
+            with self._lock:
+                if clause_id in self._entries:
+                    continue
+            signature = minhash(clause.normalized)
+            writer.set(clauses_ref.document(clause_id), {
+                'signature': [int(v) for v in signature],
+                'findings': findings,
+                'textSample': clause.text[:300],
+                'chars': len(clause.text),
+                'hits': 0,
+                'createdAt': firestore.SERVER_TIMESTAMP
+            })
+            self._index(clause_id, signature, findings)
+            added += 1
+
+        for matched_id, _, _ in (matches or {}).values():
+            writer.set(clauses_ref.document(matched_id), {'hits': firestore.Increment(1)}, merge=True)
+
+        if writer.operations:
+            writer.commit()
+        return added
+
+
+_libraries = OrderedDict()
+_libraries_lock = threading.Lock()
+
+
+def get_clause_library(tenant, version):
+    with _libraries_lock:
+        key = (tenant, version)
+        library = _libraries.get(key)
+        if library is None:
+            library = _libraries[key] = ClauseLibrary(tenant, version)
+            while len(_libraries) > CLAUSE_LIBRARY_MAX_INDEXES:
+                _libraries.popitem(last=False)
+        _libraries.move_to_end(key)
+        return library
+
+
+def library_version(*parts):
+    """
+    Version id for findings produced by the given prompt/model settings
+    """
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()[:12]
@@ -0,0 +1,234 @@
+import os
+import threading
+
+# Lazily created, process-wide clients.
+# Nothing here is built at import time: each endpoint only pays for the
+# clients (and the heavy SDK imports behind them) that it actually uses.
+
+FIREBASE_OPTIONS = {
+    'storageBucket': os.environ.get('FIREBASE_STORAGE_BUCKET', 'lambda-926aa.firebasestorage.app'),
+    'projectId': os.environ.get('FIREBASE_PROJECT_ID', 'lambda-926aa')
+}
+SECRET_PROJECT_ID = os.environ.get('SECRET_PROJECT_ID', 'lambda-926aa')
+
+# Shared outbound HTTP. One keep-alive pool per library per instance, sized
+# for the concurrent requests an instance serves, so warm instances reuse
+# TCP/TLS connections instead of handshaking on every call.
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 32))
+HTTP_KEEPALIVE_SECONDS = float(os.environ.get('HTTP_KEEPALIVE_SECONDS', 60))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 5))
+HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', 60))
+# LLM completions can legitimately take minutes on long contracts
+GROQ_READ_TIMEOUT = float(os.environ.get('GROQ_READ_TIMEOUT', 180))
+HTTP2_ENABLED = os.environ.get('HTTP2_ENABLED', 'true').lower() != 'false'
+
+_lock = threading.RLock()
+_clients = {}
+_secrets = {}
+
+
+def _get_or_create(name, factory):
+    client = _clients.get(name)
+    if client is not None:
+        return client
+    with _lock:
+        client = _clients.get(name)
+        if client is None:
+            client = factory()
+            _clients[name] = client
+        return client
+
+
+def set_client(name, client):
+    """
+    Override a client (used by local benchmarks and tooling)
+    """
+    with _lock:
+        _clients[name] = client
+
+
+def ensure_firebase_app():
+    """
+    Initialize the default Firebase app once per process and return it
+    """
+    def create():
+        from firebase_admin import initialize_app, get_app
+        try:
+            return get_app()
+        except ValueError:
+            app = initialize_app(options=FIREBASE_OPTIONS)
+            print(f"Firebase Admin initialized with storageBucket: {FIREBASE_OPTIONS['storageBucket']}")
+            return app
+
+    return _get_or_create('firebase_app', create)
+
+
+def get_db():
+    """
+    Shared Firestore client
+    """
+    def create():
+        ensure_firebase_app()
+        from firebase_admin import firestore
+        return firestore.client()
+
+    return _get_or_create('firestore', create)
+
+
+def get_bucket():
+    """
+    Shared default Storage bucket
+    """
+    def create():
+        ensure_firebase_app()
+        from firebase_admin import storage
+        # Name the bucket explicitly in case the app was initialized elsewhere
+        # without the storageBucket option
+        return storage.bucket(FIREBASE_OPTIONS['storageBucket'])
+
+    return _get_or_create('bucket', create)
+
+
+def _http2_available():
+    if not HTTP2_ENABLED:
+        return False
+    try:
+        import h2  # noqa: F401 (httpx needs it for HTTP/2)
+        return True
+    except ImportError:
+        return False
+
+
+def _httpx_limits():
+    import httpx
+    return httpx.Limits(
+        max_connections=HTTP_POOL_SIZE,
+        max_keepalive_connections=HTTP_POOL_SIZE,
+        keepalive_expiry=HTTP_KEEPALIVE_SECONDS
+    )
+
+
+def get_http_session():
+    """
+    Shared requests session (direct-URL PDF downloads)
+    """
+    def create():
+        import requests
+        from requests.adapters import HTTPAdapter
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    return _get_or_create('http_session', create)
+
+
+def get_http_client():
+    """
+    Shared httpx client (HTTP/2 when h2 is installed) used by the Groq SDK
+    """
+    def create():
+        import httpx
+        return httpx.Client(
+            http2=_http2_available(),
+            limits=_httpx_limits(),
+            timeout=httpx.Timeout(GROQ_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+        )
+
+    return _get_or_create('http_client', create)
+
+
+def get_event_loop():
+    """
+    Process-wide asyncio loop on a daemon thread. Async SDKs (LlamaParse) run
+    their coroutines here so their connection pool outlives a single call;
+    a per-call asyncio.run would discard it every time.
+    """
+    def create():
+        import asyncio
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=loop.run_forever, name='clients-event-loop', daemon=True).start()
+        return loop
+
+    return _get_or_create('event_loop', create)
+
+
+def run_async(coroutine, timeout=None):
+    """
+    Run a coroutine on the shared loop and wait for its result
+    """
+    import asyncio
+    return asyncio.run_coroutine_threadsafe(coroutine, get_event_loop()).result(timeout)
+
+
+def get_llama_parse_http_client():
+    """
+    Shared httpx.AsyncClient for LlamaParse, bound to the shared loop.
+    LlamaParse sets its own base_url, auth header and job timeout on the
+    client it is given, so this pool is not shared with other services.
+    """
+    def create():
+        import httpx
+
+        async def build():
+            return httpx.AsyncClient(http2=_http2_available(), limits=_httpx_limits())
+
+        return run_async(build())
+
+    return _get_or_create('llama_parse_http_client', create)
+
+
+def get_groq_client():
+    """
+    Shared Groq client
+    """
+    def create():
+        import httpx
+        from groq import Groq
+        from config import GROQ_API_KEY
+        # Retries are done by rate_limiter, which also adapts to the 429s
+        return Groq(
+            api_key=GROQ_API_KEY,
+            max_retries=0,
+            timeout=httpx.Timeout(GROQ_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            http_client=get_http_client()
+        )
+
+    return _get_or_create('groq', create)
+
+
+def get_llama_api_key():
+    """
+    LlamaParse API key
+    """
+    from config import LLAMA_CLOUD_API_KEY
+    return LLAMA_CLOUD_API_KEY
+
+
+def get_secret(secret_id):
+    """
+    Resolve a secret from Secret Manager once per process, falling back to the
+    environment variable of the same name
+    """
+    if secret_id in _secrets:
+        return _secrets[secret_id]
+
+    with _lock:
+        if secret_id in _secrets:
+            return _secrets[secret_id]
+        try:
+            def create():
+                from google.cloud import secretmanager
+                return secretmanager.SecretManagerServiceClient()
+
+            client = _get_or_create('secretmanager', create)
+            name = f"projects/{SECRET_PROJECT_ID}/secrets/{secret_id}/versions/latest"
+            response = client.access_secret_version(request={"name": name})
+            value = response.payload.data.decode("UTF-8")
+        except Exception as e:
+            print(f"Error getting secret {secret_id}: {str(e)}")
+            # Fallback to environment variable
+            value = os.environ.get(secret_id)
+        _secrets[secret_id] = value
+        return value
@@ -1,41 +1,70 @@
 import os
 import json
-import tempfile
-from groq import Groq
-from llama_cloud_services import LlamaParse
-from firebase_admin import firestore, storage
+import time
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from firebase_admin import firestore
 from dotenv import load_dotenv
-from google.cloud import secretmanager
+from clients import get_db, get_bucket, get_groq_client, get_llama_api_key
+from clients import get_llama_parse_http_client, run_async
+from clients import get_secret  # re-exported for existing callers
+from parse_cache import ParseCache, compute_file_sha256, make_parse_cache_key, make_page_cache_key
+from llm_client import chat_completion, stream_chat_completion, decode_json_response
+from model_router import LARGE_MODEL, routed_completion, streaming_model
+from prompt_builder import text_prompt
+from contract_chunker import build_chunks, merge_chunk_analyses, split_into_clauses
+from pdf_fetch import FetchedPdf, PdfNotFoundError, fetch_blob, fetch_url
+from pdf_text import PDF_LOCAL_EXTRACTION, extract_pages, weak_pages, single_page_pdfs, page_hash
+from json_stream import StreamingJsonParser
+from contract_revision import REVISION_MAX_CHANGED_RATIO, Clause, diff_clauses, merge_revision
+from clause_library import CLAUSE_LIBRARY_ENABLED, LIBRARY_FIELDS, get_clause_library, library_version, linked_clause
+from contract_reader import read_contract
+from analysis_store import ANALYSIS_STORAGE_MODE, offload_analysis, load_analysis, stored_analysis_path
+from analysis_store import delete_stored_analysis
+from tracing import span, annotate, propagate
 
 # Load environment variables
 load_dotenv()
 
-def get_secret(secret_id):
-    """Get secret from Google Cloud Secret Manager"""
-    try:
-        client = secretmanager.SecretManagerServiceClient()
-        name = f"projects/lambda-926aa/secrets/{secret_id}/versions/latest"
-        response = client.access_secret_version(request={"name": name})
-        return response.payload.data.decode("UTF-8")
-    except Exception as e:
-        print(f"Error getting secret {secret_id}: {str(e)}")
-        # Fallback to environment variable
-        return os.environ.get(secret_id)
-
-# Initialize clients with hardcoded keys (matching AI team's approach)
-groq_client = Groq(api_key="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")
-llama_api_key = "llx-SHymI9q0Tr65lYHubePG7sH2BwFo3myVLst8NuJThdP7x1LS"
-
-# Initialize Firebase clients
-db = firestore.client()
-bucket = storage.bucket()
+# Clients (Groq, Firestore, Storage, Secret Manager) are created lazily in
+# clients.py; llama_cloud_services is imported only when a parse is needed.
+
+# LlamaParse settings (part of the parse cache key)
+LLAMA_PARSE_LANGUAGE = "tr"  # Turkish language for better results
+LLAMA_PARSE_SPLIT_BY_PAGE = False
+# Concurrent LlamaParse jobs when only the weak pages of a PDF are sent
+LLAMA_PARSE_PAGE_WORKERS = int(os.environ.get("LLAMA_PARSE_PAGE_WORKERS", 4))
+# Above this share of pages to parse the whole PDF goes to LlamaParse as one
+# split-by-page job
+LLAMA_PARSE_FULL_DOCUMENT_RATIO = float(os.environ.get("LLAMA_PARSE_FULL_DOCUMENT_RATIO", 0.5))
+# Concurrent page artifact reads and writes (each may be a Storage request)
+PAGE_CACHE_LOOKUP_WORKERS = int(os.environ.get("PAGE_CACHE_LOOKUP_WORKERS", 8))
+
+# Content-addressed cache of LlamaParse output (local disk LRU + Storage)
+parse_cache = ParseCache(bucket_factory=get_bucket)
+
+# Map-reduce analysis for long contracts: texts above the threshold are split
+# on clause boundaries and the chunks are analyzed concurrently
+CHUNKED_ANALYSIS_THRESHOLD_CHARS = int(os.environ.get("CHUNKED_ANALYSIS_THRESHOLD_CHARS", 24000))
+ANALYSIS_CHUNK_MAX_CHARS = int(os.environ.get("ANALYSIS_CHUNK_MAX_CHARS", 12000))
+ANALYSIS_MAX_WORKERS = int(os.environ.get("ANALYSIS_MAX_WORKERS", 4))
+
+# Part label for revision mode: the model only sees the changed clauses
+REVISION_PART_LABEL = "revizyonda eklenen veya değiştirilen maddeler"
+
+# analyzeContractStream emits these analysis lists item by item
+STREAMED_SECTIONS = ('ambiguities', 'risks', 'deliverables')
+STREAM_JSON_ONLY_NOTE = """
+Sadece JSON nesnesini döndür; öncesinde veya sonrasında açıklama yazma.
+"""
 
-# Verify bucket configuration
-print(f"Firebase Storage bucket name: {bucket.name}")
-print(f"Firebase Storage bucket path: {bucket.path}")
+# Quoting a risk's clause only serves the clause library, which links risks to
+# clauses by it; without the library the field would just cost output tokens
+RISK_CLAUSE_FIELD = """
+      "clause": "Riskin dayandığı maddenin tam metni (tek bir maddeye dayanmıyorsa null)","""
 
 # B2B Enhanced Contract Analysis with Ambiguity Detection
-AMBIGUITY_SYSTEM_PROMPT = """
+AMBIGUITY_SYSTEM_PROMPT_TEMPLATE = """
 Sen, yazılım projesi sözleşmelerini analiz eden uzman bir AI asistanısın.
 Görevin, sözleşme metnindeki belirsizlikleri (ambiguities), riskleri ve netleştirilmesi gereken maddeleri tespit etmektir.
 
@@ -56,7 +85,7 @@ Görevin, sözleşme metnindeki belirsizlikleri (ambiguities), riskleri ve netle
     {
       "id": "risk_1",
       "title": "Risk başlığı",
-      "description": "Risk açıklaması",
+      "description": "Risk açıklaması",{risk_clause}
       "severity": "low" | "medium" | "high" | "critical",
       "probability": 0-100,
       "impact": 0-100,
@@ -95,6 +124,14 @@ Görevin, sözleşme metnindeki belirsizlikleri (ambiguities), riskleri ve netle
 }
 """
 
+def ambiguity_system_prompt(clause_library_enabled):
+    return AMBIGUITY_SYSTEM_PROMPT_TEMPLATE.replace(
+        "{risk_clause}", RISK_CLAUSE_FIELD if clause_library_enabled else ""
+    )
+
+# Fixed per process, so the prompt prefix stays cacheable
+AMBIGUITY_SYSTEM_PROMPT = ambiguity_system_prompt(CLAUSE_LIBRARY_ENABLED)
+
 # Legacy system prompt for backward compatibility
 SYSTEM_PROMPT = """
 Sen, bir ürün yöneticisi tarafından yazılan kodlama projesi görevlerini (task) analiz eden kıdemli bir teknik analiz uzmanısın.
@@ -134,117 +171,50 @@ Başka hiçbir açıklama, selamlama veya yorum yapma.
 
 def download_pdf_from_storage(pdf_url=None, pdf_path=None):
     """
-    Download PDF from Firebase Storage to temporary file using Firebase Admin SDK
+    Fetch the contract PDF into a spooled, hashed buffer (see pdf_fetch).
+    Storage objects are downloaded in a single request; a 404 falls back to
+    the download URL when one was given.
     """
     print("=== download_pdf_from_storage START ===")
     print(f"PDF URL: {pdf_url}")
     print(f"PDF Path: {pdf_path}")
-    print(f"Bucket name: {bucket.name}")
     
     try:
         object_path = None
 
         if pdf_path:
-            print("Using pdf_path...")
             # Accept full gs:// URIs or relative storage paths
             if pdf_path.startswith("gs://"):
                 object_path = pdf_path.split("/", 3)[-1]
-                print(f"Extracted from gs:// URI: {object_path}")
             else:
                 object_path = pdf_path.lstrip("/")
-                print(f"Using relative path: {object_path}")
         elif pdf_url:
-            print("Using pdf_url...")
-            # Extract path from Firebase Storage URL
-            if "firebasestorage.googleapis.com" in pdf_url:
-                print("Parsing firebasestorage.googleapis.com URL...")
-                # Parse Firebase Storage URL: https://firebasestorage.googleapis.com/v0/b/bucket/o/path?alt=media
-                from urllib.parse import urlparse, unquote
-                parsed_url = urlparse(pdf_url)
-                path_parts = parsed_url.path.split('/')
-                print(f"URL path parts: {path_parts}")
-                if len(path_parts) >= 6 and path_parts[1] == "v0" and path_parts[2] == "b" and path_parts[4] == "o":
-                    # Join all parts after /o/ to get full path
-                    encoded_path = '/'.join(path_parts[5:])
-                    # Remove query parameters
-                    encoded_path = encoded_path.split('?')[0] if '?' in encoded_path else encoded_path
-                    object_path = unquote(encoded_path)
-                    print(f"Extracted object path: {object_path}")
-                else:
-                    print("Using extract_storage_path_from_url...")
-                    object_path = extract_storage_path_from_url(pdf_url)
-            else:
-                print("Using extract_storage_path_from_url...")
-                try:
-                    object_path = extract_storage_path_from_url(pdf_url)
-                except ValueError as e:
-                    print(f"Error extracting storage path: {str(e)}")
-                    # If it's not a Firebase Storage URL, try direct download
-                    if "firebasestorage.googleapis.com" not in pdf_url and "storage.googleapis.com" not in pdf_url:
-                        print("Attempting direct download from non-Firebase URL...")
-                        import requests
-                        response = requests.get(pdf_url)
-                        if response.status_code == 200:
-                            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-                            temp_file.write(response.content)
-                            temp_file.close()
-                            print(f"Downloaded via direct URL to: {temp_file.name}")
-                            return temp_file.name
-                        else:
-                            raise ValueError(f"Direct download failed with status: {response.status_code}")
-                    else:
-                        raise e
+            try:
+                object_path = extract_storage_path_from_url(pdf_url)
+            except ValueError as e:
+                if "firebasestorage.googleapis.com" in pdf_url or "storage.googleapis.com" in pdf_url:
+                    raise
+                # Not a Firebase Storage URL: stream it directly
+                print(f"Attempting direct download from non-Firebase URL ({str(e)})")
+                pdf = fetch_url(pdf_url)
+                print(f"Downloaded {pdf.size} bytes via direct URL (sha256 {pdf.sha256[:12]})")
+                return pdf
 
         print(f"Final object_path: {object_path}")
         
         if not object_path:
             raise ValueError("Could not determine storage object path for PDF")
         
-        # Use Firebase Admin SDK to download the file
-        print(f"Creating blob for path: {object_path}")
-        blob = bucket.blob(object_path)
-        
-        # Check if file exists
-        print("Checking if file exists...")
-        if not blob.exists():
-            print(f"Blob doesn't exist, trying alternative download method...")
-            # Fallback: Use the download URL directly
-            if pdf_url:
-                import requests
-                print(f"Attempting direct download from URL: {pdf_url}")
-                response = requests.get(pdf_url)
-                if response.status_code == 200:
-                    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-                    temp_file.write(response.content)
-                    temp_file.close()
-                    print(f"Downloaded via direct URL to: {temp_file.name}")
-                    return temp_file.name
-                else:
-                    print(f"Direct download failed with status: {response.status_code}")
-                    # Try to list files in the bucket to debug
-                    print("Listing files in bucket for debugging...")
-                    blobs = bucket.list_blobs(prefix="contracts/")
-                    for blob_item in blobs:
-                        print(f"Found blob: {blob_item.name}")
-                    raise ValueError(f"File does not exist in storage: {object_path}")
-            else:
-                print(f"ERROR: File does not exist in storage: {object_path}")
-                print(f"Bucket: {bucket.name}")
-                print(f"Full blob path: {blob.name}")
-                # Try to list files in the bucket to debug
-                print("Listing files in bucket for debugging...")
-                blobs = bucket.list_blobs(prefix="contracts/")
-                for blob_item in blobs:
-                    print(f"Found blob: {blob_item.name}")
-                raise ValueError(f"File does not exist in storage: {object_path}")
-        
-        print("File exists, downloading...")
-        # Create temporary file
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-        blob.download_to_filename(temp_file.name)
-        print(f"Downloaded to: {temp_file.name}")
-        
-        return temp_file.name
+        try:
+            pdf = fetch_blob(get_bucket(), object_path)
+        except PdfNotFoundError:
+            if not pdf_url:
+                raise
+            print(f"Blob {object_path} not found, trying the download URL...")
+            pdf = fetch_url(pdf_url)
+
+        print(f"Downloaded {pdf.size} bytes from {pdf.source} (sha256 {pdf.sha256[:12]})")
+        return pdf
         
     except Exception as e:
         print(f"=== ERROR in download_pdf_from_storage ===")
@@ -266,7 +236,7 @@ def extract_storage_path_from_url(pdf_url: str) -> str:
     parsed_url = urlparse(pdf_url)
     host = parsed_url.netloc
     path = parsed_url.path
-    bucket_name = bucket.name
+    bucket_name = get_bucket().name
 
     print(f"Parsing URL: {pdf_url}")
     print(f"Host: {host}")
@@ -315,33 +285,169 @@ def extract_storage_path_from_url(pdf_url: str) -> str:
 
     raise ValueError("Invalid Firebase Storage URL format")
 
-def parse_pdf_with_llama(pdf_path):
+def pdf_parse_cache_key(pdf):
     """
-    Parse PDF using LlamaParse
+    Parse cache key for a FetchedPdf (hashed while downloading) or a file path
     """
-    try:
-        parser = LlamaParse(
-            api_key=llama_api_key,
-            num_workers=4,
-            verbose=True,
-            language="tr",  # Turkish language for better results
-        )
+    content_sha256 = pdf.sha256 if isinstance(pdf, FetchedPdf) else compute_file_sha256(pdf)
+    return make_parse_cache_key(content_sha256, LLAMA_PARSE_LANGUAGE, LLAMA_PARSE_SPLIT_BY_PAGE,
+                                extractor='tiered' if PDF_LOCAL_EXTRACTION else None)
 
-        # Parse the PDF
-        result = parser.parse(pdf_path)
-        
-        # Get text documents
-        text_documents = result.get_text_documents(split_by_page=False)
-        
-        if text_documents:
-            parsed_text = "\n".join([doc.text for doc in text_documents])
+def llama_parse_files(files, split_by_page=LLAMA_PARSE_SPLIT_BY_PAGE):
+    """
+    Parse PDFs (paths or binary streams) with LlamaParse, up to
+    LLAMA_PARSE_PAGE_WORKERS at a time. Returns their texts in order, or a
+    list of page texts per file with split_by_page.
+    """
+    import asyncio
+    from llama_cloud_services import LlamaParse
+
+    parser = LlamaParse(
+        api_key=get_llama_api_key(),
+        num_workers=4,
+        verbose=True,
+        language=LLAMA_PARSE_LANGUAGE,
+        custom_client=get_llama_parse_http_client(),
+    )
+
+    async def parse_all():
+        semaphore = asyncio.Semaphore(max(1, LLAMA_PARSE_PAGE_WORKERS))
+
+        async def parse_one(parser_input):
+            # In-memory buffers need a file name so LlamaParse can detect the type
+            extra_info = None if isinstance(parser_input, str) else {"file_name": "contract.pdf"}
+            async with semaphore:
+                result = await parser.aparse(parser_input, extra_info=extra_info)
+            texts = [doc.text for doc in result.get_text_documents(split_by_page=split_by_page)]
+            return texts if split_by_page else "\n".join(texts)
+
+        return await asyncio.gather(*[parse_one(f) for f in files])
+
+    # Parse on the shared loop so the keep-alive pool survives between parses
+    # (parser.parse would run a fresh event loop)
+    return run_async(parse_all())
+
+def parse_pages_with_llama(parser_input, reader, indexes, use_cache=True):
+    """
+    LlamaParse text for the given pages as {page index: text}. Pages whose
+    content hash already has a page artifact (e.g. the unchanged pages of a
+    revised contract) are served from the parse cache; only new pages are
+    parsed, as single-page jobs or, when most of the document is new, as one
+    split-by-page job. Returns (texts, None), (None, text) when LlamaParse
+    split the document into a different number of pages, or (None, None)
+    when pypdf fails to hash or split the pages.
+    """
+    page_count = len(reader.pages)
+    try:
+        keys = {i: make_page_cache_key(page_hash(reader.pages[i]), LLAMA_PARSE_LANGUAGE) for i in indexes}
+    except Exception as e:
+        print(f"Page hashing failed, parsing the whole document: {str(e)}")
+        annotate(pageParse='hash_failed')
+        return None, None
+
+    texts = {}
+    if use_cache:
+        with ThreadPoolExecutor(max_workers=max(1, min(PAGE_CACHE_LOOKUP_WORKERS, len(indexes)))) as executor:
+            cached = list(executor.map(propagate(parse_cache.get), [keys[i] for i in indexes]))
+        texts = {i: text for i, text in zip(indexes, cached) if text is not None}
+    missing = [i for i in indexes if i not in texts]
+    annotate(pageArtifactHits=len(texts), pagesParsed=len(missing))
+    print(f"Page artifacts: {len(texts)} cached, {len(missing)} of {page_count} pages to parse")
+    if not missing:
+        return texts, None
+
+    with span('llamaparse_pages', pages=len(missing)):
+        if len(missing) > LLAMA_PARSE_FULL_DOCUMENT_RATIO * page_count:
+            document_pages = llama_parse_files([parser_input], split_by_page=True)[0]
+            if len(document_pages) != page_count:
+                print(f"LlamaParse returned {len(document_pages)} pages for {page_count}, page artifacts skipped")
+                return None, "\n".join(document_pages)
+            parsed = {i: document_pages[i] for i in missing}
+        else:
+            try:
+                documents = single_page_pdfs(reader, missing)
+            except Exception as e:
+                print(f"Page splitting failed, parsing the whole document: {str(e)}")
+                annotate(pageParse='split_failed')
+                return None, None
+            parsed = dict(zip(missing, llama_parse_files(documents)))
+
+    parsed = {i: text for i, text in parsed.items() if text.strip()}
+    with ThreadPoolExecutor(max_workers=max(1, min(PAGE_CACHE_LOOKUP_WORKERS, len(parsed)))) as executor:
+        list(executor.map(propagate(lambda i: parse_cache.put(keys[i], parsed[i])), parsed))
+    texts.update(parsed)
+    return texts, None
+
+def parse_by_page(parser_input, use_cache=True):
+    """
+    Page-granular parse. With PDF_LOCAL_EXTRACTION the text layer is read
+    locally and only weak (scanned or garbled) pages need LlamaParse;
+    otherwise every page does. Pages needing LlamaParse go through
+    parse_pages_with_llama. Returns None when pypdf cannot read, hash or split
+    the PDF, so the caller parses the whole document instead.
+    """
+    with span('local_extract') as attrs:
+        reader, pages = extract_pages(parser_input)
+        if not pages:
+            return None
+        needed = weak_pages(pages) if PDF_LOCAL_EXTRACTION else list(range(len(pages)))
+        attrs.update(pages=len(pages), weakPages=len(needed))
+
+    if not needed:
+        print(f"Local extraction: all {len(pages)} pages extracted, LlamaParse skipped")
+        annotate(extractor='local')
+        return "\n".join(pages)
+
+    texts, document_text = parse_pages_with_llama(parser_input, reader, needed, use_cache=use_cache)
+    if texts is None and document_text is None:
+        return None
+    annotate(extractor='tiered' if PDF_LOCAL_EXTRACTION else 'llamaparse')
+    if document_text is not None:
+        return document_text
+    for index in needed:
+        # Without a text layer or LlamaParse text the page contributes nothing
+        pages[index] = texts.get(index, pages[index] if PDF_LOCAL_EXTRACTION else "")
+    return "\n".join(pages)
+
+def parse_pdf_with_llama(pdf, use_cache=True):
+    """
+    Parse PDF, serving repeated files from the parse cache.
+    Parsing is per page (parse_by_page): local extraction where the text
+    layer is good, page artifacts for pages seen before, and LlamaParse for
+    the rest. Without pypdf, or when it fails on this PDF, the whole PDF goes
+    to LlamaParse.
+    pdf is a FetchedPdf (already hashed while downloading) or a file path.
+    """
+    try:
+        parser_input = pdf.parser_input() if isinstance(pdf, FetchedPdf) else pdf
+
+        cache_key = None
+        if use_cache:
+            cache_key = pdf_parse_cache_key(pdf)
+            cached_text = parse_cache.get(cache_key)
+            if cached_text is not None:
+                print(f"Parse cache hit ({cache_key}). Total {len(cached_text)} characters, LlamaParse skipped.")
+                annotate(parseCache='hit', chars=len(cached_text))
+                return cached_text
+            print(f"Parse cache miss ({cache_key})")
+            annotate(parseCache='miss')
+
+        parse_started = time.monotonic()
+        parsed_text = parse_by_page(parser_input, use_cache=use_cache)
+        if parsed_text is None:
+            annotate(extractor='llamaparse')
+            parsed_text = llama_parse_files([parser_input])[0]
+
+        if parsed_text.strip():
             print(f"PDF successfully parsed. Total {len(parsed_text)} characters found.")
+            if cache_key:
+                parse_cache.put(cache_key, parsed_text, parse_seconds=time.monotonic() - parse_started)
             return parsed_text
         else:
             raise ValueError("Could not extract text from PDF")
             
     except Exception as e:
-        print(f"LlamaParse error: {str(e)}")
+        print(f"PDF parse error: {str(e)}")
         raise
 
 def analyze_contract_with_groq(parsed_text):
@@ -366,16 +472,16 @@ Lütfen bu metni sistem talimatlarında belirtilen JSON formatında analiz et:
             }
         ]
 
-        completion = groq_client.chat.completions.create(
+        json_string_response = chat_completion(
+            get_groq_client(),
             model="llama-3.1-8b-instant",
             messages=messages_to_groq,
             temperature=0.0,
-            max_tokens=4096,
+            max_tokens=text_prompt('contract_analysis_legacy', messages_to_groq[1]["content"]),
             response_format={"type": "json_object"}
         )
 
-        json_string_response = completion.choices[0].message.content
-        analysis_data = json.loads(json_string_response)
+        analysis_data = decode_json_response(json_string_response)
         
         return analysis_data
         
@@ -383,38 +489,60 @@ Lütfen bu metni sistem talimatlarında belirtilen JSON formatında analiz et:
         print(f"Groq API error: {str(e)}")
         raise
 
-def analyze_contract_with_ambiguity_detection(parsed_text):
+def ambiguity_messages(parsed_text, part_label=None, known_clauses=None):
     """
-    Enhanced contract analysis with ambiguity detection using Groq API
+    Groq messages for the ambiguity analysis of a contract (or one part of it).
+    known_clauses: clauses whose ambiguities and risks come from the clause
+    library; the model still reads them for the other fields.
     """
-    try:
-        messages_to_groq = [
-            {
-                "role": "system",
-                "content": AMBIGUITY_SYSTEM_PROMPT
-            },
-            {
-                "role": "user",
-                "content": f"""Aşağıda bir sözleşme metni bulunmaktadır. 
+    part_note = ""
+    if part_label:
+        part_note = f"""
+Not: Bu metin uzun bir sözleşmenin {part_label} bölümüdür. Sadece bu bölümde geçen maddeleri analiz et.
+"""
+    labels = [clause.label for clause in known_clauses or [] if clause.label and clause.label in parsed_text]
+    if labels:
+        listed = "\n".join(f"- {label}" for label in labels)
+        part_note += f"""
+Not: Aşağıdaki maddeler daha önce incelendi. Bu maddeler için "ambiguities" ve "risks" üretme;
+"summary", "deliverables", "milestones", "paymentPlan" ve "timeline" için tüm metni dikkate al.
+{listed}
+"""
+    return [
+        {
+            "role": "system",
+            "content": AMBIGUITY_SYSTEM_PROMPT
+        },
+        {
+            "role": "user",
+            "content": f"""Aşağıda bir sözleşme metni bulunmaktadır. 
 Lütfen bu metni sistem talimatlarında belirtilen JSON formatında analiz et:
-
+{part_note}
 --- SÖZLEŞME METNİ ---
 {parsed_text}
 --- METİN SONU ---
 """
-            }
-        ]
+        }
+    ]
+
+def analyze_contract_with_ambiguity_detection(parsed_text, bypass_cache=False, part_label=None, known_clauses=None):
+    """
+    Enhanced contract analysis with ambiguity detection using Groq API
+    """
+    try:
+        messages_to_groq = ambiguity_messages(parsed_text, part_label, known_clauses)
 
-        completion = groq_client.chat.completions.create(
-            model="llama-3.3-70b-versatile",  # Daha güçlü model
+        json_string_response = routed_completion(
+            'contract_analysis',
+            get_groq_client(),
             messages=messages_to_groq,
             temperature=0.1,
-            max_tokens=8192,
-            response_format={"type": "json_object"}
+            max_tokens=text_prompt('contract_analysis', messages_to_groq[1]["content"]),
+            response_format={"type": "json_object"},
+            bypass_cache=bypass_cache
         )
 
-        json_string_response = completion.choices[0].message.content
-        analysis_data = json.loads(json_string_response)
+        analysis_data = decode_json_response(json_string_response)
         
         return analysis_data
         
@@ -422,21 +550,105 @@ Lütfen bu metni sistem talimatlarında belirtilen JSON formatında analiz et:
         print(f"Groq API error (ambiguity detection): {str(e)}")
         raise
 
-def save_analysis_to_firestore(contract_id, analysis_data):
+def stream_contract_with_ambiguity_detection(parsed_text, bypass_cache=False, part_label=None):
+    """
+    Streamed variant of analyze_contract_with_ambiguity_detection.
+    Yields ('item', {'section', 'item'}) for every ambiguity, risk or
+    deliverable as soon as the model closes it, then ('analysis', data) with
+    the complete document.
+    """
+    try:
+        messages_to_groq = ambiguity_messages(parsed_text, part_label)
+        # JSON mode cannot stream, so the prompt alone asks for JSON
+        messages_to_groq[1]["content"] += STREAM_JSON_ONLY_NOTE
+        parser = StreamingJsonParser(STREAMED_SECTIONS)
+
+        for piece in stream_chat_completion(
+            get_groq_client(),
+            model=streaming_model('contract_analysis'),
+            messages=messages_to_groq,
+            temperature=0.1,
+            max_tokens=text_prompt('contract_analysis', messages_to_groq[1]["content"]),
+            bypass_cache=bypass_cache,
+            expect_json=True
+        ):
+            for section, item in parser.feed(piece):
+                yield 'item', {'section': section, 'item': item}
+
+        try:
+            analysis_data = decode_json_response(parser.document())
+        except ValueError:
+            # Truncated or malformed stream: redo the call in JSON mode
+            print("Streamed analysis was not valid JSON, falling back to JSON mode")
+            analysis_data = analyze_contract_with_ambiguity_detection(
+                parsed_text, bypass_cache=bypass_cache, part_label=part_label
+            )
+        yield 'analysis', analysis_data
+
+    except Exception as e:
+        print(f"Groq API error (streamed ambiguity detection): {str(e)}")
+        raise
+
+def analyze_contract_chunked(parsed_text, bypass_cache=False, max_workers=ANALYSIS_MAX_WORKERS,
+                             chunk_max_chars=ANALYSIS_CHUNK_MAX_CHARS, known_clauses=None):
+    """
+    Map-reduce contract analysis: analyze clause-aligned chunks concurrently
+    and merge them into a single AMBIGUITY_SYSTEM_PROMPT result
+    """
+    try:
+        chunks = build_chunks(parsed_text, chunk_max_chars)
+        if len(chunks) <= 1:
+            return analyze_contract_with_ambiguity_detection(parsed_text, bypass_cache=bypass_cache,
+                                                             known_clauses=known_clauses)
+
+        print(f"Chunked analysis: {len(chunks)} chunks, {min(max_workers, len(chunks))} workers")
+
+        def analyze_chunk(index):
+            return analyze_contract_with_ambiguity_detection(
+                chunks[index],
+                bypass_cache=bypass_cache,
+                part_label=f"{index + 1}/{len(chunks)}",
+                known_clauses=known_clauses
+            )
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as executor:
+            # map() keeps document order, which the merge relies on for stable ids
+            chunk_analyses = list(executor.map(propagate(analyze_chunk), range(len(chunks))))
+
+        return merge_chunk_analyses(chunk_analyses)
+
+    except Exception as e:
+        print(f"Chunked contract analysis error: {str(e)}")
+        raise
+
+def save_analysis_to_firestore(contract_id, analysis_data, parse_cache_key=None):
     """
-    Save analysis results to Firestore
+    Save analysis results to Firestore. In "storage" mode (see analysis_store)
+    the full analysis goes to Storage and the contract keeps a compact summary.
     """
     try:
         # Add analyzedAt timestamp
         analysis_data['analyzedAt'] = firestore.SERVER_TIMESTAMP
+        previous_path = None
+        stored = analysis_data
+        if ANALYSIS_STORAGE_MODE == 'storage':
+            previous_path = stored_analysis_path(contract_id)
+            stored = offload_analysis(contract_id, analysis_data)
         
         # Update contract document
-        contract_ref = db.collection('contracts').document(contract_id)
-        contract_ref.update({
-            'analysis': analysis_data,
+        contract_ref = get_db().collection('contracts').document(contract_id)
+        updates = {
+            'analysis': stored,
             'status': 'analyzed',
             'updatedAt': firestore.SERVER_TIMESTAMP
-        })
+        }
+        if parse_cache_key:
+            # Lets re-analysis reuse the parsed text without downloading the PDF
+            updates['parseCacheKey'] = parse_cache_key
+        with span('firestore_write', collection='contracts'):
+            contract_ref.update(updates)
+        if previous_path and previous_path != stored['storage']['path']:
+            delete_stored_analysis(previous_path)
         
         print(f"Analysis saved to Firestore for contract {contract_id}")
         return True
@@ -445,36 +657,254 @@ def save_analysis_to_firestore(contract_id, analysis_data):
         print(f"Error saving to Firestore: {str(e)}")
         raise
 
-def analyze_contract(contract_id, pdf_url, pdf_path=None):
+def load_previous_analysis(contract_id):
     """
-    Main function to analyze contract PDF
+    (analysis, parsed text) of the contract's last analysis, or (None, None)
+    when there is none or its parsed text is no longer cached
     """
-    temp_file_path = None
-    
+    with span('firestore_read', collection='contracts'):
+        snapshot = get_db().collection('contracts').document(contract_id).get(
+            field_paths=['analysis', 'parseCacheKey']
+        )
+    contract = (snapshot.to_dict() or {}) if snapshot.exists else {}
+    analysis = load_analysis(contract.get('analysis'))
+    previous_text = parse_cache.get(contract['parseCacheKey']) if contract.get('parseCacheKey') else None
+    if not analysis or previous_text is None:
+        return None, None
+    return analysis, previous_text
+
+def analyze_revision(contract_id, parsed_text, bypass_cache=False, tenant=None):
+    """
+    Revision-aware analysis: align the clauses with the previous version and
+    send only added or modified clauses to the LLM. Items on unchanged
+    clauses are carried forward, items on modified or deleted clauses are
+    retired (see contract_revision.merge_revision). Falls back to a full
+    analysis without a usable previous version or when most of the text changed.
+    """
+    previous, previous_text = load_previous_analysis(contract_id)
+    if previous is None:
+        print("No previous analysis with cached text, running a full analysis")
+        return analyze_parsed_text(parsed_text, bypass_cache=bypass_cache, tenant=tenant)
+
+    diff = diff_clauses(previous_text, parsed_text)
+    counts = diff.counts()
+    annotate(clauses=counts)
+    print(f"Clause diff: {counts}, {diff.changed_ratio():.0%} of the text changed")
+    if diff.changed_ratio() > REVISION_MAX_CHANGED_RATIO:
+        print("Most of the contract changed, running a full analysis")
+        return analyze_parsed_text(parsed_text, bypass_cache=bypass_cache, tenant=tenant)
+
+    changed_text = diff.changed_text()
+    fresh = None
+    if changed_text:
+        if use_chunked_analysis(changed_text):
+            fresh = analyze_contract_chunked(changed_text, bypass_cache=bypass_cache)
+        else:
+            fresh = analyze_contract_with_ambiguity_detection(
+                changed_text, bypass_cache=bypass_cache, part_label=REVISION_PART_LABEL
+            )
+    revision = (previous.get('revision') or {}).get('number', 0) + 1
+    return merge_revision(previous, diff, fresh, revision)
+
+def analyze_parsed_text(parsed_text, bypass_cache=False, analysis_mode="auto", tenant=None):
+    """
+    Run the ambiguity analysis in the requested mode over already-parsed text.
+    With the clause library (per tenant, see clause_library), ambiguities and
+    risks of known clauses are reused and the model skips them; it always
+    reads the full text for the document-level fields.
+    """
+    if not CLAUSE_LIBRARY_ENABLED or not tenant:
+        return analyze_text_with_llm(parsed_text, bypass_cache=bypass_cache, analysis_mode=analysis_mode)
+
+    clauses = [Clause(text, index) for index, text in enumerate(split_into_clauses(parsed_text))]
+    library = get_clause_library(tenant, library_version(AMBIGUITY_SYSTEM_PROMPT, LARGE_MODEL))
+    matches = {}
+    if not bypass_cache:
+        try:
+            with span('clause_library') as attrs:
+                matches = library.match(clauses)
+                attrs.update(clauses=len(clauses), known=len(matches))
+        except Exception as e:
+            print(f"Clause library lookup failed, analyzing every clause: {str(e)}")
+
+    known = [clause for clause in clauses if clause.index in matches]
+    novel = [clause for clause in clauses if clause.index not in matches]
+    print(f"Clause library: {len(known)}/{len(clauses)} clauses known")
+    fresh = analyze_text_with_llm(parsed_text, bypass_cache=bypass_cache, analysis_mode=analysis_mode,
+                                  known_clauses=known)
+
+    try:
+        library.learn(novel, fresh, matches)
+    except Exception as e:
+        # The library is an optimization; never fail the analysis because of it
+        print(f"Clause library update failed: {str(e)}")
+
+    if not matches:
+        return fresh
+    # The library's findings replace whatever the model still said about known clauses
+    fresh = dict(fresh)
+    for field in LIBRARY_FIELDS:
+        fresh[field] = [item for item in fresh.get(field) or []
+                        if not isinstance(item, dict) or linked_clause(item, clauses) not in known]
+    stored = []
+    for index in sorted(matches):
+        entry_id, score, findings = matches[index]
+        provenance = {'status': 'library', 'libraryId': entry_id, 'similarity': round(score, 3)}
+        stored.append({field: [dict(item, provenance=provenance) for item in findings.get(field) or []]
+                       for field in LIBRARY_FIELDS})
+    return merge_chunk_analyses([fresh] + stored)
+
+def analyze_text_with_llm(parsed_text, bypass_cache=False, analysis_mode="auto", known_clauses=None):
+    """
+    Ambiguity analysis of the whole text by the model, single or chunked
+    """
+    if use_chunked_analysis(parsed_text, analysis_mode):
+        print("Analyzing contract with Groq API (chunked ambiguity detection)...")
+        return analyze_contract_chunked(parsed_text, bypass_cache=bypass_cache, known_clauses=known_clauses)
+    print("Analyzing contract with Groq API (ambiguity detection)...")
+    return analyze_contract_with_ambiguity_detection(parsed_text, bypass_cache=bypass_cache,
+                                                     known_clauses=known_clauses)
+
+def use_chunked_analysis(parsed_text, analysis_mode="auto"):
+    return analysis_mode == "chunked" or (
+        analysis_mode == "auto" and len(parsed_text) > CHUNKED_ANALYSIS_THRESHOLD_CHARS
+    )
+
+def stream_parsed_text_analysis(parsed_text, bypass_cache=False, analysis_mode="auto",
+                                max_workers=ANALYSIS_MAX_WORKERS):
+    """
+    Streamed analyze_parsed_text. Chunks of a long contract are streamed
+    concurrently and their items are interleaved as they complete (with
+    chunk-local ids and a "part" number); the final ('analysis', data) is the
+    merged document with renumbered ids.
+    """
+    chunks = build_chunks(parsed_text, ANALYSIS_CHUNK_MAX_CHARS) if use_chunked_analysis(parsed_text, analysis_mode) else []
+    if len(chunks) <= 1:
+        print("Streaming contract analysis with Groq API (ambiguity detection)...")
+        yield from stream_contract_with_ambiguity_detection(parsed_text, bypass_cache=bypass_cache)
+        return
+
+    print(f"Streaming chunked analysis: {len(chunks)} chunks, {min(max_workers, len(chunks))} workers")
+    events = queue.Queue()
+    chunk_analyses = [None] * len(chunks)
+
+    def stream_chunk(index):
+        try:
+            for kind, payload in stream_contract_with_ambiguity_detection(
+                chunks[index], bypass_cache=bypass_cache, part_label=f"{index + 1}/{len(chunks)}"
+            ):
+                if kind == 'analysis':
+                    chunk_analyses[index] = payload
+                else:
+                    events.put((kind, dict(payload, part=index + 1)))
+        except Exception as e:
+            events.put(('error', e))
+        finally:
+            events.put(('done', index))
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as executor:
+        for index in range(len(chunks)):
+            executor.submit(propagate(stream_chunk), index)
+        remaining = len(chunks)
+        while remaining:
+            kind, payload = events.get()
+            if kind == 'done':
+                remaining -= 1
+            elif kind == 'error':
+                raise payload
+            else:
+                yield kind, payload
+
+    yield 'analysis', merge_chunk_analyses(chunk_analyses)
+
+def load_contract_text(pdf_url, pdf_path=None, parse_cache_key=None, report=None):
+    """
+    Parsed contract text and its parse cache key. A still-cached
+    parse_cache_key skips the download and parse stages.
+    """
+    parsed_text = parse_cache.get(parse_cache_key) if parse_cache_key else None
+    if parsed_text is not None:
+        print(f"Reusing parsed text {parse_cache_key}, skipping download and parse")
+        return parsed_text, parse_cache_key
+
+    pdf = None
     try:
-        print(f"Starting contract analysis for {contract_id}")
-        
         # Step 1: Download PDF from Firebase Storage
         print("Downloading PDF from Firebase Storage...")
-        temp_file_path = download_pdf_from_storage(pdf_url=pdf_url, pdf_path=pdf_path)
-        
+        if report:
+            report('downloading')
+        with span('download') as attrs:
+            pdf = download_pdf_from_storage(pdf_url=pdf_url, pdf_path=pdf_path)
+            attrs['bytes'] = pdf.size
+
         # Step 2: Parse PDF with LlamaParse
         print("Parsing PDF with LlamaParse...")
-        parsed_text = parse_pdf_with_llama(temp_file_path)
+        if report:
+            report('parsing')
+        parse_cache_key = pdf_parse_cache_key(pdf)
+        with span('parse'):
+            return parse_pdf_with_llama(pdf), parse_cache_key
+
+    finally:
+        # Release the spooled PDF buffer (and its temp file, if it spilled to disk)
+        if pdf is not None:
+            try:
+                pdf.close()
+            except Exception as e:
+                print(f"Error releasing PDF buffer: {str(e)}")
+
+def contract_owner(contract_id):
+    """
+    userId of the contract, which scopes its clause library; None when unknown
+    """
+    try:
+        return read_contract(contract_id, ['userId']).get('userId')
+    except Exception as e:
+        print(f"Could not read the owner of contract {contract_id}: {str(e)}")
+        return None
+
+def analyze_contract(contract_id, pdf_url, pdf_path=None, bypass_cache=False, analysis_mode="auto",
+                     progress=None, parse_cache_key=None):
+    """
+    Main function to analyze contract PDF.
+    analysis_mode: "single" (one prompt), "chunked" (map-reduce), "auto"
+    (chunked once the text exceeds CHUNKED_ANALYSIS_THRESHOLD_CHARS) or
+    "revision" (re-analyze only the clauses changed since the last analysis).
+    progress: optional callable invoked with each stage name as it starts.
+    parse_cache_key: key recorded by a previous analysis; when its text is
+    still cached the download and parse stages are skipped.
+    """
+    def report(stage):
+        if progress:
+            progress(stage)
+    
+    try:
+        print(f"Starting contract analysis for {contract_id}")
+
+        # Steps 1-2: Download and parse the PDF (or reuse the cached text)
+        parsed_text, parse_cache_key = load_contract_text(pdf_url, pdf_path, parse_cache_key, report)
         
         # Step 3: Analyze with Groq API (Enhanced with ambiguity detection)
-        print("Analyzing contract with Groq API (ambiguity detection)...")
-        analysis_data = analyze_contract_with_ambiguity_detection(parsed_text)
+        report('analyzing')
+        tenant = contract_owner(contract_id) if CLAUSE_LIBRARY_ENABLED else None
+        if analysis_mode == "revision":
+            analysis_data = analyze_revision(contract_id, parsed_text, bypass_cache=bypass_cache, tenant=tenant)
+        else:
+            analysis_data = analyze_parsed_text(parsed_text, bypass_cache=bypass_cache, analysis_mode=analysis_mode,
+                                                tenant=tenant)
         
         # Step 4: Save to Firestore
         print("Saving analysis to Firestore...")
-        save_analysis_to_firestore(contract_id, analysis_data)
+        report('saving')
+        save_analysis_to_firestore(contract_id, analysis_data, parse_cache_key=parse_cache_key)
         
         print(f"Contract analysis completed successfully for {contract_id}")
+        print(f"Parse cache stats: {parse_cache.stats()}")
         return {
             'success': True,
             'contractId': contract_id,
-            'analysis': analysis_data
+            'analysis': analysis_data,
+            'parseCache': parse_cache.stats()
         }
         
     except Exception as e:
@@ -484,12 +914,44 @@ def analyze_contract(contract_id, pdf_url, pdf_path=None):
             'error': str(e),
             'contractId': contract_id
         }
-        
-    finally:
-        # Clean up temporary file
-        if temp_file_path and os.path.exists(temp_file_path):
-            try:
-                os.unlink(temp_file_path)
-                print("Temporary file cleaned up")
-            except Exception as e:
-                print(f"Error cleaning up temporary file: {str(e)}")
+
+def stream_contract_analysis(contract_id, pdf_url, pdf_path=None, bypass_cache=False, analysis_mode="auto",
+                             parse_cache_key=None):
+    """
+    analyze_contract as a sequence of (event, data) pairs for analyzeContractStream:
+    'stage' as each stage starts, 'item' for every finished ambiguity, risk or
+    deliverable, then 'complete' with the saved analysis (or 'error').
+    The saved Firestore document is the same as analyze_contract's.
+    """
+    try:
+        print(f"Starting streamed contract analysis for {contract_id}")
+        started = time.monotonic()
+
+        # Download and parse run inside one call, so they share one event
+        yield 'stage', {'stage': 'parsing'}
+        parsed_text, parse_cache_key = load_contract_text(pdf_url, pdf_path, parse_cache_key)
+
+        yield 'stage', {'stage': 'analyzing'}
+        analysis_data = None
+        first_item_logged = False
+        for kind, payload in stream_parsed_text_analysis(parsed_text, bypass_cache=bypass_cache,
+                                                         analysis_mode=analysis_mode):
+            if kind == 'analysis':
+                analysis_data = payload
+                continue
+            if not first_item_logged:
+                print(f"First streamed item after {time.monotonic() - started:.2f}s")
+                first_item_logged = True
+            yield kind, payload
+
+        yield 'stage', {'stage': 'saving'}
+        # Copy before save_analysis_to_firestore adds its server timestamp
+        result = dict(analysis_data)
+        save_analysis_to_firestore(contract_id, analysis_data, parse_cache_key=parse_cache_key)
+
+        print(f"Streamed contract analysis completed for {contract_id} in {time.monotonic() - started:.2f}s")
+        yield 'complete', {'success': True, 'contractId': contract_id, 'analysis': result}
+
+    except Exception as e:
+        print(f"Streamed contract analysis failed: {str(e)}")
+        yield 'error', {'success': False, 'error': str(e), 'contractId': contract_id}
@@ -0,0 +1,154 @@
+import re
+
+# Clause-aware splitting of parsed contract text and merging of per-chunk
+# analyses back into the AMBIGUITY_SYSTEM_PROMPT schema.
+
+# Lines that start a new clause/section in LlamaParse output:
+#   "# Başlık", "MADDE 5 -", "Madde 5.1", "Article 3", "5.", "5.1.2", "5)"
+CLAUSE_BOUNDARY_RE = re.compile(
+    r"^\s*(?:"
+    r"#{1,6}\s+\S"
+    r"|(?:MADDE|Madde|madde|ARTICLE|Article|SECTION|Section|BÖLÜM|Bölüm)\s+\d+"
+    r"|\d+(?:\.\d+)*[.)]\s+\S"
+    r")"
+)
+
+SEVERITY_RANK = {'low': 0, 'medium': 1, 'high': 2, 'critical': 3}
+
+# List fields of the analysis schema and the id prefix used when renumbering
+LIST_FIELDS = [
+    ('ambiguities', 'amb'),
+    ('risks', 'risk'),
+    ('deliverables', 'del'),
+    ('milestones', 'mil'),
+    ('paymentPlan', 'pay'),
+]
+
+
+def split_into_clauses(text):
+    """
+    Split parsed contract text into clauses on section/heading boundaries
+    """
+    clauses = []
+    current = []
+    for line in text.splitlines():
+        if CLAUSE_BOUNDARY_RE.match(line) and any(l.strip() for l in current):
+            clauses.append("\n".join(current).strip())
+            current = []
+        current.append(line)
+    if any(l.strip() for l in current):
+        clauses.append("\n".join(current).strip())
+    return clauses
+
+
+def _split_oversized(clause, max_chars):
+    """
+    Break a clause longer than max_chars on paragraph, then line boundaries
+    """
+    pieces = []
+    current = ""
+    for part in clause.split("\n\n"):
+        candidate = f"{current}\n\n{part}" if current else part
+        if len(candidate) <= max_chars:
+            current = candidate
+            continue
+        if current:
+            pieces.append(current)
+        # A single paragraph can still be too long; fall back to line/hard cuts
+        while len(part) > max_chars:
+            cut = part.rfind("\n", 0, max_chars)
+            if cut <= 0:
+                cut = max_chars
+            pieces.append(part[:cut])
+            part = part[cut:].lstrip("\n")
+        current = part
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def build_chunks(text, max_chars):
+    """
+    Pack consecutive clauses into chunks of at most max_chars characters
+    """
+    chunks = []
+    current = ""
+    for clause in split_into_clauses(text):
+        for piece in (_split_oversized(clause, max_chars) if len(clause) > max_chars else [clause]):
+            candidate = f"{current}\n\n{piece}" if current else piece
+            if len(candidate) <= max_chars:
+                current = candidate
+            else:
+                chunks.append(current)
+                current = piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _normalize(value):
+    text = str(value or "").lower()
+    text = re.sub(r"[^\w\s]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _dedupe_key(field, item):
+    if field == 'ambiguities':
+        return (_normalize(item.get('clause'))[:300], _normalize(item.get('issue'))[:200])
+    if field == 'paymentPlan':
+        return (
+            str(item.get('amount')),
+            _normalize(item.get('currency')),
+            str(item.get('dueDate')),
+            _normalize(item.get('description'))[:200],
+        )
+    return _normalize(item.get('title'))
+
+
+def _more_severe(a, b):
+    return SEVERITY_RANK.get(str(a.get('severity')).lower(), -1) > \
+        SEVERITY_RANK.get(str(b.get('severity')).lower(), -1)
+
+
+def _merge_timeline(timelines):
+    merged = {'optimistic': None, 'realistic': None, 'pessimistic': None}
+    for key, pick in (('optimistic', min), ('realistic', max), ('pessimistic', max)):
+        values = [t.get(key) for t in timelines if isinstance(t, dict) and t.get(key)]
+        if values:
+            merged[key] = pick(values)
+    return merged
+
+
+def merge_chunk_analyses(chunk_analyses):
+    """
+    Merge per-chunk analyses (in document order) into a single analysis.
+    Duplicates are collapsed (keeping the most severe copy) and ids are
+    renumbered in document order so they are stable for the same input.
+    """
+    merged = {}
+
+    summaries = [a.get('summary') for a in chunk_analyses if a.get('summary')]
+    merged['summary'] = summaries[0] if summaries else ""
+
+    for field, prefix in LIST_FIELDS:
+        seen = {}
+        items = []
+        for analysis in chunk_analyses:
+            for item in analysis.get(field) or []:
+                if not isinstance(item, dict):
+                    continue
+                key = _dedupe_key(field, item)
+                if key in seen:
+                    index = seen[key]
+                    if _more_severe(item, items[index]):
+                        items[index] = dict(item)
+                    continue
+                seen[key] = len(items)
+                items.append(dict(item))
+
+        for number, item in enumerate(items, start=1):
+            item['id'] = f"{prefix}_{number}"
+        merged[field] = items
+
+    merged['timeline'] = _merge_timeline([a.get('timeline') for a in chunk_analyses])
+    return merged
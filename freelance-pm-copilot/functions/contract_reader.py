@@ -0,0 +1,136 @@
+import os
+import copy
+import threading
+from collections import OrderedDict
+from clients import get_db
+from tracing import span
+from analysis_store import load_analysis
+
+# Projected, cached reads of contract documents.
+# Callers name the fields they need (e.g. analysis.deliverables) and only
+# those are read. Fields already cached on this instance are served after a
+# metadata-only read confirms the document's update_time has not changed, so
+# back-to-back generate calls on a warm instance skip the analysis payload.
+# Analyses offloaded to Storage are loaded through analysis_store.
+
+CONTRACT_CACHE_SIZE = int(os.environ.get("CONTRACT_CACHE_SIZE", 128))
+
+# What the planners read from a contract's analysis
+TASK_ANALYSIS_FIELDS = ['analysis.summary', 'analysis.deliverables', 'analysis.milestones']
+SPRINT_ANALYSIS_FIELDS = TASK_ANALYSIS_FIELDS + ['analysis.risks']
+
+_MISSING = object()
+
+# contract id -> (update_time, {field path: value}); most recently used last
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def _field(data, path):
+    value = data
+    for part in path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _nest(fields):
+    """
+    {'analysis.summary': ...} -> {'analysis': {'summary': ...}}
+    """
+    data = {}
+    for path, value in fields.items():
+        if value is _MISSING:
+            continue
+        target = data
+        *parents, leaf = path.split('.')
+        for part in parents:
+            target = target.setdefault(part, {})
+        target[leaf] = copy.deepcopy(value)
+    return data
+
+
+def _remember(contract_id, update_time, fields):
+    with _lock:
+        cached = _cache.get(contract_id)
+        if cached is not None and cached[0] == update_time:
+            fields = dict(cached[1], **fields)
+        _cache[contract_id] = (update_time, fields)
+        _cache.move_to_end(contract_id)
+        while len(_cache) > CONTRACT_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def read_contract(contract_id, field_paths):
+    """
+    The requested fields of a contract as a nested dict (missing fields are
+    left out). Raises ValueError when the contract does not exist.
+    """
+    contract_ref = get_db().collection('contracts').document(contract_id)
+    with _lock:
+        cached = _cache.get(contract_id)
+        if cached is not None:
+            _cache.move_to_end(contract_id)
+
+    if cached is not None and all(path in cached[1] for path in field_paths):
+        with span('firestore_read', collection='contracts', projection='metadata'):
+            snapshot = contract_ref.get(field_paths=[])
+        if not snapshot.exists:
+            invalidate(contract_id)
+            raise ValueError(f"Contract {contract_id} not found")
+        if snapshot.update_time == cached[0]:
+            return _nest({path: cached[1][path] for path in field_paths})
+
+    with span('firestore_read', collection='contracts', projection=','.join(field_paths)):
+        snapshot = contract_ref.get(field_paths=field_paths)
+    if not snapshot.exists:
+        invalidate(contract_id)
+        raise ValueError(f"Contract {contract_id} not found")
+
+    data = snapshot.to_dict() or {}
+    fields = {path: _field(data, path) for path in field_paths}
+    _remember(contract_id, snapshot.update_time, fields)
+    return _nest(fields)
+
+
+def get_contract_analysis(contract_id, field_paths=TASK_ANALYSIS_FIELDS):
+    """
+    The projected analysis of a contract; raises ValueError when the contract
+    or its analysis is missing
+    """
+    analysis = read_contract(contract_id, list(field_paths) + ['analysis.storage']).get('analysis')
+    if not analysis:
+        raise ValueError(f"No analysis found for contract {contract_id}")
+    if analysis.get('storage'):
+        # Offloaded analysis (analysis_store): pick the fields from the full copy
+        full = load_analysis(analysis)
+        keys = [path.split('.', 1)[1] for path in field_paths if path.startswith('analysis.')]
+        analysis = {key: full[key] for key in keys if key in full}
+    return analysis
+
+
+def get_full_analysis(contract_id, user_id=None):
+    """
+    The complete analysis of a contract, wherever it is stored; raises
+    ValueError when the contract or its analysis is missing and
+    PermissionError when user_id is given and does not own the contract
+    """
+    contract = read_contract(contract_id, ['userId', 'analysis'])
+    if user_id is not None and contract.get('userId') != user_id:
+        raise PermissionError(f"Contract {contract_id} belongs to another user")
+    analysis = contract.get('analysis')
+    if not analysis:
+        raise ValueError(f"No analysis found for contract {contract_id}")
+    return load_analysis(analysis)
+
+
+def invalidate(contract_id=None):
+    """
+    Drop one contract (or all of them) from this instance's cache
+    """
+    with _lock:
+        if contract_id is None:
+            _cache.clear()
+        else:
+            _cache.pop(contract_id, None)
@@ -0,0 +1,199 @@
+import os
+import difflib
+import hashlib
+from contract_chunker import LIST_FIELDS, split_into_clauses, _dedupe_key, _normalize
+
+# Revision-aware re-analysis.
+# Clauses of the previous and the new parsed text are aligned; only added and
+# modified clauses go to the LLM. Items of the previous analysis tied to
+# unchanged clauses are carried forward, items tied to modified or deleted
+# clauses are retired, and every item records its provenance.
+
+# Modified clauses must be at least this similar to the clause they replace;
+# less similar pairs count as a deletion plus an addition
+CLAUSE_MATCH_MIN_RATIO = float(os.environ.get("CLAUSE_MATCH_MIN_RATIO", 0.5))
+# Share of an item's words that must appear in a clause to tie the item to it
+ITEM_CLAUSE_MIN_OVERLAP = float(os.environ.get("ITEM_CLAUSE_MIN_OVERLAP", 0.6))
+# Above this share of changed text a full analysis is cheaper and more coherent
+REVISION_MAX_CHANGED_RATIO = float(os.environ.get("REVISION_MAX_CHANGED_RATIO", 0.6))
+
+UNCHANGED, MODIFIED, ADDED, DELETED = 'unchanged', 'modified', 'added', 'deleted'
+
+
+class Clause:
+    def __init__(self, text, index):
+        self.text = text
+        self.index = index
+        self.normalized = _normalize(text)
+        self.words = set(self.normalized.split())
+        self.hash = hashlib.sha256(self.normalized.encode("utf-8")).hexdigest()[:16]
+        first_line = text.strip().splitlines()[0] if text.strip() else ""
+        self.label = first_line[:80]
+
+
+class ClauseDiff:
+    """
+    Alignment of old and new clauses: (status, old Clause or None, new Clause or None)
+    """
+
+    def __init__(self, old_clauses, new_clauses, pairs):
+        self.old_clauses = old_clauses
+        self.new_clauses = new_clauses
+        self.pairs = pairs
+
+    def changed_clauses(self):
+        return [new for status, _, new in self.pairs if status in (MODIFIED, ADDED)]
+
+    def changed_text(self):
+        return "\n\n".join(clause.text for clause in self.changed_clauses())
+
+    def counts(self):
+        counts = {UNCHANGED: 0, MODIFIED: 0, ADDED: 0, DELETED: 0}
+        for status, _, _ in self.pairs:
+            counts[status] += 1
+        return counts
+
+    def changed_ratio(self):
+        total = sum(len(c.text) for c in self.new_clauses)
+        return sum(len(c.text) for c in self.changed_clauses()) / total if total else 0.0
+
+
+def diff_clauses(old_text, new_text):
+    """
+    Align the clauses of two versions of a contract. Identical clauses are
+    matched by content hash in order; within a replaced run, clauses are
+    paired as modified when similar enough.
+    """
+    old_clauses = [Clause(text, i) for i, text in enumerate(split_into_clauses(old_text))]
+    new_clauses = [Clause(text, i) for i, text in enumerate(split_into_clauses(new_text))]
+    matcher = difflib.SequenceMatcher(
+        None, [c.hash for c in old_clauses], [c.hash for c in new_clauses], autojunk=False
+    )
+
+    pairs = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            pairs.extend((UNCHANGED, old, new) for old, new in zip(old_clauses[i1:i2], new_clauses[j1:j2]))
+            continue
+        old_run, new_run = old_clauses[i1:i2], new_clauses[j1:j2]
+        used = set()
+        for new in new_run:
+            best, best_ratio = None, CLAUSE_MATCH_MIN_RATIO
+            for old in old_run:
+                if old.index in used:
+                    continue
+                similarity = difflib.SequenceMatcher(None, old.normalized, new.normalized, autojunk=False)
+                # Cheap upper bounds first; ratio() is quadratic in the clause length
+                if similarity.real_quick_ratio() < best_ratio or similarity.quick_ratio() < best_ratio:
+                    continue
+                ratio = similarity.ratio()
+                if ratio >= best_ratio:
+                    best, best_ratio = old, ratio
+            if best is not None:
+                used.add(best.index)
+                pairs.append((MODIFIED, best, new))
+            else:
+                pairs.append((ADDED, None, new))
+        pairs.extend((DELETED, old, None) for old in old_run if old.index not in used)
+    return ClauseDiff(old_clauses, new_clauses, pairs)
+
+
+def _item_words(field, item):
+    keys = ('clause', 'issue') if field == 'ambiguities' else ('title', 'description', 'clause')
+    return set(_normalize(" ".join(str(item.get(k) or "") for k in keys)).split())
+
+
+def attribute_item(field, item, clauses):
+    """
+    Clause an analysis item was derived from: the quoted clause text for
+    ambiguities, otherwise the clause containing most of the item's words.
+    None for document-level items.
+    """
+    quote = _normalize(item.get('clause'))[:200]
+    if quote:
+        for clause in clauses:
+            if quote in clause.normalized:
+                return clause
+    words = _item_words(field, item)
+    if len(words) < 3:
+        return None
+    best, best_overlap = None, ITEM_CLAUSE_MIN_OVERLAP
+    for clause in clauses:
+        overlap = len(words & clause.words) / len(words)
+        if overlap > best_overlap:
+            best, best_overlap = clause, overlap
+    return best
+
+
+def _next_number(items, prefix):
+    numbers = [0]
+    for item in items:
+        suffix = str(item.get('id', '')).rpartition(f"{prefix}_")[2]
+        if suffix.isdigit():
+            numbers.append(int(suffix))
+    return max(numbers) + 1
+
+
+def merge_revision(previous, diff, fresh, revision):
+    """
+    Merged analysis for a revision: previous items on unchanged clauses (ids
+    kept), plus the fresh analysis of the changed clauses (new ids). Every
+    item gets a provenance record; retired item ids are listed per field.
+    """
+    old_status = {old.hash: status for status, old, _ in diff.pairs if old is not None}
+    new_by_old_hash = {old.hash: new for status, old, new in diff.pairs if status == UNCHANGED}
+    old_by_hash = {c.hash: c for c in diff.old_clauses}
+    changed = diff.changed_clauses()
+    fresh = fresh or {}
+
+    merged = {'summary': previous.get('summary') or fresh.get('summary', "")}
+    retired = {}
+    for field, prefix in LIST_FIELDS:
+        items = []
+        keys = set()
+        for item in previous.get(field) or []:
+            if not isinstance(item, dict):
+                continue
+            provenance = item.get('provenance') or {}
+            clause = old_by_hash.get(provenance.get('clauseHash')) if provenance.get('clauseHash') \
+                else attribute_item(field, item, diff.old_clauses)
+            if clause is not None and old_status.get(clause.hash) != UNCHANGED:
+                retired.setdefault(field, []).append(item.get('id'))
+                continue
+            new_clause = new_by_old_hash.get(clause.hash) if clause is not None else None
+            carried = dict(item)
+            carried['provenance'] = {
+                'status': 'carried',
+                'revision': provenance.get('revision', 0),
+                'clauseHash': new_clause.hash if new_clause else None,
+                'clause': new_clause.label if new_clause else None,
+            }
+            items.append(carried)
+            keys.add(_dedupe_key(field, item))
+
+        number = _next_number(items + [{'id': i} for i in retired.get(field, [])], prefix)
+        for item in fresh.get(field) or []:
+            if not isinstance(item, dict) or _dedupe_key(field, item) in keys:
+                continue
+            keys.add(_dedupe_key(field, item))
+            clause = attribute_item(field, item, changed)
+            added = dict(item, id=f"{prefix}_{number}")
+            number += 1
+            added['provenance'] = {
+                'status': 'new',
+                'revision': revision,
+                'clauseHash': clause.hash if clause else None,
+                'clause': clause.label if clause else None,
+            }
+            items.append(added)
+        merged[field] = items
+
+    timeline = dict(previous.get('timeline') or {})
+    timeline.update({k: v for k, v in (fresh.get('timeline') or {}).items() if v})
+    merged['timeline'] = timeline
+    merged['revision'] = {
+        'number': revision,
+        'clauses': diff.counts(),
+        'retired': retired,
+    }
+    return merged
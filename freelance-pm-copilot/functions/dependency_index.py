@@ -0,0 +1,251 @@
+import re
+import uuid
+import threading
+from firebase_admin import firestore
+from clients import get_db
+from tracing import span
+
+# Per-project dependency index over tasks.dependsOn.
+# Holds forward (task -> dependencies) and reverse (task -> dependents)
+# adjacency lists plus a lazily filled transitive-closure cache, so impact
+# questions ("what is downstream of these tasks?") are answered in memory.
+#
+# Indexes are cached per process and validated against
+# projects/{projectId}.tasksVersion; a stale index is rebuilt on the next
+# lookup. Bulk writers bump the version once in their own batch and stamp
+# their task writes with BULK_WRITE_FIELD; the onTaskWritten trigger bumps it
+# for every other task write.
+
+TASK_INDEX_FIELDS = ['title', 'dependsOn', 'estimatedHours', 'status']
+# Words too common in Turkish (and English) requests to tie them to a task
+MATCH_STOPWORDS = {
+    've', 'ile', 'için', 'bir', 'bu', 'şu', 'daha', 'gibi', 'olan', 'olarak', 'ama', 'veya', 'her',
+    'çok', 'ekle', 'eklenmesi', 'yeni', 'değişiklik', 'talep', 'istiyoruz', 'lütfen', 'sayfa', 'sayfası',
+    'the', 'and', 'for', 'with', 'add', 'new', 'page', 'change',
+}
+BULK_WRITE_FIELD = 'bulkWriteId'
+DONE_STATUSES = ('done', 'completed')
+
+_lock = threading.Lock()
+_indexes = {}
+
+
+class DependencyIndex:
+    """
+    Forward/reverse adjacency and cached reachability for one project's tasks
+    """
+
+    def __init__(self, tasks, version=None):
+        self.version = version
+        self.tasks = {}
+        self.forward = {}
+        self.reverse = {}
+        self._closure = {}
+        for task in tasks:
+            task_id = str(task['id'])
+            self.tasks[task_id] = task
+            self.forward[task_id] = [str(d) for d in (task.get('dependsOn') or [])]
+            self.reverse.setdefault(task_id, [])
+        for task_id, deps in self.forward.items():
+            for dep in deps:
+                if dep in self.tasks:
+                    self.reverse[dep].append(task_id)
+
+    def descendants(self, task_id):
+        """
+        Every task that transitively depends on task_id (cached per task)
+        """
+        cached = self._closure.get(task_id)
+        if cached is not None:
+            return cached
+        seen = set()
+        stack = list(self.reverse.get(task_id, []))
+        while stack:
+            current = stack.pop()
+            if current in seen:
+                continue
+            seen.add(current)
+            known = self._closure.get(current)
+            if known is not None:
+                seen |= known
+                continue
+            stack.extend(self.reverse.get(current, []))
+        seen.discard(task_id)
+        result = frozenset(seen)
+        self._closure[task_id] = result
+        return result
+
+    def downstream(self, task_ids):
+        result = set()
+        for task_id in task_ids:
+            result |= self.descendants(task_id)
+        return result - set(task_ids)
+
+    def remaining_hours(self, task_id):
+        task = self.tasks.get(task_id) or {}
+        if task.get('status') in DONE_STATUSES:
+            return 0.0
+        try:
+            return float(task.get('estimatedHours') or 0)
+        except (TypeError, ValueError):
+            return 0.0
+
+    def longest_chain_hours(self, task_ids):
+        """
+        Remaining hours on the longest dependency chain starting at task_ids:
+        how far a slip in those tasks can push the end of the project
+        """
+        seeds = [t for t in task_ids if t in self.tasks]
+        nodes = set(seeds) | self.downstream(seeds)
+        # Kahn order within the affected subgraph, then relax it backwards
+        pending = {n: sum(1 for d in self.forward[n] if d in nodes) for n in nodes}
+        order = [n for n, count in pending.items() if count == 0]
+        for current in order:
+            for dependent in self.reverse[current]:
+                if dependent in pending:
+                    pending[dependent] -= 1
+                    if pending[dependent] == 0:
+                        order.append(dependent)
+        longest = {}
+        for current in reversed(order):
+            tail = max([longest.get(d, 0.0) for d in self.reverse[current]] or [0.0])
+            longest[current] = self.remaining_hours(current) + tail
+        return max([longest.get(t, self.remaining_hours(t)) for t in seeds] or [0.0])
+
+    def impact(self, seed_ids, extra_hours=0.0, plan=None):
+        """
+        Deterministic impact of changing seed_ids (optionally adding extra_hours
+        of work to them) on the task graph and, if given, the current sprint plan
+        """
+        seeds = [t for t in dict.fromkeys(str(s) for s in seed_ids) if t in self.tasks]
+        downstream = self.downstream(seeds)
+        impacted = set(seeds) | downstream
+
+        result = {
+            'seedTasks': seeds,
+            'downstreamTasks': sorted(downstream),
+            'impactedTaskCount': len(impacted),
+            'hoursAtRisk': round(sum(self.remaining_hours(t) for t in impacted), 1),
+            'hourDelta': round(float(extra_hours or 0), 1),
+            'criticalChainHours': round(self.longest_chain_hours(seeds), 1),
+            'downstreamBySeed': {t: sorted(self.descendants(t)) for t in seeds},
+            'affectedSprints': [],
+            'slippedSprints': [],
+            'taskSprints': {}
+        }
+
+        if plan:
+            sprint_of = {}
+            for sprint in plan.get('sprints', []):
+                for task in sprint.get('tasks', []):
+                    sprint_of[str(task['taskId'])] = sprint['sprintNum']
+            affected = sorted({sprint_of[t] for t in impacted if t in sprint_of})
+            result['affectedSprints'] = affected
+            result['taskSprints'] = {t: sprint_of[t] for t in sorted(impacted) if t in sprint_of}
+            if affected and extra_hours:
+                # Added work on the seeds pushes every later sprint holding
+                # downstream work
+                first_seed_sprint = min([sprint_of[t] for t in seeds if t in sprint_of] or affected)
+                result['slippedSprints'] = [s for s in affected if s >= first_seed_sprint]
+        return result
+
+
+def load_dependency_index(project_id, version=None):
+    """
+    Build an index from the project's tasks, reading only the fields it needs
+    """
+    query = get_db().collection('tasks').where('projectId', '==', project_id).select(TASK_INDEX_FIELDS)
+    tasks = []
+    with span('firestore_read', collection='tasks') as attrs:
+        for snapshot in query.stream():
+            task = snapshot.to_dict() or {}
+            task['id'] = snapshot.id
+            tasks.append(task)
+        attrs['documents'] = len(tasks)
+    print(f"Dependency index built for project {project_id}: {len(tasks)} tasks")
+    return DependencyIndex(tasks, version=version)
+
+
+def _tasks_version(project_id):
+    with span('firestore_read', collection='projects'):
+        snapshot = get_db().collection('projects').document(project_id).get(field_paths=['tasksVersion'])
+    return (snapshot.to_dict() or {}).get('tasksVersion', 0) if snapshot.exists else 0
+
+
+def get_dependency_index(project_id):
+    """
+    Cached index for a project, rebuilt when its tasksVersion moved on
+    """
+    version = _tasks_version(project_id)
+    with _lock:
+        index = _indexes.get(project_id)
+    if index is not None and index.version == version:
+        return index
+    index = load_dependency_index(project_id, version=version)
+    with _lock:
+        _indexes[project_id] = index
+    return index
+
+
+def invalidate_dependency_index(project_id):
+    with _lock:
+        _indexes.pop(project_id, None)
+
+
+def bump_tasks_version(project_id):
+    """
+    Mark the project's task graph as changed (called from the tasks trigger)
+    """
+    get_db().collection('projects').document(project_id).set({
+        'tasksVersion': firestore.Increment(1)
+    }, merge=True)
+    invalidate_dependency_index(project_id)
+
+
+def new_bulk_write_id():
+    """
+    Id a bulk writer stores in BULK_WRITE_FIELD of every task it writes, so
+    the trigger skips them
+    """
+    return uuid.uuid4().hex
+
+
+def bump_tasks_version_in_batch(writer, project_id):
+    """
+    Queue the bulk write's single tasksVersion bump on a BatchWriter; queue it
+    after the task writes so a chunked commit bumps only once they all landed
+    """
+    writer.set(get_db().collection('projects').document(project_id), {
+        'tasksVersion': firestore.Increment(1)
+    }, merge=True)
+    invalidate_dependency_index(project_id)
+
+
+def written_in_bulk(before, after):
+    """
+    Whether a task write came from a bulk writer that bumped the version itself
+    """
+    bulk_id = after.get(BULK_WRITE_FIELD)
+    return bool(bulk_id) and bulk_id != before.get(BULK_WRITE_FIELD)
+
+
+def _significant_words(text):
+    return {w for w in re.findall(r"\w+", str(text or '').lower()) if len(w) > 2 and w not in MATCH_STOPWORDS}
+
+
+def match_tasks(text, index, limit=5):
+    """
+    Tasks whose titles share the most words with a free-text change request.
+    A guess: titles must share two significant words (or all of a shorter
+    title's), and callers treat the result as a hint.
+    """
+    words = _significant_words(text)
+    if not words:
+        return []
+    scored = []
+    for task_id, task in index.tasks.items():
+        title_words = _significant_words(task.get('title', ''))
+        overlap = len(words & title_words)
+        if overlap and overlap >= min(2, len(title_words)):
+            scored.append((-overlap, task_id))
+    return [task_id for _, task_id in sorted(scored)[:limit]]
@@ -0,0 +1,56 @@
+from clients import get_db
+from tracing import span
+
+# Chunked WriteBatch helper.
+# Document ids are allocated client-side with collection.document(), so callers
+# can resolve cross references (task dependsOn, epicId, planId) before anything
+# is written and then persist everything in a few batch commits.
+
+# Firestore limit on writes per batch commit
+MAX_BATCH_WRITES = 500
+
+
+class BatchWriter:
+    """
+    Queue set/update operations and commit them in batches of up to
+    MAX_BATCH_WRITES. Each chunk is atomic; a write set that fits in one chunk
+    is committed atomically as a whole.
+    """
+
+    def __init__(self, db=None, max_writes=MAX_BATCH_WRITES):
+        self.db = db or get_db()
+        self.max_writes = max_writes
+        self.operations = []
+        self.commits = 0
+
+    def new_ref(self, collection):
+        """
+        Reference with a pre-allocated id; nothing is written until commit
+        """
+        return self.db.collection(collection).document()
+
+    def set(self, ref, data, merge=False):
+        self.operations.append(('set', ref, data, {'merge': True} if merge else {}))
+        return ref
+
+    def update(self, ref, data):
+        self.operations.append(('update', ref, data, {}))
+        return ref
+
+    def commit(self):
+        """
+        Commit all queued operations and return the number of RPCs used
+        """
+        operations, self.operations = self.operations, []
+        commits = 0
+        with span('firestore_write', writes=len(operations)) as attrs:
+            for start in range(0, len(operations), self.max_writes):
+                batch = self.db.batch()
+                for op, ref, data, options in operations[start:start + self.max_writes]:
+                    getattr(batch, op)(ref, data, **options)
+                batch.commit()
+                commits += 1
+            attrs['commits'] = commits
+        self.commits += commits
+        print(f"Committed {len(operations)} writes in {commits} batch(es)")
+        return commits
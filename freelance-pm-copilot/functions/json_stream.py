@@ -0,0 +1,91 @@
+import json
+
+# Incremental JSON scanner for streamed completions.
+# Tokens are fed as they arrive; every object that closes directly inside one
+# of the watched top-level arrays (e.g. "risks": [{...}, {...}]) is decoded
+# and returned immediately, long before the whole document is complete.
+# Text before the first "{" (markdown fences, chatter) is skipped.
+
+
+class StreamingJsonParser:
+    """
+    Feed text chunks, get back (array_key, item) for each completed item
+    """
+
+    def __init__(self, watched_keys):
+        self.watched_keys = set(watched_keys)
+        self.started = False
+        self.finished = False
+        self.in_string = False
+        self.escaped = False
+        self.stack = []          # '{' / '[' containers currently open
+        self.last_string = None  # last complete string, the key of a top-level member
+        self.current_key = None  # key whose value is being read at depth 1
+        self._string_start = None
+        self._item_start = None
+        self._item_key = None
+        self._text = []          # characters since the document started
+
+    def feed(self, chunk):
+        items = []
+        for char in chunk or '':
+            item = self._consume(char)
+            if item is not None:
+                items.append(item)
+        return items
+
+    def _consume(self, char):
+        if self.finished:
+            return None
+        if not self.started:
+            if char != '{':
+                return None
+            self.started = True
+
+        self._text.append(char)
+        position = len(self._text) - 1
+
+        if self.in_string:
+            if self.escaped:
+                self.escaped = False
+            elif char == '\\':
+                self.escaped = True
+            elif char == '"':
+                self.in_string = False
+                if len(self.stack) == 1:
+                    self.last_string = ''.join(self._text[self._string_start + 1:position])
+            return None
+
+        if char == '"':
+            self.in_string = True
+            self._string_start = position
+        elif char == ':' and len(self.stack) == 1:
+            self.current_key = self.last_string
+        elif char in '{[':
+            # An object opening directly inside a watched top-level array
+            if (char == '{' and self.stack == ['{', '[']
+                    and self.current_key in self.watched_keys):
+                self._item_start = position
+                self._item_key = self.current_key
+            self.stack.append(char)
+        elif char in '}]':
+            if self.stack:
+                self.stack.pop()
+            if char == '}' and self._item_start is not None and self.stack == ['{', '[']:
+                raw = ''.join(self._text[self._item_start:position + 1])
+                key = self._item_key
+                self._item_start = None
+                try:
+                    return key, json.loads(raw)
+                except ValueError:
+                    print(f"Skipping malformed streamed item in {key}")
+                    return None
+            if not self.stack:
+                self.finished = True
+        return None
+
+    def document(self):
+        """
+        The raw JSON document seen so far (complete once finished is True)
+        """
+        return ''.join(self._text)
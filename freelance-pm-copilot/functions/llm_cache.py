@@ -0,0 +1,111 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+# In-process cache for deterministic Groq completions.
+# Entries expire after a TTL and are evicted least-recently-used once either
+# the entry count or the total cached size exceeds its limit.
+
+LLM_CACHE_TTL_SECONDS = int(os.environ.get("LLM_CACHE_TTL_SECONDS", 6 * 60 * 60))
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", 512))
+LLM_CACHE_MAX_BYTES = int(os.environ.get("LLM_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+
+def _sha256(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def make_completion_key(model, messages, temperature, max_tokens):
+    """
+    Build the cache key from (model, system prompt hash, user prompt hash, temperature, max_tokens)
+    """
+    system_prompt = "\n".join(m["content"] for m in messages if m["role"] == "system")
+    user_prompt = "\n".join(
+        f"{m['role']}:{m['content']}" for m in messages if m["role"] != "system"
+    )
+    return "|".join([
+        model,
+        _sha256(system_prompt),
+        _sha256(user_prompt),
+        f"{float(temperature):.3f}",
+        str(max_tokens),
+    ])
+
+
+class CompletionCache:
+    """
+    Thread-safe TTL + LRU cache of completion content strings
+    """
+
+    def __init__(self, ttl_seconds=LLM_CACHE_TTL_SECONDS, max_entries=LLM_CACHE_MAX_ENTRIES,
+                 max_bytes=LLM_CACHE_MAX_BYTES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (expires_at, content)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'bypasses': 0, 'evictions': 0, 'expirations': 0}
+
+    def get(self, key):
+        """
+        Return cached content for key, or None when missing or expired
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            expires_at, content = entry
+            if expires_at <= now:
+                self._remove(key)
+                self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return content
+
+    def put(self, key, content):
+        """
+        Store content under key and evict until both size limits hold
+        """
+        size = len(content.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, content)
+            self._bytes += size
+            while self._entries and (
+                len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+            ):
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self._stats['evictions'] += 1
+
+    def record_bypass(self):
+        with self._lock:
+            self._stats['bypasses'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        _, content = self._entries.pop(key)
+        self._bytes -= len(content.encode("utf-8"))
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+        lookups = stats['hits'] + stats['misses']
+        stats['hitRate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        return stats
@@ -0,0 +1,165 @@
+import os
+import json
+import time
+from llm_cache import CompletionCache, make_completion_key
+from rate_limiter import rate_limited_call, rate_limited_stream
+from tracing import span, annotate
+
+# Shared entry point for every Groq chat completion made by the functions.
+# Identical low-temperature requests are answered from the completion cache;
+# everything else goes through the process-wide rate limiter (rate_limiter.py).
+
+# Only cache near-deterministic calls; higher temperatures are meant to vary
+LLM_CACHE_MAX_TEMPERATURE = float(os.environ.get("LLM_CACHE_MAX_TEMPERATURE", 0.2))
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE_ENABLED", "true").lower() != "false"
+# An answer cut off at a smaller max_tokens is retried once with this budget
+LLM_MAX_OUTPUT_TOKENS = int(os.environ.get("LLM_MAX_OUTPUT_TOKENS", 8192))
+
+completion_cache = CompletionCache()
+
+
+def chat_completion(client, model, messages, temperature, max_tokens=None,
+                    response_format=None, bypass_cache=False):
+    """
+    Run a chat completion and return the message content, using the shared cache
+    """
+    with span('llm', model=model):
+        return _chat_completion(client, model, messages, temperature, max_tokens,
+                                response_format, bypass_cache)
+
+
+def _chat_completion(client, model, messages, temperature, max_tokens, response_format, bypass_cache):
+    cacheable = LLM_CACHE_ENABLED and temperature <= LLM_CACHE_MAX_TEMPERATURE
+    cache_key = None
+
+    if cacheable:
+        cache_key = make_completion_key(model, messages, temperature, max_tokens)
+        if bypass_cache:
+            completion_cache.record_bypass()
+        else:
+            cached_content = completion_cache.get(cache_key)
+            if cached_content is not None:
+                print(f"LLM cache hit for {model}")
+                annotate(cached=True)
+                return cached_content
+
+    request_kwargs = {
+        'model': model,
+        'messages': messages,
+        'temperature': temperature,
+    }
+    if max_tokens is not None:
+        request_kwargs['max_tokens'] = max_tokens
+    if response_format is not None:
+        request_kwargs['response_format'] = response_format
+
+    def create():
+        return rate_limited_call(
+            model, request_kwargs,
+            lambda: client.chat.completions.create(**request_kwargs),
+            usage_of=lambda result: result.usage.total_tokens
+        )
+
+    started = time.monotonic()
+    completion = create()
+    truncated = completion.choices[0].finish_reason == 'length'
+    if truncated and max_tokens is not None and max_tokens < LLM_MAX_OUTPUT_TOKENS:
+        # A cut-off JSON answer does not parse; pay for one bigger call instead
+        print(f"Groq completion ({model}) hit max_tokens={max_tokens}, retrying with {LLM_MAX_OUTPUT_TOKENS}")
+        annotate(lengthRetry=True)
+        request_kwargs['max_tokens'] = LLM_MAX_OUTPUT_TOKENS
+        completion = create()
+        truncated = completion.choices[0].finish_reason == 'length'
+    content = completion.choices[0].message.content
+    print(f"Groq completion ({model}) took {time.monotonic() - started:.2f}s")
+    usage = getattr(completion, 'usage', None)
+    if usage is not None:
+        annotate(promptTokens=usage.prompt_tokens, completionTokens=usage.completion_tokens)
+
+    if cache_key and not truncated and _is_cacheable_content(content, response_format):
+        completion_cache.put(cache_key, content)
+
+    return content
+
+
+def decode_json_response(content):
+    """
+    json.loads for model output, timed as the json_decode stage
+    """
+    with span('json_decode', chars=len(content or '')):
+        return json.loads(content)
+
+
+def _is_cacheable_content(content, response_format):
+    """
+    Never cache empty or malformed JSON bodies so a retry can recover
+    """
+    if not content:
+        return False
+    if response_format and response_format.get("type") == "json_object":
+        try:
+            json.loads(content)
+        except ValueError:
+            return False
+    return True
+
+
+def stream_chat_completion(client, model, messages, temperature, max_tokens=None,
+                           bypass_cache=False, expect_json=False):
+    """
+    Yield the message content in pieces as the model produces it. A cached
+    answer is yielded as a single piece; a complete streamed answer is cached
+    under the same key chat_completion uses (JSON mode cannot be combined with
+    streaming, so expect_json only guards what gets cached).
+    """
+    with span('llm', model=model, stream=True):
+        yield from _stream_chat_completion(client, model, messages, temperature, max_tokens,
+                                           bypass_cache, expect_json)
+
+
+def _stream_chat_completion(client, model, messages, temperature, max_tokens, bypass_cache, expect_json):
+    cacheable = LLM_CACHE_ENABLED and temperature <= LLM_CACHE_MAX_TEMPERATURE
+    cache_key = None
+
+    if cacheable:
+        cache_key = make_completion_key(model, messages, temperature, max_tokens)
+        if bypass_cache:
+            completion_cache.record_bypass()
+        else:
+            cached_content = completion_cache.get(cache_key)
+            if cached_content is not None:
+                print(f"LLM cache hit for {model} (stream)")
+                annotate(cached=True)
+                yield cached_content
+                return
+
+    request_kwargs = {
+        'model': model,
+        'messages': messages,
+        'temperature': temperature,
+        'stream': True,
+    }
+    if max_tokens is not None:
+        request_kwargs['max_tokens'] = max_tokens
+
+    started = time.monotonic()
+    first_token_seconds = None
+    pieces = []
+    for chunk in rate_limited_stream(model, request_kwargs, lambda: client.chat.completions.create(**request_kwargs)):
+        if not chunk.choices:
+            continue
+        piece = chunk.choices[0].delta.content
+        if not piece:
+            continue
+        if first_token_seconds is None:
+            first_token_seconds = time.monotonic() - started
+        pieces.append(piece)
+        yield piece
+
+    content = "".join(pieces)
+    print(f"Groq stream ({model}) took {time.monotonic() - started:.2f}s, "
+          f"first token after {first_token_seconds or 0:.2f}s")
+    annotate(firstTokenMs=round((first_token_seconds or 0) * 1000, 1), completionChars=len(content))
+    json_format = {"type": "json_object"} if expect_json else None
+    if cache_key and _is_cacheable_content(content, json_format):
+        completion_cache.put(cache_key, content)
@@ -1,34 +1,20 @@
 import os
 import json
-import tempfile
-from firebase_functions import https_fn, firestore_fn
-from firebase_admin import initialize_app, firestore, storage
-import requests
-
-# Initialize Firebase Admin with explicit configuration
-try:
-    # Force reinitialize with correct storage bucket
-    from firebase_admin import delete_app, get_app
-    try:
-        delete_app()
-    except:
-        pass
-    
-    initialize_app(options={
-        'storageBucket': 'lambda-926aa.firebasestorage.app',
-        'projectId': 'lambda-926aa'
-    })
-    print("Firebase Admin initialized with storageBucket: lambda-926aa.firebasestorage.app")
-except ValueError as e:
-    print(f"Firebase Admin already initialized: {e}")
-    # Try to get existing app and verify bucket
-    try:
-        app = get_app()
-        print(f"Using existing Firebase app: {app.name}")
-    except:
-        pass
+from firebase_functions import https_fn, firestore_fn, scheduler_fn
+from clients import ensure_firebase_app
+from tracing import traced, trace_block, log_payload
+
+# Initialize Firebase Admin once per process. Heavy SDKs (Groq, LlamaParse,
+# Firestore, Secret Manager) are imported lazily by the endpoint that uses them.
+ensure_firebase_app()
+
+# analyzeContract answers synchronously unless the request sets "async": true.
+# The web app's callers (contracts/new, /api/contracts/trigger-analysis) do not
+# poll getAnalysisJob yet, so async stays opt-in.
+ANALYZE_CONTRACT_ASYNC_DEFAULT = os.environ.get("ANALYZE_CONTRACT_ASYNC", "false").lower() == "true"
 
 @https_fn.on_request()
+@traced('analyzeContract')
 def analyzeContract(req: https_fn.Request) -> https_fn.Response:
     """
     Cloud Function to analyze contract PDF using AI
@@ -36,7 +22,6 @@ def analyzeContract(req: https_fn.Request) -> https_fn.Response:
     print("=== analyzeContract START ===")
     print(f"Request method: {req.method}")
     print(f"Request URL: {req.url}")
-    print(f"Request headers: {dict(req.headers)}")
     
     # CORS headers for all responses
     cors_headers = {
@@ -52,15 +37,10 @@ def analyzeContract(req: https_fn.Request) -> https_fn.Response:
             print("Handling OPTIONS preflight request")
             return https_fn.Response('', status=200, headers=cors_headers)
         
-        # Log request details
-        print("Importing contract_analyzer...")
-        from contract_analyzer import analyze_contract
-        print("contract_analyzer imported successfully")
-        
         # Get request data
         print("Parsing request JSON...")
         data = req.get_json()
-        print(f"Request data: {data}")
+        log_payload("Request data", data)
         
         if not data:
             print("ERROR: No data provided")
@@ -73,6 +53,9 @@ def analyzeContract(req: https_fn.Request) -> https_fn.Response:
         contract_id = data.get('contractId')
         pdf_url = data.get('pdfUrl')
         pdf_path = data.get('pdfPath')
+        bypass_cache = bool(data.get('bypassCache', False))
+        analysis_mode = data.get('analysisMode', 'auto')
+        run_async = bool(data.get('async', ANALYZE_CONTRACT_ASYNC_DEFAULT))
         
         print(f"Contract ID: {contract_id}")
         print(f"PDF URL: {pdf_url}")
@@ -81,15 +64,62 @@ def analyzeContract(req: https_fn.Request) -> https_fn.Response:
         if not contract_id or not (pdf_url or pdf_path):
             print("ERROR: Missing contractId or PDF reference")
             return https_fn.Response(
-                json.dumps({'error': 'Missing contractId or PDF reference'}), 
-                status=400, 
+                json.dumps({'error': 'Missing contractId or PDF reference'}),
+                status=400,
                 headers=cors_headers
             )
-        
-        # Call the contract analyzer
+
+        if analysis_mode not in ('auto', 'single', 'chunked', 'revision'):
+            return https_fn.Response(
+                json.dumps({'error': f"Invalid analysisMode: {analysis_mode}"}),
+                status=400,
+                headers=cors_headers
+            )
+
+        if run_async:
+            # Queue the job; runAnalysisJob executes it in the background
+            from analysis_jobs import create_analysis_job
+            from contract_reader import read_contract
+            try:
+                # Only the contract's owner may poll the job
+                owner_id = read_contract(contract_id, ['userId']).get('userId')
+            except ValueError as e:
+                return https_fn.Response(
+                    json.dumps({'error': str(e)}),
+                    status=404,
+                    headers=cors_headers
+                )
+            job_id = create_analysis_job(
+                contract_id,
+                pdf_url=pdf_url,
+                pdf_path=pdf_path,
+                options={'bypassCache': bypass_cache, 'analysisMode': analysis_mode},
+                user_id=owner_id
+            )
+            return https_fn.Response(
+                json.dumps({
+                    'success': True,
+                    'message': 'Contract analysis queued',
+                    'contractId': contract_id,
+                    'jobId': job_id,
+                    'status': 'queued'
+                }),
+                status=202,
+                headers=cors_headers
+            )
+
+        # Synchronous mode: run the whole pipeline inside this request
+        print("Importing contract_analyzer...")
+        from contract_analyzer import analyze_contract
+        print("contract_analyzer imported successfully")
+
         print("Calling analyze_contract...")
-        analysis_result = analyze_contract(contract_id, pdf_url, pdf_path)
-        print(f"Analysis result: {analysis_result}")
+        analysis_result = analyze_contract(
+            contract_id, pdf_url, pdf_path,
+            bypass_cache=bypass_cache,
+            analysis_mode=analysis_mode
+        )
+        log_payload("Analysis result", analysis_result)
         
         if analysis_result.get('success'):
             print("Analysis completed successfully")
@@ -132,7 +162,321 @@ def analyzeContract(req: https_fn.Request) -> https_fn.Response:
             headers=cors_headers
         )
 
+@https_fn.on_request(timeout_sec=540)
+def analyzeContractStream(req: https_fn.Request) -> https_fn.Response:
+    """
+    analyzeContract as server-sent events: stage changes, every ambiguity,
+    risk and deliverable as soon as the model finishes it, then the saved
+    analysis. Accepts a JSON POST body or GET query parameters (EventSource).
+    """
+    print("=== analyzeContractStream START ===")
+
+    cors_headers = {
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+        'Access-Control-Allow-Headers': 'Content-Type, Authorization',
+        'Content-Type': 'application/json'
+    }
+
+    try:
+        if req.method == 'OPTIONS':
+            return https_fn.Response('', status=200, headers=cors_headers)
+
+        data = req.get_json(silent=True) if req.method == 'POST' else dict(req.args)
+        if not data:
+            return https_fn.Response(
+                json.dumps({'error': 'No data provided'}),
+                status=400,
+                headers=cors_headers
+            )
+
+        contract_id = data.get('contractId')
+        pdf_url = data.get('pdfUrl')
+        pdf_path = data.get('pdfPath')
+        bypass_cache = str(data.get('bypassCache', False)).lower() == 'true'
+        analysis_mode = data.get('analysisMode', 'auto')
+
+        if not contract_id or not (pdf_url or pdf_path):
+            return https_fn.Response(
+                json.dumps({'error': 'Missing contractId or PDF reference'}),
+                status=400,
+                headers=cors_headers
+            )
+
+        if analysis_mode not in ('auto', 'single', 'chunked'):
+            return https_fn.Response(
+                json.dumps({'error': f"Invalid analysisMode: {analysis_mode}"}),
+                status=400,
+                headers=cors_headers
+            )
+
+        from contract_analyzer import stream_contract_analysis
+
+        def events():
+            # The body runs after this handler returns, so it carries its own trace
+            with trace_block('analyzeContractStream'):
+                for event, payload in stream_contract_analysis(
+                    contract_id, pdf_url, pdf_path,
+                    bypass_cache=bypass_cache,
+                    analysis_mode=analysis_mode
+                ):
+                    yield f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False, default=str)}\n\n"
+
+        stream_headers = dict(cors_headers)
+        stream_headers.update({
+            'Content-Type': 'text/event-stream; charset=utf-8',
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+        return https_fn.Response(events(), status=200, headers=stream_headers)
+
+    except Exception as e:
+        print(f"=== CRITICAL ERROR in analyzeContractStream ===")
+        print(f"Error type: {type(e).__name__}")
+        print(f"Error message: {str(e)}")
+        import traceback
+        print(f"Traceback: {traceback.format_exc()}")
+        print("=== END ERROR ===")
+
+        return https_fn.Response(
+            json.dumps({
+                'success': False,
+                'error': f"Critical error: {str(e)}",
+                'error_type': type(e).__name__
+            }),
+            status=500,
+            headers=cors_headers
+        )
+
+@firestore_fn.on_document_created(document="analysisJobs/{jobId}", timeout_sec=540)
+@traced('runAnalysisJob')
+def runAnalysisJob(event: firestore_fn.Event[firestore_fn.DocumentSnapshot | None]) -> None:
+    """
+    Background worker for asynchronous analyzeContract jobs
+    """
+    job_id = event.params['jobId']
+    print(f"=== runAnalysisJob START ({job_id}) ===")
+
+    try:
+        from analysis_jobs import run_analysis_job
+        run_analysis_job(job_id)
+    except Exception as e:
+        print(f"=== CRITICAL ERROR in runAnalysisJob ===")
+        print(f"Error type: {type(e).__name__}")
+        print(f"Error message: {str(e)}")
+        import traceback
+        print(f"Traceback: {traceback.format_exc()}")
+        print("=== END ERROR ===")
+
+@scheduler_fn.on_schedule(schedule="every 10 minutes", timeout_sec=540)
+@traced('reclaimAnalysisJobs')
+def reclaimAnalysisJobs(event: scheduler_fn.ScheduledEvent) -> None:
+    """
+    Re-run or fail analysis jobs whose worker died before finishing
+    """
+    try:
+        from analysis_jobs import reclaim_expired_jobs
+        reclaimed = reclaim_expired_jobs()
+        if reclaimed:
+            print(f"Reclaimed analysis jobs: {reclaimed}")
+    except Exception as e:
+        print(f"Error reclaiming analysis jobs: {str(e)}")
+        import traceback
+        print(f"Traceback: {traceback.format_exc()}")
+
+@firestore_fn.on_document_written(document="tasks/{taskId}")
+@traced('onTaskWritten')
+def onTaskWritten(event: firestore_fn.Event[firestore_fn.Change[firestore_fn.DocumentSnapshot | None]]) -> None:
+    """
+    Invalidate cached dependency indexes of the projects a task write touched
+    """
+    try:
+        from dependency_index import bump_tasks_version, written_in_bulk, TASK_INDEX_FIELDS
+
+        before, after = [
+            (snapshot.to_dict() or {}) if snapshot is not None and snapshot.exists else {}
+            for snapshot in (event.data.before, event.data.after)
+        ]
+        if all(before.get(f) == after.get(f) for f in TASK_INDEX_FIELDS + ['projectId']):
+            # Only fields the index ignores changed (e.g. description)
+            return
+        if written_in_bulk(before, after):
+            # The bulk writer bumped tasksVersion once in its own batch
+            return
+
+        project_ids = {v.get('projectId') for v in (before, after) if v.get('projectId')}
+        for project_id in project_ids:
+            bump_tasks_version(project_id)
+    except Exception as e:
+        print(f"Error invalidating dependency index for task {event.params.get('taskId')}: {str(e)}")
+
+@https_fn.on_request()
+@traced('getAnalysisJob')
+def getAnalysisJob(req: https_fn.Request) -> https_fn.Response:
+    """
+    Cloud Function to poll the status of an asynchronous analysis job
+    """
+    # CORS headers for all responses
+    cors_headers = {
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+        'Access-Control-Allow-Headers': 'Content-Type, Authorization',
+        'Content-Type': 'application/json'
+    }
+    
+    try:
+        # Handle preflight OPTIONS request
+        if req.method == 'OPTIONS':
+            return https_fn.Response('', status=200, headers=cors_headers)
+
+        job_id = req.args.get('jobId')
+        if not job_id and req.method == 'POST':
+            job_id = (req.get_json(silent=True) or {}).get('jobId')
+
+        if not job_id:
+            return https_fn.Response(
+                json.dumps({'error': 'Missing jobId'}),
+                status=400,
+                headers=cors_headers
+            )
+
+        # Jobs are only readable by the contract's owner (firestore.rules),
+        # so require their Firebase ID token
+        from firebase_admin import auth
+        authorization = req.headers.get('Authorization', '')
+        try:
+            user_id = auth.verify_id_token(authorization.removeprefix('Bearer ').strip())['uid']
+        except Exception as e:
+            print(f"Rejected getAnalysisJob token: {str(e)}")
+            return https_fn.Response(
+                json.dumps({'error': 'Missing or invalid ID token'}),
+                status=401,
+                headers=cors_headers
+            )
+
+        from analysis_jobs import get_analysis_job
+        try:
+            job = get_analysis_job(job_id, user_id=user_id)
+        except PermissionError as e:
+            return https_fn.Response(
+                json.dumps({'error': str(e)}),
+                status=403,
+                headers=cors_headers
+            )
+
+        if job is None:
+            return https_fn.Response(
+                json.dumps({'error': f"Job {job_id} not found"}),
+                status=404,
+                headers=cors_headers
+            )
+
+        return https_fn.Response(
+            json.dumps({'success': True, 'job': job}),
+            status=200,
+            headers=cors_headers
+        )
+
+    except Exception as e:
+        print(f"=== CRITICAL ERROR in getAnalysisJob ===")
+        print(f"Error type: {type(e).__name__}")
+        print(f"Error message: {str(e)}")
+        
+        return https_fn.Response(
+            json.dumps({
+                'success': False, 
+                'error': f"Critical error: {str(e)}",
+                'error_type': type(e).__name__
+            }),
+            status=500,
+            headers=cors_headers
+        )
+
+@https_fn.on_request()
+@traced('getContractAnalysis')
+def getContractAnalysis(req: https_fn.Request) -> https_fn.Response:
+    """
+    Cloud Function returning a contract's full analysis to its owner. With
+    ANALYSIS_STORAGE_MODE=storage the contract document only holds a compact
+    summary and the full analysis is loaded from Storage here.
+    """
+    # CORS headers for all responses
+    cors_headers = {
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+        'Access-Control-Allow-Headers': 'Content-Type, Authorization',
+        'Content-Type': 'application/json'
+    }
+    
+    try:
+        # Handle preflight OPTIONS request
+        if req.method == 'OPTIONS':
+            return https_fn.Response('', status=200, headers=cors_headers)
+
+        contract_id = req.args.get('contractId')
+        if not contract_id and req.method == 'POST':
+            contract_id = (req.get_json(silent=True) or {}).get('contractId')
+
+        if not contract_id:
+            return https_fn.Response(
+                json.dumps({'error': 'Missing contractId'}),
+                status=400,
+                headers=cors_headers
+            )
+
+        # The analysis is otherwise only readable by the contract's owner
+        # (firestore.rules), so require their Firebase ID token
+        from firebase_admin import auth
+        authorization = req.headers.get('Authorization', '')
+        try:
+            user_id = auth.verify_id_token(authorization.removeprefix('Bearer ').strip())['uid']
+        except Exception as e:
+            print(f"Rejected getContractAnalysis token: {str(e)}")
+            return https_fn.Response(
+                json.dumps({'error': 'Missing or invalid ID token'}),
+                status=401,
+                headers=cors_headers
+            )
+
+        from contract_reader import get_full_analysis
+        try:
+            analysis = get_full_analysis(contract_id, user_id=user_id)
+        except PermissionError as e:
+            return https_fn.Response(
+                json.dumps({'error': str(e)}),
+                status=403,
+                headers=cors_headers
+            )
+        except ValueError as e:
+            return https_fn.Response(
+                json.dumps({'error': str(e)}),
+                status=404,
+                headers=cors_headers
+            )
+
+        return https_fn.Response(
+            json.dumps({'success': True, 'contractId': contract_id, 'analysis': analysis}, default=str),
+            status=200,
+            headers=cors_headers
+        )
+
+    except Exception as e:
+        print(f"=== CRITICAL ERROR in getContractAnalysis ===")
+        print(f"Error type: {type(e).__name__}")
+        print(f"Error message: {str(e)}")
+        
+        return https_fn.Response(
+            json.dumps({
+                'success': False, 
+                'error': f"Critical error: {str(e)}",
+                'error_type': type(e).__name__
+            }),
+            status=500,
+            headers=cors_headers
+        )
+
 @https_fn.on_request()
+@traced('generateSprintPlan')
 def generateSprintPlan(req: https_fn.Request) -> https_fn.Response:
     """
     Cloud Function to generate sprint plan for a contract
@@ -167,6 +511,7 @@ def generateSprintPlan(req: https_fn.Request) -> https_fn.Response:
         
         contract_id = data.get('contractId')
         sprint_duration_weeks = data.get('sprintDurationWeeks', 2)
+        bypass_cache = bool(data.get('bypassCache', False))
         
         if not contract_id:
             return https_fn.Response(
@@ -176,7 +521,7 @@ def generateSprintPlan(req: https_fn.Request) -> https_fn.Response:
             )
         
         # Call the sprint planner
-        plan_result = generate_sprint_plan(contract_id, sprint_duration_weeks)
+        plan_result = generate_sprint_plan(contract_id, sprint_duration_weeks, bypass_cache=bypass_cache)
         
         if plan_result.get('success'):
             return https_fn.Response(
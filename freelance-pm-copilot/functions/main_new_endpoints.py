@@ -2,15 +2,14 @@
 import os
 import json
 from firebase_functions import https_fn
-from firebase_admin import initialize_app, firestore, storage
+from clients import ensure_firebase_app
+from tracing import traced
 
-# Initialize Firebase Admin
-initialize_app(options={
-    'storageBucket': 'lambda-926aa.firebasestorage.app',
-    'projectId': 'lambda-926aa'
-})
+# Initialize Firebase Admin (no-op if main.py already did)
+ensure_firebase_app()
 
 @https_fn.on_request()
+@traced('generateTasks')
 def generateTasks(req: https_fn.Request) -> https_fn.Response:
     """
     Cloud Function to generate tasks from contract analysis
@@ -45,6 +44,7 @@ def generateTasks(req: https_fn.Request) -> https_fn.Response:
         
         contract_id = data.get('contractId')
         project_id = data.get('projectId')
+        bypass_cache = bool(data.get('bypassCache', False))
         
         if not contract_id or not project_id:
             return https_fn.Response(
@@ -54,7 +54,7 @@ def generateTasks(req: https_fn.Request) -> https_fn.Response:
             )
         
         # Call the task generator
-        result = generate_tasks(contract_id, project_id)
+        result = generate_tasks(contract_id, project_id, bypass_cache=bypass_cache)
         
         if result.get('success'):
             return https_fn.Response(
@@ -96,6 +96,7 @@ def generateTasks(req: https_fn.Request) -> https_fn.Response:
         )
 
 @https_fn.on_request()
+@traced('generateSmartPlan')
 def generateSmartPlan(req: https_fn.Request) -> https_fn.Response:
     """
     Cloud Function to generate smart sprint plan with skill-based assignments
@@ -131,6 +132,10 @@ def generateSmartPlan(req: https_fn.Request) -> https_fn.Response:
         tasks = data.get('tasks')
         team_data = data.get('teamData')
         sprint_duration_weeks = data.get('sprintDurationWeeks', 2)
+        bypass_cache = bool(data.get('bypassCache', False))
+        use_llm_rationale = bool(data.get('useLlmRationale', False))
+        start_date = data.get('startDate')
+        project_id = data.get('projectId')
         
         if not tasks or not team_data:
             return https_fn.Response(
@@ -140,13 +145,32 @@ def generateSmartPlan(req: https_fn.Request) -> https_fn.Response:
             )
         
         # Call the smart sprint planner
-        sprint_plan = generate_smart_sprint_plan(tasks, team_data, sprint_duration_weeks)
+        sprint_plan = generate_smart_sprint_plan(
+            tasks, team_data, sprint_duration_weeks,
+            bypass_cache=bypass_cache,
+            use_llm_rationale=use_llm_rationale,
+            start_date=start_date
+        )
+
+        # With a projectId the plan becomes the project's current plan version,
+        # which replanProject later updates incrementally
+        plan_version_id = None
+        if project_id:
+            from replanner import load_current_plan_version, save_plan_version
+            _, current = load_current_plan_version(project_id)
+            plan_start = sprint_plan['sprints'][0]['startDate'] if sprint_plan['sprints'] else start_date
+            plan_version_id, _ = save_plan_version(
+                project_id, sprint_plan, tasks, team_data, sprint_duration_weeks,
+                plan_start, 'Plan regenerated' if current else 'Initial plan',
+                previous=current, contract_id=data.get('contractId'), created_by=data.get('createdBy')
+            )
         
         return https_fn.Response(
             json.dumps({
                 'success': True,
                 'message': 'Smart sprint plan generated successfully',
-                'sprintPlan': sprint_plan
+                'sprintPlan': sprint_plan,
+                'planVersionId': plan_version_id
             }),
             status=200,
             headers=cors_headers
@@ -171,6 +195,7 @@ def generateSmartPlan(req: https_fn.Request) -> https_fn.Response:
         )
 
 @https_fn.on_request()
+@traced('analyzeChangeOrder')
 def analyzeChangeOrder(req: https_fn.Request) -> https_fn.Response:
     """
     Cloud Function to analyze change request and provide options
@@ -204,6 +229,7 @@ def analyzeChangeOrder(req: https_fn.Request) -> https_fn.Response:
             )
         
         change_request_id = data.get('changeRequestId')
+        bypass_cache = bool(data.get('bypassCache', False))
         
         if not change_request_id:
             return https_fn.Response(
@@ -213,7 +239,7 @@ def analyzeChangeOrder(req: https_fn.Request) -> https_fn.Response:
             )
         
         # Call the change analyzer
-        result = analyze_change_request(change_request_id)
+        result = analyze_change_request(change_request_id, bypass_cache=bypass_cache)
         
         if result.get('success'):
             return https_fn.Response(
@@ -254,6 +280,7 @@ def analyzeChangeOrder(req: https_fn.Request) -> https_fn.Response:
         )
 
 @https_fn.on_request()
+@traced('replanProject')
 def replanProject(req: https_fn.Request) -> https_fn.Response:
     """
     Cloud Function to replan project based on changes (vacation, delay, etc.)
@@ -284,7 +311,9 @@ def replanProject(req: https_fn.Request) -> https_fn.Response:
             )
         
         project_id = data.get('projectId')
-        change_reason = data.get('changeReason', 'Manual replan')
+        # The Next.js /api/replan route sends "reason"
+        change_reason = data.get('changeReason') or data.get('reason') or 'Manual replan'
+        changes = data.get('changes') or []
         
         if not project_id:
             return https_fn.Response(
@@ -292,20 +321,30 @@ def replanProject(req: https_fn.Request) -> https_fn.Response:
                 status=400, 
                 headers=cors_headers
             )
-        
-        # TODO: Implement replan logic
-        # This would involve:
-        # 1. Getting current project data
-        # 2. Getting team availability changes
-        # 3. Regenerating sprint plan with new constraints
-        # 4. Creating new plan version
+
+        # Import here to avoid circular imports
+        from replanner import replan_project, ReplanError
+
+        try:
+            result = replan_project(project_id, changes, change_reason, created_by=data.get('createdBy'))
+        except ReplanError as e:
+            return https_fn.Response(
+                json.dumps({'success': False, 'error': str(e)}),
+                status=400,
+                headers=cors_headers
+            )
         
         return https_fn.Response(
             json.dumps({
                 'success': True,
                 'message': 'Project replanning completed',
                 'projectId': project_id,
-                'changeReason': change_reason
+                'changeReason': change_reason,
+                'planVersionId': result['planVersionId'],
+                'version': result['version'],
+                'newPlan': result['newPlan'],
+                'diff': result['diff'],
+                'diffSummary': result['diffSummary']
             }),
             status=200,
             headers=cors_headers
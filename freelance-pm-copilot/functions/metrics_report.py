@@ -0,0 +1,87 @@
+"""
+Latency report from the latencyHistograms collection.
+
+Merges the daily per-endpoint histograms written by tracing.py and prints
+count, mean and p50/p95/p99 (bucket upper bounds, in ms) per endpoint and
+stage as JSON, so it is easy to see which stage a slow p95 comes from.
+Endpoints that route LLM calls (model_router) also get their escalation rate
+from the llm_route and llm_escalation span counts.
+
+Usage:
+    python metrics_report.py --days 7
+    python metrics_report.py --days 1 --endpoint analyzeContract --output report.json
+"""
+import json
+import argparse
+from datetime import datetime, timedelta, timezone
+from tracing import LATENCY_HISTOGRAMS_COLLECTION, percentile_from_buckets
+
+
+def merge_histograms(documents):
+    """
+    Sum histogram documents into {endpoint: {stage: {count, sumMs, buckets}}}
+    """
+    merged = {}
+    for doc in documents:
+        endpoint = doc.get('endpoint', 'unknown')
+        for stage, stats in (doc.get('stages') or {}).items():
+            target = merged.setdefault(endpoint, {}).setdefault(stage, {'count': 0, 'sumMs': 0.0, 'buckets': {}})
+            target['count'] += stats.get('count', 0)
+            target['sumMs'] += stats.get('sumMs', 0.0)
+            for label, n in (stats.get('buckets') or {}).items():
+                target['buckets'][label] = target['buckets'].get(label, 0) + n
+    return merged
+
+
+def summarize(merged):
+    report = {}
+    for endpoint, stages in merged.items():
+        report[endpoint] = {}
+        for stage, stats in sorted(stages.items()):
+            count = stats['count']
+            report[endpoint][stage] = {
+                'count': count,
+                'meanMs': round(stats['sumMs'] / count, 1) if count else None,
+                'p50Ms': percentile_from_buckets(stats['buckets'], count, 0.50),
+                'p95Ms': percentile_from_buckets(stats['buckets'], count, 0.95),
+                'p99Ms': percentile_from_buckets(stats['buckets'], count, 0.99),
+            }
+        routed = stages.get('llm_route', {}).get('count', 0)
+        if routed:
+            escalated = stages.get('llm_escalation', {}).get('count', 0)
+            report[endpoint]['llmEscalationRate'] = round(escalated / routed, 3)
+    return report
+
+
+def load_histograms(db, days, endpoint=None):
+    today = datetime.now(timezone.utc).date()
+    first_day = (today - timedelta(days=days - 1)).isoformat()
+    query = db.collection(LATENCY_HISTOGRAMS_COLLECTION).where('day', '>=', first_day)
+    documents = [snapshot.to_dict() or {} for snapshot in query.stream()]
+    if endpoint:
+        documents = [d for d in documents if d.get('endpoint') == endpoint]
+    return documents
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-endpoint latency percentiles")
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--endpoint', help="Only this endpoint")
+    parser.add_argument('--output', help="Write the report to this JSON file instead of stdout")
+    args = parser.parse_args(argv)
+
+    from clients import get_db
+    report = summarize(merge_histograms(load_histograms(get_db(), args.days, args.endpoint)))
+
+    text = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+        print(f"Report for {len(report)} endpoints written to {args.output}")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
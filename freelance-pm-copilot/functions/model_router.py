@@ -0,0 +1,142 @@
+import os
+import json
+from llm_client import chat_completion
+from tracing import span
+
+# Tiered model routing.
+# Endpoints with a "tiered" policy run a first pass on the small model and
+# escalate to the large model only when the answer is not valid JSON, fails
+# the endpoint's schema check, or the endpoint's policy says the result needs
+# the large model (e.g. a major scope change or low self-reported confidence).
+#
+# Policies can be overridden per endpoint with MODEL_ROUTING, e.g.
+#   MODEL_ROUTING='{"change_order": "large", "task_generation": "tiered"}'
+#
+# Every routed call is an llm_route span (mode, escalated, reason) and every
+# escalation also an llm_escalation span, so the latency histograms carry
+# both counts and metrics_report.py derives the escalation rate from them.
+
+SMALL_MODEL = os.environ.get("ROUTER_SMALL_MODEL", "llama-3.1-8b-instant")
+LARGE_MODEL = os.environ.get("ROUTER_LARGE_MODEL", "llama-3.3-70b-versatile")
+ROUTER_MIN_CONFIDENCE = float(os.environ.get("ROUTER_MIN_CONFIDENCE", 0.7))
+ROUTING_MODES = ('tiered', 'small', 'large')
+
+CHANGE_CLASSIFICATIONS = ('bug', 'minor_scope', 'major_scope', 'out_of_scope')
+# Classifications whose options and pricing are worth the large model
+ESCALATE_CLASSIFICATIONS = ('major_scope', 'out_of_scope')
+
+
+def _check_change_order(data):
+    if data.get('classification') not in CHANGE_CLASSIFICATIONS:
+        return "invalid classification"
+    if not isinstance(data.get('options'), list) or len(data['options']) < 3:
+        return "missing options"
+    if data['classification'] in ESCALATE_CLASSIFICATIONS:
+        return f"classification {data['classification']}"
+    confidence = data.get('confidence')
+    if isinstance(confidence, (int, float)) and confidence < ROUTER_MIN_CONFIDENCE:
+        return f"low confidence {confidence}"
+    return None
+
+
+def _check_sprint_rationale(data):
+    if not isinstance(data.get('sprints'), list) or not isinstance(data.get('reasons'), dict):
+        return "schema"
+    return None
+
+
+def _check_sprint_plan(data):
+    sprints = list(data.values())[0] if isinstance(data, dict) and len(data) == 1 else data
+    if not isinstance(sprints, list) or not sprints:
+        return "schema"
+    if not all(isinstance(s, dict) and isinstance(s.get('gorevler'), list) for s in sprints):
+        return "schema"
+    return None
+
+
+def _check_task_generation(data):
+    if not isinstance(data.get('tasks'), list) or not data['tasks']:
+        return "schema"
+    return None
+
+
+# endpoint -> (default mode, check returning an escalation reason or None)
+ROUTING_POLICIES = {
+    'change_order': ('tiered', _check_change_order),
+    'sprint_rationale': ('tiered', _check_sprint_rationale),
+    'sprint_plan': ('tiered', _check_sprint_plan),
+    'task_generation': ('large', _check_task_generation),
+    'contract_analysis': ('large', None),
+}
+
+
+def _configured_modes():
+    try:
+        overrides = json.loads(os.environ.get("MODEL_ROUTING", "{}"))
+    except ValueError:
+        print("Ignoring invalid MODEL_ROUTING value")
+        return {}
+    return {k: v for k, v in overrides.items() if v in ROUTING_MODES}
+
+
+_modes = _configured_modes()
+
+
+def routing_mode(endpoint):
+    return _modes.get(endpoint, ROUTING_POLICIES.get(endpoint, ('large', None))[0])
+
+
+def streaming_model(endpoint):
+    """
+    Model for a streamed call. Streamed output reaches the client as it is
+    generated and cannot be escalated afterwards, so tiered endpoints stream
+    from the large model.
+    """
+    return SMALL_MODEL if routing_mode(endpoint) == 'small' else LARGE_MODEL
+
+
+def _escalation_reason(content, check):
+    try:
+        data = json.loads(content)
+    except (TypeError, ValueError):
+        return "invalid json"
+    return check(data) if check else None
+
+
+def routed_completion(endpoint, client, messages, temperature, max_tokens=None,
+                      response_format=None, bypass_cache=False):
+    """
+    chat_completion with the model chosen by the endpoint's routing policy
+    """
+    mode = routing_mode(endpoint)
+    check = ROUTING_POLICIES.get(endpoint, (None, None))[1]
+
+    with span('llm_route', routedEndpoint=endpoint, mode=mode) as attrs:
+        reason = None
+        if mode in ('small', 'tiered'):
+            try:
+                content = chat_completion(
+                    client, SMALL_MODEL, messages, temperature, max_tokens=max_tokens,
+                    response_format=response_format, bypass_cache=bypass_cache
+                )
+                reason = _escalation_reason(content, check) if mode == 'tiered' else None
+            except Exception as e:
+                if mode == 'small':
+                    raise
+                reason = f"error: {type(e).__name__}"
+
+            attrs['escalated'] = reason is not None
+            if reason is None:
+                return content
+            attrs['reason'] = reason
+            print(f"Router [{endpoint}]: escalating to {LARGE_MODEL} ({reason})")
+            with span('llm_escalation', routedEndpoint=endpoint, reason=reason):
+                return chat_completion(
+                    client, LARGE_MODEL, messages, temperature, max_tokens=max_tokens,
+                    response_format=response_format, bypass_cache=bypass_cache
+                )
+
+        return chat_completion(
+            client, LARGE_MODEL, messages, temperature, max_tokens=max_tokens,
+            response_format=response_format, bypass_cache=bypass_cache
+        )
@@ -0,0 +1,240 @@
+import os
+import gzip
+import hashlib
+import tempfile
+import threading
+
+# Content-addressed cache for LlamaParse output, per document and per page.
+# Tier 1: local on-disk LRU (per instance, lives in /tmp on Cloud Functions)
+# Tier 2: durable Firebase Storage objects shared by every instance
+
+PARSE_CACHE_DIR = os.environ.get(
+    "PARSE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "parse-cache")
+)
+PARSE_CACHE_MAX_BYTES = int(os.environ.get("PARSE_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+PARSE_CACHE_STORAGE_PREFIX = "parse-cache/"
+
+# Bump when the way parsed text is produced changes so old artifacts are ignored
+PARSE_CACHE_VERSION = 1
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def compute_file_sha256(file_path):
+    """
+    Compute the SHA-256 hex digest of a file without loading it into memory
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_parse_cache_key(content_sha256, language, split_by_page, extractor=None):
+    """
+    Build the cache key from the PDF content hash and the parser settings.
+    extractor names a non-default extraction pipeline (None = LlamaParse only,
+    which keeps the keys of existing artifacts unchanged).
+    """
+    settings = f"v{PARSE_CACHE_VERSION}|lang={language}|split_by_page={bool(split_by_page)}"
+    if extractor:
+        settings += f"|extractor={extractor}"
+    settings_hash = hashlib.sha256(settings.encode("utf-8")).hexdigest()[:16]
+    return f"{content_sha256}-{settings_hash}"
+
+
+def make_page_cache_key(page_sha256, language):
+    """
+    Cache key for the parsed text of a single page (see pdf_text.page_hash)
+    """
+    settings = f"v{PARSE_CACHE_VERSION}|lang={language}|page"
+    settings_hash = hashlib.sha256(settings.encode("utf-8")).hexdigest()[:16]
+    return f"page-{page_sha256}-{settings_hash}"
+
+
+class ParseCache:
+    """
+    Two-tier parse artifact cache keyed by make_parse_cache_key()
+    """
+
+    def __init__(self, bucket=None, cache_dir=PARSE_CACHE_DIR, max_bytes=PARSE_CACHE_MAX_BYTES,
+                 bucket_factory=None):
+        self._bucket = bucket
+        self._bucket_factory = bucket_factory
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats = {
+            'localHits': 0,
+            'durableHits': 0,
+            'misses': 0,
+            'writes': 0,
+            'charsServed': 0,
+            'parseSecondsSpent': 0.0,
+        }
+
+    # ---- local tier -------------------------------------------------------
+
+    def _local_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.txt.gz")
+
+    def _get_local(self, key):
+        path = self._local_path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # Touch the file so mtime tracks recency for LRU eviction
+            os.utime(path, None)
+            return gzip.decompress(data).decode("utf-8")
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Parse cache: dropping unreadable local entry {key}: {str(e)}")
+            self._remove_local(path)
+            return None
+
+    def _put_local(self, key, compressed):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._local_path(key)
+        # Write atomically so concurrent readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(compressed)
+            os.replace(tmp_path, path)
+        except Exception:
+            self._remove_local(tmp_path)
+            raise
+        self._evict_local()
+
+    def _evict_local(self):
+        """
+        Remove least recently used entries until the tier fits in max_bytes
+        """
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".txt.gz"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+
+        if total <= self.max_bytes:
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove_local(path)
+            total -= size
+
+    @staticmethod
+    def _remove_local(path):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    # ---- durable tier -----------------------------------------------------
+
+    @property
+    def bucket(self):
+        # Resolved on first use so building the cache never creates a client
+        if self._bucket is None and self._bucket_factory is not None:
+            self._bucket = self._bucket_factory()
+        return self._bucket
+
+    def _blob(self, key):
+        return self.bucket.blob(f"{PARSE_CACHE_STORAGE_PREFIX}{key}.txt.gz")
+
+    def _get_durable(self, key):
+        if self.bucket is None:
+            return None
+        from google.api_core.exceptions import NotFound
+        try:
+            return self._blob(key).download_as_bytes()
+        except NotFound:
+            return None
+        except Exception as e:
+            print(f"Parse cache: durable tier read failed for {key}: {str(e)}")
+            return None
+
+    def _put_durable(self, key, compressed):
+        if self.bucket is None:
+            return
+        try:
+            self._blob(key).upload_from_string(compressed, content_type="application/gzip")
+        except Exception as e:
+            # The durable tier is an optimization; never fail the parse because of it
+            print(f"Parse cache: durable tier write failed for {key}: {str(e)}")
+
+    # ---- public API -------------------------------------------------------
+
+    def get(self, key):
+        """
+        Return cached parsed text for key, or None on a miss
+        """
+        text = self._get_local(key)
+        if text is not None:
+            self._record('localHits', text)
+            return text
+
+        compressed = self._get_durable(key)
+        if compressed is not None:
+            text = gzip.decompress(compressed).decode("utf-8")
+            try:
+                self._put_local(key, compressed)
+            except Exception as e:
+                print(f"Parse cache: local backfill failed for {key}: {str(e)}")
+            self._record('durableHits', text)
+            return text
+
+        with self._lock:
+            self._stats['misses'] += 1
+        return None
+
+    def put(self, key, text, parse_seconds=None):
+        """
+        Store parsed text in both tiers
+        """
+        compressed = gzip.compress(text.encode("utf-8"))
+        try:
+            self._put_local(key, compressed)
+        except Exception as e:
+            print(f"Parse cache: local write failed for {key}: {str(e)}")
+        self._put_durable(key, compressed)
+        with self._lock:
+            self._stats['writes'] += 1
+            if parse_seconds is not None:
+                self._stats['parseSecondsSpent'] += parse_seconds
+
+    def _record(self, counter, text):
+        with self._lock:
+            self._stats[counter] += 1
+            self._stats['charsServed'] += len(text)
+
+    def stats(self):
+        """
+        Hit/miss counters plus an estimate of the LlamaParse time saved
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        hits = stats['localHits'] + stats['durableHits']
+        lookups = hits + stats['misses']
+        avg_parse_seconds = (
+            stats['parseSecondsSpent'] / stats['writes'] if stats['writes'] else 0.0
+        )
+        stats['hits'] = hits
+        stats['hitRate'] = round(hits / lookups, 4) if lookups else 0.0
+        stats['llamaParseCallsSaved'] = hits
+        stats['estimatedSecondsSaved'] = round(hits * avg_parse_seconds, 2)
+        stats['parseSecondsSpent'] = round(stats['parseSecondsSpent'], 2)
+        return stats
+
@@ -0,0 +1,140 @@
+import io
+import os
+import hashlib
+import tempfile
+from clients import get_http_session, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT
+
+# Streaming PDF fetch: one request per download, chunks are hashed while being
+# written to a spooled buffer (memory below the threshold, temp file above).
+
+PDF_MAX_BYTES = int(os.environ.get("PDF_MAX_BYTES", 50 * 1024 * 1024))
+PDF_SPOOL_MAX_MEMORY_BYTES = int(os.environ.get("PDF_SPOOL_MAX_MEMORY_BYTES", 8 * 1024 * 1024))
+PDF_FETCH_CHUNK_BYTES = 256 * 1024
+PDF_FETCH_TIMEOUT = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+
+
+class PdfNotFoundError(ValueError):
+    """
+    Raised when the PDF object or URL does not exist (HTTP 404)
+    """
+
+
+class PdfTooLargeError(ValueError):
+    """
+    Raised when the PDF exceeds PDF_MAX_BYTES
+    """
+
+
+class FetchedPdf:
+    """
+    Spooled, hashed PDF body. Acts as a writable stream while downloading.
+    """
+
+    def __init__(self, source, max_bytes=PDF_MAX_BYTES, max_memory_bytes=PDF_SPOOL_MAX_MEMORY_BYTES):
+        self.source = source
+        self.max_bytes = max_bytes
+        self.max_memory_bytes = max_memory_bytes
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._file = io.BytesIO()
+        self._path = None
+
+    # ---- stream interface used by blob.download_to_file / iter_content ----
+
+    def write(self, data):
+        if not data:
+            return 0
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise PdfTooLargeError(
+                f"PDF exceeds maximum size of {self.max_bytes} bytes: {self.source}"
+            )
+        self._digest.update(data)
+        if self._path is None and self.size > self.max_memory_bytes:
+            self._rollover()
+        return self._file.write(data)
+
+    def flush(self):
+        self._file.flush()
+
+    def _rollover(self):
+        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
+        temp_file.write(self._file.getvalue())
+        self._file = temp_file
+        self._path = temp_file.name
+
+    # ---- consumer side ----------------------------------------------------
+
+    @property
+    def sha256(self):
+        return self._digest.hexdigest()
+
+    @property
+    def path(self):
+        """
+        Temp file path when the body spilled to disk, otherwise None
+        """
+        return self._path
+
+    def parser_input(self):
+        """
+        Input for LlamaParse: the temp file path, or the in-memory buffer
+        """
+        self._file.flush()
+        if self._path:
+            return self._path
+        self._file.seek(0)
+        return self._file
+
+    def close(self):
+        try:
+            self._file.close()
+        finally:
+            if self._path and os.path.exists(self._path):
+                os.unlink(self._path)
+            self._path = None
+
+
+def fetch_blob(bucket, object_path, max_bytes=PDF_MAX_BYTES):
+    """
+    Download a Storage object in a single request; 404 raises PdfNotFoundError
+    """
+    from google.api_core.exceptions import NotFound
+
+    pdf = FetchedPdf(f"gs://{bucket.name}/{object_path}", max_bytes=max_bytes)
+    try:
+        bucket.blob(object_path).download_to_file(pdf)
+    except NotFound:
+        pdf.close()
+        raise PdfNotFoundError(f"File does not exist in storage: {object_path}")
+    except Exception:
+        pdf.close()
+        raise
+    return pdf
+
+
+def fetch_url(url, max_bytes=PDF_MAX_BYTES, session=None):
+    """
+    Stream a PDF from an HTTP(S) URL; 404 raises PdfNotFoundError
+    """
+    http = session or get_http_session()
+    pdf = FetchedPdf(url, max_bytes=max_bytes)
+    try:
+        with http.get(url, stream=True, timeout=PDF_FETCH_TIMEOUT) as response:
+            if response.status_code == 404:
+                raise PdfNotFoundError(f"PDF not found at URL: {url}")
+            if response.status_code != 200:
+                raise ValueError(f"Direct download failed with status: {response.status_code}")
+
+            content_length = response.headers.get('Content-Length')
+            if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+                raise PdfTooLargeError(
+                    f"PDF exceeds maximum size of {max_bytes} bytes: {url}"
+                )
+
+            for chunk in response.iter_content(chunk_size=PDF_FETCH_CHUNK_BYTES):
+                pdf.write(chunk)
+    except Exception:
+        pdf.close()
+        raise
+    return pdf
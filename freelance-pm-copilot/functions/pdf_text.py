@@ -0,0 +1,125 @@
+import io
+import os
+import re
+import hashlib
+
+# Local text extraction for born-digital PDFs (pypdf).
+# Pages whose extracted text is too short or looks garbled (scans, broken font
+# encodings) are reported as weak so only those go to LlamaParse.
+# page_hash identifies a page by what is drawn on it, so the unchanged pages
+# of a revised contract match the parse artifacts of the previous version.
+
+PDF_LOCAL_EXTRACTION = os.environ.get("PDF_LOCAL_EXTRACTION", "true").lower() == "true"
+# A page needs at least this many non-whitespace characters...
+PDF_MIN_PAGE_CHARS = int(os.environ.get("PDF_MIN_PAGE_CHARS", 200))
+# ...and this quality score (0-1, see page_quality) to skip LlamaParse
+PDF_MIN_PAGE_QUALITY = float(os.environ.get("PDF_MIN_PAGE_QUALITY", 0.7))
+
+_CID_RE = re.compile(r"\(cid:\d+\)")
+_WORD_RE = re.compile(r"[(\"'“‘]*[^\W\d_]+(?:['’-][^\W\d_]+)*[.,;:!?)\"'”’%]*")
+_PUNCTUATION = set(".,;:!?()[]{}\"'%/-–—*&@#$€₺+=<>_’“”")
+
+
+def extract_pages(source):
+    """
+    Text of every page as (reader, [page text]), or (None, None) when pypdf is
+    not installed or cannot read the file. source is a path or a binary stream;
+    a stream is rewound afterwards so it can still be uploaded.
+    """
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        print("pypdf not installed, local PDF extraction disabled")
+        return None, None
+
+    position = None if isinstance(source, str) else source.tell()
+    try:
+        reader = PdfReader(source)
+        if reader.is_encrypted:
+            reader.decrypt("")
+        return reader, [page.extract_text() or "" for page in reader.pages]
+    except Exception as e:
+        print(f"Local PDF extraction failed: {str(e)}")
+        return None, None
+    finally:
+        if position is not None:
+            source.seek(position)
+
+
+def page_quality(text):
+    """
+    0-1 score: the lower of the share of sane characters (no replacement
+    characters or (cid:N) glyph codes) and the share of tokens containing
+    letters that read as words
+    """
+    text = text.strip()
+    if not text:
+        return 0.0
+    bad = text.count("\ufffd") + sum(len(m) for m in _CID_RE.findall(text))
+    sane = sum(1 for ch in text if ch.isalnum() or ch.isspace() or ch in _PUNCTUATION)
+    char_ratio = max(0.0, sane - bad) / len(text)
+
+    tokens = [t for t in text.split() if any(ch.isalpha() for ch in t)]
+    word_ratio = sum(1 for t in tokens if _WORD_RE.fullmatch(t)) / len(tokens) if tokens else 0.0
+    return round(min(char_ratio, word_ratio), 3)
+
+
+def weak_pages(pages, min_chars=PDF_MIN_PAGE_CHARS, min_quality=PDF_MIN_PAGE_QUALITY):
+    """
+    Indexes of pages that need OCR / LlamaParse
+    """
+    return [
+        index for index, text in enumerate(pages)
+        if len("".join(text.split())) < min_chars or page_quality(text) < min_quality
+    ]
+
+
+def single_page_pdfs(reader, indexes):
+    """
+    One in-memory PDF per requested page, for parsing weak pages on their own
+    """
+    from pypdf import PdfWriter
+
+    documents = []
+    for index in indexes:
+        writer = PdfWriter()
+        writer.add_page(reader.pages[index])
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        buffer.seek(0)
+        documents.append(buffer)
+    return documents
+
+
+def page_hash(page):
+    """
+    SHA-256 of a page's content stream, the images and forms it draws and its
+    fonts; independent of object numbering, so it survives re-exports
+    """
+    digest = hashlib.sha256()
+    digest.update(str(page.get('/Rotate', 0)).encode())
+    contents = page.get_contents()
+    if contents is not None:
+        digest.update(contents.get_data())
+    _hash_resources(page.get('/Resources'), digest)
+    return digest.hexdigest()
+
+
+def _hash_resources(resources, digest, depth=0):
+    resources = resources.get_object() if resources is not None else None
+    if not resources or depth > 3:
+        return
+    fonts = resources.get('/Font')
+    for name, font in sorted((fonts.get_object() if fonts else {}).items()):
+        font = font.get_object()
+        digest.update(f"{name}:{font.get('/BaseFont')}".encode())
+        to_unicode = font.get('/ToUnicode')
+        if to_unicode is not None:
+            digest.update(to_unicode.get_object().get_data())
+    xobjects = resources.get('/XObject')
+    for name, xobject in sorted((xobjects.get_object() if xobjects else {}).items()):
+        xobject = xobject.get_object()
+        digest.update(name.encode())
+        digest.update(xobject.get_data())
+        if xobject.get('/Subtype') == '/Form':
+            _hash_resources(xobject.get('/Resources'), digest, depth + 1)
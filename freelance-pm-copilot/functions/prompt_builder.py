@@ -0,0 +1,181 @@
+import os
+import json
+
+# Token-aware prompt construction shared by every Groq call site.
+# Inputs are serialized compactly, checked against a per-endpoint input
+# budget (dropping low-value fields first, then truncating long text, then
+# dropping trailing records) and max_tokens is sized from the expected output.
+#
+# System prompts are module-level constants and must stay byte-identical
+# between calls: anything request-specific belongs in the user prompt, so the
+# provider can reuse the cached prompt prefix.
+
+# Rough estimate without a tokenizer dependency. Llama tokenizers average
+# ~4 chars/token on English and fewer on Turkish; 3.2 errs on the safe side.
+CHARS_PER_TOKEN = float(os.environ.get("PROMPT_CHARS_PER_TOKEN", 3.2))
+TRUNCATED_TEXT_CHARS = 160
+MAX_TOKENS_STEP = 256
+
+# Per-endpoint input budget and output sizing:
+# max_tokens = base + per_item * expected items (+ input_ratio * input tokens), capped
+PROMPT_BUDGETS = {
+    # Analyses of short contracts can still be long; always allow the full 8192
+    'contract_analysis': {'input': 24000, 'base': 8192, 'per_item': 0, 'input_ratio': 0, 'cap': 8192},
+    'contract_analysis_legacy': {'input': 24000, 'base': 1024, 'per_item': 0, 'input_ratio': 0.15, 'cap': 4096},
+    'task_generation': {'input': 6000, 'base': 512, 'per_item': 900, 'input_ratio': 0, 'cap': 8192},
+    'sprint_plan': {'input': 6000, 'base': 256, 'per_item': 220, 'input_ratio': 0, 'cap': 4096},
+    'sprint_rationale': {'input': 12000, 'base': 128, 'per_item': 40, 'input_ratio': 0, 'cap': 4096},
+    'change_order': {'input': 4000, 'base': 1280, 'per_item': 0, 'input_ratio': 0, 'cap': 2048},
+}
+
+
+def estimate_tokens(text):
+    """
+    Approximate token count of a prompt string
+    """
+    if not text:
+        return 0
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+
+def compact_json(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def _clean(record, fields):
+    """
+    Keep only the listed fields, dropping empty values
+    """
+    if not isinstance(record, dict):
+        return record
+    kept = {}
+    for field in fields or record.keys():
+        value = record.get(field)
+        if value not in (None, '', [], {}):
+            kept[field] = value
+    return kept
+
+
+def _truncate(record, limit):
+    truncated = {}
+    for key, value in record.items():
+        if isinstance(value, str) and len(value) > limit:
+            value = value[:limit].rstrip() + "…"
+        truncated[key] = value
+    return truncated
+
+
+class PromptSection:
+    """
+    A list of records rendered into the user prompt.
+
+    fields: fields to keep, in output order (None keeps all)
+    drop: fields removed first, in order, when the prompt is over budget
+    """
+
+    def __init__(self, name, records, fields=None, drop=()):
+        self.name = name
+        self.original = list(records or [])
+        self.fields = fields
+        self.drop = list(drop)
+        self.records = [_clean(r, fields) for r in self.original]
+
+    def render(self):
+        return compact_json(self.records)
+
+    def baseline(self):
+        # What the call sites used to send: every field, indent=2
+        return json.dumps(self.original, ensure_ascii=False, indent=2)
+
+
+def build_prompt(endpoint, template, sections, expected_items=0, **values):
+    """
+    Render template with compact sections that fit the endpoint's input budget.
+    Returns (user_prompt, max_tokens).
+
+    template is a str.format template; each section is available under its
+    name and plain values are passed as keyword arguments.
+    """
+    budget = PROMPT_BUDGETS[endpoint]
+
+    def render():
+        rendered = {section.name: section.render() for section in sections}
+        return template.format(**rendered, **values)
+
+    prompt = render()
+    trimmed = []
+
+    # 1. Drop low-value fields, one field at a time across all sections
+    drop_rounds = max([len(s.drop) for s in sections] or [0])
+    for round_index in range(drop_rounds):
+        if estimate_tokens(prompt) <= budget['input']:
+            break
+        for section in sections:
+            if round_index < len(section.drop):
+                field = section.drop[round_index]
+                section.records = [
+                    {k: v for k, v in r.items() if k != field} if isinstance(r, dict) else r
+                    for r in section.records
+                ]
+                trimmed.append(f"{section.name}.{field}")
+        prompt = render()
+
+    # 2. Truncate long strings
+    if estimate_tokens(prompt) > budget['input']:
+        for section in sections:
+            section.records = [
+                _truncate(r, TRUNCATED_TEXT_CHARS) if isinstance(r, dict) else r for r in section.records
+            ]
+        trimmed.append("truncated text")
+        prompt = render()
+
+    # 3. Drop trailing records from the largest section
+    while estimate_tokens(prompt) > budget['input']:
+        largest = max(sections, key=lambda s: len(s.render()), default=None)
+        if largest is None or not largest.records:
+            break
+        largest.records.pop()
+        trimmed.append(f"{largest.name}[-1]")
+        prompt = render()
+
+    prompt_tokens = estimate_tokens(prompt)
+    baseline_tokens = estimate_tokens(template.format(
+        **{section.name: section.baseline() for section in sections}, **values
+    ))
+    max_tokens = size_max_tokens(endpoint, expected_items, prompt_tokens)
+    log_prompt_stats(endpoint, prompt_tokens, baseline_tokens, max_tokens, trimmed)
+    return prompt, max_tokens
+
+
+def size_max_tokens(endpoint, expected_items=0, input_tokens=0):
+    """
+    Output budget from the expected result size, rounded up to MAX_TOKENS_STEP
+    """
+    budget = PROMPT_BUDGETS[endpoint]
+    estimate = budget['base'] + budget['per_item'] * expected_items + budget['input_ratio'] * input_tokens
+    rounded = int(-(-estimate // MAX_TOKENS_STEP) * MAX_TOKENS_STEP)
+    return max(MAX_TOKENS_STEP, min(budget['cap'], rounded))
+
+
+def log_prompt_stats(endpoint, prompt_tokens, baseline_tokens=None, max_tokens=None, trimmed=None):
+    baseline_tokens = baseline_tokens if baseline_tokens is not None else prompt_tokens
+    saved = baseline_tokens - prompt_tokens
+    message = (f"Prompt [{endpoint}]: ~{prompt_tokens} input tokens "
+               f"(saved ~{saved} vs uncompacted), max_tokens={max_tokens}")
+    if trimmed:
+        message += f", trimmed: {', '.join(dict.fromkeys(trimmed))}"
+    print(message)
+
+
+def text_prompt(endpoint, prompt):
+    """
+    Budget check and output sizing for prompts built around raw text (contract
+    bodies), which are never trimmed here. Returns max_tokens.
+    """
+    prompt_tokens = estimate_tokens(prompt)
+    if prompt_tokens > PROMPT_BUDGETS[endpoint]['input']:
+        print(f"Prompt [{endpoint}]: ~{prompt_tokens} input tokens exceeds the "
+              f"{PROMPT_BUDGETS[endpoint]['input']} budget; use chunked analysis")
+    max_tokens = size_max_tokens(endpoint, input_tokens=prompt_tokens)
+    log_prompt_stats(endpoint, prompt_tokens, max_tokens=max_tokens)
+    return max_tokens
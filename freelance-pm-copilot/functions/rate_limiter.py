@@ -0,0 +1,363 @@
+import os
+import json
+import time
+import random
+import threading
+from prompt_builder import estimate_tokens, CHARS_PER_TOKEN
+from tracing import annotate
+
+# Process-wide Groq rate limiting shared by every chat completion.
+# Each model gets a request bucket (RPM), a token bucket (TPM) and an adaptive
+# concurrency limit: a full window of successes raises the limit by one slot,
+# every 429 halves it and pauses the model for the server's retry-after (AIMD).
+# Rate-limited, 5xx and connection errors are retried with jittered backoff.
+#
+# With GROQ_LIMITER_SHARED=true a 429 is also published to
+# groqRateLimits/{model} in Firestore, so every instance backs off together.
+# Instances only write on a 429 and read the document every few seconds;
+# Firestore is not on the per-call path.
+
+GROQ_DEFAULT_RPM = float(os.environ.get("GROQ_REQUESTS_PER_MINUTE", 30))
+GROQ_DEFAULT_TPM = float(os.environ.get("GROQ_TOKENS_PER_MINUTE", 60000))
+# Per-model overrides, e.g. '{"llama-3.1-8b-instant": {"rpm": 30, "tpm": 120000}}'
+GROQ_MODEL_LIMITS = os.environ.get("GROQ_MODEL_LIMITS", "{}")
+GROQ_MAX_CONCURRENCY = int(os.environ.get("GROQ_MAX_CONCURRENCY", 16))
+GROQ_MAX_RETRIES = int(os.environ.get("GROQ_MAX_RETRIES", 5))
+GROQ_BACKOFF_BASE_SECONDS = float(os.environ.get("GROQ_BACKOFF_BASE_SECONDS", 1.0))
+GROQ_BACKOFF_MAX_SECONDS = float(os.environ.get("GROQ_BACKOFF_MAX_SECONDS", 30.0))
+GROQ_LIMITER_SHARED = os.environ.get("GROQ_LIMITER_SHARED", "false").lower() == "true"
+GROQ_LIMITER_SYNC_SECONDS = float(os.environ.get("GROQ_LIMITER_SYNC_SECONDS", 5.0))
+RATE_LIMITS_COLLECTION = 'groqRateLimits'
+
+RETRYABLE_ERRORS = ('APIConnectionError', 'APITimeoutError')
+
+
+class TokenBucket:
+    """
+    Refills at rate_per_minute up to one minute's worth
+    """
+
+    def __init__(self, rate_per_minute):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(rate_per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """
+        Seconds until amount is available (0 when it is available now)
+        """
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate if self.rate > 0 else GROQ_BACKOFF_MAX_SECONDS
+
+    def take(self, amount):
+        self.tokens -= min(amount, self.capacity)
+
+    def give_back(self, amount):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class ModelLimiter:
+    """
+    RPM and TPM buckets plus an AIMD concurrency limit for one model
+    """
+
+    def __init__(self, model, rpm, tpm, max_concurrency=GROQ_MAX_CONCURRENCY):
+        self.model = model
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_concurrency = max_concurrency
+        self.concurrency = float(max(1, max_concurrency // 2))
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.stats = {'calls': 0, 'rateLimited': 0, 'retries': 0, 'waitSeconds': 0.0}
+        self._condition = threading.Condition()
+
+    def acquire(self, estimated_tokens):
+        """
+        Block until a slot and budget are free; returns the seconds waited
+        """
+        started = time.monotonic()
+        while True:
+            # Refresh the shared pause before taking the condition: a stale
+            # cache means a blocking Firestore read, which must not hold up
+            # release() on other threads
+            shared_backoff.paused_until(self.model)
+            with self._condition:
+                while True:
+                    now = time.monotonic()
+                    paused_until = max(self.paused_until, shared_backoff.cached_paused_until(self.model))
+                    wait = max(
+                        paused_until - now,
+                        self.requests.wait_time(1, now),
+                        self.tokens.wait_time(estimated_tokens, now)
+                    )
+                    if self.in_flight >= int(self.concurrency):
+                        # Woken by release(); the timeout guards against a missed notify
+                        wait = max(wait, 1.0)
+                    elif wait <= 0:
+                        self.requests.take(1)
+                        self.tokens.take(estimated_tokens)
+                        self.in_flight += 1
+                        self.stats['calls'] += 1
+                        waited = time.monotonic() - started
+                        self.stats['waitSeconds'] += waited
+                        return waited
+                    self._condition.wait(timeout=wait)
+                    if shared_backoff.stale(self.model):
+                        break
+
+    def release(self, estimated_tokens, used_tokens=None, rate_limited=False, retry_after=None,
+                failed=False, retrying=False):
+        with self._condition:
+            self.in_flight -= 1
+            if retrying:
+                self.stats['retries'] += 1
+            if used_tokens is not None and used_tokens < estimated_tokens:
+                self.tokens.give_back(estimated_tokens - used_tokens)
+            if rate_limited:
+                self.stats['rateLimited'] += 1
+                self.concurrency = max(1.0, self.concurrency / 2)
+                pause = retry_after if retry_after is not None else GROQ_BACKOFF_BASE_SECONDS
+                self.paused_until = max(self.paused_until, time.monotonic() + pause)
+                print(f"Groq 429 for {self.model}: concurrency -> {int(self.concurrency)}, "
+                      f"pausing {pause:.1f}s")
+            elif not failed:
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1.0 / max(1.0, self.concurrency))
+            self._condition.notify_all()
+        if rate_limited:
+            shared_backoff.publish(self.model, retry_after or GROQ_BACKOFF_BASE_SECONDS)
+
+    def snapshot(self):
+        with self._condition:
+            return dict(self.stats, concurrency=int(self.concurrency), inFlight=self.in_flight,
+                        waitSeconds=round(self.stats['waitSeconds'], 2))
+
+
+class SharedBackoff:
+    """
+    Cross-instance pause on 429s through Firestore (no-op unless enabled)
+    """
+
+    def __init__(self, enabled=GROQ_LIMITER_SHARED, sync_seconds=GROQ_LIMITER_SYNC_SECONDS):
+        self.enabled = enabled
+        self.sync_seconds = sync_seconds
+        self._lock = threading.Lock()
+        self._paused = {}   # model -> monotonic pause end
+        self._synced = {}   # model -> monotonic time of the last read
+
+    def stale(self, model):
+        """
+        Whether the next paused_until(model) call reads Firestore
+        """
+        if not self.enabled:
+            return False
+        with self._lock:
+            return time.monotonic() - self._synced.get(model, float('-inf')) >= self.sync_seconds
+
+    def cached_paused_until(self, model):
+        """
+        The last known pause end, without reading Firestore
+        """
+        with self._lock:
+            return self._paused.get(model, 0.0)
+
+    def paused_until(self, model):
+        if not self.enabled:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            if now - self._synced.get(model, float('-inf')) < self.sync_seconds:
+                return self._paused.get(model, 0.0)
+            self._synced[model] = now
+        try:
+            from clients import get_db
+            snapshot = get_db().collection(RATE_LIMITS_COLLECTION).document(model).get()
+            remaining = (snapshot.to_dict() or {}).get('pausedUntil', 0) - time.time() if snapshot.exists else 0
+        except Exception as e:
+            print(f"Error reading shared Groq backoff: {str(e)}")
+            remaining = 0
+        with self._lock:
+            if remaining > 0:
+                self._paused[model] = max(self._paused.get(model, 0.0), now + remaining)
+            return self._paused.get(model, 0.0)
+
+    def publish(self, model, pause_seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            # One write per pause window is enough
+            if self._paused.get(model, 0.0) > time.monotonic():
+                return
+            self._paused[model] = time.monotonic() + pause_seconds
+        try:
+            from clients import get_db
+            get_db().collection(RATE_LIMITS_COLLECTION).document(model).set({
+                'pausedUntil': time.time() + pause_seconds
+            }, merge=True)
+        except Exception as e:
+            print(f"Error publishing shared Groq backoff: {str(e)}")
+
+
+shared_backoff = SharedBackoff()
+
+_lock = threading.Lock()
+_limiters = {}
+
+
+def _model_limits():
+    try:
+        return json.loads(GROQ_MODEL_LIMITS)
+    except ValueError:
+        print("Ignoring invalid GROQ_MODEL_LIMITS value")
+        return {}
+
+
+def get_limiter(model):
+    with _lock:
+        limiter = _limiters.get(model)
+        if limiter is None:
+            limits = _model_limits().get(model, {})
+            limiter = ModelLimiter(
+                model,
+                rpm=float(limits.get('rpm', GROQ_DEFAULT_RPM)),
+                tpm=float(limits.get('tpm', GROQ_DEFAULT_TPM))
+            )
+            _limiters[model] = limiter
+        return limiter
+
+
+def _annotate_call(limiter, queued, attempt, rate_limited):
+    # Limiter state at the time of the call, on the caller's llm span
+    annotate(queueMs=round(queued * 1000, 1), retries=attempt, rateLimited=rate_limited,
+             concurrencyLimit=limiter.snapshot()['concurrency'])
+
+
+def estimate_request_tokens(request_kwargs):
+    """
+    Prompt tokens plus the completion budget, which is what Groq counts
+    against the TPM limit up front
+    """
+    prompt = sum(estimate_tokens(m.get('content') or '') for m in request_kwargs.get('messages', []))
+    return prompt + (request_kwargs.get('max_tokens') or 1024)
+
+
+def _status_code(error):
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status
+
+
+def _retry_after(error):
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        if headers.get('retry-after'):
+            return float(headers['retry-after'])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def _backoff(attempt, retry_after=None):
+    # Full jitter, but never earlier than the server asked for
+    delay = random.uniform(0, min(GROQ_BACKOFF_MAX_SECONDS, GROQ_BACKOFF_BASE_SECONDS * 2 ** attempt))
+    return max(delay, retry_after or 0.0)
+
+
+def rate_limited_call(model, request_kwargs, call, usage_of=None, max_retries=GROQ_MAX_RETRIES):
+    """
+    Run call() under the model's limiter, retrying 429, 5xx and connection
+    errors with jittered backoff. usage_of(result) may return the tokens
+    actually used so an over-estimate is credited back.
+    """
+    limiter = get_limiter(model)
+    estimated = estimate_request_tokens(request_kwargs)
+    queued = 0.0
+    rate_limited_count = 0
+
+    for attempt in range(max_retries + 1):
+        queued += limiter.acquire(estimated)
+        _annotate_call(limiter, queued, attempt, rate_limited_count)
+        try:
+            result = call()
+        except Exception as e:
+            status = _status_code(e)
+            rate_limited = status == 429
+            rate_limited_count += rate_limited
+            retryable = rate_limited or (status is not None and status >= 500) or type(e).__name__ in RETRYABLE_ERRORS
+            retry_after = _retry_after(e)
+            will_retry = retryable and attempt < max_retries
+            limiter.release(estimated, rate_limited=rate_limited, retry_after=retry_after,
+                            failed=True, retrying=will_retry)
+            if not will_retry:
+                raise
+            delay = _backoff(attempt, retry_after)
+            print(f"Groq call failed ({status or type(e).__name__}), retry {attempt + 1}/{max_retries} in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+
+        used = None
+        if usage_of:
+            try:
+                used = usage_of(result)
+            except Exception:
+                used = None
+        limiter.release(estimated, used_tokens=used)
+        return result
+
+
+def rate_limited_stream(model, request_kwargs, create, max_retries=GROQ_MAX_RETRIES):
+    """
+    Yield the chunks of a streamed completion, holding a limiter slot until the
+    stream ends. Only failures before the first chunk are retried; a stream
+    that already reached the client cannot be replayed.
+    """
+    limiter = get_limiter(model)
+    estimated = estimate_request_tokens(request_kwargs)
+    queued = 0.0
+    rate_limited_count = 0
+
+    for attempt in range(max_retries + 1):
+        queued += limiter.acquire(estimated)
+        _annotate_call(limiter, queued, attempt, rate_limited_count)
+        streamed_chars = 0
+        yielded = False
+        released = False
+        try:
+            for chunk in create():
+                for choice in chunk.choices or []:
+                    streamed_chars += len(choice.delta.content or '')
+                yielded = True
+                yield chunk
+        except Exception as e:
+            status = _status_code(e)
+            rate_limited = status == 429
+            rate_limited_count += rate_limited
+            retryable = rate_limited or (status is not None and status >= 500) or type(e).__name__ in RETRYABLE_ERRORS
+            retry_after = _retry_after(e)
+            will_retry = retryable and attempt < max_retries and not yielded
+            released = True
+            limiter.release(estimated, rate_limited=rate_limited, retry_after=retry_after,
+                            failed=True, retrying=will_retry)
+            if not will_retry:
+                raise
+            delay = _backoff(attempt, retry_after)
+            print(f"Groq stream failed ({status or type(e).__name__}), retry {attempt + 1}/{max_retries} in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+        finally:
+            # Also runs on GeneratorExit when the client goes away mid-stream
+            if not released:
+                prompt = estimated - (request_kwargs.get('max_tokens') or 1024)
+                limiter.release(estimated, used_tokens=prompt + int(streamed_chars / CHARS_PER_TOKEN) + 1)
+        return
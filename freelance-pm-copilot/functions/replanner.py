@@ -0,0 +1,421 @@
+import os
+import copy
+import gzip
+import json
+import time
+import hashlib
+from datetime import date, timedelta
+from firebase_admin import firestore
+from clients import get_bucket, get_db
+from tracing import span
+from firestore_batch import BatchWriter
+from sprint_scheduler import schedule_sprints, sprint_capacity, MAX_SPRINTS
+from timeline_forecast import forecast_plan
+from dependency_index import DONE_STATUSES
+
+# Incremental replanning for replanProject.
+# The current plan lives in the latest planVersions document of a project
+# (projects/{projectId}.currentPlanVersionId). A change (vacation, delay,
+# capacity change) marks the tasks it directly disturbs; those tasks and
+# everything downstream of them in the dependsOn graph are rescheduled, and
+# every other task stays pinned to its current sprint and assignee.
+# Tasks and assignees are read from the live tasks and assignments
+# collections, so edits made since the plan was saved are replanned too. A
+# version document keeps the plan, task ids and diff; the task and team
+# snapshot it was planned from goes to Storage to stay clear of the 1 MiB
+# document limit.
+
+PLAN_VERSIONS_COLLECTION = 'planVersions'
+PLAN_SNAPSHOT_PREFIX = os.environ.get("PLAN_SNAPSHOT_PREFIX", "planVersions/")
+# Firestore caps 'in' filters at 30 values
+ASSIGNMENT_QUERY_CHUNK = 30
+CHANGE_TYPES = ('vacation', 'delay', 'capacity')
+WORKDAYS_PER_WEEK = 5
+HOURS_PER_WORKDAY = 8
+
+
+class ReplanError(ValueError):
+    """
+    Invalid replan request (no current plan, unknown change type, bad ids)
+    """
+
+
+def load_current_plan_version(project_id):
+    """
+    Return (version id, version data) for the project's current plan, or (None, None)
+    """
+    db = get_db()
+    with span('firestore_read', collection='projects'):
+        project_doc = db.collection('projects').document(project_id).get()
+    version_id = (project_doc.to_dict() or {}).get('currentPlanVersionId') if project_doc.exists else None
+    if not version_id:
+        return None, None
+    with span('firestore_read', collection=PLAN_VERSIONS_COLLECTION):
+        version_doc = db.collection(PLAN_VERSIONS_COLLECTION).document(version_id).get()
+    if not version_doc.exists:
+        return None, None
+    version = version_doc.to_dict()
+    version['id'] = version_id
+    return version_id, version
+
+
+def store_plan_snapshot(project_id, tasks, team_data):
+    """
+    Upload the tasks and team a plan was made from and return the reference
+    kept on the version document
+    """
+    payload = json.dumps({'tasks': tasks, 'teamData': team_data}, ensure_ascii=False, default=str).encode("utf-8")
+    digest = hashlib.sha256(payload).hexdigest()
+    path = f"{PLAN_SNAPSHOT_PREFIX}{project_id}/{digest[:16]}.json.gz"
+    compressed = gzip.compress(payload)
+    with span('storage_write', bytes=len(compressed)):
+        get_bucket().blob(path).upload_from_string(compressed, content_type="application/gzip")
+    return {'path': path, 'sha256': digest, 'bytes': len(payload)}
+
+
+def load_plan_snapshot(version):
+    """
+    (tasks, teamData) a version was planned from; versions saved before
+    snapshots moved to Storage keep them inline
+    """
+    snapshot = version.get('snapshot')
+    if not snapshot:
+        return version.get('tasks') or [], version.get('teamData') or {}
+    with span('storage_read', path=snapshot['path']):
+        compressed = get_bucket().blob(snapshot['path']).download_as_bytes()
+    data = json.loads(gzip.decompress(compressed).decode("utf-8"))
+    return data.get('tasks') or [], data.get('teamData') or {}
+
+
+def load_live_tasks(project_id):
+    """
+    The project's tasks from the tasks collection, with their document ids
+    """
+    query = get_db().collection('tasks').where('projectId', '==', project_id)
+    with span('firestore_read', collection='tasks'):
+        snapshots = list(query.stream())
+    tasks = []
+    for snapshot in snapshots:
+        task = snapshot.to_dict() or {}
+        task['id'] = snapshot.id
+        tasks.append(task)
+    return tasks
+
+
+def load_live_assignments(task_ids):
+    """
+    taskId -> its most recent assignment from the assignments collection
+    """
+    task_ids = list(task_ids)
+    latest = {}
+    for i in range(0, len(task_ids), ASSIGNMENT_QUERY_CHUNK):
+        chunk = task_ids[i:i + ASSIGNMENT_QUERY_CHUNK]
+        query = get_db().collection('assignments').where('taskId', 'in', chunk)
+        with span('firestore_read', collection='assignments'):
+            snapshots = list(query.stream())
+        for snapshot in snapshots:
+            assignment = snapshot.to_dict() or {}
+            task_id = str(assignment.get('taskId'))
+            current = latest.get(task_id)
+            if current is None or str(assignment.get('assignedAt') or '') >= str(current.get('assignedAt') or ''):
+                latest[task_id] = assignment
+    return latest
+
+
+def merge_live_state(snapshot_tasks, live_tasks, placed, assignments):
+    """
+    Tasks to replan and their placements, brought up to date with the live
+    collections. Live task fields win over the snapshot; tasks only in the
+    snapshot are kept (plans can be made from tasks that were never stored).
+    A live assignment moves a placed task to its person. Returns (tasks, done
+    task ids).
+    """
+    tasks_by_id = {}
+    for index, task in enumerate(snapshot_tasks):
+        tasks_by_id[_task_id(task, index)] = dict(task)
+    for task in live_tasks:
+        task_id = str(task['id'])
+        tasks_by_id[task_id] = dict(tasks_by_id.get(task_id, {}), **task)
+
+    done = {task_id for task_id, task in tasks_by_id.items() if task.get('status') in DONE_STATUSES}
+    for task_id, assignment in assignments.items():
+        if task_id in placed and assignment.get('personId'):
+            placed[task_id]['assignedTo'] = assignment['personId']
+            if assignment.get('personName'):
+                placed[task_id]['assignedToName'] = assignment['personName']
+    return list(tasks_by_id.values()), done
+
+
+def save_plan_version(project_id, sprint_plan, tasks, team_data, sprint_duration_weeks, start_date,
+                      change_reason, previous=None, diff=None, contract_id=None, created_by=None):
+    """
+    Write a new planVersions document and point the project at it, atomically
+    """
+    previous = previous or {}
+    if diff is None and previous.get('plan'):
+        diff = diff_plans(previous['plan'], sprint_plan)
+    snapshot = store_plan_snapshot(project_id, tasks, team_data)
+    writer = BatchWriter()
+    version_ref = writer.new_ref(PLAN_VERSIONS_COLLECTION)
+    version = int(previous.get('version', 0)) + 1
+    writer.set(version_ref, {
+        'projectId': project_id,
+        'contractId': contract_id or previous.get('contractId', ''),
+        'version': version,
+        'previousVersionId': previous.get('id'),
+        'changeReason': change_reason,
+        'diffSummary': (diff or {}).get('summary', 'Initial plan'),
+        'diff': diff,
+        'plan': sprint_plan,
+        'taskIds': [_task_id(task, i) for i, task in enumerate(tasks)],
+        'snapshot': snapshot,
+        'sprintDurationWeeks': sprint_duration_weeks,
+        'startDate': start_date,
+        'createdAt': firestore.SERVER_TIMESTAMP,
+        'createdBy': created_by or ''
+    })
+    writer.set(get_db().collection('projects').document(project_id), {
+        'currentPlanVersionId': version_ref.id,
+        'currentPlanVersion': version,
+        'updatedAt': firestore.SERVER_TIMESTAMP
+    }, merge=True)
+    writer.commit()
+    print(f"Plan version {version} ({version_ref.id}) saved for project {project_id}")
+    return version_ref.id, version
+
+
+def _placements(sprint_plan):
+    """
+    taskId -> scheduled task entry (with sprintNum) for every assigned task
+    """
+    placed = {}
+    for sprint in sprint_plan.get('sprints', []):
+        for task in sprint.get('tasks', []):
+            placed[task['taskId']] = dict(task, sprintNum=sprint['sprintNum'])
+    return placed
+
+
+def _task_id(task, index):
+    return str(task.get('id') or task.get('taskId') or f"task_{index + 1}")
+
+
+def _find_person(team_data, person_id):
+    for person in team_data.get('people') or []:
+        if str(person.get('id')) == str(person_id):
+            return person
+    raise ReplanError(f"Unknown personId: {person_id}")
+
+
+def _workdays_between(start, end):
+    days = 0
+    current = start
+    while current <= end:
+        if current.weekday() < WORKDAYS_PER_WEEK:
+            days += 1
+        current += timedelta(days=1)
+    return days
+
+
+def _overbooked_tasks(placed, person_id, capacity_for_sprint):
+    """
+    Tasks to move so the person fits each sprint's capacity again. The latest
+    tasks in a sprint are moved first; the rest keep their placement.
+    """
+    by_sprint = {}
+    for task in placed.values():
+        if str(task.get('assignedTo')) == str(person_id):
+            by_sprint.setdefault(task['sprintNum'], []).append(task)
+
+    overbooked = set()
+    for sprint_num, sprint_tasks in by_sprint.items():
+        load = sum(t.get('estimatedHours') or 0 for t in sprint_tasks)
+        capacity = capacity_for_sprint(sprint_num)
+        for task in reversed(sprint_tasks):
+            if load <= capacity:
+                break
+            overbooked.add(task['taskId'])
+            load -= task.get('estimatedHours') or 0
+    return overbooked
+
+
+def apply_changes(tasks, team_data, placed, changes, sprint_duration_weeks, start):
+    """
+    Apply availability changes in place and return (capacity_overrides,
+    directly affected task ids)
+    """
+    tasks_by_id = {_task_id(t, i): t for i, t in enumerate(tasks)}
+    capacity_overrides = {}
+    affected = set()
+
+    def base_capacity(person):
+        return sprint_capacity(team_data, person, sprint_duration_weeks)
+
+    for change in changes:
+        change_type = change.get('type')
+        if change_type not in CHANGE_TYPES:
+            raise ReplanError(f"Unknown change type: {change_type}")
+
+        if change_type == 'delay':
+            task = tasks_by_id.get(str(change.get('taskId')))
+            if task is None:
+                raise ReplanError(f"Unknown taskId: {change.get('taskId')}")
+            hours = float(task.get('estimatedHours') or 0)
+            if change.get('estimatedHours') is not None:
+                hours = float(change['estimatedHours'])
+            hours += float(change.get('extraHours') or 0)
+            hours += float(change.get('delayDays') or 0) * HOURS_PER_WORKDAY
+            task['estimatedHours'] = hours
+            affected.add(str(change['taskId']))
+
+        elif change_type == 'capacity':
+            person = _find_person(team_data, change.get('personId'))
+            for field in ('hoursPerWeek', 'currentWorkload'):
+                if change.get(field) is not None:
+                    person[field] = change[field]
+            person_id = str(person['id'])
+            affected |= _overbooked_tasks(
+                placed, person_id,
+                lambda s: capacity_overrides.get((s, person_id), base_capacity(person))
+            )
+
+        elif change_type == 'vacation':
+            person = _find_person(team_data, change.get('personId'))
+            person_id = str(person['id'])
+            if not change.get('startDate'):
+                raise ReplanError("Vacation change requires startDate")
+            off_start = date.fromisoformat(str(change['startDate'])[:10])
+            off_end = date.fromisoformat(str(change.get('endDate') or change['startDate'])[:10])
+            sprint_workdays = sprint_duration_weeks * WORKDAYS_PER_WEEK
+            for sprint_num in range(1, MAX_SPRINTS + 1):
+                sprint_start = start + timedelta(weeks=sprint_duration_weeks * (sprint_num - 1))
+                sprint_end = sprint_start + timedelta(weeks=sprint_duration_weeks) - timedelta(days=1)
+                if sprint_start > off_end:
+                    break
+                overlap = _workdays_between(max(sprint_start, off_start), min(sprint_end, off_end))
+                if overlap:
+                    current = capacity_overrides.get((sprint_num, person_id), base_capacity(person))
+                    reduction = base_capacity(person) * overlap / sprint_workdays
+                    capacity_overrides[(sprint_num, person_id)] = max(0.0, current - reduction)
+            affected |= _overbooked_tasks(
+                placed, person_id,
+                lambda s: capacity_overrides.get((s, person_id), base_capacity(person))
+            )
+
+    return capacity_overrides, affected
+
+
+def downstream_of(task_ids, tasks):
+    """
+    task_ids plus every task that transitively depends on them
+    """
+    dependents = {}
+    for index, task in enumerate(tasks):
+        for dep in task.get('dependsOn') or []:
+            dependents.setdefault(str(dep), []).append(_task_id(task, index))
+
+    closure = set(task_ids)
+    stack = list(task_ids)
+    while stack:
+        for dependent in dependents.get(stack.pop(), []):
+            if dependent not in closure:
+                closure.add(dependent)
+                stack.append(dependent)
+    return closure
+
+
+def diff_plans(old_plan, new_plan):
+    """
+    Per-task placement changes between two plans plus a one-line summary
+    """
+    old_placed = _placements(old_plan)
+    new_placed = _placements(new_plan)
+    moved, reassigned = [], []
+    for task_id, new in new_placed.items():
+        old = old_placed.get(task_id)
+        if not old:
+            continue
+        if old['sprintNum'] != new['sprintNum']:
+            moved.append({'taskId': task_id, 'fromSprint': old['sprintNum'], 'toSprint': new['sprintNum']})
+        if old.get('assignedTo') != new.get('assignedTo'):
+            reassigned.append({'taskId': task_id, 'from': old.get('assignedTo'), 'to': new.get('assignedTo')})
+
+    newly_unassigned = [t for t in old_placed if t not in new_placed]
+    newly_scheduled = [t for t in new_placed if t not in old_placed]
+    old_p50 = (old_plan.get('timeline') or {}).get('p50Days')
+    new_p50 = (new_plan.get('timeline') or {}).get('p50Days')
+    p50_delta = new_p50 - old_p50 if old_p50 is not None and new_p50 is not None else None
+
+    parts = [f"{len(moved)} tasks moved", f"{len(reassigned)} reassigned"]
+    if newly_unassigned:
+        parts.append(f"{len(newly_unassigned)} unassigned")
+    if newly_scheduled:
+        parts.append(f"{len(newly_scheduled)} scheduled")
+    if p50_delta is not None:
+        parts.append(f"p50 {p50_delta:+d} days")
+
+    return {
+        'moved': moved,
+        'reassigned': reassigned,
+        'newlyUnassigned': newly_unassigned,
+        'newlyScheduled': newly_scheduled,
+        'sprintCount': {'before': len(old_plan.get('sprints', [])), 'after': len(new_plan.get('sprints', []))},
+        'p50DaysDelta': p50_delta,
+        'summary': ", ".join(parts)
+    }
+
+
+def replan_project(project_id, changes, change_reason, created_by=None):
+    """
+    Reschedule the parts of the current plan affected by changes and save the
+    result as a new plan version
+    """
+    started = time.monotonic()
+    version_id, current = load_current_plan_version(project_id)
+    if current is None:
+        raise ReplanError(
+            f"No plan version for project {project_id}; generate a smart plan with projectId first"
+        )
+
+    snapshot_tasks, team_data = load_plan_snapshot(current)
+    team_data = copy.deepcopy(team_data)
+    sprint_duration_weeks = current.get('sprintDurationWeeks', 2)
+    start_iso = current.get('startDate') or date.today().isoformat()
+    start = date.fromisoformat(start_iso[:10])
+    old_plan = current.get('plan') or {'sprints': []}
+
+    placed = _placements(old_plan)
+    live_tasks = load_live_tasks(project_id)
+    assignments = load_live_assignments(placed)
+    tasks, done = merge_live_state(snapshot_tasks, live_tasks, placed, assignments)
+    capacity_overrides, affected = apply_changes(
+        tasks, team_data, placed, changes or [], sprint_duration_weeks, start
+    )
+    # Finished work keeps its sprint even when something upstream moves
+    rescheduled = downstream_of(affected, tasks) - done
+    pinned = {task_id: task for task_id, task in placed.items() if task_id not in rescheduled}
+    print(f"Replanning {len(rescheduled)} of {len(tasks)} tasks ({len(pinned)} pinned)")
+
+    new_plan = schedule_sprints(
+        tasks, team_data, sprint_duration_weeks, start_date=start,
+        pinned=pinned, capacity_overrides=capacity_overrides
+    )
+    new_plan['timeline'] = forecast_plan(new_plan, tasks, team_data, start_date=start)
+
+    diff = diff_plans(old_plan, new_plan)
+    diff['rescheduledTasks'] = sorted(rescheduled)
+    new_version_id, version = save_plan_version(
+        project_id, new_plan, tasks, team_data, sprint_duration_weeks, start_iso,
+        change_reason, previous=current, diff=diff, created_by=created_by
+    )
+
+    elapsed_ms = int((time.monotonic() - started) * 1000)
+    print(f"Project {project_id} replanned in {elapsed_ms}ms: {diff['summary']}")
+    return {
+        'projectId': project_id,
+        'planVersionId': new_version_id,
+        'version': version,
+        'newPlan': new_plan,
+        'diff': diff,
+        'diffSummary': diff['summary'],
+        'elapsedMs': elapsed_ms
+    }
@@ -1,132 +1,123 @@
 import os
 import json
-from groq import Groq
 from firebase_admin import firestore
 from dotenv import load_dotenv
+from clients import get_db, get_groq_client
+from model_router import routed_completion
+from llm_client import decode_json_response
+from firestore_batch import BatchWriter
+from sprint_scheduler import schedule_sprints
+from timeline_forecast import forecast_timeline, forecast_plan
+from prompt_builder import build_prompt, PromptSection
+import contract_reader
 
 # Load environment variables
 load_dotenv()
 
-# Initialize clients
-groq_client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
-db = firestore.client()
-
 def get_contract_analysis(contract_id):
     """
-    Get contract analysis from Firestore
+    Get the parts of the contract analysis the sprint planner uses
     """
     try:
-        contract_ref = db.collection('contracts').document(contract_id)
-        contract_doc = contract_ref.get()
-        
-        if not contract_doc.exists:
-            raise ValueError(f"Contract {contract_id} not found")
-        
-        contract_data = contract_doc.to_dict()
-        analysis = contract_data.get('analysis')
-        
-        if not analysis:
-            raise ValueError(f"No analysis found for contract {contract_id}")
-        
-        return analysis
+        return contract_reader.get_contract_analysis(contract_id, contract_reader.SPRINT_ANALYSIS_FIELDS)
         
     except Exception as e:
         print(f"Error getting contract analysis: {str(e)}")
         raise
 
-def generate_smart_sprint_plan(tasks, team_data, sprint_duration_weeks=2):
-    """
-    Generate sprint plan with skill-based assignments using Groq API
-    """
-    try:
-        # Prepare team data with skills and capacity
-        team_context = json.dumps({
-            "people": team_data["people"],
-            "skills": team_data["skills"],
-            "currentWorkload": team_data["workload"]
-        }, ensure_ascii=False)
-        
-        tasks_json = json.dumps(tasks, ensure_ascii=False, indent=2)
-        
-        # Smart sprint planning system prompt
-        SMART_SPRINT_PROMPT = f"""
-Sen, deneyimli bir Agile Scrum Master ve kaynak planlama uzmanısın.
-
-Görevin:
-1. Task'ları skill gereksinimlerine göre analiz et
-2. Ekip üyelerinin skill ve kapasitelerine göre atama yap
-3. Bağımlılıkları ve WIP limitlerini dikkate al
-4. Sprint'leri oluştur ve timeline tahminleri yap
+# Used only to word sprint goals and assignment reasons; the schedule itself
+# comes from sprint_scheduler and is never changed by the model
+RATIONALE_SYSTEM_PROMPT = """
+Sen, deneyimli bir Agile Scrum Master'sın.
+Sana zaten yapılmış bir sprint planı verilecek. Atamaları DEĞİŞTİRME.
+Görevin sadece her sprint için kısa bir hedef cümlesi ve her atama için tek cümlelik bir gerekçe yazmaktır.
 
 Çıktı formatı:
-{{
-  "sprints": [
-    {{
-      "sprintNum": 1,
-      "goal": "Sprint hedefi",
-      "startDate": "2025-01-15",
-      "endDate": "2025-01-29",
-      "tasks": [
-        {{
-          "taskId": "task_1",
-          "title": "Task başlığı",
-          "assignedTo": "person_id",
-          "assignedToName": "Ahmet Yılmaz",
-          "estimatedHours": 16,
-          "requiredSkills": ["Flutter"],
-          "assignmentReason": "5/5 Flutter skill, 20 saat müsait"
-        }}
-      ],
-      "totalCapacity": 160,
-      "totalPlanned": 140,
-      "utilizationRate": 87.5
-    }}
-  ],
-  "timeline": {{
-    "p50Days": 42,
-    "p75Days": 56,
-    "p90Days": 70
-  }},
-  "unassignedTasks": [],
-  "warnings": ["Uyarı mesajları"]
-}}
+{
+  "sprints": [{"sprintNum": 1, "goal": "Sprint hedefi"}],
+  "reasons": {"task_1": "Atama gerekçesi"}
+}
 """
-        
-        # User prompt with tasks and team data
-        USER_PROMPT = f"""
-Lütfen aşağıdaki task'lar ve ekip bilgileri için smart sprint planı oluştur:
 
-Task'lar:
-{tasks_json}
-
-Ekip Bilgileri:
-{team_context}
-
-Talimat: 
-- Task'ları skill gereksinimlerine göre analiz et
-- Ekip üyelerinin skill seviyeleri ve müsaitliklerine göre atama yap
-- Bağımlılıkları dikkate al
-- {sprint_duration_weeks} haftalık sprint'ler oluştur
-- Her atama için gerekçe belirt
-- Timeline tahminleri yap (p50, p75, p90)
+RATIONALE_USER_TEMPLATE = """
+Plan (s: sprint, id: taskId, t: başlık, p: atanan kişi, r: skill/kapasite bilgisi):
+{plan}
 
 Sadece yukarıdaki JSON formatını döndür.
 """
 
-        # Call Groq API
-        completion = groq_client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
+def word_assignment_rationale(sprint_plan, bypass_cache=False):
+    """
+    Ask the LLM to word sprint goals and assignment reasons for a computed plan
+    """
+    try:
+        # Short keys: s=sprint, id=taskId, t=title, p=person, r=computed reason
+        rows = [
+            {'s': sprint['sprintNum'], 'id': t['taskId'], 't': t['title'],
+             'p': t['assignedToName'], 'r': t['assignmentReason']}
+            for sprint in sprint_plan['sprints'] for t in sprint['tasks']
+        ]
+        USER_PROMPT, max_tokens = build_prompt(
+            'sprint_rationale',
+            RATIONALE_USER_TEMPLATE,
+            [PromptSection('plan', rows, drop=['r'])],
+            expected_items=len(rows) + len(sprint_plan['sprints'])
+        )
+        json_string_response = routed_completion(
+            'sprint_rationale',
+            get_groq_client(),
             messages=[
-                {"role": "system", "content": SMART_SPRINT_PROMPT},
+                {"role": "system", "content": RATIONALE_SYSTEM_PROMPT},
                 {"role": "user", "content": USER_PROMPT}
             ],
             temperature=0.2,
-            max_tokens=8192,
-            response_format={"type": "json_object"}
+            max_tokens=max_tokens,
+            response_format={"type": "json_object"},
+            bypass_cache=bypass_cache
         )
-        
-        json_string_response = completion.choices[0].message.content
-        sprint_plan_data = json.loads(json_string_response)
+        wording = decode_json_response(json_string_response)
+
+        goals = {s.get("sprintNum"): s.get("goal") for s in wording.get("sprints", []) if isinstance(s, dict)}
+        reasons = wording.get("reasons") or {}
+        for sprint in sprint_plan["sprints"]:
+            if goals.get(sprint["sprintNum"]):
+                sprint["goal"] = goals[sprint["sprintNum"]]
+            for task in sprint["tasks"]:
+                if reasons.get(task["taskId"]):
+                    # Keep the computed facts next to the model's wording
+                    task["assignmentReason"] = f"{reasons[task['taskId']]} ({task['assignmentReason']})"
+        return sprint_plan
+
+    except Exception as e:
+        # Wording is cosmetic: fall back to the deterministic reasons
+        print(f"Error wording assignment rationale, keeping computed reasons: {str(e)}")
+        sprint_plan.setdefault("warnings", []).append("Atama gerekçeleri otomatik oluşturuldu (LLM kullanılamadı)")
+        return sprint_plan
+
+def generate_smart_sprint_plan(tasks, team_data, sprint_duration_weeks=2, bypass_cache=False,
+                               use_llm_rationale=False, start_date=None):
+    """
+    Generate sprint plan with skill-based assignments.
+    Scheduling is deterministic (sprint_scheduler); the LLM is optional and
+    only words the sprint goals and assignment reasons.
+    """
+    try:
+        sprint_plan_data = schedule_sprints(
+            tasks, team_data, sprint_duration_weeks, start_date=start_date
+        )
+        print(
+            f"Smart sprint plan scheduled: {len(sprint_plan_data['sprints'])} sprints, "
+            f"{len(sprint_plan_data['unassignedTasks'])} unassigned tasks"
+        )
+
+        # Replace the single-point estimate with Monte Carlo percentiles over
+        # the scheduled assignments
+        sprint_plan_data['timeline'] = forecast_plan(
+            sprint_plan_data, tasks, team_data, start_date=start_date
+        )
+
+        if use_llm_rationale and sprint_plan_data['sprints']:
+            sprint_plan_data = word_assignment_rationale(sprint_plan_data, bypass_cache=bypass_cache)
         
         print("Smart sprint planning completed successfully")
         return sprint_plan_data
@@ -135,45 +126,38 @@ Sadece yukarıdaki JSON formatını döndür.
         print(f"Error in smart sprint planning: {str(e)}")
         raise
 
-def generate_sprint_plan_with_groq(contract_analysis, sprint_duration_weeks=2):
-    """
-    Generate sprint plan using Groq API
-    """
-    try:
-        # Prepare data for Groq
-        deliverables = json.dumps(contract_analysis.get("deliverables", []), ensure_ascii=False, indent=2)
-        milestones = json.dumps(contract_analysis.get("milestones", []), ensure_ascii=False, indent=2)
-        risks = json.dumps(contract_analysis.get("risks", []), ensure_ascii=False, indent=2)
-        
-        # Sprint planning system prompt
-        SPRINT_SYSTEM_PROMPT = f"""
+# Static so the prompt prefix is identical across calls; the sprint length is
+# part of the user prompt
+SPRINT_SYSTEM_PROMPT = """
 Sen, deneyimli bir Mobil Uygulama Proje Yöneticisi ve Scrum Master'sın.
-Görevin, sana verilen proje kapsamı ve teslimat listesine dayanarak, projeyi {sprint_duration_weeks} haftalık mantıklı sprint'lere bölmek ve her sprint için spesifik, teknik görevler (task) oluşturmaktır.
+Görevin, sana verilen proje kapsamı ve teslimat listesine dayanarak, projeyi kullanıcının belirttiği uzunlukta mantıklı sprint'lere bölmek ve her sprint için spesifik, teknik görevler (task) oluşturmaktır.
+Her görev için "tahmini_saat" alanına, görevi tek bir geliştiricinin kaç saatte bitireceğini gerçekçi bir tam sayı olarak yaz.
 Çıktın SADECE ve SADECE aşağıdaki JSON formatında bir dizi (array) olmalıdır. Başka hiçbir açıklama yapma.
 
 [
-  {{
+  {
     "sprint_num": 1,
     "sprint_hedefi": "Sprint 1 için net bir hedef cümlesi.",
     "gorevler": [
-      "Sprint 1'de yapılacak spesifik bir görev (örn: 'API tasarımı ve veritabanı şeması').",
-      "Sprint 1'de yapılacak başka bir görev (örn: 'Kullanıcı giriş/kayıt UI tasarımı')."
+      {"gorev": "Sprint 1'de yapılacak spesifik bir görev (örn: 'API tasarımı ve veritabanı şeması').", "tahmini_saat": 16},
+      {"gorev": "Sprint 1'de yapılacak başka bir görev (örn: 'Kullanıcı giriş/kayıt UI tasarımı').", "tahmini_saat": 12}
     ]
-  }},
-  {{
+  },
+  {
     "sprint_num": 2,
     "sprint_hedefi": "...",
-    "gorevler": [ "..." ]
-  }}
+    "gorevler": [ {"gorev": "...", "tahmini_saat": 8} ]
+  }
 ]
 """
-        
-        # User prompt with contract data
-        USER_PROMPT = f"""
+
+SPRINT_USER_TEMPLATE = """
 Lütfen aşağıdaki proje bilgileri için bir sprint planı oluştur:
 
+Sprint Süresi: {sprint_duration_weeks} hafta
+
 Proje Kapsamı:
-{contract_analysis.get('summary', '')}
+{summary}
 
 Ana Teslimatlar Listesi:
 {deliverables}
@@ -187,19 +171,46 @@ Riskler:
 Talimat: Bu projeyi {sprint_duration_weeks} haftalık mantıklı sprint'lere böl ve sistem talimatlarında belirtilen JSON formatında bir plan çıkar.
 """
 
+def generate_sprint_plan_with_groq(contract_analysis, sprint_duration_weeks=2, bypass_cache=False):
+    """
+    Generate sprint plan using Groq API
+    """
+    try:
+        # Prepare data for Groq
+        deliverables = contract_analysis.get("deliverables", [])
+        USER_PROMPT, max_tokens = build_prompt(
+            'sprint_plan',
+            SPRINT_USER_TEMPLATE,
+            [
+                PromptSection('deliverables', deliverables,
+                              fields=['id', 'title', 'description', 'acceptanceCriteria'],
+                              drop=['acceptanceCriteria', 'description']),
+                PromptSection('milestones', contract_analysis.get("milestones", []),
+                              fields=['id', 'title', 'dueDate']),
+                PromptSection('risks', contract_analysis.get("risks", []),
+                              fields=['id', 'title', 'severity', 'description'],
+                              drop=['description']),
+            ],
+            expected_items=max(1, len(deliverables)),
+            summary=contract_analysis.get('summary', ''),
+            sprint_duration_weeks=sprint_duration_weeks
+        )
+
         # Call Groq API
-        completion = groq_client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
+        json_string_response = routed_completion(
+            'sprint_plan',
+            get_groq_client(),
             messages=[
                 {"role": "system", "content": SPRINT_SYSTEM_PROMPT},
                 {"role": "user", "content": USER_PROMPT}
             ],
             temperature=0.2,
-            response_format={"type": "json_object"}
+            max_tokens=max_tokens,
+            response_format={"type": "json_object"},
+            bypass_cache=bypass_cache
         )
         
-        json_string_response = completion.choices[0].message.content
-        sprint_plan_data = json.loads(json_string_response)
+        sprint_plan_data = decode_json_response(json_string_response)
         
         # Handle different response formats
         sprint_plan = sprint_plan_data
@@ -213,6 +224,43 @@ Talimat: Bu projeyi {sprint_duration_weeks} haftalık mantıklı sprint'lere bö
         print(f"Error generating sprint plan with Groq: {str(e)}")
         raise
 
+def parse_sprint_task(item):
+    """
+    (title, estimated hours) of a model sprint task; plans cached before the
+    prompt asked for hours list plain strings, which carry no estimate
+    """
+    if isinstance(item, dict):
+        title = str(item.get('gorev') or item.get('title') or '')
+        try:
+            hours = float(item.get('tahmini_saat'))
+        except (TypeError, ValueError):
+            hours = None
+        return title, hours if hours and hours > 0 else None
+    return str(item), None
+
+def sprint_forecast_tasks(sprints):
+    """
+    Forecast input for a sprint-level plan: every task with estimatedHours,
+    depending on the estimated tasks of the sprint before it. Empty when no
+    task has an estimate.
+    """
+    tasks = []
+    previous_ids = []
+    for sprint in sprints:
+        sprint_ids = []
+        for task in sprint['tasks']:
+            if not task.get('estimatedHours'):
+                continue
+            tasks.append({
+                'id': task['id'],
+                'estimatedHours': task['estimatedHours'],
+                'dependsOn': list(previous_ids)
+            })
+            sprint_ids.append(task['id'])
+        if sprint_ids:
+            previous_ids = sprint_ids
+    return tasks
+
 def save_sprint_plan_to_firestore(contract_id, sprint_plan, sprint_duration_weeks):
     """
     Save sprint plan to Firestore
@@ -231,14 +279,15 @@ def save_sprint_plan_to_firestore(contract_id, sprint_plan, sprint_duration_week
             }
             
             # Convert tasks
-            for i, task_desc in enumerate(sprint['gorevler']):
+            for i, item in enumerate(sprint['gorevler']):
+                task_desc, estimated_hours = parse_sprint_task(item)
                 task = {
                     'id': f"sprint_{sprint['sprint_num']}_task_{i+1}",
                     'title': task_desc,
                     'description': task_desc,
                     'status': 'todo',
                     'assignee': '',
-                    'estimatedHours': None,
+                    'estimatedHours': estimated_hours,
                     'actualHours': None,
                     'dueDate': None,
                     'completedAt': None
@@ -247,6 +296,14 @@ def save_sprint_plan_to_firestore(contract_id, sprint_plan, sprint_duration_week
             
             sprints.append(sprint_obj)
         
+        # Forecast over the model's per-task hour estimates; a plan without
+        # any (e.g. an older cached completion) leaves the timeline blank
+        # rather than guessed
+        forecast = None
+        estimated_tasks = sprint_forecast_tasks(sprints)
+        if estimated_tasks:
+            forecast = forecast_timeline(estimated_tasks)
+
         # Create plan document
         plan_data = {
             'contractId': contract_id,
@@ -255,6 +312,13 @@ def save_sprint_plan_to_firestore(contract_id, sprint_plan, sprint_duration_week
             'title': f'Sprint Plan - {sprint_duration_weeks} weeks',
             'sprints': sprints,
             'timeline': {
+                'optimistic': forecast['optimistic'],
+                'realistic': forecast['realistic'],
+                'pessimistic': forecast['pessimistic'],
+                'p50Days': forecast['p50Days'],
+                'p75Days': forecast['p75Days'],
+                'p90Days': forecast['p90Days']
+            } if forecast else {
                 'optimistic': '',
                 'realistic': '',
                 'pessimistic': ''
@@ -264,16 +328,15 @@ def save_sprint_plan_to_firestore(contract_id, sprint_plan, sprint_duration_week
             'updatedAt': firestore.SERVER_TIMESTAMP
         }
         
-        # Save to Firestore
-        plan_ref = db.collection('plans').add(plan_data)
-        plan_id = plan_ref[1].id
-        
-        # Update contract with plan reference
-        contract_ref = db.collection('contracts').document(contract_id)
-        contract_ref.update({
+        # Save the plan and the contract's plan reference in one atomic batch
+        writer = BatchWriter()
+        plan_ref = writer.set(writer.new_ref('plans'), plan_data)
+        plan_id = plan_ref.id
+        writer.update(get_db().collection('contracts').document(contract_id), {
             'planId': plan_id,
             'updatedAt': firestore.SERVER_TIMESTAMP
         })
+        writer.commit()
         
         print(f"Sprint plan saved with ID: {plan_id}")
         return plan_id
@@ -282,7 +345,7 @@ def save_sprint_plan_to_firestore(contract_id, sprint_plan, sprint_duration_week
         print(f"Error saving sprint plan: {str(e)}")
         raise
 
-def generate_sprint_plan(contract_id, sprint_duration_weeks=2):
+def generate_sprint_plan(contract_id, sprint_duration_weeks=2, bypass_cache=False):
     """
     Main function to generate sprint plan
     """
@@ -295,7 +358,7 @@ def generate_sprint_plan(contract_id, sprint_duration_weeks=2):
         
         # Step 2: Generate sprint plan with Groq
         print("Generating sprint plan with Groq API...")
-        sprint_plan = generate_sprint_plan_with_groq(contract_analysis, sprint_duration_weeks)
+        sprint_plan = generate_sprint_plan_with_groq(contract_analysis, sprint_duration_weeks, bypass_cache=bypass_cache)
         
         # Step 3: Save to Firestore
         print("Saving sprint plan to Firestore...")
@@ -0,0 +1,355 @@
+import heapq
+from datetime import date, timedelta
+
+# Deterministic constraint-based sprint scheduler.
+# Takes the same tasks/teamData payload as generateSmartPlan and returns the
+# smart sprint plan schema (sprints, unassignedTasks, warnings, utilizationRate).
+#
+# Tasks are placed in dependency (topological) order. Each task goes to the
+# earliest sprint in which some qualified person can finish it after its
+# dependencies, without exceeding that person's capacity for the sprint.
+
+DEFAULT_HOURS_PER_WEEK = 40
+DEFAULT_TASK_HOURS = 8
+MAX_SPRINTS = 52
+
+
+def _as_number(value, default):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return default
+    return number if number >= 0 else default
+
+
+def _normalize_tasks(tasks, warnings):
+    normalized = []
+    seen = set()
+    for index, task in enumerate(tasks):
+        task_id = str(task.get('id') or task.get('taskId') or f"task_{index + 1}")
+        if task_id in seen:
+            warnings.append(f"Duplicate task id {task_id} ignored")
+            continue
+        seen.add(task_id)
+        hours = _as_number(task.get('estimatedHours'), None)
+        if hours is None or hours == 0:
+            hours = DEFAULT_TASK_HOURS
+        normalized.append({
+            'id': task_id,
+            'title': task.get('title', task_id),
+            'hours': hours,
+            'requiredSkills': [s for s in (task.get('requiredSkills') or []) if s],
+            'dependsOn': [str(d) for d in (task.get('dependsOn') or [])],
+            'order': index,
+        })
+
+    for task in normalized:
+        missing = [d for d in task['dependsOn'] if d not in seen]
+        if missing:
+            warnings.append(f"{task['id']}: unknown dependencies ignored ({', '.join(missing)})")
+        task['dependsOn'] = [d for d in task['dependsOn'] if d in seen]
+    return normalized
+
+
+def topological_order(tasks, warnings=None):
+    """
+    Kahn's algorithm with input order as the tie-break, so output is stable.
+    Tasks on a dependency cycle are appended in input order with a warning.
+    """
+    by_id = {t['id']: t for t in tasks}
+    indegree = {t['id']: len(t['dependsOn']) for t in tasks}
+    dependents = {t['id']: [] for t in tasks}
+    for task in tasks:
+        for dep in task['dependsOn']:
+            dependents[dep].append(task['id'])
+
+    ready = [(t['order'], t['id']) for t in tasks if indegree[t['id']] == 0]
+    heapq.heapify(ready)
+    ordered = []
+    while ready:
+        _, task_id = heapq.heappop(ready)
+        ordered.append(by_id[task_id])
+        for dependent in dependents[task_id]:
+            indegree[dependent] -= 1
+            if indegree[dependent] == 0:
+                heapq.heappush(ready, (by_id[dependent]['order'], dependent))
+
+    if len(ordered) < len(tasks):
+        placed = {t['id'] for t in ordered}
+        cyclic = [t for t in tasks if t['id'] not in placed]
+        if warnings is not None:
+            warnings.append(
+                f"Dependency cycle among {', '.join(t['id'] for t in cyclic)}; scheduled in input order"
+            )
+        ordered.extend(cyclic)
+    return ordered
+
+
+def _skill_levels(team_data):
+    """
+    personId -> {skill (lowercase): (level, display name)} from personSkills
+    records or from skills embedded on people
+    """
+    levels = {}
+
+    def add(person_id, key, level):
+        if not person_id or not key:
+            return
+        entry = levels.setdefault(str(person_id), {})
+        lowered = str(key).strip().lower()
+        level = int(_as_number(level, 1))
+        if lowered not in entry or entry[lowered][0] < level:
+            entry[lowered] = (level, str(key).strip())
+
+    for record in team_data.get('skills') or []:
+        if isinstance(record, dict):
+            add(record.get('personId'), record.get('skillKey') or record.get('key'), record.get('level', 1))
+
+    for person in team_data.get('people') or []:
+        embedded = person.get('skills') or []
+        if isinstance(embedded, dict):
+            embedded = [{'skillKey': k, 'level': v} for k, v in embedded.items()]
+        for record in embedded:
+            if isinstance(record, str):
+                add(person.get('id'), record, 1)
+            elif isinstance(record, dict):
+                add(person.get('id'), record.get('skillKey') or record.get('key'), record.get('level', 1))
+    return levels
+
+
+def workload_percent(team_data, person):
+    """
+    Current workload (0-100) of a person from teamData.workload or the person record
+    """
+    workload = team_data.get('workload')
+    person_id = person.get('id')
+    value = None
+    if isinstance(workload, dict):
+        value = workload.get(person_id)
+        if isinstance(value, dict):
+            value = value.get('currentWorkload', value.get('workload'))
+    elif isinstance(workload, list):
+        for record in workload:
+            if isinstance(record, dict) and record.get('personId') == person_id:
+                value = record.get('currentWorkload', record.get('workload'))
+                break
+    if value is None:
+        value = person.get('currentWorkload', 0)
+    return min(100.0, _as_number(value, 0.0))
+
+
+def sprint_capacity(team_data, person, sprint_duration_weeks):
+    """
+    Hours a person can take on in one sprint, net of current workload
+    """
+    hours_per_week = _as_number(person.get('hoursPerWeek'), DEFAULT_HOURS_PER_WEEK)
+    workload = workload_percent(team_data, person)
+    return hours_per_week * sprint_duration_weeks * (1 - workload / 100.0)
+
+
+def _normalize_people(team_data, sprint_duration_weeks, warnings):
+    levels = _skill_levels(team_data)
+    people = []
+    for person in team_data.get('people') or []:
+        person_id = person.get('id')
+        if not person_id:
+            continue
+        capacity = sprint_capacity(team_data, person, sprint_duration_weeks)
+        people.append({
+            'id': str(person_id),
+            'name': person.get('name', person_id),
+            'capacity': round(capacity, 2),
+            'skills': levels.get(str(person_id), {}),
+        })
+    if not people:
+        warnings.append("No team members with an id in teamData.people")
+    return people
+
+
+def _match(person, required_skills):
+    """
+    (missing skill count, -average level of matched skills) -- lower is better
+    """
+    matched_levels = []
+    missing = 0
+    for skill in required_skills:
+        entry = person['skills'].get(skill.strip().lower())
+        if entry:
+            matched_levels.append(entry[0])
+        else:
+            missing += 1
+    average = sum(matched_levels) / len(matched_levels) if matched_levels else 0
+    return missing, -average
+
+
+def _assignment_reason(person, task, available_before):
+    parts = []
+    for skill in task['requiredSkills']:
+        entry = person['skills'].get(skill.strip().lower())
+        parts.append(f"{entry[0]}/5 {entry[1]}" if entry else f"{skill} eksik")
+    parts.append(f"{available_before:g} saat müsait")
+    return ", ".join(parts)
+
+
+def _sprint_dates(start, sprint_num, sprint_duration_weeks):
+    sprint_start = start + timedelta(weeks=sprint_duration_weeks * (sprint_num - 1))
+    sprint_end = sprint_start + timedelta(weeks=sprint_duration_weeks) - timedelta(days=1)
+    return sprint_start.isoformat(), sprint_end.isoformat()
+
+
+def schedule_sprints(tasks, team_data, sprint_duration_weeks=2, start_date=None, max_sprints=MAX_SPRINTS,
+                     pinned=None, capacity_overrides=None):
+    """
+    Build a smart sprint plan without an LLM.
+
+    pinned maps taskId -> {'sprintNum', 'assignedTo', 'assignmentReason'} for
+    tasks that keep their current placement (incremental replanning); they are
+    booked first and everything else is scheduled around them.
+    capacity_overrides maps (sprintNum, personId) -> hours for sprints where a
+    person has less (or more) time than usual, e.g. a vacation.
+    """
+    pinned = pinned or {}
+    capacity_overrides = capacity_overrides or {}
+    warnings = []
+    normalized = _normalize_tasks(tasks or [], warnings)
+    ordered = topological_order(normalized, warnings)
+    people = _normalize_people(team_data or {}, sprint_duration_weeks, warnings)
+
+    if isinstance(start_date, str) and start_date:
+        start = date.fromisoformat(start_date[:10])
+    else:
+        start = start_date or date.today()
+
+    # booked[(sprint, personId)] = hours already on that person's sprint timeline
+    booked = {}
+    # placement[taskId] = (sprint, finish offset in hours within that sprint)
+    placement = {}
+    sprint_tasks = {}
+    unassigned = []
+    blocked = set()
+
+    people_by_id = {p['id']: p for p in people}
+
+    def capacity(sprint, person):
+        return capacity_overrides.get((sprint, person['id']), person['capacity'])
+
+    def book(task, sprint, person, finish, reason):
+        booked[(sprint, person['id'])] = finish
+        placement[task['id']] = (sprint, finish)
+        sprint_tasks.setdefault(sprint, []).append({
+            'taskId': task['id'],
+            'title': task['title'],
+            'assignedTo': person['id'],
+            'assignedToName': person['name'],
+            'estimatedHours': task['hours'],
+            'requiredSkills': task['requiredSkills'],
+            'dependsOn': task['dependsOn'],
+            'assignmentReason': reason,
+        })
+
+    # Pinned tasks first, so the rest is scheduled into the capacity they leave
+    for task in ordered:
+        pin = pinned.get(task['id'])
+        if not pin or str(pin.get('assignedTo')) not in people_by_id:
+            continue
+        person = people_by_id[str(pin['assignedTo'])]
+        sprint = int(pin['sprintNum'])
+        used = booked.get((sprint, person['id']), 0)
+        dep_finish = max(
+            [placement[d][1] for d in task['dependsOn'] if d in placement and placement[d][0] == sprint] or [0]
+        )
+        reason = pin.get('assignmentReason') or _assignment_reason(person, task, capacity(sprint, person) - used)
+        book(task, sprint, person, max(used, dep_finish) + task['hours'], reason)
+
+    for task in ordered:
+        if task['id'] in placement:
+            continue
+        blocking = [d for d in task['dependsOn'] if d in blocked or d not in placement]
+        if blocking:
+            blocked.add(task['id'])
+            unassigned.append({
+                'taskId': task['id'],
+                'title': task['title'],
+                'reason': f"Bağımlılık planlanamadı: {', '.join(blocking)}"
+            })
+            continue
+
+        earliest_sprint = max([placement[d][0] for d in task['dependsOn']] or [1])
+
+        ranked = sorted(people, key=lambda p: (_match(p, task['requiredSkills']), p['id']))
+        if ranked and _match(ranked[0], task['requiredSkills'])[0] > 0:
+            best_missing = _match(ranked[0], task['requiredSkills'])[0]
+            ranked = [p for p in ranked if _match(p, task['requiredSkills'])[0] == best_missing]
+            warnings.append(
+                f"{task['id']}: no one has all required skills ({', '.join(task['requiredSkills'])}); "
+                "assigned to the closest match"
+            )
+        else:
+            ranked = [p for p in ranked if _match(p, task['requiredSkills'])[0] == 0]
+
+        fits_anyone = any(task['hours'] <= p['capacity'] for p in ranked)
+        if not ranked or not fits_anyone:
+            blocked.add(task['id'])
+            reason = "Uygun ekip üyesi yok" if not ranked else \
+                f"{task['hours']:g} saat tek sprint kapasitesini aşıyor; task'ı bölün"
+            unassigned.append({'taskId': task['id'], 'title': task['title'], 'reason': reason})
+            continue
+
+        choice = None
+        for sprint in range(earliest_sprint, max_sprints + 1):
+            # Dependencies finishing in this same sprint push the start later
+            dep_finish = max(
+                [placement[d][1] for d in task['dependsOn'] if placement[d][0] == sprint] or [0]
+            )
+            candidates = []
+            for rank, person in enumerate(ranked):
+                used = booked.get((sprint, person['id']), 0)
+                finish = max(used, dep_finish) + task['hours']
+                if finish <= capacity(sprint, person):
+                    # Earliest finish first, then better skill match, then more slack
+                    candidates.append((finish, rank, used, person))
+            if candidates:
+                choice = (sprint,) + min(candidates, key=lambda c: (c[0], c[1], c[2]))
+                break
+
+        if choice is None:
+            blocked.add(task['id'])
+            unassigned.append({
+                'taskId': task['id'],
+                'title': task['title'],
+                'reason': f"{max_sprints} sprint içinde kapasite bulunamadı"
+            })
+            continue
+
+        sprint, finish, _, used, person = choice
+        book(task, sprint, person, finish, _assignment_reason(person, task, capacity(sprint, person) - used))
+
+    sprints = []
+    for sprint_num in range(1, (max(sprint_tasks) if sprint_tasks else 0) + 1):
+        planned = sum(t['estimatedHours'] for t in sprint_tasks.get(sprint_num, []))
+        available = sum(capacity(sprint_num, p) for p in people)
+        start_iso, end_iso = _sprint_dates(start, sprint_num, sprint_duration_weeks)
+        titles = [t['title'] for t in sprint_tasks.get(sprint_num, [])]
+        sprints.append({
+            'sprintNum': sprint_num,
+            'goal': ", ".join(titles[:3]) + (f" +{len(titles) - 3}" if len(titles) > 3 else ""),
+            'startDate': start_iso,
+            'endDate': end_iso,
+            'tasks': sprint_tasks.get(sprint_num, []),
+            'totalCapacity': round(available, 2),
+            'totalPlanned': round(planned, 2),
+            'utilizationRate': round(planned / available * 100, 1) if available else 0.0,
+        })
+
+    total_planned = sum(s['totalPlanned'] for s in sprints)
+    total_capacity = sum(s['totalCapacity'] for s in sprints)
+    plan_days = len(sprints) * sprint_duration_weeks * 7
+
+    return {
+        'sprints': sprints,
+        # Single-point estimate from the schedule length; see timeline_forecast
+        'timeline': {'p50Days': plan_days, 'p75Days': plan_days, 'p90Days': plan_days},
+        'unassignedTasks': unassigned,
+        'warnings': warnings,
+        'utilizationRate': round(total_planned / total_capacity * 100, 1) if total_capacity else 0.0,
+    }
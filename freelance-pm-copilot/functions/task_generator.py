@@ -1,16 +1,18 @@
 import os
 import json
-from groq import Groq
 from firebase_admin import firestore
 from dotenv import load_dotenv
+from clients import get_groq_client
+from model_router import routed_completion
+from llm_client import decode_json_response
+from firestore_batch import BatchWriter
+from prompt_builder import build_prompt, PromptSection
+from contract_reader import TASK_ANALYSIS_FIELDS, get_contract_analysis
+from dependency_index import BULK_WRITE_FIELD, new_bulk_write_id, bump_tasks_version_in_batch
 
 # Load environment variables
 load_dotenv()
 
-# Initialize clients
-groq_client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
-db = firestore.client()
-
 TASK_GENERATION_PROMPT = """
 Sen, proje kapsamını WBS (Work Breakdown Structure) ve task'lara dönüştüren uzman bir proje yöneticisisin.
 
@@ -41,18 +43,7 @@ Görevin, verilen deliverable'ları ve milestone'ları analiz edip, her birini e
 }
 """
 
-def generate_tasks_from_contract(contract_analysis):
-    """
-    Generate WBS and tasks from contract analysis
-    """
-    try:
-        # Prepare contract data for Groq
-        deliverables = json.dumps(contract_analysis.get("deliverables", []), ensure_ascii=False, indent=2)
-        milestones = json.dumps(contract_analysis.get("milestones", []), ensure_ascii=False, indent=2)
-        summary = contract_analysis.get("summary", "")
-        
-        # User prompt with contract data
-        USER_PROMPT = f"""
+TASK_USER_TEMPLATE = """
 Lütfen aşağıdaki proje bilgileri için WBS ve task listesi oluştur:
 
 Proje Özeti:
@@ -71,20 +62,42 @@ Bağımlılıkları da dikkate al.
 Sadece yukarıdaki JSON formatını döndür.
 """
 
+def generate_tasks_from_contract(contract_analysis, bypass_cache=False):
+    """
+    Generate WBS and tasks from contract analysis
+    """
+    try:
+        # Prepare contract data for Groq
+        deliverables = contract_analysis.get("deliverables", [])
+        USER_PROMPT, max_tokens = build_prompt(
+            'task_generation',
+            TASK_USER_TEMPLATE,
+            [
+                PromptSection('deliverables', deliverables,
+                              fields=['id', 'title', 'description', 'acceptanceCriteria'],
+                              drop=['acceptanceCriteria', 'description']),
+                PromptSection('milestones', contract_analysis.get("milestones", []),
+                              fields=['id', 'title', 'dueDate']),
+            ],
+            expected_items=len(deliverables),
+            summary=contract_analysis.get("summary", "")
+        )
+
         # Call Groq API
-        completion = groq_client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
+        json_string_response = routed_completion(
+            'task_generation',
+            get_groq_client(),
             messages=[
                 {"role": "system", "content": TASK_GENERATION_PROMPT},
                 {"role": "user", "content": USER_PROMPT}
             ],
             temperature=0.2,
-            max_tokens=8192,
-            response_format={"type": "json_object"}
+            max_tokens=max_tokens,
+            response_format={"type": "json_object"},
+            bypass_cache=bypass_cache
         )
         
-        json_string_response = completion.choices[0].message.content
-        task_data = json.loads(json_string_response)
+        task_data = decode_json_response(json_string_response)
         
         print("Task generation completed successfully")
         return task_data
@@ -95,15 +108,22 @@ Sadece yukarıdaki JSON formatını döndür.
 
 def save_tasks_to_firestore(contract_id, project_id, task_data):
     """
-    Save generated tasks to Firestore
+    Save generated tasks to Firestore.
+    Ids are allocated up front so dependsOn can point at any task, including
+    later ones, and everything is written in chunked batch commits.
     """
     try:
-        # Save epics
+        writer = BatchWriter()
+
+        # Allocate ids for every epic and task before writing anything
         epics = task_data.get("epics", [])
-        epic_ids = {}
+        tasks = task_data.get("tasks", [])
+        epic_refs = {epic['id']: writer.new_ref('epics') for epic in epics}
+        task_refs = {task['id']: writer.new_ref('tasks') for task in tasks}
+        bulk_write_id = new_bulk_write_id()
         
         for epic in epics:
-            epic_ref = db.collection('epics').add({
+            writer.set(epic_refs[epic['id']], {
                 'contractId': contract_id,
                 'projectId': project_id,
                 'title': epic['title'],
@@ -111,23 +131,21 @@ def save_tasks_to_firestore(contract_id, project_id, task_data):
                 'deliverableId': epic.get('deliverableId'),
                 'createdAt': firestore.SERVER_TIMESTAMP
             })
-            epic_ids[epic['id']] = epic_ref[1].id
-        
-        # Save tasks
-        tasks = task_data.get("tasks", [])
-        task_ids = {}
         
         for task in tasks:
             # Convert dependsOn to actual task IDs
             depends_on = []
             for dep_id in task.get('dependsOn', []):
-                if dep_id in task_ids:
-                    depends_on.append(task_ids[dep_id])
-            
-            task_ref = db.collection('tasks').add({
+                if dep_id in task_refs:
+                    depends_on.append(task_refs[dep_id].id)
+                else:
+                    print(f"Task {task['id']}: unknown dependency {dep_id} ignored")
+
+            epic_ref = epic_refs.get(task.get('epicId'))
+            writer.set(task_refs[task['id']], {
                 'contractId': contract_id,
                 'projectId': project_id,
-                'epicId': epic_ids.get(task.get('epicId')),
+                'epicId': epic_ref.id if epic_ref else None,
                 'title': task['title'],
                 'description': task['description'],
                 'requiredSkills': task.get('requiredSkills', []),
@@ -135,21 +153,25 @@ def save_tasks_to_firestore(contract_id, project_id, task_data):
                 'acceptanceCriteria': task.get('acceptanceCriteria', []),
                 'dependsOn': depends_on,
                 'status': 'todo',
+                BULK_WRITE_FIELD: bulk_write_id,
                 'createdAt': firestore.SERVER_TIMESTAMP
             })
-            task_ids[task['id']] = task_ref[1].id
+        if tasks and project_id:
+            bump_tasks_version_in_batch(writer, project_id)
+
+        writer.commit()
         
         print(f"Tasks saved to Firestore for contract {contract_id}")
         return {
-            'epicIds': epic_ids,
-            'taskIds': task_ids
+            'epicIds': {epic_id: ref.id for epic_id, ref in epic_refs.items()},
+            'taskIds': {task_id: ref.id for task_id, ref in task_refs.items()}
         }
         
     except Exception as e:
         print(f"Error saving tasks to Firestore: {str(e)}")
         raise
 
-def generate_tasks(contract_id, project_id):
+def generate_tasks(contract_id, project_id, bypass_cache=False):
     """
     Main function to generate tasks from contract
     """
@@ -158,21 +180,11 @@ def generate_tasks(contract_id, project_id):
         
         # Step 1: Get contract analysis
         print("Getting contract analysis...")
-        contract_ref = db.collection('contracts').document(contract_id)
-        contract_doc = contract_ref.get()
-        
-        if not contract_doc.exists:
-            raise ValueError(f"Contract {contract_id} not found")
-        
-        contract_data = contract_doc.to_dict()
-        analysis = contract_data.get('analysis')
-        
-        if not analysis:
-            raise ValueError(f"No analysis found for contract {contract_id}")
+        analysis = get_contract_analysis(contract_id, TASK_ANALYSIS_FIELDS)
         
         # Step 2: Generate tasks with Groq
         print("Generating tasks with Groq API...")
-        task_data = generate_tasks_from_contract(analysis)
+        task_data = generate_tasks_from_contract(analysis, bypass_cache=bypass_cache)
         
         # Step 3: Save to Firestore
         print("Saving tasks to Firestore...")
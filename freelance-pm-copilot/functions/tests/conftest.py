@@ -0,0 +1,37 @@
+import os
+import sys
+import pytest
+
+# Tests import the function modules the way main.py does, and reuse the
+# in-memory Firestore and Storage stand-ins from benchmarks/fakes.py
+FUNCTIONS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, FUNCTIONS_DIR)
+sys.path.insert(0, os.path.join(FUNCTIONS_DIR, 'benchmarks'))
+
+import clients
+from fakes import RpcCounter, InMemoryFirestore, FakeBucket
+
+
+@pytest.fixture
+def counter():
+    return RpcCounter()
+
+
+@pytest.fixture
+def db(monkeypatch, counter):
+    """
+    InMemoryFirestore installed as the shared Firestore client
+    """
+    fake = InMemoryFirestore(counter, latency_ms=0)
+    monkeypatch.setitem(clients._clients, 'firestore', fake)
+    return fake
+
+
+@pytest.fixture
+def bucket(monkeypatch, counter):
+    """
+    FakeBucket installed as the shared Storage bucket
+    """
+    fake = FakeBucket(counter, latency_ms=0, ms_per_mb=0)
+    monkeypatch.setitem(clients._clients, 'bucket', fake)
+    return fake
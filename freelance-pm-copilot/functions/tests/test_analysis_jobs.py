@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+import analysis_jobs
+from analysis_jobs import (
+    ANALYSIS_JOB_LEASE_SECONDS, ANALYSIS_JOB_MAX_ATTEMPTS,
+    claim_updates, create_analysis_job, get_analysis_job, lease_expired, reclaim_expired_jobs
+)
+
+NOW = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def running(lease_delta, attempts=1):
+    return {'status': 'running', 'stage': 'parsing', 'attempts': attempts,
+            'leaseExpiresAt': NOW + timedelta(seconds=lease_delta)}
+
+
+def test_lease_expiry():
+    assert lease_expired(running(-1), NOW)
+    assert lease_expired(running(0), NOW)
+    assert not lease_expired(running(60), NOW)
+    assert not lease_expired({'status': 'succeeded', 'leaseExpiresAt': NOW - timedelta(hours=1)}, NOW)
+    assert not lease_expired({'status': 'running'}, NOW)
+
+
+def test_queued_job_gets_a_lease():
+    updates = claim_updates({'status': 'queued', 'attempts': 0}, NOW)
+    assert updates['status'] == 'running'
+    assert updates['attempts'] == 1
+    assert updates['leaseExpiresAt'] == NOW + timedelta(seconds=ANALYSIS_JOB_LEASE_SECONDS)
+
+
+def test_live_lease_is_not_claimed_twice():
+    assert claim_updates(running(60), NOW) is None
+    assert claim_updates({'status': 'succeeded'}, NOW) is None
+
+
+def test_expired_lease_is_retried_then_failed():
+    retry = claim_updates(running(-1, attempts=ANALYSIS_JOB_MAX_ATTEMPTS - 1), NOW)
+    assert (retry['status'], retry['attempts']) == ('running', ANALYSIS_JOB_MAX_ATTEMPTS)
+
+    failed = claim_updates(running(-1, attempts=ANALYSIS_JOB_MAX_ATTEMPTS), NOW)
+    assert failed['status'] == 'failed'
+    assert failed['failedStage'] == 'parsing'
+
+
+def test_reclaim_reruns_only_expired_jobs(db, monkeypatch):
+    jobs = db.collection('analysisJobs')
+    past = datetime.now(timezone.utc) - timedelta(minutes=1)
+    jobs.document('expired').set({'status': 'running', 'leaseExpiresAt': past})
+    jobs.document('live').set({'status': 'running', 'leaseExpiresAt': past + timedelta(hours=1)})
+    jobs.document('done').set({'status': 'succeeded'})
+    ran = []
+    monkeypatch.setattr(analysis_jobs, 'run_analysis_job', ran.append)
+
+    assert reclaim_expired_jobs() == ['expired']
+    assert ran == ['expired']
+
+
+def test_job_is_only_readable_by_its_owner(db):
+    job_id = create_analysis_job('c1', pdf_path='contracts/c1/a.pdf', user_id='owner')
+    assert get_analysis_job(job_id, user_id='owner')['userId'] == 'owner'
+    with pytest.raises(PermissionError):
+        get_analysis_job(job_id, user_id='someone-else')
+    assert get_analysis_job('missing', user_id='owner') is None
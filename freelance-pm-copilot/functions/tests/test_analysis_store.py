@@ -0,0 +1,61 @@
+import gzip
+import json
+import analysis_store
+from analysis_store import summarize_analysis, offload_analysis, load_analysis, delete_stored_analysis
+
+ANALYSIS = {
+    'summary': 'Mobil uygulama sözleşmesi',
+    'timeline': {'realistic': '2026-04-01'},
+    'ambiguities': [
+        {'id': 'amb_1', 'severity': 'high'},
+        {'id': 'amb_2', 'severity': 'high'},
+        {'id': 'amb_3', 'severity': 'low'},
+        {'id': 'amb_4'},
+    ],
+    'risks': [{'id': 'risk_1', 'severity': 'medium'}],
+    'deliverables': [{'id': 'del_1'}, {'id': 'del_2'}],
+    'paymentPlan': None,
+}
+
+
+def test_summary_counts_every_list_and_histograms_severities():
+    compact = summarize_analysis(ANALYSIS)
+    assert compact == {
+        'summary': 'Mobil uygulama sözleşmesi',
+        'timeline': {'realistic': '2026-04-01'},
+        'counts': {'ambiguities': 4, 'risks': 1, 'deliverables': 2, 'milestones': 0, 'paymentPlan': 0},
+        'severity': {'ambiguities': {'high': 2, 'low': 1}, 'risks': {'medium': 1}},
+    }
+
+
+def test_summary_keeps_revision_and_tolerates_an_empty_analysis():
+    assert summarize_analysis({'revision': {'number': 2}})['revision'] == {'number': 2}
+    assert summarize_analysis({})['counts']['risks'] == 0
+
+
+def test_offloaded_analysis_round_trips(bucket, monkeypatch):
+    monkeypatch.setattr(analysis_store, '_cache', analysis_store.OrderedDict())
+    compact = offload_analysis('contract-1', ANALYSIS)
+
+    path = compact['storage']['path']
+    assert path.startswith('analyses/contract-1/')
+    assert compact['counts']['ambiguities'] == 4
+    stored = json.loads(gzip.decompress(bucket.objects[path]).decode('utf-8'))
+    assert stored['risks'] == ANALYSIS['risks']
+
+    # Served from Storage once the instance cache is gone
+    analysis_store._cache.clear()
+    loaded = load_analysis(compact)
+    assert loaded['ambiguities'] == ANALYSIS['ambiguities']
+    # Callers get their own copy
+    loaded['ambiguities'].clear()
+    assert len(load_analysis(compact)['ambiguities']) == 4
+
+    delete_stored_analysis(path)
+    assert path not in bucket.objects
+    # Deleting again is harmless
+    delete_stored_analysis(path)
+
+
+def test_inline_analysis_is_returned_as_is():
+    assert load_analysis(ANALYSIS) is ANALYSIS
@@ -0,0 +1,82 @@
+import json
+import time
+import threading
+import contract_analyzer
+import bulk_reanalyze
+from bulk_reanalyze import bulk_reanalyze as run_bulk, query_contract_ids, reanalyze_one
+
+
+class Recorder:
+    def __init__(self, fail=(), delay=0.0):
+        self.fail = set(fail)
+        self.delay = delay
+        self.calls = []
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, db, contract_id, bypass_cache, analysis_mode):
+        with self._lock:
+            self.calls.append(contract_id)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        if contract_id in self.fail:
+            raise RuntimeError('Groq timeout')
+
+
+def test_contracts_fan_out_over_the_worker_pool(monkeypatch, tmp_path):
+    recorder = Recorder(fail={'c3'}, delay=0.05)
+    monkeypatch.setattr(bulk_reanalyze, 'reanalyze_one', recorder)
+    checkpoint = tmp_path / 'run.json'
+
+    summary = run_bulk(None, ['c1', 'c2', 'c3', 'c4', 'c1'], concurrency=4,
+                       rate_per_minute=0, checkpoint_path=str(checkpoint))
+
+    assert sorted(recorder.calls) == ['c1', 'c2', 'c3', 'c4']
+    assert recorder.peak > 1
+    assert (summary['requested'], summary['succeeded'], summary['failed']) == (4, 3, 1)
+    saved = json.loads(checkpoint.read_text())
+    assert saved == {'completed': ['c1', 'c2', 'c4'], 'failed': {'c3': 'Groq timeout'}}
+
+
+def test_checkpoint_resumes_and_only_retries_failures_on_request(monkeypatch, tmp_path):
+    checkpoint = tmp_path / 'run.json'
+    checkpoint.write_text(json.dumps({'completed': ['c1'], 'failed': {'c2': 'boom'}}))
+    recorder = Recorder()
+    monkeypatch.setattr(bulk_reanalyze, 'reanalyze_one', recorder)
+
+    summary = run_bulk(None, ['c1', 'c2', 'c3'], rate_per_minute=0, checkpoint_path=str(checkpoint))
+    assert recorder.calls == ['c3']
+    assert summary['skipped'] == 2
+
+    run_bulk(None, ['c1', 'c2', 'c3'], rate_per_minute=0, checkpoint_path=str(checkpoint), retry_failed=True)
+    assert recorder.calls == ['c3', 'c2']
+    assert json.loads(checkpoint.read_text())['failed'] == {}
+
+
+def test_query_selects_ids_only(db):
+    contracts = db.collection('contracts')
+    contracts.document('a').set({'status': 'analyzed', 'analysis': {'summary': 'x'}})
+    contracts.document('b').set({'status': 'error'})
+    contracts.document('c').set({'status': 'analyzed'})
+
+    assert sorted(query_contract_ids(db, [('status', '==', 'analyzed')])) == ['a', 'c']
+    assert len(query_contract_ids(db, [('status', '==', 'analyzed')], limit=1)) == 1
+
+
+def test_reanalysis_reuses_the_parse_cache_key(db, monkeypatch):
+    db.collection('contracts').document('c1').set({
+        'pdfPath': 'contracts/c1/a.pdf', 'parseCacheKey': 'sha-tr', 'analysis': {'summary': 'x'}
+    })
+    calls = []
+
+    def analyze(contract_id, pdf_url, pdf_path, **kwargs):
+        calls.append((contract_id, pdf_path, kwargs['parse_cache_key'], kwargs['bypass_cache']))
+        return {'success': True}
+
+    monkeypatch.setattr(contract_analyzer, 'analyze_contract', analyze)
+    reanalyze_one(db, 'c1', True, 'auto')
+    assert calls == [('c1', 'contracts/c1/a.pdf', 'sha-tr', True)]
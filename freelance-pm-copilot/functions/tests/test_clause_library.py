@@ -0,0 +1,184 @@
+from collections import OrderedDict
+import pytest
+import clause_library
+import contract_analyzer
+from contract_revision import Clause
+from clause_library import ClauseLibrary, minhash, similarity, exact_only, linked_clause
+
+CONFIDENTIALITY = (
+    "MADDE 3 - Gizlilik\n"
+    "Taraflar, bu sözleşmenin ifası sırasında öğrendikleri her türlü ticari sırrı, müşteri bilgisini, "
+    "kaynak kodunu, tasarım belgesini ve iş planını gizli tutmayı, bu bilgileri yalnızca sözleşmenin "
+    "amacı doğrultusunda kullanmayı ve karşı tarafın yazılı izni olmaksızın üçüncü kişilerle "
+    "paylaşmamayı kabul eder. Gizlilik yükümlülüğü sözleşmenin herhangi bir sebeple sona ermesinden "
+    "sonra da makul bir süre boyunca devam eder ve ihlal halinde zarar gören taraf uğradığı tüm "
+    "zararların tazminini talep edebilir."
+)
+IP_TRANSFER = (
+    "MADDE 5 - Fikri Mülkiyet\n"
+    "Yüklenicinin proje kapsamında ürettiği yazılım, arayüz tasarımları, dokümantasyon ve diğer tüm "
+    "eserler üzerindeki mali haklar, iş bedelinin tamamen ödenmesiyle birlikte müşteriye devredilir. "
+    "Yüklenici, projede kullandığı açık kaynak bileşenleri ve kendi hazır kütüphanelerini ayrıca "
+    "bildirir; bu bileşenler üzerindeki haklar devredilmez ancak müşteriye süresiz kullanım izni verilir."
+)
+PAYMENT = (
+    "MADDE 4 - Ödeme\n"
+    "İş bedeli toplam 50.000 TL olup bedelin yüzde otuzu sözleşmenin imzalanmasıyla, kalan kısmı ise "
+    "uygulamanın mağazalarda yayınlanmasını izleyen on beş gün içinde yükleniciye banka havalesi ile "
+    "ödenir. Geciken ödemeler için yasal faiz işletilir ve yüklenici ödeme yapılana kadar işi durdurabilir."
+)
+
+CONFIDENTIALITY_QUOTE = "makul bir süre boyunca devam eder"
+IP_QUOTE = "süresiz kullanım izni verilir"
+PAYMENT_QUOTE = "yükleniciye banka havalesi ile ödenir"
+
+
+def clauses_of(*texts):
+    return [Clause(text, index) for index, text in enumerate(texts)]
+
+
+def analysis_for(quotes):
+    return {
+        'ambiguities': [
+            {'id': f'amb_{i}', 'clause': quote, 'issue': 'Belirsiz ifade', 'severity': 'medium'}
+            for i, quote in enumerate(quotes, start=1)
+        ],
+        'risks': [],
+    }
+
+
+def test_minhash_estimates_similarity():
+    base = Clause(CONFIDENTIALITY, 0).normalized
+    edited = Clause(CONFIDENTIALITY.replace("talep edebilir.", "talep eder."), 0).normalized
+    other = Clause(IP_TRANSFER, 0).normalized
+    assert similarity(minhash(base), minhash(base)) == 1.0
+    assert (minhash(base) == minhash(base)).all()
+    assert similarity(minhash(base), minhash(edited)) >= clause_library.CLAUSE_LIBRARY_MIN_SIMILARITY
+    assert similarity(minhash(base), minhash(other)) < 0.2
+
+
+def test_only_numbers_in_the_body_make_a_clause_exact_only():
+    assert not exact_only(Clause(CONFIDENTIALITY, 0))
+    assert not exact_only(Clause("5.1) Gizlilik hükümleri saklıdır", 0))
+    assert exact_only(Clause(PAYMENT, 0))
+
+
+def test_findings_link_to_the_one_clause_they_quote():
+    clauses = clauses_of(CONFIDENTIALITY, IP_TRANSFER)
+    assert linked_clause({'clause': CONFIDENTIALITY_QUOTE}, clauses) is clauses[0]
+    # Too short to tell clauses apart
+    assert linked_clause({'clause': 'sözleşmenin'}, clauses) is None
+    # Quoted text that appears in both clauses is ambiguous
+    twice = clauses_of(CONFIDENTIALITY, CONFIDENTIALITY.replace("MADDE 3", "MADDE 9"))
+    assert linked_clause({'clause': CONFIDENTIALITY_QUOTE}, twice) is None
+
+
+def test_learned_clauses_match_near_duplicates_for_the_same_user(db):
+    library = ClauseLibrary('user-1', 'v1')
+    clauses = clauses_of(CONFIDENTIALITY, IP_TRANSFER, PAYMENT)
+    assert library.learn(clauses, analysis_for([CONFIDENTIALITY_QUOTE, PAYMENT_QUOTE])) == 2
+
+    # Another instance loads the entries from Firestore
+    reloaded = ClauseLibrary('user-1', 'v1')
+    reloaded.refresh(force=True)
+    edited = CONFIDENTIALITY.replace("talep edebilir.", "talep eder.")
+    matches = reloaded.match(clauses_of(edited, IP_TRANSFER, PAYMENT))
+
+    assert sorted(matches) == [0, 2]
+    entry_id, score, findings = matches[0]
+    assert score >= clause_library.CLAUSE_LIBRARY_MIN_SIMILARITY
+    assert findings['ambiguities'][0]['clause'] == CONFIDENTIALITY_QUOTE
+    assert 'id' not in findings['ambiguities'][0]
+    assert matches[2][1] == 1.0
+
+    other_user = ClauseLibrary('user-2', 'v1')
+    other_user.refresh(force=True)
+    assert other_user.match(clauses) == {}
+
+
+def test_clauses_with_numbers_only_match_verbatim(db):
+    library = ClauseLibrary('user-1', 'v1')
+    library.learn(clauses_of(PAYMENT), analysis_for([PAYMENT_QUOTE]))
+    assert library.match(clauses_of(PAYMENT.replace("50.000", "60.000"))) == {}
+    assert list(library.match(clauses_of(PAYMENT))) == [0]
+
+
+def test_clauses_without_quoted_findings_are_not_learned(db):
+    library = ClauseLibrary('user-1', 'v1')
+    clauses = clauses_of(CONFIDENTIALITY, IP_TRANSFER)
+    analysis = analysis_for([CONFIDENTIALITY_QUOTE])
+    # A finding without a usable quote that is probably about the confidentiality clause
+    analysis['risks'] = [{'id': 'risk_1', 'title': 'Gizlilik süresi',
+                          'description': 'gizlilik yükümlülüğü makul bir süre boyunca devam eder'}]
+    assert library.learn(clauses, analysis) == 0
+    assert library.learn(clauses, {'ambiguities': [], 'risks': []}) == 0
+    assert list(db.collection('users/user-1/clauseLibrary/v1/clauses').stream()) == []
+
+
+class FakeAnalyzer:
+    """
+    Stands in for analyze_text_with_llm: records what the model was sent and
+    reports the same findings every time
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, parsed_text, bypass_cache=False, analysis_mode="auto", known_clauses=None):
+        self.calls.append((parsed_text, [c.label for c in known_clauses or []]))
+        analysis = analysis_for([CONFIDENTIALITY_QUOTE, IP_QUOTE])
+        analysis.update({
+            'summary': f"Özet {len(self.calls)}",
+            'deliverables': [{'id': 'del_1', 'title': 'Mobil uygulama'}],
+            'timeline': {'realistic': '2026-04-01'},
+        })
+        return analysis
+
+
+@pytest.fixture
+def library_enabled(monkeypatch, db):
+    monkeypatch.setattr(contract_analyzer, 'CLAUSE_LIBRARY_ENABLED', True)
+    monkeypatch.setattr(clause_library, '_libraries', OrderedDict())
+    analyzer = FakeAnalyzer()
+    monkeypatch.setattr(contract_analyzer, 'analyze_text_with_llm', analyzer)
+    return analyzer
+
+
+def test_reused_clause_library_run(library_enabled):
+    # Regression: known clauses were cut from the text, so the model never saw
+    # the whole contract and document-level fields came out wrong
+    text = "\n\n".join([CONFIDENTIALITY, IP_TRANSFER, PAYMENT])
+
+    first = contract_analyzer.analyze_parsed_text(text, tenant='user-1')
+    second = contract_analyzer.analyze_parsed_text(text, tenant='user-1')
+
+    assert [sent for sent, _ in library_enabled.calls] == [text, text]
+    assert library_enabled.calls[0][1] == []
+    assert library_enabled.calls[1][1] == ['MADDE 3 - Gizlilik', 'MADDE 5 - Fikri Mülkiyet']
+
+    assert first['summary'] == 'Özet 1'
+    assert second['summary'] == 'Özet 2'
+    assert second['deliverables'] == [{'id': 'del_1', 'title': 'Mobil uygulama'}]
+    # The library's copy replaces the model's repeat; nothing is doubled
+    assert [a['clause'] for a in second['ambiguities']] == [CONFIDENTIALITY_QUOTE, IP_QUOTE]
+    assert all(a['provenance']['status'] == 'library' for a in second['ambiguities'])
+    assert [a['id'] for a in second['ambiguities']] == ['amb_1', 'amb_2']
+
+
+def test_clause_library_is_per_user_and_opt_in(library_enabled, monkeypatch):
+    text = "\n\n".join([CONFIDENTIALITY, IP_TRANSFER])
+    contract_analyzer.analyze_parsed_text(text, tenant='user-1')
+    contract_analyzer.analyze_parsed_text(text, tenant='user-2')
+    assert library_enabled.calls[1][1] == []
+
+    monkeypatch.setattr(contract_analyzer, 'CLAUSE_LIBRARY_ENABLED', False)
+    result = contract_analyzer.analyze_parsed_text(text, tenant='user-1')
+    assert library_enabled.calls[2][1] == []
+    assert 'provenance' not in result['ambiguities'][0]
+
+
+
+def test_risk_clause_is_only_requested_with_the_library():
+    assert '"clause": "Riskin' not in contract_analyzer.ambiguity_system_prompt(False)
+    assert '"clause": "Riskin' in contract_analyzer.ambiguity_system_prompt(True)
+    assert '{risk_clause}' not in contract_analyzer.ambiguity_system_prompt(False)
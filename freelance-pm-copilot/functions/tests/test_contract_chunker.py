@@ -0,0 +1,57 @@
+from contract_chunker import merge_chunk_analyses, split_into_clauses, build_chunks
+
+
+def test_duplicates_collapse_to_the_most_severe_copy():
+    merged = merge_chunk_analyses([
+        {'risks': [{'id': 'risk_1', 'title': 'Gecikme cezası', 'severity': 'low'}]},
+        {'risks': [
+            {'id': 'risk_1', 'title': 'gecikme  cezası!', 'severity': 'high'},
+            {'id': 'risk_2', 'title': 'Fikri mülkiyet', 'severity': 'medium'},
+        ]},
+    ])
+    assert [(r['id'], r['title'], r['severity']) for r in merged['risks']] == [
+        ('risk_1', 'gecikme  cezası!', 'high'),
+        ('risk_2', 'Fikri mülkiyet', 'medium'),
+    ]
+
+
+def test_ids_are_renumbered_in_document_order():
+    merged = merge_chunk_analyses([
+        {'ambiguities': [{'id': 'amb_1', 'clause': 'A', 'issue': 'x'}]},
+        {'ambiguities': [{'id': 'amb_1', 'clause': 'B', 'issue': 'y'}]},
+        {'deliverables': [{'id': 'del_9', 'title': 'Uygulama'}]},
+    ])
+    assert [a['id'] for a in merged['ambiguities']] == ['amb_1', 'amb_2']
+    assert [a['clause'] for a in merged['ambiguities']] == ['A', 'B']
+    assert merged['deliverables'] == [{'id': 'del_1', 'title': 'Uygulama'}]
+
+
+def test_payments_differing_in_amount_are_kept():
+    merged = merge_chunk_analyses([
+        {'paymentPlan': [{'amount': 1000, 'currency': 'TRY', 'dueDate': '2026-01-01', 'description': 'Peşinat'}]},
+        {'paymentPlan': [{'amount': 2000, 'currency': 'TRY', 'dueDate': '2026-01-01', 'description': 'Peşinat'}]},
+    ])
+    assert [p['amount'] for p in merged['paymentPlan']] == [1000, 2000]
+
+
+def test_summary_timeline_and_bad_items():
+    merged = merge_chunk_analyses([
+        {'summary': '', 'timeline': {'optimistic': '2026-03-01', 'realistic': '2026-04-01'}},
+        {'summary': 'İkinci parça', 'risks': ['not a dict'],
+         'timeline': {'optimistic': '2026-02-01', 'pessimistic': '2026-06-01'}},
+    ])
+    assert merged['summary'] == 'İkinci parça'
+    assert merged['risks'] == []
+    assert merged['timeline'] == {
+        'optimistic': '2026-02-01', 'realistic': '2026-04-01', 'pessimistic': '2026-06-01'
+    }
+
+
+def test_clauses_split_on_headings_and_chunks_respect_the_limit():
+    text = "Giriş\n\nMADDE 1 - Konu\nMetin bir.\n\n2. Ücret\nMetin iki.\n\n# Ekler\nEk."
+    assert split_into_clauses(text) == [
+        "Giriş", "MADDE 1 - Konu\nMetin bir.", "2. Ücret\nMetin iki.", "# Ekler\nEk."
+    ]
+    chunks = build_chunks(text, 30)
+    assert all(len(chunk) <= 30 for chunk in chunks)
+    assert "".join(chunks).replace("\n", "") == text.replace("\n", "")
@@ -0,0 +1,107 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+import pytest
+import analysis_store
+import contract_reader
+from contract_reader import read_contract, get_contract_analysis, get_full_analysis, invalidate, TASK_ANALYSIS_FIELDS
+
+ANALYSIS = {
+    'summary': 'Mobil uygulama sözleşmesi',
+    'deliverables': [{'id': 'del_1', 'title': 'iOS uygulaması'}],
+    'milestones': [{'id': 'ms_1', 'title': 'Beta'}],
+    'risks': [{'id': 'risk_1', 'description': 'Belirsiz kapsam ' * 200}],
+}
+UPDATED_AT = datetime(2026, 1, 5, tzinfo=timezone.utc)
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches(monkeypatch):
+    monkeypatch.setattr(contract_reader, '_cache', OrderedDict())
+    monkeypatch.setattr(analysis_store, '_cache', OrderedDict())
+
+
+def seed(db, data, update_time=UPDATED_AT):
+    db.docs['contracts/c1'] = (data, update_time)
+
+
+def test_only_the_requested_fields_are_read(db, counter):
+    seed(db, {'userId': 'u1', 'analysis': ANALYSIS})
+
+    contract = read_contract('c1', ['analysis.summary', 'analysis.missing'])
+
+    assert contract == {'analysis': {'summary': ANALYSIS['summary']}}
+    assert counter.snapshot()['firestoreBytesRead'] < 100
+
+
+def test_cached_fields_are_served_after_a_metadata_read(db, counter):
+    seed(db, {'userId': 'u1', 'analysis': ANALYSIS})
+    first = read_contract('c1', TASK_ANALYSIS_FIELDS)
+    bytes_read = counter.snapshot()['firestoreBytesRead']
+
+    second = read_contract('c1', ['analysis.summary', 'analysis.deliverables'])
+
+    assert second == {'analysis': {k: first['analysis'][k] for k in ('summary', 'deliverables')}}
+    assert counter.snapshot()['firestoreReads'] == 2
+    # The metadata read returns an empty document
+    assert counter.snapshot()['firestoreBytesRead'] == bytes_read + len('{}')
+
+
+def test_a_newer_document_replaces_the_cached_fields(db):
+    seed(db, {'analysis': {'summary': 'eski'}})
+    assert read_contract('c1', ['analysis.summary'])['analysis']['summary'] == 'eski'
+
+    seed(db, {'analysis': {'summary': 'yeni'}}, UPDATED_AT + timedelta(seconds=1))
+
+    assert read_contract('c1', ['analysis.summary'])['analysis']['summary'] == 'yeni'
+
+
+def test_deleted_contract_is_dropped_from_the_cache(db):
+    seed(db, {'analysis': ANALYSIS})
+    read_contract('c1', ['analysis.summary'])
+    del db.docs['contracts/c1']
+
+    with pytest.raises(ValueError):
+        read_contract('c1', ['analysis.summary'])
+    assert 'c1' not in contract_reader._cache
+
+
+def test_cached_values_are_not_shared_with_callers(db):
+    seed(db, {'analysis': ANALYSIS})
+    read_contract('c1', ['analysis.deliverables'])['analysis']['deliverables'].append({'id': 'x'})
+
+    assert read_contract('c1', ['analysis.deliverables'])['analysis']['deliverables'] == ANALYSIS['deliverables']
+
+
+def test_offloaded_analysis_is_loaded_from_storage(db, bucket):
+    compact = analysis_store.offload_analysis('c1', ANALYSIS)
+    compact.pop('analyzedAt')
+    seed(db, {'userId': 'u1', 'analysis': compact})
+    analysis_store._cache.clear()
+
+    analysis = get_contract_analysis('c1')
+
+    assert analysis == {k: ANALYSIS[k] for k in ('summary', 'deliverables', 'milestones')}
+    assert get_full_analysis('c1', user_id='u1')['risks'] == ANALYSIS['risks']
+
+
+def test_missing_analysis_and_foreign_owner_fail(db):
+    seed(db, {'userId': 'u1'})
+    with pytest.raises(ValueError):
+        get_contract_analysis('c1')
+    with pytest.raises(PermissionError):
+        get_full_analysis('c1', user_id='u2')
+    with pytest.raises(ValueError):
+        get_full_analysis('c1', user_id='u1')
+
+
+def test_invalidate_forces_a_full_read(db, counter):
+    seed(db, {'analysis': ANALYSIS})
+    read_contract('c1', ['analysis.summary'])
+    invalidate('c1')
+    bytes_read = counter.snapshot()['firestoreBytesRead']
+
+    read_contract('c1', ['analysis.summary'])
+
+    assert counter.snapshot()['firestoreBytesRead'] == 2 * bytes_read
+    invalidate()
+    assert not contract_reader._cache
@@ -0,0 +1,87 @@
+from contract_revision import (
+    diff_clauses, merge_revision, attribute_item, Clause,
+    UNCHANGED, MODIFIED, ADDED, DELETED,
+)
+
+OLD_TEXT = """MADDE 1 - Konu
+Yüklenici, müşteri için iOS ve Android mobil uygulaması geliştirecektir.
+
+MADDE 2 - Teslim
+Uygulama makul bir sürede teslim edilecektir ve kabul testleri müşteri tarafından yapılacaktır.
+
+MADDE 3 - Gizlilik
+Taraflar birbirlerinin ticari sırlarını üçüncü kişilerle paylaşmayacaktır."""
+
+NEW_TEXT = """MADDE 1 - Konu
+Yüklenici, müşteri için iOS ve Android mobil uygulaması geliştirecektir.
+
+MADDE 2 - Teslim
+Uygulama makul bir sürede teslim edilecektir ve kabul testleri müşteri ile birlikte yapılacaktır.
+
+MADDE 4 - Fesih
+Taraflardan biri otuz gün önceden yazılı bildirimle sözleşmeyi feshedebilir."""
+
+
+def statuses(diff):
+    return [(status, old.label if old else None, new.label if new else None)
+            for status, old, new in diff.pairs]
+
+
+def test_clauses_are_aligned_as_unchanged_modified_added_and_deleted():
+    diff = diff_clauses(OLD_TEXT, NEW_TEXT)
+    assert statuses(diff) == [
+        (UNCHANGED, 'MADDE 1 - Konu', 'MADDE 1 - Konu'),
+        (MODIFIED, 'MADDE 2 - Teslim', 'MADDE 2 - Teslim'),
+        (ADDED, None, 'MADDE 4 - Fesih'),
+        (DELETED, 'MADDE 3 - Gizlilik', None),
+    ]
+    assert diff.counts() == {UNCHANGED: 1, MODIFIED: 1, ADDED: 1, DELETED: 1}
+    assert [c.label for c in diff.changed_clauses()] == ['MADDE 2 - Teslim', 'MADDE 4 - Fesih']
+    assert 0 < diff.changed_ratio() < 1
+
+
+def test_identical_texts_have_nothing_to_analyze():
+    diff = diff_clauses(OLD_TEXT, OLD_TEXT)
+    assert diff.changed_clauses() == []
+    assert diff.changed_ratio() == 0.0
+
+
+def test_items_are_attributed_by_quote_or_word_overlap():
+    clauses = [Clause(text, i) for i, text in enumerate(OLD_TEXT.split("\n\n"))]
+    quoted = {'clause': 'makul bir sürede teslim edilecektir', 'issue': 'Süre belirsiz'}
+    assert attribute_item('ambiguities', quoted, clauses).index == 1
+    described = {'title': 'Ticari sırlar', 'description': 'taraflar ticari sırlarını paylaşmayacaktır'}
+    assert attribute_item('risks', described, clauses).index == 2
+    assert attribute_item('risks', {'title': 'Genel'}, clauses) is None
+
+
+def test_merge_carries_unchanged_items_and_retires_changed_ones():
+    diff = diff_clauses(OLD_TEXT, NEW_TEXT)
+    previous = {
+        'summary': 'Mobil uygulama',
+        'ambiguities': [
+            {'id': 'amb_1', 'clause': 'mobil uygulaması geliştirecektir', 'issue': 'Kapsam belirsiz'},
+            {'id': 'amb_2', 'clause': 'makul bir sürede teslim edilecektir', 'issue': 'Süre belirsiz'},
+        ],
+        'timeline': {'optimistic': '2026-01-01'},
+    }
+    fresh = {
+        'ambiguities': [
+            {'id': 'amb_1', 'clause': 'otuz gün önceden yazılı bildirimle', 'issue': 'Bildirim şekli'},
+        ],
+        'timeline': {'realistic': '2026-02-01'},
+    }
+
+    merged = merge_revision(previous, diff, fresh, revision=2)
+
+    ambiguities = merged['ambiguities']
+    assert [a['id'] for a in ambiguities] == ['amb_1', 'amb_3']
+    assert ambiguities[0]['provenance']['status'] == 'carried'
+    assert ambiguities[0]['provenance']['clause'] == 'MADDE 1 - Konu'
+    assert ambiguities[1]['provenance'] == {
+        'status': 'new', 'revision': 2,
+        'clauseHash': diff.new_clauses[2].hash, 'clause': 'MADDE 4 - Fesih',
+    }
+    assert merged['revision']['retired'] == {'ambiguities': ['amb_2']}
+    assert merged['summary'] == 'Mobil uygulama'
+    assert merged['timeline'] == {'optimistic': '2026-01-01', 'realistic': '2026-02-01'}
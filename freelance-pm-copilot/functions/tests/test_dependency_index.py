@@ -0,0 +1,75 @@
+import pytest
+import dependency_index
+from firestore_batch import BatchWriter
+from dependency_index import (
+    DependencyIndex, BULK_WRITE_FIELD, bump_tasks_version, bump_tasks_version_in_batch,
+    get_dependency_index, match_tasks, written_in_bulk
+)
+
+TASKS = [
+    {'id': 'api', 'title': 'Ödeme API entegrasyonu', 'estimatedHours': 10},
+    {'id': 'ui', 'title': 'Ödeme ekranı tasarımı', 'estimatedHours': 6, 'dependsOn': ['api']},
+    {'id': 'test', 'title': 'Uçtan uca testler', 'estimatedHours': 4, 'dependsOn': ['ui', 'api']},
+    {'id': 'docs', 'title': 'Dokümantasyon', 'estimatedHours': 2, 'status': 'completed'},
+]
+
+
+@pytest.fixture
+def project(db, monkeypatch):
+    monkeypatch.setattr(dependency_index, '_indexes', {})
+    for task in TASKS:
+        db.collection('tasks').document(task['id']).set(
+            dict({k: v for k, v in task.items() if k != 'id'}, projectId='proj'))
+    return 'proj'
+
+
+def test_impact_follows_dependents_transitively():
+    index = DependencyIndex(TASKS)
+    plan = {'sprints': [{'sprintNum': 1, 'tasks': [{'taskId': 'api'}]},
+                        {'sprintNum': 2, 'tasks': [{'taskId': 'ui'}, {'taskId': 'test'}]}]}
+
+    impact = index.impact(['api'], extra_hours=8, plan=plan)
+
+    assert impact['downstreamTasks'] == ['test', 'ui']
+    assert impact['hoursAtRisk'] == 20
+    assert impact['criticalChainHours'] == 20
+    assert impact['slippedSprints'] == [1, 2]
+    assert index.remaining_hours('docs') == 0
+
+
+def test_index_is_cached_until_the_tasks_version_moves(project, counter):
+    index = get_dependency_index(project)
+    reads = counter.snapshot()['firestoreDocsRead']
+    assert get_dependency_index(project) is index
+    # Only the version document is read again
+    assert counter.snapshot()['firestoreDocsRead'] == reads + 1
+
+    bump_tasks_version(project)
+    rebuilt = get_dependency_index(project)
+    assert rebuilt is not index
+    assert rebuilt.version == 1
+
+
+def test_bulk_writers_bump_the_version_once(project, db):
+    index = get_dependency_index(project)
+    writer = BatchWriter()
+    writer.set(db.collection('tasks').document('new'),
+               {'projectId': project, 'title': 'Yeni', 'dependsOn': ['test'], BULK_WRITE_FIELD: 'run1'})
+    bump_tasks_version_in_batch(writer, project)
+    writer.commit()
+
+    rebuilt = get_dependency_index(project)
+    assert rebuilt is not index
+    assert 'new' in rebuilt.downstream(['api'])
+
+
+def test_trigger_skips_only_fresh_bulk_writes():
+    assert written_in_bulk({}, {BULK_WRITE_FIELD: 'run1'})
+    assert not written_in_bulk({BULK_WRITE_FIELD: 'run1'}, {BULK_WRITE_FIELD: 'run1', 'status': 'done'})
+    assert not written_in_bulk({}, {'status': 'done'})
+
+
+def test_change_requests_match_task_titles():
+    index = DependencyIndex(TASKS)
+    assert match_tasks('Ödeme API entegrasyonu için yeni sağlayıcı', index) == ['api']
+    assert match_tasks('ve ile için', index) == []
@@ -0,0 +1,37 @@
+from firestore_batch import BatchWriter, MAX_BATCH_WRITES
+
+
+def test_writes_are_committed_in_chunks_of_500(db, counter):
+    writer = BatchWriter()
+    refs = [writer.set(writer.new_ref('tasks'), {'n': n}) for n in range(2 * MAX_BATCH_WRITES + 1)]
+    # Ids are allocated up front, before anything is written
+    assert len({ref.id for ref in refs}) == len(refs)
+    assert counter.snapshot().get('firestoreCommits', 0) == 0
+
+    assert writer.commit() == 3
+    assert writer.operations == []
+    snapshot = counter.snapshot()
+    assert (snapshot['firestoreCommits'], snapshot['firestoreDocsWritten']) == (3, len(refs))
+    assert refs[-1].get().to_dict() == {'n': 2 * MAX_BATCH_WRITES}
+
+
+def test_exactly_500_writes_fit_one_commit(db, counter):
+    writer = BatchWriter()
+    for n in range(MAX_BATCH_WRITES):
+        writer.set(writer.new_ref('tasks'), {'n': n})
+    assert writer.commit() == 1
+
+
+def test_updates_and_merges_apply_in_order(db):
+    ref = db.collection('contracts').document('c1')
+    ref.set({'status': 'analyzed', 'title': 'Sözleşme'})
+    writer = BatchWriter(max_writes=2)
+    writer.update(ref, {'status': 'planned'})
+    writer.set(ref, {'planId': 'p1'}, merge=True)
+    writer.update(ref, {'status': 'active'})
+
+    assert writer.commit() == 2
+    assert ref.get().to_dict() == {'status': 'active', 'title': 'Sözleşme', 'planId': 'p1'}
+    assert writer.commits == 2
+    # Nothing queued, nothing sent
+    assert writer.commit() == 0
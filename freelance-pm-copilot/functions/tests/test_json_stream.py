@@ -0,0 +1,68 @@
+import json
+from json_stream import StreamingJsonParser
+
+DOCUMENT = {
+    'summary': 'Mobil uygulama {geliştirme} sözleşmesi',
+    'ambiguities': [
+        {'id': 'amb_1', 'clause': 'Teslim "makul sürede" yapılır', 'severity': 'high'},
+        {'id': 'amb_2', 'clause': 'Ek talepler [gerekirse] ücretlendirilir', 'severity': 'low'},
+    ],
+    'risks': [{'id': 'risk_1', 'title': 'Belirsiz kabul', 'tags': ['a', 'b']}],
+    'timeline': {'optimistic': '2026-01-01'},
+}
+
+
+def feed_in_chunks(parser, text, size):
+    items = []
+    for i in range(0, len(text), size):
+        items.extend(parser.feed(text[i:i + size]))
+    return items
+
+
+def test_items_of_watched_arrays_are_emitted_in_order():
+    text = json.dumps(DOCUMENT, ensure_ascii=False)
+    parser = StreamingJsonParser(['ambiguities', 'risks'])
+
+    items = feed_in_chunks(parser, text, 7)
+
+    assert items == [
+        ('ambiguities', DOCUMENT['ambiguities'][0]),
+        ('ambiguities', DOCUMENT['ambiguities'][1]),
+        ('risks', DOCUMENT['risks'][0]),
+    ]
+    assert parser.finished
+    assert json.loads(parser.document()) == DOCUMENT
+
+
+def test_chunk_boundaries_do_not_matter():
+    text = json.dumps(DOCUMENT, ensure_ascii=False)
+    whole = StreamingJsonParser(['ambiguities', 'risks']).feed(text)
+    for size in (1, 3, 64):
+        assert feed_in_chunks(StreamingJsonParser(['ambiguities', 'risks']), text, size) == whole
+
+
+def test_unwatched_arrays_and_nested_objects_are_not_emitted():
+    text = json.dumps({'deliverables': [{'id': 'del_1'}], 'risks': [{'id': 'r', 'meta': {'x': 1}}]})
+    items = StreamingJsonParser(['risks']).feed(text)
+    assert items == [('risks', {'id': 'r', 'meta': {'x': 1}})]
+
+
+def test_text_before_the_document_is_skipped():
+    parser = StreamingJsonParser(['risks'])
+    items = parser.feed('```json\n{"risks": [{"id": "risk_1"}]}\n```')
+    assert items == [('risks', {'id': 'risk_1'})]
+    assert parser.document() == '{"risks": [{"id": "risk_1"}]}'
+
+
+def test_escaped_quotes_and_braces_inside_strings():
+    text = r'{"risks": [{"title": "a \"}\" b", "description": "[x] {y}"}]}'
+    assert StreamingJsonParser(['risks']).feed(text) == [
+        ('risks', {'title': 'a "}" b', 'description': '[x] {y}'})
+    ]
+
+
+def test_unfinished_document_emits_only_closed_items():
+    parser = StreamingJsonParser(['risks'])
+    items = parser.feed('{"risks": [{"id": "risk_1"}, {"id": "ris')
+    assert items == [('risks', {'id': 'risk_1'})]
+    assert not parser.finished
@@ -0,0 +1,109 @@
+import uuid
+import types
+import pytest
+import llm_client
+from llm_cache import CompletionCache, make_completion_key
+from llm_client import chat_completion, LLM_MAX_OUTPUT_TOKENS
+
+MESSAGES = [{'role': 'user', 'content': 'Sözleşmeyi analiz et'}]
+
+
+def completion(content, finish_reason='stop'):
+    return types.SimpleNamespace(
+        choices=[types.SimpleNamespace(finish_reason=finish_reason, message=types.SimpleNamespace(content=content))],
+        usage=types.SimpleNamespace(total_tokens=10, prompt_tokens=5, completion_tokens=5)
+    )
+
+
+class FakeGroq:
+    """
+    Answers chat.completions.create from a list and records the requests
+    """
+
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.requests = []
+        self.chat = types.SimpleNamespace(completions=self)
+
+    def create(self, **kwargs):
+        self.requests.append(dict(kwargs))
+        return self.answers.pop(0)
+
+
+@pytest.fixture
+def model():
+    return f"test-model-{uuid.uuid4().hex[:8]}"
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(llm_client, 'completion_cache', CompletionCache())
+
+
+def test_complete_answers_are_cached(model):
+    client = FakeGroq(completion('{"ok": true}'))
+    for _ in range(2):
+        assert chat_completion(client, model, MESSAGES, 0.1, max_tokens=512,
+                               response_format={'type': 'json_object'}) == '{"ok": true}'
+    assert len(client.requests) == 1
+
+
+def test_bypass_and_high_temperature_skip_the_cache(model):
+    client = FakeGroq(completion('a'), completion('b'), completion('c'))
+    chat_completion(client, model, MESSAGES, 0.1, max_tokens=512)
+    assert chat_completion(client, model, MESSAGES, 0.1, max_tokens=512, bypass_cache=True) == 'b'
+    assert chat_completion(client, model, MESSAGES, 0.9, max_tokens=512) == 'c'
+
+
+def test_key_covers_model_prompts_temperature_and_budget():
+    key = make_completion_key('m', MESSAGES, 0.1, 512)
+    assert key == make_completion_key('m', list(MESSAGES), 0.1, 512)
+    assert key != make_completion_key('other', MESSAGES, 0.1, 512)
+    assert key != make_completion_key('m', MESSAGES, 0.2, 512)
+    assert key != make_completion_key('m', MESSAGES, 0.1, 1024)
+    assert key != make_completion_key('m', [{'role': 'system', 'content': 'x'}] + MESSAGES, 0.1, 512)
+
+
+def test_cache_evicts_least_recently_used_and_expires_entries():
+    cache = CompletionCache(ttl_seconds=60, max_entries=2)
+    cache.put('a', '1')
+    cache.put('b', '2')
+    cache.get('a')
+    cache.put('c', '3')
+    assert (cache.get('a'), cache.get('b'), cache.get('c')) == ('1', None, '3')
+    assert cache.stats()['evictions'] == 1
+
+    expired = CompletionCache(ttl_seconds=0)
+    expired.put('a', '1')
+    assert expired.get('a') is None
+    assert expired.stats()['expirations'] == 1
+
+
+def test_cache_respects_the_byte_limit():
+    cache = CompletionCache(max_bytes=10)
+    cache.put('big', 'x' * 11)
+    cache.put('a', 'x' * 6)
+    cache.put('b', 'x' * 6)
+    assert cache.get('big') is None and cache.get('a') is None
+    assert cache.stats()['bytes'] == 6
+
+
+def test_truncated_answer_is_retried_with_the_full_budget(model):
+    # Regression: a budget too small for the answer returned cut-off JSON
+    client = FakeGroq(completion('{"risks": [{"id": "ri', 'length'), completion('{"risks": []}'))
+
+    content = chat_completion(client, model, MESSAGES, 0.1, max_tokens=512,
+                              response_format={'type': 'json_object'})
+
+    assert content == '{"risks": []}'
+    assert [r['max_tokens'] for r in client.requests] == [512, LLM_MAX_OUTPUT_TOKENS]
+
+
+def test_answer_truncated_at_the_full_budget_is_not_cached(model):
+    client = FakeGroq(completion('{"a": "cut', 'length'), completion('{"a": "cut', 'length'))
+
+    chat_completion(client, model, MESSAGES, 0.1, max_tokens=LLM_MAX_OUTPUT_TOKENS)
+    chat_completion(client, model, MESSAGES, 0.1, max_tokens=LLM_MAX_OUTPUT_TOKENS)
+
+    # No retry at the maximum, and no cache hit for the second call
+    assert len(client.requests) == 2
@@ -0,0 +1,94 @@
+import json
+import types
+import pytest
+import tracing
+import model_router
+from metrics_report import summarize
+from model_router import routed_completion, streaming_model, SMALL_MODEL, LARGE_MODEL
+
+MESSAGES = [{'role': 'user', 'content': 'Değişiklik talebi'}]
+OPTIONS = [{'id': n} for n in range(3)]
+
+
+class FakeGroq:
+    """
+    Answers by model name and records which models were asked
+    """
+
+    def __init__(self, small, large='{"tasks": [1]}'):
+        self.answers = {SMALL_MODEL: small, LARGE_MODEL: large}
+        self.models = []
+        self.chat = types.SimpleNamespace(completions=self)
+
+    def create(self, **kwargs):
+        self.models.append(kwargs['model'])
+        answer = self.answers[kwargs['model']]
+        if isinstance(answer, Exception):
+            raise answer
+        return types.SimpleNamespace(
+            choices=[types.SimpleNamespace(finish_reason='stop', message=types.SimpleNamespace(content=answer))],
+            usage=types.SimpleNamespace(total_tokens=10, prompt_tokens=5, completion_tokens=5)
+        )
+
+
+@pytest.fixture
+def spans(monkeypatch):
+    records = []
+    monkeypatch.setattr(tracing, 'TRACE_LOG_SPANS', True)
+    monkeypatch.setattr(tracing, '_emit', records.append)
+    monkeypatch.setattr(model_router, '_modes', {})
+    return records
+
+
+def change_order(**fields):
+    return json.dumps(dict({'classification': 'minor_scope', 'options': OPTIONS, 'confidence': 0.9}, **fields))
+
+
+def route(endpoint, client):
+    return routed_completion(endpoint, client, MESSAGES, 0.1, bypass_cache=True)
+
+
+@pytest.mark.parametrize('answer, reason', [
+    ('not json', 'invalid json'),
+    (change_order(classification='major_scope'), 'classification major_scope'),
+    (change_order(confidence=0.4), 'low confidence 0.4'),
+    (change_order(options=[]), 'missing options'),
+])
+def test_tiered_answers_are_escalated(spans, answer, reason):
+    client = FakeGroq(answer, large='{"ok": true}')
+    assert route('change_order', client) == '{"ok": true}'
+    assert client.models == [SMALL_MODEL, LARGE_MODEL]
+    routed = next(r for r in spans if r['span'] == 'llm_route')
+    assert (routed['escalated'], routed['reason']) == (True, reason)
+    assert any(r['span'] == 'llm_escalation' for r in spans)
+
+
+def test_good_small_answers_are_kept(spans):
+    client = FakeGroq(change_order())
+    assert route('change_order', client) == change_order()
+    assert client.models == [SMALL_MODEL]
+    assert [r['span'] for r in spans if r['span'].startswith('llm_')] == ['llm_route']
+
+
+def test_small_model_errors_escalate_only_in_tiered_mode(spans, monkeypatch):
+    client = FakeGroq(RuntimeError('rate limited'))
+    assert route('change_order', client) == '{"tasks": [1]}'
+
+    monkeypatch.setattr(model_router, '_modes', {'change_order': 'small'})
+    with pytest.raises(RuntimeError):
+        route('change_order', FakeGroq(RuntimeError('rate limited')))
+
+
+def test_large_endpoints_and_streams_skip_the_small_model(spans):
+    client = FakeGroq('unused')
+    route('task_generation', client)
+    assert client.models == [LARGE_MODEL]
+    assert streaming_model('change_order') == LARGE_MODEL
+
+
+def test_escalation_rate_is_reported_from_span_counts():
+    stage = lambda count: {'count': count, 'sumMs': 10.0 * count, 'buckets': {'le_10': count}}
+    report = summarize({'analyzeChangeOrder': {'llm_route': stage(4), 'llm_escalation': stage(1)},
+                        'analyzeContract': {'parse': stage(2)}})
+    assert report['analyzeChangeOrder']['llmEscalationRate'] == 0.25
+    assert 'llmEscalationRate' not in report['analyzeContract']
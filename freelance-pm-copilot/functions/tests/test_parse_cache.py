@@ -0,0 +1,75 @@
+import os
+import gzip
+import pytest
+from parse_cache import ParseCache, make_parse_cache_key, make_page_cache_key, compute_file_sha256
+
+
+@pytest.fixture
+def cache(tmp_path, bucket):
+    return ParseCache(bucket=bucket, cache_dir=str(tmp_path / 'local'))
+
+
+def test_keys_depend_on_content_and_settings(tmp_path):
+    pdf = tmp_path / 'a.pdf'
+    pdf.write_bytes(b'%PDF-1.4 test')
+    sha = compute_file_sha256(str(pdf))
+    assert len(sha) == 64
+    key = make_parse_cache_key(sha, 'tr', False)
+    assert key.startswith(sha)
+    assert key != make_parse_cache_key(sha, 'en', False)
+    assert key != make_parse_cache_key(sha, 'tr', True)
+    assert key != make_parse_cache_key(sha, 'tr', False, extractor='tiered')
+    assert make_page_cache_key('abc', 'tr').startswith('page-abc-')
+
+
+def test_miss_then_local_hit(cache):
+    assert cache.get('k') is None
+    cache.put('k', 'Sözleşme metni', parse_seconds=4.0)
+    assert cache.get('k') == 'Sözleşme metni'
+    stats = cache.stats()
+    assert (stats['misses'], stats['localHits'], stats['writes']) == (1, 1, 1)
+    assert stats['hitRate'] == 0.5
+    assert stats['estimatedSecondsSaved'] == 4.0
+
+
+def test_durable_hit_backfills_the_local_tier(tmp_path, bucket):
+    ParseCache(bucket=bucket, cache_dir=str(tmp_path / 'one')).put('k', 'metin')
+    assert 'parse-cache/k.txt.gz' in bucket.objects
+
+    # A fresh instance has an empty local tier
+    other = ParseCache(bucket=bucket, cache_dir=str(tmp_path / 'two'))
+    assert other.get('k') == 'metin'
+    assert os.path.exists(tmp_path / 'two' / 'k.txt.gz')
+    bucket.objects.clear()
+    assert other.get('k') == 'metin'
+    assert (other.stats()['durableHits'], other.stats()['localHits']) == (1, 1)
+
+
+def test_unreadable_local_entry_is_dropped(cache):
+    cache.put('k', 'metin')
+    with open(cache._local_path('k'), 'wb') as f:
+        f.write(b'not gzip')
+    # Served from the durable tier instead
+    assert cache.get('k') == 'metin'
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    text = os.urandom(3000).hex()
+    size = len(gzip.compress(text.encode('utf-8')))
+    cache = ParseCache(cache_dir=str(tmp_path), max_bytes=size * 2 + size // 2)
+    cache.put('a', text + 'a')
+    cache.put('b', text + 'b')
+    os.utime(cache._local_path('a'), (1, 1))
+    os.utime(cache._local_path('b'), (2, 2))
+    cache.get('a')  # touching 'a' makes 'b' the oldest
+    cache.put('c', text + 'c')
+
+    assert cache.get('b') is None
+    assert cache.get('a') == text + 'a'
+    assert cache.get('c') == text + 'c'
+
+
+def test_without_a_bucket_only_the_local_tier_is_used(tmp_path):
+    cache = ParseCache(cache_dir=str(tmp_path))
+    cache.put('k', 'metin')
+    assert cache.get('k') == 'metin'
@@ -0,0 +1,103 @@
+import os
+import hashlib
+import pytest
+import clients
+import contract_analyzer
+from pdf_fetch import FetchedPdf, PdfNotFoundError, PdfTooLargeError, fetch_blob, fetch_url
+
+PDF = b'%PDF-1.4 ' + os.urandom(4096)
+BUCKET_URL = 'https://firebasestorage.googleapis.com/v0/b/bench-bucket/o/contracts%2Fc1%2Fa.pdf?alt=media&token=t'
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=b'', headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.body), chunk_size):
+            yield self.body[start:start + chunk_size]
+
+
+class FakeSession:
+    def __init__(self, response):
+        self.response = response
+        self.urls = []
+
+    def get(self, url, stream=False, timeout=None):
+        self.urls.append(url)
+        return self.response
+
+
+def test_small_bodies_stay_in_memory_and_large_ones_spill_to_disk():
+    pdf = FetchedPdf('test', max_memory_bytes=1024)
+    pdf.write(PDF[:512])
+    assert pdf.path is None
+    pdf.write(PDF[512:])
+    path = pdf.path
+    assert path and os.path.exists(path)
+    assert pdf.sha256 == hashlib.sha256(PDF).hexdigest()
+    with open(pdf.parser_input(), 'rb') as f:
+        assert f.read() == PDF
+    pdf.close()
+    assert not os.path.exists(path)
+
+
+def test_size_limit_is_enforced_while_streaming():
+    pdf = FetchedPdf('test', max_bytes=100)
+    with pytest.raises(PdfTooLargeError):
+        pdf.write(b'x' * 101)
+
+
+def test_blob_is_downloaded_in_one_request(bucket, counter):
+    bucket.objects['contracts/c1/a.pdf'] = PDF
+    pdf = fetch_blob(bucket, 'contracts/c1/a.pdf')
+    assert (pdf.size, pdf.sha256) == (len(PDF), hashlib.sha256(PDF).hexdigest())
+    assert counter.snapshot()['storageReads'] == 1
+    with pytest.raises(PdfNotFoundError):
+        fetch_blob(bucket, 'contracts/c1/missing.pdf')
+
+
+def test_url_fetch_statuses():
+    pdf = fetch_url('https://example.com/a.pdf', session=FakeSession(FakeResponse(200, PDF)))
+    assert pdf.parser_input().read() == PDF
+    with pytest.raises(PdfNotFoundError):
+        fetch_url('https://example.com/a.pdf', session=FakeSession(FakeResponse(404)))
+    with pytest.raises(ValueError):
+        fetch_url('https://example.com/a.pdf', session=FakeSession(FakeResponse(500)))
+    with pytest.raises(PdfTooLargeError):
+        fetch_url('https://example.com/a.pdf', max_bytes=10,
+                  session=FakeSession(FakeResponse(200, PDF, {'Content-Length': str(len(PDF))})))
+
+
+def test_missing_blob_falls_back_to_the_download_url(bucket, monkeypatch):
+    session = FakeSession(FakeResponse(200, PDF))
+    monkeypatch.setitem(clients._clients, 'http_session', session)
+
+    pdf = contract_analyzer.download_pdf_from_storage(pdf_url=BUCKET_URL)
+
+    assert session.urls == [BUCKET_URL]
+    assert pdf.sha256 == hashlib.sha256(PDF).hexdigest()
+
+
+def test_existing_blob_skips_the_url(bucket, monkeypatch):
+    bucket.objects['contracts/c1/a.pdf'] = PDF
+    session = FakeSession(FakeResponse(500))
+    monkeypatch.setitem(clients._clients, 'http_session', session)
+
+    pdf = contract_analyzer.download_pdf_from_storage(pdf_url=BUCKET_URL)
+
+    assert session.urls == []
+    assert pdf.size == len(PDF)
+
+
+def test_missing_blob_without_url_fails(bucket):
+    with pytest.raises(PdfNotFoundError):
+        contract_analyzer.download_pdf_from_storage(pdf_path='contracts/c1/missing.pdf')
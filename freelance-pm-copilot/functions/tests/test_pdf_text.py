@@ -0,0 +1,83 @@
+import io
+import sys
+import pytest
+import contract_analyzer
+from fakes import SCANNED_PAGE_TEXT, fake_pdf, install_fake_llamaparse
+from pdf_fetch import FetchedPdf
+from parse_cache import ParseCache
+from pdf_text import extract_pages, page_hash, page_quality, single_page_pdfs, weak_pages
+
+PAGES = [f"Madde {n}. Yuklenici uygulamayi teslim tarihinde eksiksiz olarak teslim eder. " * 6 for n in range(1, 4)]
+
+
+@pytest.fixture
+def llamaparse(monkeypatch, counter, tmp_path):
+    monkeypatch.setattr(contract_analyzer, 'parse_cache', ParseCache(cache_dir=str(tmp_path)))
+    monkeypatch.delitem(sys.modules, 'llama_cloud_services', raising=False)
+    install_fake_llamaparse(counter, time_scale=0)
+    monkeypatch.setattr(contract_analyzer, 'get_llama_api_key', lambda: 'test')
+    monkeypatch.setattr(contract_analyzer, 'get_llama_parse_http_client', lambda: None)
+    return counter
+
+
+def fetched(data):
+    pdf = FetchedPdf('test')
+    pdf.write(data)
+    return pdf
+
+
+def test_text_pages_are_extracted_and_scans_are_weak():
+    stream = io.BytesIO(fake_pdf(PAGES, scanned_pages=(1,)))
+    reader, pages = extract_pages(stream)
+
+    assert len(pages) == 3 and 'Madde 3.' in pages[2]
+    assert weak_pages(pages) == [1]
+    # The stream is rewound for the upload
+    assert stream.tell() == 0
+
+
+def test_unreadable_pdfs_are_reported_as_none():
+    assert extract_pages(io.BytesIO(b'not a pdf')) == (None, None)
+
+
+def test_garbled_text_scores_low():
+    assert page_quality(PAGES[0]) == 1.0
+    assert page_quality('(cid:12)(cid:34)(cid:56) ��') < 0.3
+    assert page_quality('   ') == 0.0
+
+
+def test_page_hashes_follow_content_not_position():
+    first = extract_pages(io.BytesIO(fake_pdf(PAGES)))[0]
+    revised = extract_pages(io.BytesIO(fake_pdf([PAGES[0], 'Yeni madde. ' * 30, PAGES[2]])))[0]
+    hashes = [page_hash(page) for page in first.pages]
+    assert len(set(hashes)) == 3
+    assert [page_hash(page) for page in revised.pages] == [hashes[0], page_hash(revised.pages[1]), hashes[2]]
+    assert page_hash(revised.pages[1]) != hashes[1]
+
+
+def test_single_page_documents():
+    reader = extract_pages(io.BytesIO(fake_pdf(PAGES)))[0]
+    (document,) = single_page_pdfs(reader, [2])
+    assert extract_pages(document)[1] == [reader.pages[2].extract_text()]
+
+
+def test_scanned_pages_are_parsed_on_their_own(llamaparse):
+    pdf = fetched(fake_pdf(PAGES, scanned_pages=(1,)))
+    text = contract_analyzer.parse_pdf_with_llama(pdf, use_cache=False)
+    assert 'Madde 1.' in text and 'Madde 3.' in text and SCANNED_PAGE_TEXT.strip() in text
+    assert llamaparse.snapshot()['llamaParsePages'] == 1
+
+
+@pytest.mark.parametrize('broken', ['page_hash', 'single_page_pdfs'])
+def test_page_failures_fall_back_to_the_whole_document(llamaparse, monkeypatch, broken):
+    def fail(*args):
+        raise KeyError('/Contents')
+
+    monkeypatch.setattr(contract_analyzer, broken, fail)
+    pdf = fetched(fake_pdf(PAGES, scanned_pages=(1,)))
+
+    text = contract_analyzer.parse_pdf_with_llama(pdf, use_cache=False)
+
+    assert 'Madde 1.' in text and 'Madde 3.' in text and SCANNED_PAGE_TEXT.strip() in text
+    snapshot = llamaparse.snapshot()
+    assert (snapshot['llamaParseCalls'], snapshot['llamaParsePages']) == (1, 3)
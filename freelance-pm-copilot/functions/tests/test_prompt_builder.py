@@ -0,0 +1,73 @@
+import pytest
+import prompt_builder
+from prompt_builder import (
+    PromptSection, build_prompt, estimate_tokens, size_max_tokens, MAX_TOKENS_STEP, TRUNCATED_TEXT_CHARS
+)
+
+TEMPLATE = "Teslimatlar:\n{deliverables}\n\nKapsam: {summary}"
+
+
+def deliverables(count, description_chars=40):
+    return [
+        {'id': f'del_{n}', 'title': f'Teslimat {n}', 'description': 'x' * description_chars,
+         'acceptanceCriteria': ['kabul'], 'notes': None}
+        for n in range(1, count + 1)
+    ]
+
+
+@pytest.fixture
+def budget(monkeypatch):
+    def set_budget(tokens):
+        monkeypatch.setitem(prompt_builder.PROMPT_BUDGETS, 'test',
+                            {'input': tokens, 'base': 256, 'per_item': 100, 'input_ratio': 0, 'cap': 1024})
+    return set_budget
+
+
+def test_small_prompts_are_sent_compact_and_whole(budget):
+    budget(10000)
+    prompt, max_tokens = build_prompt('test', TEMPLATE, [PromptSection('deliverables', deliverables(3))],
+                                      expected_items=3, summary='Mobil uygulama')
+    assert '"description":"' + 'x' * 40 in prompt
+    # Empty values and indentation are left out
+    assert '"notes"' not in prompt and '\n  ' not in prompt
+    assert max_tokens == 768
+
+
+def test_low_value_fields_are_dropped_first(budget):
+    section = PromptSection('deliverables', deliverables(10, 200), drop=['acceptanceCriteria', 'description'])
+    budget(estimate_tokens(TEMPLATE.format(deliverables=section.render(), summary='')) - 10)
+
+    prompt, _ = build_prompt('test', TEMPLATE, [section], summary='')
+
+    assert '"acceptanceCriteria"' not in prompt
+    assert '"description"' in prompt
+
+
+def test_long_text_is_truncated_before_records_are_dropped(budget):
+    section = PromptSection('deliverables', deliverables(5, 2000), fields=['id', 'title', 'description'])
+    budget(1000)
+
+    prompt, _ = build_prompt('test', TEMPLATE, [section], summary='')
+
+    assert [r['id'] for r in section.records] == ['del_1', 'del_2', 'del_3', 'del_4', 'del_5']
+    assert all(len(r['description']) == TRUNCATED_TEXT_CHARS + 1 for r in section.records)
+    assert estimate_tokens(prompt) <= 1000
+
+
+def test_trailing_records_go_last_and_the_prompt_fits(budget):
+    section = PromptSection('deliverables', deliverables(200, 150))
+    budget(1500)
+
+    prompt, _ = build_prompt('test', TEMPLATE, [section], summary='')
+
+    assert estimate_tokens(prompt) <= 1500
+    assert 0 < len(section.records) < 200
+    # Leading records are kept
+    assert section.records[0]['id'] == 'del_1'
+
+
+def test_output_budget_is_rounded_and_capped(budget):
+    budget(1000)
+    assert size_max_tokens('test') == MAX_TOKENS_STEP
+    assert size_max_tokens('test', expected_items=2) == 512
+    assert size_max_tokens('test', expected_items=100) == 1024
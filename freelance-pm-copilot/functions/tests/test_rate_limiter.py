@@ -0,0 +1,189 @@
+import time
+import uuid
+import types
+import threading
+import pytest
+import tracing
+import rate_limiter
+from rate_limiter import TokenBucket, ModelLimiter, get_limiter, rate_limited_call, rate_limited_stream
+
+REQUEST = {'messages': [{'role': 'user', 'content': 'merhaba'}], 'max_tokens': 100}
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def chunk(text):
+    return types.SimpleNamespace(choices=[types.SimpleNamespace(delta=types.SimpleNamespace(content=text))])
+
+
+@pytest.fixture
+def model():
+    # Limiters are process-wide; a fresh model name gives each test its own
+    return f"test-model-{uuid.uuid4().hex[:8]}"
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(rate_limiter, '_backoff', lambda attempt, retry_after=None: 0.0)
+    monkeypatch.setattr(rate_limiter, 'GROQ_BACKOFF_BASE_SECONDS', 0.0)
+
+
+def test_token_bucket_waits_for_refill():
+    bucket = TokenBucket(60)
+    now = bucket.updated
+    assert bucket.wait_time(60, now) == 0.0
+    bucket.take(60)
+    assert bucket.wait_time(1, now) == pytest.approx(1.0)
+    assert bucket.wait_time(1, now + 1.0) == 0.0
+    bucket.give_back(1000)
+    assert bucket.tokens == bucket.capacity
+
+
+def test_limiter_halves_concurrency_on_429_and_grows_back():
+    limiter = ModelLimiter('m', rpm=1000, tpm=1000000, max_concurrency=8)
+    assert int(limiter.concurrency) == 4
+    limiter.acquire(10)
+    limiter.release(10, rate_limited=True, retry_after=0.0)
+    assert int(limiter.concurrency) == 2
+    assert limiter.snapshot()['rateLimited'] == 1
+    for _ in range(10):
+        limiter.acquire(10)
+        limiter.release(10)
+    assert limiter.concurrency > 2
+    assert limiter.snapshot()['inFlight'] == 0
+
+
+def test_over_estimate_is_credited_back():
+    limiter = ModelLimiter('m', rpm=1000, tpm=1000, max_concurrency=4)
+    limiter.acquire(600)
+    limiter.release(600, used_tokens=100)
+    assert limiter.tokens.tokens == pytest.approx(900, abs=1)
+
+
+def test_call_retries_server_errors(model):
+    attempts = []
+
+    def call():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise StatusError(503)
+        return 'ok'
+
+    assert rate_limited_call(model, REQUEST, call) == 'ok'
+    stats = get_limiter(model).snapshot()
+    assert (len(attempts), stats['retries'], stats['inFlight']) == (3, 2, 0)
+
+
+def test_call_does_not_retry_client_errors(model):
+    def call():
+        raise StatusError(400)
+
+    with pytest.raises(StatusError):
+        rate_limited_call(model, REQUEST, call)
+    assert get_limiter(model).snapshot()['inFlight'] == 0
+
+
+def test_stream_retries_before_the_first_chunk(model):
+    attempts = []
+
+    def create():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise StatusError(429)
+        return iter([chunk('a'), chunk('b')])
+
+    chunks = list(rate_limited_stream(model, REQUEST, create))
+    assert [c.choices[0].delta.content for c in chunks] == ['a', 'b']
+    assert get_limiter(model).snapshot()['inFlight'] == 0
+
+
+def test_stream_failing_midway_is_not_replayed(model):
+    def create():
+        yield chunk('a')
+        raise StatusError(503)
+
+    stream = rate_limited_stream(model, REQUEST, create)
+    assert next(stream).choices[0].delta.content == 'a'
+    with pytest.raises(StatusError):
+        next(stream)
+    assert get_limiter(model).snapshot()['inFlight'] == 0
+
+
+def test_client_disconnect_mid_stream_releases_the_slot(model):
+    # Regression: closing the generator (GeneratorExit) used to leak the slot
+    def create():
+        return iter([chunk('a'), chunk('b'), chunk('c')])
+
+    stream = rate_limited_stream(model, REQUEST, create)
+    next(stream)
+    assert get_limiter(model).snapshot()['inFlight'] == 1
+    stream.close()
+    assert get_limiter(model).snapshot()['inFlight'] == 0
+
+    # The slot is usable again
+    assert len(list(rate_limited_stream(model, REQUEST, create))) == 3
+    assert get_limiter(model).snapshot()['inFlight'] == 0
+
+
+@pytest.fixture
+def shared(monkeypatch, db):
+    backoff = rate_limiter.SharedBackoff(enabled=True, sync_seconds=0.05)
+    monkeypatch.setattr(rate_limiter, 'shared_backoff', backoff)
+    return backoff
+
+
+def test_shared_pause_from_another_instance_is_honoured(model, shared, db):
+    document = db.collection('groqRateLimits').document(model)
+    document.set({'pausedUntil': time.time() + 0.2})
+    limiter = ModelLimiter(model, rpm=600, tpm=100000)
+
+    limiter.acquire(10)
+    assert time.time() >= document.get().to_dict()['pausedUntil'] - 0.05
+    limiter.release(10)
+
+
+def test_shared_pause_is_read_without_holding_the_limiter_lock(model, shared, db, monkeypatch):
+    limiter = ModelLimiter(model, rpm=600, tpm=100000)
+    lock_free_during_reads = []
+    document = db.collection('groqRateLimits').document(model)
+    original_get = type(document).get
+
+    def get(self, *args, **kwargs):
+        # release() on another thread must not wait for this read
+        probe = threading.Thread(target=lambda: lock_free_during_reads.append(
+            limiter._condition.acquire(timeout=0) and (limiter._condition.release() or True)))
+        probe.start()
+        probe.join()
+        return original_get(self, *args, **kwargs)
+
+    monkeypatch.setattr(type(document), 'get', get)
+    document.set({'pausedUntil': time.time() + 0.15})
+
+    limiter.acquire(10)
+    limiter.release(10)
+    assert len(lock_free_during_reads) >= 2
+    assert all(lock_free_during_reads)
+
+
+def test_limiter_state_is_recorded_on_the_llm_span(model, monkeypatch):
+    records = []
+    monkeypatch.setattr(tracing, '_emit', records.append)
+    answers = [StatusError(429), 'ok']
+
+    def call():
+        answer = answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    with tracing.span('llm', model=model):
+        rate_limited_call(model, REQUEST, call)
+
+    llm = records[-1]
+    assert (llm['retries'], llm['rateLimited']) == (1, 1)
+    assert llm['concurrencyLimit'] == get_limiter(model).snapshot()['concurrency']
+    assert 'queueMs' in llm
@@ -0,0 +1,64 @@
+from datetime import date
+import pytest
+from sprint_scheduler import schedule_sprints
+from replanner import save_plan_version, load_current_plan_version, load_plan_snapshot, replan_project, ReplanError
+
+START = date(2026, 1, 5)
+TASKS = [
+    {'id': 'a', 'title': 'A', 'estimatedHours': 10},
+    {'id': 'b', 'title': 'B', 'estimatedHours': 10, 'dependsOn': ['a']},
+    {'id': 'c', 'title': 'C', 'estimatedHours': 10},
+]
+TEAM = {'people': [
+    {'id': 'p1', 'name': 'Ayşe', 'hoursPerWeek': 40, 'currentWorkload': 0},
+    {'id': 'p2', 'name': 'Mehmet', 'hoursPerWeek': 40, 'currentWorkload': 0},
+]}
+
+
+@pytest.fixture
+def project(db, bucket):
+    plan = schedule_sprints(TASKS, TEAM, 2, start_date=START)
+    save_plan_version('proj', plan, TASKS, TEAM, 2, START.isoformat(), 'Initial plan')
+    return plan
+
+
+def test_version_keeps_task_ids_and_stores_the_snapshot_in_storage(project, bucket):
+    _, version = load_current_plan_version('proj')
+    assert version['taskIds'] == ['a', 'b', 'c']
+    assert 'tasks' not in version and 'teamData' not in version
+    assert version['snapshot']['path'] in bucket.objects
+    assert load_plan_snapshot(version) == (TASKS, TEAM)
+
+
+def test_replan_uses_live_tasks_and_assignments(project, db):
+    db.collection('tasks').document('a').set({'projectId': 'proj', 'title': 'A', 'estimatedHours': 10,
+                                              'status': 'done'})
+    db.collection('tasks').document('c').set({'projectId': 'proj', 'title': 'C', 'estimatedHours': 30})
+    placed_c = next(t['assignedTo'] for s in project['sprints'] for t in s['tasks'] if t['taskId'] == 'c')
+    other = 'p1' if placed_c == 'p2' else 'p2'
+    db.collection('assignments').document('x').set({'taskId': 'c', 'personId': other, 'personName': 'X',
+                                                    'assignedAt': '2026-01-06'})
+
+    result = replan_project('proj', [{'type': 'delay', 'taskId': 'a', 'extraHours': 20}], 'Gecikme')
+
+    # The done task keeps its place even though it was delayed
+    assert result['diff']['rescheduledTasks'] == ['b']
+    scheduled = {t['taskId']: t for s in result['newPlan']['sprints'] for t in s['tasks']}
+    assert scheduled['c']['assignedTo'] == other
+    assert scheduled['c']['estimatedHours'] == 30
+    assert result['version'] == 2
+
+
+def test_replan_without_a_plan_version_fails(db, bucket):
+    with pytest.raises(ReplanError):
+        replan_project('missing', [], 'Gecikme')
+
+
+def test_completed_tasks_count_as_done(project, db):
+    # 'completed' counts as done, as in the dependency index
+    db.collection('tasks').document('a').set({'projectId': 'proj', 'title': 'A', 'estimatedHours': 10,
+                                              'status': 'completed'})
+
+    result = replan_project('proj', [{'type': 'delay', 'taskId': 'a', 'extraHours': 20}], 'Gecikme')
+
+    assert result['diff']['rescheduledTasks'] == ['b']
@@ -0,0 +1,42 @@
+from sprint_planner import parse_sprint_task, save_sprint_plan_to_firestore
+
+SPRINT_PLAN = [
+    {'sprint_num': 1, 'sprint_hedefi': 'Altyapı', 'gorevler': [
+        {'gorev': 'API tasarımı', 'tahmini_saat': 16},
+        {'gorev': 'Giriş ekranı', 'tahmini_saat': '12'},
+    ]},
+    {'sprint_num': 2, 'sprint_hedefi': 'Ödeme', 'gorevler': [
+        {'gorev': 'Ödeme entegrasyonu', 'tahmini_saat': 24},
+    ]},
+]
+
+
+def test_task_items_carry_their_estimates():
+    assert parse_sprint_task({'gorev': 'API tasarımı', 'tahmini_saat': 16}) == ('API tasarımı', 16.0)
+    assert parse_sprint_task({'gorev': 'Test', 'tahmini_saat': 'yok'}) == ('Test', None)
+    assert parse_sprint_task({'gorev': 'Test', 'tahmini_saat': 0}) == ('Test', None)
+    # Completions cached before the prompt asked for hours
+    assert parse_sprint_task('Eski görev') == ('Eski görev', None)
+
+
+def test_saved_plan_has_a_forecast_timeline(db):
+    db.collection('contracts').document('c1').set({'status': 'analyzed'})
+
+    plan_id = save_sprint_plan_to_firestore('c1', SPRINT_PLAN, 2)
+
+    plan = db.collection('plans').document(plan_id).get().to_dict()
+    assert [t['estimatedHours'] for s in plan['sprints'] for t in s['tasks']] == [16.0, 12.0, 24.0]
+    timeline = plan['timeline']
+    assert timeline['realistic'] and timeline['optimistic'] <= timeline['realistic'] <= timeline['pessimistic']
+    assert timeline['p50Days'] > 0
+    assert db.collection('contracts').document('c1').get().to_dict()['planId'] == plan_id
+
+
+def test_plan_without_estimates_leaves_the_timeline_blank(db):
+    db.collection('contracts').document('c1').set({'status': 'analyzed'})
+    plan = [{'sprint_num': 1, 'sprint_hedefi': 'Altyapı', 'gorevler': ['API tasarımı']}]
+
+    plan_id = save_sprint_plan_to_firestore('c1', plan, 2)
+
+    timeline = db.collection('plans').document(plan_id).get().to_dict()['timeline']
+    assert timeline == {'optimistic': '', 'realistic': '', 'pessimistic': ''}
@@ -0,0 +1,79 @@
+from datetime import date
+from sprint_scheduler import schedule_sprints, topological_order, _normalize_tasks
+
+START = date(2026, 1, 5)
+
+TEAM = {
+    'people': [
+        {'id': 'p1', 'name': 'Ayşe', 'hoursPerWeek': 20, 'currentWorkload': 0,
+         'skills': [{'skillKey': 'React', 'level': 4}]},
+        {'id': 'p2', 'name': 'Mehmet', 'hoursPerWeek': 20, 'currentWorkload': 0,
+         'skills': [{'skillKey': 'Flutter', 'level': 5}]},
+    ]
+}
+
+
+def placements(plan):
+    return {task['taskId']: (sprint['sprintNum'], task['assignedTo'])
+            for sprint in plan['sprints'] for task in sprint['tasks']}
+
+
+def test_dependencies_come_first():
+    tasks = [
+        {'id': 'b', 'title': 'B', 'dependsOn': ['a']},
+        {'id': 'a', 'title': 'A'},
+        {'id': 'c', 'title': 'C', 'dependsOn': ['b', 'a']},
+    ]
+    ordered = topological_order(_normalize_tasks(tasks, []))
+    assert [t['id'] for t in ordered] == ['a', 'b', 'c']
+
+
+def test_dependent_task_lands_in_a_later_sprint():
+    tasks = [
+        {'id': 'b', 'title': 'B', 'estimatedHours': 20, 'dependsOn': ['a'], 'requiredSkills': ['React']},
+        {'id': 'a', 'title': 'A', 'estimatedHours': 20, 'requiredSkills': ['React']},
+    ]
+    plan = schedule_sprints(tasks, TEAM, 1, start_date=START)
+    placed = placements(plan)
+    assert placed['a'] == (1, 'p1')
+    assert placed['b'] == (2, 'p1')
+    assert plan['sprints'][0]['startDate'] == '2026-01-05'
+    assert plan['sprints'][1]['startDate'] == '2026-01-12'
+
+
+def test_tasks_go_to_the_person_with_the_skill():
+    tasks = [
+        {'id': 'web', 'title': 'Web', 'estimatedHours': 10, 'requiredSkills': ['React']},
+        {'id': 'app', 'title': 'App', 'estimatedHours': 10, 'requiredSkills': ['Flutter']},
+    ]
+    placed = placements(schedule_sprints(tasks, TEAM, 1, start_date=START))
+    assert placed == {'web': (1, 'p1'), 'app': (1, 'p2')}
+
+
+def test_sprint_capacity_is_never_exceeded():
+    tasks = [{'id': f't{i}', 'title': f'T{i}', 'estimatedHours': 8} for i in range(10)]
+    plan = schedule_sprints(tasks, TEAM, 1, start_date=START)
+    for sprint in plan['sprints']:
+        load = {}
+        for task in sprint['tasks']:
+            load[task['assignedTo']] = load.get(task['assignedTo'], 0) + task['estimatedHours']
+        assert all(hours <= 20 for hours in load.values())
+    assert len(placements(plan)) == 10
+
+
+def test_task_larger_than_a_sprint_is_unassigned():
+    tasks = [{'id': 'huge', 'title': 'Huge', 'estimatedHours': 500}]
+    plan = schedule_sprints(tasks, TEAM, 1, start_date=START)
+    assert [t['taskId'] for t in plan['unassignedTasks']] == ['huge']
+    assert plan['sprints'] == []
+
+
+def test_pinned_tasks_keep_their_sprint_and_assignee():
+    tasks = [
+        {'id': 'a', 'title': 'A', 'estimatedHours': 10, 'requiredSkills': ['React']},
+        {'id': 'b', 'title': 'B', 'estimatedHours': 10, 'requiredSkills': ['React']},
+    ]
+    pinned = {'a': {'sprintNum': 3, 'assignedTo': 'p2'}}
+    placed = placements(schedule_sprints(tasks, TEAM, 1, start_date=START, pinned=pinned))
+    assert placed['a'] == (3, 'p2')
+    assert placed['b'] == (1, 'p1')
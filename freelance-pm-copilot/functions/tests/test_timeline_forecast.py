@@ -0,0 +1,58 @@
+import numpy as np
+from timeline_forecast import forecast_timeline, forecast_plan, sample_durations, simulate_finish_days
+
+
+def test_fixed_durations_give_an_exact_forecast():
+    tasks = [
+        {'id': 'a', 'estimatedHours': 16},
+        {'id': 'b', 'estimatedHours': 8, 'dependsOn': ['a']},
+    ]
+    forecast = forecast_timeline(tasks, start_date='2026-01-05', trials=100, distribution='fixed')
+    # 24 hours at 8 hours a day = 3 working days = 5 calendar days
+    assert (forecast['p50Days'], forecast['p90Days']) == (5, 5)
+    assert forecast['optimistic'] == forecast['pessimistic'] == '2026-01-10'
+
+
+def test_one_person_runs_tasks_one_at_a_time():
+    tasks = [
+        {'id': 'a', 'estimatedHours': 16, 'assignedTo': 'p'},
+        {'id': 'b', 'estimatedHours': 16, 'assignedTo': 'p'},
+    ]
+    finish = simulate_finish_days(tasks, people={'p': 8}, trials=10, distribution='fixed')
+    assert np.all(finish == 4)
+    # Unassigned work shares the pooled team, which is no faster
+    assert np.all(simulate_finish_days(tasks, trials=10, distribution='fixed') == 4)
+
+
+def test_pert_samples_stay_within_the_estimate_spread():
+    rng = np.random.default_rng(0)
+    durations = sample_durations([{'estimatedHours': 10}], 5000, 'pert', rng=rng)
+    assert durations.shape == (1, 5000)
+    assert durations.min() >= 8 and durations.max() <= 20
+    # Estimates are more often low than high
+    assert np.median(durations) > 10
+
+
+def test_explicit_bounds_override_the_default_spread():
+    rng = np.random.default_rng(0)
+    durations = sample_durations(
+        [{'estimatedHours': 10, 'optimisticHours': 9, 'pessimisticHours': 11}], 2000, 'triangular', rng=rng
+    )
+    assert durations.min() >= 9 and durations.max() <= 11
+
+
+def test_percentiles_are_ordered_and_seeded():
+    tasks = [{'id': str(i), 'estimatedHours': 8 + i} for i in range(5)]
+    first = forecast_timeline(tasks, start_date='2026-01-05', trials=2000, seed=7)
+    assert first['p50Days'] <= first['p75Days'] <= first['p90Days']
+    assert first == forecast_timeline(tasks, start_date='2026-01-05', trials=2000, seed=7)
+
+
+def test_forecast_plan_reads_bounds_from_input_tasks():
+    plan = {'sprints': [{'tasks': [{'taskId': 'a', 'estimatedHours': 8, 'assignedTo': 'p1'}]}]}
+    team = {'people': [{'id': 'p1', 'hoursPerWeek': 40, 'currentWorkload': 0}]}
+    forecast = forecast_plan(plan, [{'id': 'a', 'optimisticHours': 8, 'pessimisticHours': 8}], team,
+                             start_date='2026-01-05', trials=200, seed=1)
+    # One 8-hour working day, two calendar days
+    assert forecast['p50Days'] == forecast['p90Days'] == 2
+    assert forecast['optimistic'] == '2026-01-07'
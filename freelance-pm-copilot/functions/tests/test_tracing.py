@@ -0,0 +1,106 @@
+import types
+import pytest
+import tracing
+from tracing import (
+    LatencyHistograms, annotate, bucket_label, percentile_from_buckets, propagate, span, trace_block, traced
+)
+from concurrent.futures import ThreadPoolExecutor
+
+
+@pytest.fixture
+def records(monkeypatch):
+    emitted = []
+    monkeypatch.setattr(tracing, '_emit', emitted.append)
+    monkeypatch.setattr(tracing, 'histograms', LatencyHistograms())
+    # Never flush from inside a test
+    monkeypatch.setattr(tracing, 'METRICS_FLUSH_SECONDS', float('inf'))
+    return emitted
+
+
+def test_spans_carry_attributes_and_annotations(records):
+    with trace_block('generateTasks'):
+        with span('firestore_read', collection='contracts') as attrs:
+            attrs['documents'] = 3
+            with span('llm', model='m'):
+                annotate(tokens=120)
+            annotate(cached=False)
+
+    llm, read, total = records
+    assert (llm['span'], llm['tokens'], llm['endpoint']) == ('llm', 120, 'generateTasks')
+    assert (read['documents'], read['cached']) == (3, False)
+    assert llm['trace'] == read['trace'] == total['trace']
+    assert set(total['stagesMs']) == {'firestore_read', 'llm'}
+
+
+def test_failed_spans_and_handlers_are_marked(records):
+    @traced('analyzeContract')
+    def handler():
+        with span('parse'):
+            raise ValueError('bozuk PDF')
+
+    with pytest.raises(ValueError):
+        handler()
+    parse, total = records
+    assert (parse['status'], parse['error'], parse['severity']) == ('error', 'ValueError', 'WARNING')
+    assert total['status'] == 'error'
+
+
+def test_error_responses_are_recorded_by_status_code(records):
+    @traced('getAnalysisJob')
+    def handler():
+        return types.SimpleNamespace(status_code=404)
+
+    handler()
+    assert records[-1]['status'] == '404'
+
+
+def test_stage_latencies_feed_the_endpoint_histograms(records):
+    for _ in range(3):
+        with trace_block('analyzeChangeOrder'):
+            with span('llm'):
+                pass
+    stages = tracing.histograms.snapshot()['analyzeChangeOrder']
+    assert stages['total']['count'] == stages['llm']['count'] == 3
+    # Spans outside any endpoint still count
+    with span('parse'):
+        pass
+    assert tracing.histograms.snapshot()['untraced']['parse']['count'] == 1
+
+
+def test_worker_threads_stay_in_the_callers_trace(records):
+    def analyze_chunk(part):
+        with span('chunk', part=part):
+            pass
+
+    with trace_block('analyzeContract') as trace:
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            list(pool.map(propagate(analyze_chunk), [1, 2]))
+            # Without propagate the worker has no trace
+            pool.submit(analyze_chunk, 3).result()
+
+    traces = {r['part']: r['trace'] for r in records if r.get('span') == 'chunk'}
+    assert traces == {1: trace.trace_id, 2: trace.trace_id, 3: None}
+
+
+def test_histograms_are_merged_into_firestore(db, records):
+    histograms = LatencyHistograms()
+    histograms.record('generateTasks', 'total', 40)
+    histograms.record('generateTasks', 'total', 900)
+    assert histograms.flush() == 1
+    # Nothing new, nothing written
+    assert histograms.flush() == 0
+
+    (document,) = [s.to_dict() for s in db.collection('latencyHistograms').stream()]
+    total = document['stages']['total']
+    assert (document['endpoint'], total['count'], total['sumMs']) == ('generateTasks', 2, 940)
+    assert total['buckets'] == {'le_50': 1, 'le_1000': 1}
+
+
+def test_percentiles_come_from_bucket_bounds():
+    assert bucket_label(5) == 'le_5'
+    assert bucket_label(10 ** 6) == 'inf'
+    buckets = {'le_10': 50, 'le_100': 45, 'le_1000': 5}
+    assert percentile_from_buckets(buckets, 100, 0.5) == 10
+    assert percentile_from_buckets(buckets, 100, 0.95) == 100
+    assert percentile_from_buckets(buckets, 100, 0.99) == 1000
+    assert percentile_from_buckets({}, 0, 0.5) is None
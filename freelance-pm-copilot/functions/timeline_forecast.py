@@ -0,0 +1,220 @@
+import os
+import numpy as np
+from datetime import date, timedelta
+from sprint_scheduler import workload_percent
+
+# Monte Carlo timeline forecaster.
+# Task durations are sampled around estimatedHours and propagated through the
+# dependsOn DAG and per-person capacity. All trials run in one vectorized pass:
+# the loop is over tasks (in topological order), each step is an array op over
+# every trial at once.
+
+FORECAST_TRIALS = int(os.environ.get("FORECAST_TRIALS", "10000"))
+FORECAST_DISTRIBUTION = os.environ.get("FORECAST_DISTRIBUTION", "pert")
+
+# Default spread around estimatedHours when a task has no explicit
+# optimisticHours/pessimisticHours: estimates are far more often low than high
+DEFAULT_UNCERTAINTY = {'optimistic': 0.8, 'pessimistic': 2.0}
+DEFAULT_TASK_HOURS = 8
+DEFAULT_HOURS_PER_DAY = 8
+WORKDAYS_PER_WEEK = 5
+PERCENTILES = (10, 50, 75, 90)
+
+
+def _as_positive(value, default):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return default
+    return number if number > 0 else default
+
+
+def _duration_bounds(tasks, uncertainty):
+    """
+    (low, mode, high) hour arrays, one entry per task
+    """
+    low_factor = uncertainty.get('optimistic', DEFAULT_UNCERTAINTY['optimistic'])
+    high_factor = uncertainty.get('pessimistic', DEFAULT_UNCERTAINTY['pessimistic'])
+    mode = np.array([_as_positive(t.get('estimatedHours'), DEFAULT_TASK_HOURS) for t in tasks])
+    low = np.array([
+        _as_positive(t.get('optimisticHours'), m * low_factor) for t, m in zip(tasks, mode)
+    ])
+    high = np.array([
+        _as_positive(t.get('pessimisticHours'), m * high_factor) for t, m in zip(tasks, mode)
+    ])
+    low = np.minimum(low, mode)
+    high = np.maximum(high, mode)
+    return low, mode, high
+
+
+def sample_durations(tasks, trials, distribution=FORECAST_DISTRIBUTION, uncertainty=None, rng=None):
+    """
+    Sample task durations in hours, shape (len(tasks), trials)
+    """
+    rng = rng or np.random.default_rng()
+    low, mode, high = _duration_bounds(tasks, uncertainty or DEFAULT_UNCERTAINTY)
+    shape = (len(tasks), trials)
+    low, mode, high = low[:, None], mode[:, None], high[:, None]
+    spread = np.where(high > low, high - low, 1.0)
+
+    if distribution == 'pert':
+        # Beta-PERT: beta distribution scaled to [low, high] with its mode at the estimate
+        alpha = (1 + 4 * (mode - low) / spread)[:, 0]
+        beta = (1 + 4 * (high - mode) / spread)[:, 0]
+        unit = np.empty(shape)
+        # Tasks using the default spread share one shape; sampling with scalar
+        # parameters per group is several times faster than per-element ones
+        shapes, group = np.unique(np.round(np.stack([alpha, beta], axis=1), 6), axis=0, return_inverse=True)
+        group = group.reshape(-1)
+        for g, (a, b) in enumerate(shapes):
+            rows = np.flatnonzero(group == g)
+            unit[rows] = rng.beta(a, b, size=(len(rows), trials))
+        samples = low + unit * (high - low)
+    elif distribution == 'triangular':
+        samples = low + (high - low) * _triangular_unit(rng.random(shape), (mode - low) / spread)
+    elif distribution == 'lognormal':
+        # Median at the estimate; high is treated as the 90th percentile
+        sigma = np.log(np.maximum(high / mode, 1.0 + 1e-9)) / 1.2816
+        samples = mode * np.exp(sigma * rng.standard_normal(shape))
+    elif distribution == 'fixed':
+        samples = np.broadcast_to(mode, shape).copy()
+    else:
+        raise ValueError(f"Unknown forecast distribution: {distribution}")
+    return samples
+
+
+def _triangular_unit(u, c):
+    """
+    Inverse CDF of the triangular distribution on [0, 1] with mode c
+    """
+    c = np.broadcast_to(c, u.shape)
+    return np.where(u < c, np.sqrt(u * c), 1 - np.sqrt((1 - u) * (1 - c)))
+
+
+def _topological_indices(tasks):
+    index_by_id = {str(t.get('id') or t.get('taskId')): i for i, t in enumerate(tasks)}
+    deps = [
+        [index_by_id[str(d)] for d in (t.get('dependsOn') or []) if str(d) in index_by_id]
+        for t in tasks
+    ]
+    indegree = [len(d) for d in deps]
+    dependents = [[] for _ in tasks]
+    for i, task_deps in enumerate(deps):
+        for d in task_deps:
+            dependents[d].append(i)
+
+    order = [i for i, n in enumerate(indegree) if n == 0]
+    for i in order:
+        for dependent in dependents[i]:
+            indegree[dependent] -= 1
+            if indegree[dependent] == 0:
+                order.append(dependent)
+    if len(order) < len(tasks):
+        # Cycles: drop the offending edges and keep input order
+        placed = set(order)
+        for i in range(len(tasks)):
+            if i not in placed:
+                deps[i] = [d for d in deps[i] if d in placed]
+                order.append(i)
+                placed.add(i)
+    return order, deps
+
+
+def simulate_finish_days(tasks, people=None, trials=FORECAST_TRIALS, distribution=FORECAST_DISTRIBUTION,
+                         uncertainty=None, seed=None):
+    """
+    Sampled project length in working days, shape (trials,).
+
+    people maps personId -> working hours per day. Tasks with an assignedTo in
+    people run one at a time on that person in list order; other tasks share a
+    pooled team whose total throughput caps the overall pace.
+    """
+    if not tasks:
+        return np.zeros(trials)
+
+    rng = np.random.default_rng(seed)
+    durations = sample_durations(tasks, trials, distribution, uncertainty, rng)
+    people = people or {}
+    order, deps = _topological_indices(tasks)
+
+    finish = np.zeros((len(tasks), trials))
+    person_free = {}
+    for i in order:
+        start = finish[deps[i]].max(axis=0) if deps[i] else np.zeros(trials)
+        person_id = tasks[i].get('assignedTo')
+        if person_id in people:
+            start = np.maximum(start, person_free.get(person_id, 0.0))
+            finish[i] = start + durations[i] / people[person_id]
+            person_free[person_id] = finish[i]
+        else:
+            finish[i] = start + durations[i] / DEFAULT_HOURS_PER_DAY
+
+    makespan = finish.max(axis=0)
+    unassigned = np.array([t.get('assignedTo') not in people for t in tasks])
+    team_hours_per_day = sum(people.values()) or DEFAULT_HOURS_PER_DAY
+    if unassigned.any():
+        # Unassigned work cannot go faster than the whole team working on it
+        makespan = np.maximum(makespan, durations[unassigned].sum(axis=0) / team_hours_per_day)
+    return makespan
+
+
+def hours_per_day(team_data):
+    """
+    personId -> available working hours per day, net of current workload
+    """
+    people = {}
+    for person in (team_data or {}).get('people') or []:
+        person_id = person.get('id')
+        if not person_id:
+            continue
+        # Keep a sliver of capacity so a fully booked person still finishes eventually
+        busy = min(workload_percent(team_data, person), 95.0)
+        weekly = _as_positive(person.get('hoursPerWeek'), DEFAULT_HOURS_PER_DAY * WORKDAYS_PER_WEEK)
+        if person.get('hoursPerWeek') == 0:
+            # Off the project: nothing can be assigned to them
+            continue
+        people[str(person_id)] = weekly / WORKDAYS_PER_WEEK * (1 - busy / 100.0)
+    return people
+
+
+def forecast_timeline(tasks, team_data=None, start_date=None, trials=FORECAST_TRIALS,
+                      distribution=FORECAST_DISTRIBUTION, uncertainty=None, seed=None):
+    """
+    Percentile forecast in calendar days plus optimistic/realistic/pessimistic
+    end dates (p10/p50/p90)
+    """
+    working_days = simulate_finish_days(
+        tasks, hours_per_day(team_data), trials, distribution, uncertainty, seed
+    )
+    # Working days -> calendar days (weekends)
+    calendar_days = np.ceil(working_days * 7 / WORKDAYS_PER_WEEK)
+    p10, p50, p75, p90 = (int(v) for v in np.percentile(calendar_days, PERCENTILES))
+
+    if isinstance(start_date, str) and start_date:
+        start = date.fromisoformat(start_date[:10])
+    else:
+        start = start_date or date.today()
+
+    return {
+        'p50Days': p50,
+        'p75Days': p75,
+        'p90Days': p90,
+        'optimistic': (start + timedelta(days=p10)).isoformat(),
+        'realistic': (start + timedelta(days=p50)).isoformat(),
+        'pessimistic': (start + timedelta(days=p90)).isoformat(),
+        'trials': int(trials),
+        'distribution': distribution
+    }
+
+
+def forecast_plan(sprint_plan, tasks=None, team_data=None, start_date=None, **kwargs):
+    """
+    Forecast a smart sprint plan over its scheduled assignments. Input tasks
+    supply optional optimisticHours/pessimisticHours.
+    """
+    input_by_id = {str(t.get('id') or t.get('taskId')): t for t in tasks or []}
+    scheduled_tasks = [
+        dict(input_by_id.get(task['taskId'], {}), id=task['taskId'], **task)
+        for sprint in sprint_plan['sprints'] for task in sprint['tasks']
+    ]
+    return forecast_timeline(scheduled_tasks, team_data, start_date=start_date, **kwargs)
@@ -0,0 +1,288 @@
+import os
+import json
+import time
+import uuid
+import random
+import threading
+import functools
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Lightweight per-request tracing.
+# Endpoints are wrapped with @traced(name); pipeline stages open span(stage)
+# blocks (download, parse, llm, json_decode, firestore_read, firestore_write).
+# Every span is printed as one JSON line (Cloud Logging turns these into
+# structured entries) and its duration is added to a per-endpoint latency
+# histogram. Histograms are aggregated in memory and merged into
+# latencyHistograms/{day}_{endpoint} with Increment at most every
+# METRICS_FLUSH_SECONDS; metrics_report.py turns them into p50/p95/p99.
+
+TRACE_LOG_SPANS = os.environ.get("TRACE_LOG_SPANS", "true").lower() != "false"
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() != "false"
+METRICS_FLUSH_SECONDS = float(os.environ.get("METRICS_FLUSH_SECONDS", 60))
+LATENCY_HISTOGRAMS_COLLECTION = 'latencyHistograms'
+# Upper bounds (ms) of the histogram buckets; larger values land in "inf"
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 60000, 120000)
+
+# Request/response payloads in logs: truncated, and printed at all only for a
+# sample of requests
+LOG_PAYLOAD_MAX_CHARS = int(os.environ.get("LOG_PAYLOAD_MAX_CHARS", 300))
+LOG_PAYLOAD_SAMPLE_RATE = float(os.environ.get("LOG_PAYLOAD_SAMPLE_RATE", 0.01))
+
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+
+class Trace:
+    """
+    One endpoint invocation: its id, endpoint name and completed spans
+    """
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.started = time.monotonic()
+        self.sampled = random.random() < LOG_PAYLOAD_SAMPLE_RATE
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, name, duration_ms):
+        with self._lock:
+            self.spans.append((name, duration_ms))
+
+
+def _emit(record):
+    if TRACE_LOG_SPANS:
+        print(json.dumps(record, ensure_ascii=False, default=str))
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Time a stage of the current request. Yields the span's attribute dict so
+    the body can add details (model, tokens, document counts, ...).
+    """
+    trace = _current_trace.get()
+    attrs = dict(attributes)
+    token = _current_span.set(attrs)
+    started = time.monotonic()
+    status = 'ok'
+    try:
+        yield attrs
+    except Exception as e:
+        status = 'error'
+        attrs['error'] = type(e).__name__
+        raise
+    finally:
+        _current_span.reset(token)
+        duration_ms = round((time.monotonic() - started) * 1000, 1)
+        if trace is not None:
+            trace.add(name, duration_ms)
+        _emit({
+            'severity': 'INFO' if status == 'ok' else 'WARNING',
+            'message': f"span {name} {duration_ms}ms",
+            'trace': trace.trace_id if trace else None,
+            'endpoint': trace.endpoint if trace else None,
+            'span': name,
+            'status': status,
+            'durationMs': duration_ms,
+            **attrs
+        })
+        if trace is None:
+            # Stages run outside an endpoint (scripts, tooling) still count
+            histograms.record('untraced', name, duration_ms)
+
+
+def annotate(**attributes):
+    """
+    Add attributes to the innermost open span (no-op outside a span)
+    """
+    attrs = _current_span.get()
+    if attrs is not None:
+        attrs.update(attributes)
+
+
+def propagate(fn):
+    """
+    Wrap fn so it runs inside the caller's trace when handed to a thread pool
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+
+    return run
+
+
+def traced(endpoint):
+    """
+    Decorator for endpoint handlers and triggers: opens a trace, records the
+    total latency and response status, and flushes histograms when due
+    """
+    def decorate(handler):
+        @functools.wraps(handler)
+        def wrapper(*args, **kwargs):
+            trace = Trace(endpoint)
+            token = _current_trace.set(trace)
+            status = 'ok'
+            try:
+                response = handler(*args, **kwargs)
+                code = getattr(response, 'status_code', None)
+                if code is not None and code >= 400:
+                    status = str(code)
+                return response
+            except Exception:
+                status = 'error'
+                raise
+            finally:
+                _current_trace.reset(token)
+                finish_trace(trace, status)
+
+        return wrapper
+
+    return decorate
+
+
+@contextmanager
+def trace_block(endpoint):
+    """
+    Trace a block instead of a whole handler (e.g. the body of a streamed
+    response, which runs after the handler has returned)
+    """
+    trace = Trace(endpoint)
+    token = _current_trace.set(trace)
+    status = 'ok'
+    try:
+        yield trace
+    except Exception:
+        status = 'error'
+        raise
+    finally:
+        _current_trace.reset(token)
+        finish_trace(trace, status)
+
+
+def finish_trace(trace, status='ok'):
+    total_ms = round((time.monotonic() - trace.started) * 1000, 1)
+    with trace._lock:
+        spans = list(trace.spans)
+    stages = {}
+    for name, duration_ms in spans:
+        stages[name] = round(stages.get(name, 0) + duration_ms, 1)
+    _emit({
+        'severity': 'INFO' if status == 'ok' else 'WARNING',
+        'message': f"{trace.endpoint} {status} {total_ms}ms",
+        'trace': trace.trace_id,
+        'endpoint': trace.endpoint,
+        'status': status,
+        'durationMs': total_ms,
+        'stagesMs': stages
+    })
+    histograms.record(trace.endpoint, 'total', total_ms)
+    for name, duration_ms in stages.items():
+        histograms.record(trace.endpoint, name, duration_ms)
+    histograms.flush_if_due()
+
+
+def log_payload(label, value):
+    """
+    Print a request/response payload for sampled requests only, truncated to
+    LOG_PAYLOAD_MAX_CHARS
+    """
+    trace = _current_trace.get()
+    if trace is None or not trace.sampled:
+        return
+    text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False, default=str)
+    if len(text) > LOG_PAYLOAD_MAX_CHARS:
+        text = text[:LOG_PAYLOAD_MAX_CHARS] + f"... ({len(text)} chars)"
+    print(f"{label}: {text}")
+
+
+def bucket_label(duration_ms):
+    for bound in LATENCY_BUCKETS_MS:
+        if duration_ms <= bound:
+            return f"le_{bound}"
+    return "inf"
+
+
+class LatencyHistograms:
+    """
+    In-memory per (endpoint, stage) histograms, merged into Firestore with
+    Increment so every instance adds to the same daily documents
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {}
+        self._pending = {}
+        self._last_flush = time.monotonic()
+
+    def record(self, endpoint, stage, duration_ms):
+        label = bucket_label(duration_ms)
+        with self._lock:
+            for target in (self._totals, self._pending):
+                stats = target.setdefault(endpoint, {}).setdefault(
+                    stage, {'count': 0, 'sumMs': 0.0, 'buckets': {}}
+                )
+                stats['count'] += 1
+                stats['sumMs'] += duration_ms
+                stats['buckets'][label] = stats['buckets'].get(label, 0) + 1
+
+    def snapshot(self):
+        """
+        JSON export of everything recorded by this instance
+        """
+        with self._lock:
+            return json.loads(json.dumps(self._totals))
+
+    def flush_if_due(self):
+        if time.monotonic() - self._last_flush >= METRICS_FLUSH_SECONDS:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if not pending or not METRICS_ENABLED:
+            return 0
+        try:
+            from firebase_admin import firestore
+            from clients import get_db
+            day = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+            db = get_db()
+            batch = db.batch()
+            for endpoint, stages in pending.items():
+                increments = {}
+                for stage, stats in stages.items():
+                    increments[stage] = {
+                        'count': firestore.Increment(stats['count']),
+                        'sumMs': firestore.Increment(round(stats['sumMs'], 1)),
+                        'buckets': {label: firestore.Increment(n) for label, n in stats['buckets'].items()}
+                    }
+                ref = db.collection(LATENCY_HISTOGRAMS_COLLECTION).document(f"{day}_{endpoint}")
+                batch.set(ref, {'endpoint': endpoint, 'day': day, 'stages': increments}, merge=True)
+            batch.commit()
+            return len(pending)
+        except Exception as e:
+            # Metrics are best effort; keep serving
+            print(f"Error flushing latency histograms: {str(e)}")
+            return 0
+
+
+histograms = LatencyHistograms()
+
+
+def percentile_from_buckets(buckets, count, fraction):
+    """
+    Upper bound (ms) of the bucket holding the given fraction of samples
+    """
+    if not count:
+        return None
+    target = fraction * count
+    seen = 0
+    for bound in LATENCY_BUCKETS_MS:
+        seen += buckets.get(f"le_{bound}", 0)
+        if seen >= target:
+            return bound
+    return float('inf')
@@ -42,6 +42,9 @@ export default function ContractDetailPage() {
         const contractData = await ContractService.getContract(contractId);
         
         if (contractData) {
+          if (contractData.analysis?.storage) {
+            contractData.analysis = await ContractService.getFullAnalysis(contractData, await user.getIdToken());
+          }
           setContract(contractData);
         } else {
           console.error('Contract not found');
@@ -191,7 +194,15 @@ export default function ContractDetailPage() {
     analyzedAt: new Date()
   };
 
-  const analysis: ContractAnalysis = contract.analysis ?? mockAnalysis;
+  const storedAnalysis: ContractAnalysis = contract.analysis ?? mockAnalysis;
+  // Analyses written by older or partial runs may miss some lists
+  const analysis: ContractAnalysis = {
+    ...storedAnalysis,
+    deliverables: storedAnalysis.deliverables ?? [],
+    milestones: storedAnalysis.milestones ?? [],
+    paymentPlan: storedAnalysis.paymentPlan ?? [],
+    risks: storedAnalysis.risks ?? []
+  };
 
   return (
     <div className="min-h-screen bg-gray-50">
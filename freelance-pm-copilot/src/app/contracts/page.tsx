@@ -7,7 +7,7 @@ import { Button } from '@/components/ui/button';
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card';
 import { Badge } from '@/components/ui/badge';
 import { ContractService } from '@/lib/firestore-service';
-import { Contract } from '@/lib/firestore-schema';
+import { Contract, countAmbiguities } from '@/lib/firestore-schema';
 import Sidebar from '@/components/Sidebar';
 import PageHeader from '@/components/PageHeader';
 import Loading from '@/components/Loading';
@@ -112,7 +112,7 @@ export default function ContractsPage() {
                   <p className="text-sm font-medium text-gray-400">Critical Issues</p>
                   <p className="text-2xl font-bold text-white">
                     {contracts.reduce((acc, contract) =>
-                      acc + (contract.analysis?.ambiguities?.filter(a => a.severity === 'critical').length || 0), 0
+                      acc + countAmbiguities(contract.analysis, 'critical'), 0
                     )}
                   </p>
                 </div>
@@ -126,7 +126,7 @@ export default function ContractsPage() {
                   <p className="text-sm font-medium text-gray-400">High Risk</p>
                   <p className="text-2xl font-bold text-white">
                     {contracts.reduce((acc, contract) =>
-                      acc + (contract.analysis?.ambiguities?.filter(a => a.severity === 'high').length || 0), 0
+                      acc + countAmbiguities(contract.analysis, 'high'), 0
                     )}
                   </p>
                 </div>
@@ -174,13 +174,13 @@ export default function ContractsPage() {
                       {contract.status}
                     </span>
 
-                    {contract.analysis?.ambiguities && (
+                    {(contract.analysis?.ambiguities || contract.analysis?.severity) && (
                       <div className="flex space-x-1">
                         <span className="text-xs bg-red-400/20 text-red-400 px-2 py-1 rounded">
-                          {contract.analysis.ambiguities.filter(a => a.severity === 'critical').length} critical
+                          {countAmbiguities(contract.analysis, 'critical')} critical
                         </span>
                         <span className="text-xs bg-orange-400/20 text-orange-400 px-2 py-1 rounded">
-                          {contract.analysis.ambiguities.filter(a => a.severity === 'high').length} high
+                          {countAmbiguities(contract.analysis, 'high')} high
                         </span>
                       </div>
                     )}
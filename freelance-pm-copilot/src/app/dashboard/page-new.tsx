@@ -5,7 +5,7 @@ import { useRouter } from 'next/navigation';
 import { useEffect, useState } from 'react';
 import { Button } from '@/components/ui/button';
 import { ContractService, ChangeRequestService, CompanyService, TeamService, PersonService } from '@/lib/firestore-service';
-import { Contract, ChangeRequest, Company, Team, Person } from '@/lib/firestore-schema';
+import { Contract, ChangeRequest, Company, Team, Person, countAmbiguities } from '@/lib/firestore-schema';
 import Sidebar from '@/components/Sidebar';
 import PageHeader from '@/components/PageHeader';
 import StatCard from '@/components/StatCard';
@@ -168,7 +168,7 @@ export default function DashboardPage() {
             <StatCard
               title="Critical Ambiguities"
               value={contracts.reduce((acc, contract) => 
-                acc + (contract.analysis?.ambiguities?.filter(a => a.severity === 'critical').length || 0), 0
+                acc + countAmbiguities(contract.analysis, 'critical'), 0
               )}
               description="Require immediate attention"
               icon={AlertTriangle}
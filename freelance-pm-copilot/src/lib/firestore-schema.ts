@@ -124,6 +124,19 @@ export interface ContractAnalysis {
   };
   summary: string;
   analyzedAt: Date;
+  // Set when the full analysis is kept in Storage (ANALYSIS_STORAGE_MODE=storage):
+  // the contract then only holds summary, timeline, counts and severity, and
+  // ContractService.getFullAnalysis loads the rest
+  counts?: Record<string, number>;
+  severity?: {
+    ambiguities?: Record<string, number>;
+    risks?: Record<string, number>;
+  };
+  storage?: {
+    path: string;
+    sha256: string;
+    bytes: number;
+  };
 }
 
 export interface Ambiguity {
@@ -294,6 +307,13 @@ export const COLLECTIONS = {
 } as const;
 
 // Helper functions for data validation
+// Number of ambiguities of a severity, from the full analysis or its compact summary
+export const countAmbiguities = (analysis: ContractAnalysis | undefined, severity: Ambiguity['severity']): number => {
+  if (!analysis) return 0;
+  if (analysis.ambiguities) return analysis.ambiguities.filter(a => a.severity === severity).length;
+  return analysis.severity?.ambiguities?.[severity] ?? 0;
+};
+
 export const validateContract = (contract: Partial<Contract>): contract is Contract => {
   return !!(
     contract.id &&
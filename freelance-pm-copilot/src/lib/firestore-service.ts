@@ -19,6 +19,7 @@ import {
 import { db } from './firebase-client';
 import { 
   Contract, 
+  ContractAnalysis,
   ChangeRequest, 
   Communication, 
   Plan, 
@@ -37,6 +38,8 @@ import {
   validateCommunication
 } from './firestore-schema';
 
+const CLOUD_FUNCTIONS_BASE_URL = `https://us-central1-${process.env.NEXT_PUBLIC_FIREBASE_PROJECT_ID}.cloudfunctions.net`;
+
 // Contract Service
 export class ContractService {
   static async createContract(contract: Omit<Contract, 'id' | 'createdAt' | 'updatedAt'>): Promise<string> {
@@ -69,6 +72,25 @@ export class ContractService {
     } as Contract;
   }
 
+  // Full analysis of a contract; loaded through getContractAnalysis when the
+  // contract only holds a compact summary of an analysis kept in Storage
+  static async getFullAnalysis(contract: Contract, idToken: string): Promise<ContractAnalysis | undefined> {
+    if (!contract.analysis?.storage) {
+      return contract.analysis;
+    }
+
+    const response = await fetch(
+      `${CLOUD_FUNCTIONS_BASE_URL}/getContractAnalysis?contractId=${encodeURIComponent(contract.id)}`,
+      { headers: { 'Authorization': `Bearer ${idToken}` } }
+    );
+    if (!response.ok) {
+      throw new Error(`Failed to load contract analysis: ${response.status} ${response.statusText}`);
+    }
+
+    const data = await response.json();
+    return { ...data.analysis, analyzedAt: contract.analysis.analyzedAt } as ContractAnalysis;
+  }
+
   static async getContractsByUser(userId: string): Promise<Contract[]> {
     const contractsRef = collection(db, COLLECTIONS.CONTRACTS);
     const q = query(